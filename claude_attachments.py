@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+Załączniki (obrazy, PDF, pliki tekstowe) dla Claude GUI Assistant
+Przygotowanie odbywa się w puli wątków, poza wątkiem Tk: obrazy są zmniejszane do
+rozdzielczości, którą model faktycznie wykorzystuje (dłuższy bok 1568 px, ~1,15 Mpx -
+większe API i tak skaluje w dół) i kodowane ponownie, PDF i tekst trafiają do bloków
+"document". Pliki od 1 MB czytane są przez mmap (hash i base64 bez kopii w pamięci).
+Gotowy ładunek zapisywany jest w cache adresowanym treścią (sha256 pliku + parametry
+przetwarzania) - ponowne dołączenie tego samego pliku, także po restarcie, nie
+przetwarza go drugi raz, a kolejne tury rozmowy używają gotowych bloków.
+
+Użycie:
+    pipeline = AttachmentPipeline()
+    future = pipeline.submit("zdjecie.jpg")    # Future[Attachment]
+    attachment = future.result()
+    attachment.describe()                      # "zdjecie.jpg: 4032×3024 → 1238×928, 3.1 MB → 182 kB (41 ms)"
+    message = user_message("Co jest na zdjęciu?", [attachment])
+    python claude_attachments.py zdjecie.jpg raport.pdf
+"""
+
+import io
+import os
+import sys
+import json
+import mmap
+import time
+import base64
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+CACHE_DIR = "attachment_cache"  # zmienna ATTACHMENT_CACHE_DIR wskazuje inny katalog
+CACHE_VERSION = 1               # zmiana przetwarzania unieważnia wpisy cache
+MEMORY_ITEMS = 64               # gotowych ładunków w pamięci (LRU)
+MEMORY_BYTES = 128 * 1024 * 1024        # ... i łącznie najwyżej tyle (base64)
+DISK_CACHE_BYTES = 1024 * 1024 * 1024   # limit katalogu cache - najdawniej używane wpisy usuwane
+WORKERS = 2
+MMAP_MIN_BYTES = 1024 * 1024    # od tego rozmiaru plik czytany przez mmap
+
+# Obrazy: powyżej tych wymiarów API skaluje obraz w dół - wysyłanie większych to strata
+MAX_IMAGE_EDGE = 1568
+MAX_IMAGE_PIXELS = 1_150_000
+JPEG_QUALITY = 85
+PNG_COMPRESS_LEVEL = 3      # 6 (domyślny PIL) kompresuje kilka % lepiej, ale ~3x wolniej
+MAX_IMAGE_BYTES = 5 * 1024 * 1024   # limit API na obraz
+MAX_PDF_BYTES = 32 * 1024 * 1024    # limit API na zapytanie z PDF
+MAX_TEXT_BYTES = 10 * 1024 * 1024
+
+IMAGE_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg",
+               ".gif": "image/gif", ".webp": "image/webp"}
+PIL_FORMATS = {"PNG": "image/png", "JPEG": "image/jpeg", "GIF": "image/gif", "WEBP": "image/webp"}
+TEXT_SUFFIXES = {".txt", ".md", ".py", ".js", ".ts", ".json", ".csv", ".tsv", ".xml", ".html",
+                 ".css", ".sql", ".yaml", ".yml", ".toml", ".ini", ".log", ".java", ".c", ".h",
+                 ".cpp", ".rs", ".go", ".sh"}
+FILE_TYPES = [
+    ("Obsługiwane pliki", " ".join(f"*{suffix}" for suffix in [*IMAGE_TYPES, ".pdf", *sorted(TEXT_SUFFIXES)])),
+    ("Obrazy", " ".join(f"*{suffix}" for suffix in IMAGE_TYPES)),
+    ("PDF", "*.pdf"),
+    ("Wszystkie pliki", "*.*"),
+]
+
+
+def attachment_kind(path: str) -> str:
+    """Rodzaj załącznika po rozszerzeniu: image, pdf albo text"""
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix in IMAGE_TYPES:
+        return "image"
+    if suffix == ".pdf":
+        return "pdf"
+    return "text"
+
+
+def format_bytes(size: int) -> str:
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.1f} MB"
+    return f"{size / 1024:.0f} kB"
+
+
+def marker(name: str) -> str:
+    """Znacznik załącznika w treści wiadomości (czat, baza, eksport)"""
+    return f"[📎 {name}]"
+
+
+@dataclass
+class Attachment:
+    """Przygotowany załącznik - blok treści dla API i statystyki przetwarzania"""
+    name: str
+    kind: str
+    digest: str             # klucz cache: sha256 pliku + parametry przetwarzania
+    block: Dict
+    source_bytes: int
+    payload_bytes: int      # po przetworzeniu, przed base64
+    seconds: float
+    cached: bool = False
+    detail: str = ""        # np. wymiary przed i po zmniejszeniu
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.source_bytes - self.payload_bytes
+
+    def describe(self) -> str:
+        text = f"{self.name}: "
+        if self.detail:
+            text += f"{self.detail}, "
+        text += f"{format_bytes(self.source_bytes)}"
+        if self.payload_bytes != self.source_bytes:
+            text += f" → {format_bytes(self.payload_bytes)}"
+        timing = "z cache" if self.cached else f"{self.seconds * 1000:.0f} ms"
+        return f"{text} ({timing})"
+
+
+def attachment_name(item) -> str:
+    """Nazwa pliku załącznika - gotowego albo jeszcze przygotowywanego (Future)"""
+    return item.name if isinstance(item, Attachment) else item.attachment_name
+
+
+def user_message(text: str, attachments: List) -> Dict:
+    """
+    Wiadomość użytkownika z załącznikami. content zostaje tekstem (ze znacznikami
+    plików) - tak widzą ją czat, baza i eksport; bloki dokłada dopiero silnik zapytań.
+    attachments to Attachment albo Future[Attachment] (przygotowanie w toku)
+    """
+    names = [marker(attachment_name(item)) for item in attachments]
+    content = "\n".join(names + ([text] if text else []))
+    return {"role": "user", "content": content, "attachments": list(attachments)}
+
+
+def resolve_messages(messages: List[Dict]) -> List[Dict]:
+    """Czeka na przygotowanie załączników (wątek roboczy); błąd przetwarzania przerywa zapytanie"""
+    resolved = []
+    for message in messages:
+        attachments = message.get("attachments")
+        if attachments and any(isinstance(item, Future) for item in attachments):
+            message = {**message, "attachments": [
+                item.result() if isinstance(item, Future) else item for item in attachments
+            ]}
+        resolved.append(message)
+    return resolved
+
+
+def drop_failed(messages: List[Dict]) -> List[str]:
+    """
+    Usuwa z historii załączniki, których przygotowanie się nie udało (wątek Tk) - inaczej
+    każda kolejna tura zgłaszałaby ten sam błąd. Gotowe Future zastępuje wynikiem.
+    Zwraca nazwy usuniętych plików
+    """
+    dropped = []
+    for index, message in enumerate(messages):
+        attachments = message.get("attachments")
+        if not attachments or not any(isinstance(item, Future) and item.done() for item in attachments):
+            continue
+        kept = []
+        for item in attachments:
+            if isinstance(item, Future) and item.done():
+                if item.exception() is not None:
+                    dropped.append(item.attachment_name)
+                    continue
+                item = item.result()
+            kept.append(item)
+        # Nowy słownik - migawki historii w wątkach roboczych zostają nietknięte
+        messages[index] = {**message, "attachments": kept}
+        if not kept:
+            del messages[index]["attachments"]
+    return dropped
+
+
+def payload_size(attachment: Attachment) -> int:
+    """Rozmiar ładunku w pamięci (base64 albo tekst)"""
+    return len(attachment.block["source"]["data"])
+
+
+@contextmanager
+def read_source(path: str):
+    """Zawartość pliku jako bufor - duże pliki mapowane z dysku zamiast kopiowane do pamięci"""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_MIN_BYTES:
+            yield f.read()
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+
+
+def target_size(width: int, height: int) -> tuple:
+    """Wymiary po zmniejszeniu do MAX_IMAGE_EDGE i MAX_IMAGE_PIXELS (bez powiększania)"""
+    scale = min(1.0, MAX_IMAGE_EDGE / max(width, height), (MAX_IMAGE_PIXELS / (width * height)) ** 0.5)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def prepare_image(source) -> tuple:
+    """(media_type, dane, opis wymiarów) - oryginał, gdy mieści się w limitach"""
+    from PIL import Image, ImageOps
+
+    image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    with image:
+        width, height = image.size
+        size = target_size(width, height)
+        orientation = image.getexif().get(0x0112, 1)  # EXIF Orientation
+        media_type = PIL_FORMATS.get(image.format)
+        if (size == (width, height) and orientation == 1 and media_type
+                and len(source) <= MAX_IMAGE_BYTES):
+            return media_type, bytes(source), f"{width}×{height}"
+
+        # JPEG dekodowany od razu w skali 1/2..1/8 - dużo szybciej niż pełne zdjęcie
+        image.draft("RGB", size)
+        image = ImageOps.exif_transpose(image)
+        if orientation in (5, 6, 7, 8):
+            size = size[::-1]
+        if image.size != size:
+            image = image.resize(size, Image.LANCZOS, reducing_gap=2.0)
+
+        # Przezroczystość zachowuje PNG, reszta jako JPEG
+        output = io.BytesIO()
+        if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+            image.save(output, "PNG", compress_level=PNG_COMPRESS_LEVEL)
+            media_type = "image/png"
+        else:
+            image.convert("RGB").save(output, "JPEG", quality=JPEG_QUALITY)
+            media_type = "image/jpeg"
+        data = output.getvalue()
+        if len(data) > MAX_IMAGE_BYTES:
+            raise ValueError(f"obraz po zmniejszeniu ma {format_bytes(len(data))} (limit API 5 MB)")
+        return media_type, data, f"{width}×{height} → {size[0]}×{size[1]}"
+
+
+class AttachmentPipeline:
+    """Przygotowanie załączników w tle z cache ładunków adresowanym treścią"""
+
+    def __init__(self, cache_dir: Optional[str] = None, workers: int = WORKERS):
+        self.cache_dir = cache_dir or os.environ.get("ATTACHMENT_CACHE_DIR", CACHE_DIR)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="attachments")
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Attachment]" = OrderedDict()
+        self._memory_bytes = 0
+        self.totals = {"files": 0, "cache_hits": 0, "source_bytes": 0, "payload_bytes": 0, "seconds": 0.0}
+
+    def submit(self, path: str) -> Future:
+        """Przygotowanie w puli wątków - Future[Attachment] z nazwą pliku w attachment_name"""
+        future = self.executor.submit(self.prepare, path)
+        future.attachment_name = os.path.basename(path)
+        return future
+
+    def prepare(self, path: str) -> Attachment:
+        started = time.perf_counter()
+        name = os.path.basename(path)
+        kind = attachment_kind(path)
+        with read_source(path) as source:
+            recipe = f"v{CACHE_VERSION}:{kind}:{MAX_IMAGE_EDGE}:{MAX_IMAGE_PIXELS}:{JPEG_QUALITY}:{PNG_COMPRESS_LEVEL}"
+            digest = hashlib.sha256(source).hexdigest()
+            key = hashlib.sha256(f"{digest}:{recipe}".encode()).hexdigest()
+
+            attachment = self._cached(key, name, len(source))
+            if attachment is None:
+                attachment = self._build(kind, name, key, source)
+                self._store(attachment)
+        attachment.seconds = time.perf_counter() - started
+        self._count(attachment)
+        print(f"[ATTACH] {attachment.describe()}")
+        return attachment
+
+    def _build(self, kind: str, name: str, key: str, source) -> Attachment:
+        detail = ""
+        if kind == "image":
+            media_type, data, detail = prepare_image(source)
+            payload_bytes = len(data)
+            block = {"type": "image", "source": {
+                "type": "base64", "media_type": media_type, "data": base64.b64encode(data).decode("ascii")
+            }}
+        elif kind == "pdf":
+            if len(source) > MAX_PDF_BYTES:
+                raise ValueError(f"{name}: {format_bytes(len(source))} (limit API 32 MB)")
+            payload_bytes = len(source)
+            block = {"type": "document", "title": name, "source": {
+                "type": "base64", "media_type": "application/pdf",
+                "data": base64.b64encode(source).decode("ascii")
+            }}
+        else:
+            if len(source) > MAX_TEXT_BYTES:
+                raise ValueError(f"{name}: {format_bytes(len(source))} (limit 10 MB)")
+            text = bytes(source).decode("utf-8", errors="replace")
+            payload_bytes = len(source)
+            block = {"type": "document", "title": name, "source": {
+                "type": "text", "media_type": "text/plain", "data": text
+            }}
+        return Attachment(name=name, kind=kind, digest=key, block=block, source_bytes=len(source),
+                          payload_bytes=payload_bytes, seconds=0.0, detail=detail)
+
+    # --- cache ---
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _cached(self, key: str, name: str, source_bytes: int) -> Optional[Attachment]:
+        """Gotowy ładunek z pamięci albo z dysku (nazwa pliku może być inna niż za pierwszym razem)"""
+        with self._lock:
+            attachment = self._memory.get(key)
+            if attachment is not None:
+                self._memory.move_to_end(key)
+        if attachment is None:
+            path = self._cache_path(key)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    entry = json.load(f)
+                # Czas modyfikacji = ostatnie użycie (przycinanie najdawniej używanych)
+                os.utime(path)
+            except (OSError, ValueError):
+                return None
+            attachment = Attachment(**entry, seconds=0.0)
+            self._remember(attachment)
+        block = dict(attachment.block)
+        if "title" in block:
+            block["title"] = name
+        return Attachment(name=name, kind=attachment.kind, digest=key, block=block,
+                          source_bytes=source_bytes, payload_bytes=attachment.payload_bytes,
+                          seconds=0.0, cached=True, detail=attachment.detail)
+
+    def _store(self, attachment: Attachment):
+        self._remember(attachment)
+        path = self._cache_path(attachment.digest)
+        entry = {field: getattr(attachment, field)
+                 for field in ("name", "kind", "digest", "block", "source_bytes", "payload_bytes", "detail")}
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"[ATTACH] ⚠️ Nie można zapisać cache załącznika: {e}")
+            return
+        self._prune_disk()
+
+    def _prune_disk(self):
+        """Przycina katalog cache do DISK_CACHE_BYTES, zaczynając od najdawniej używanych wpisów"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for filename in files:
+                if not filename.endswith(".json"):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= DISK_CACHE_BYTES:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        if removed:
+            print(f"[ATTACH] Cache przycięty: usunięto {removed} wpisów, zostało {format_bytes(total)}")
+
+    def _remember(self, attachment: Attachment):
+        size = payload_size(attachment)
+        if size > MEMORY_BYTES:
+            return
+        with self._lock:
+            previous = self._memory.pop(attachment.digest, None)
+            if previous is not None:
+                self._memory_bytes -= payload_size(previous)
+            self._memory[attachment.digest] = attachment
+            self._memory_bytes += size
+            while len(self._memory) > MEMORY_ITEMS or self._memory_bytes > MEMORY_BYTES:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= payload_size(evicted)
+
+    # --- statystyki ---
+
+    def _count(self, attachment: Attachment):
+        with self._lock:
+            self.totals["files"] += 1
+            self.totals["cache_hits"] += attachment.cached
+            self.totals["source_bytes"] += attachment.source_bytes
+            self.totals["payload_bytes"] += attachment.payload_bytes
+            self.totals["seconds"] += attachment.seconds
+
+    def summary(self) -> str:
+        """Łączne oszczędności i czas przygotowania w tej sesji"""
+        with self._lock:
+            totals = dict(self.totals)
+        saved = totals["source_bytes"] - totals["payload_bytes"]
+        return (f"{totals['files']} plików ({totals['cache_hits']} z cache), "
+                f"zaoszczędzono {format_bytes(saved)}, przygotowanie {totals['seconds'] * 1000:.0f} ms")
+
+
+def main(argv=None):
+    """Punkt wejścia CLI - przygotowanie plików jak w GUI (z cache) i statystyki"""
+    parser = argparse.ArgumentParser(description="Przygotowanie załączników dla Claude")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--dir", help=f"Katalog cache (domyślnie ATTACHMENT_CACHE_DIR albo {CACHE_DIR})")
+    args = parser.parse_args(argv)
+
+    pipeline = AttachmentPipeline(args.dir)
+    for future in [pipeline.submit(path) for path in args.files]:
+        try:
+            future.result()
+        except (OSError, ValueError) as e:
+            print(f"[ATTACH] ❌ {future.attachment_name}: {e}")
+    print(f"[ATTACH] {pipeline.summary()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
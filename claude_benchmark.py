@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Benchmark Claude GUI Assistant na lokalnym serwerze testowym
+Uruchamia claude_fake_api (streaming SSE z zadanym tempem tokenów, myśleniem
+i błędami 429/529) i przepuszcza przez aplikację serię zapytań: send_api_request,
+renderowanie streamu w czacie i zapis do bazy (DatabaseManager, osobny plik SQLite).
+Mierzy czasy klatek pętli Tk, przepustowość, TTFT, pamięć i opóźnienie zapisu
+do bazy. Wyniki dopisywane są do benchmark_results.jsonl (z wersją z gita),
+a --compare zestawia je z poprzednim przebiegiem tego samego scenariusza.
+
+Użycie:
+    python claude_benchmark.py                          # wszystkie scenariusze w GUI
+    python claude_benchmark.py --scenario long --headless
+    python claude_benchmark.py --compare
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from claude_fake_api import start_in_thread
+from claude_models import MODELS
+from claude_telemetry import percentiles
+from claude_tracing import tracer
+
+RESULTS_FILE = "benchmark_results.jsonl"
+FRAME_MS = 16           # docelowy odstęp klatek (~60 fps)
+SLOW_FRAME_MS = 50      # klatka wyraźnie zauważalna dla użytkownika
+REGRESSION_THRESHOLD = 0.10
+SERVER_SEED = 42
+READY_TIMEOUT = 30.0
+
+# Parametry serwera testowego i liczba zapytań dla każdego scenariusza
+SCENARIOS = {
+    "short": {"prompts": 20, "response_tokens": 100, "token_rate": 0, "ttft": 0.0},
+    "long": {"prompts": 5, "response_tokens": 2000, "token_rate": 400, "ttft": 0.2},
+    "thinking": {"prompts": 5, "response_tokens": 400, "thinking_tokens": 400, "token_rate": 400,
+                 "ttft": 0.2, "thinking": True},
+    "errors": {"prompts": 10, "response_tokens": 200, "token_rate": 0, "message_error_rate": 0.3},
+}
+
+# Metryki, dla których wzrost oznacza poprawę (pozostałe: im mniej, tym lepiej)
+HIGHER_IS_BETTER = {"requests_per_sec", "output_tokens_per_sec"}
+# Metryki porównywane między wersjami
+COMPARED_METRICS = ("requests_per_sec", "output_tokens_per_sec", "ttft_ms.p50", "ttft_ms.p95",
+                    "frame_ms.p95", "frame_ms.p99", "slow_frames", "db_write_ms.p50", "db_write_ms.p95",
+                    "tracemalloc_peak_mb")
+
+
+def benchmark_prompts(count: int) -> List[str]:
+    """Deterministyczne prompty o różnej długości"""
+    return [f"Pytanie testowe {i}: " + "opisz wydajność interfejsu " * (1 + i % 5) for i in range(count)]
+
+
+def git_version() -> Optional[str]:
+    """Skrót commita, z którego uruchomiono benchmark"""
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return result.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def max_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def ms_percentiles(values: List[float]) -> Dict[str, float]:
+    return {key: value * 1000 for key, value in percentiles(values).items()}
+
+
+class FrameSampler:
+    """Mierzy odstępy między kolejnymi klatkami pętli Tk (root.after co FRAME_MS)"""
+
+    def __init__(self, root):
+        self.root = root
+        self.intervals: List[float] = []
+        self._last = 0.0
+        self._running = False
+
+    def start(self):
+        self._running = True
+        self._last = time.perf_counter()
+        self.root.after(FRAME_MS, self._tick)
+
+    def _tick(self):
+        if not self._running:
+            return
+        now = time.perf_counter()
+        self.intervals.append(now - self._last)
+        self._last = now
+        self.root.after(FRAME_MS, self._tick)
+
+    def stop(self):
+        self._running = False
+
+
+class BenchmarkRun:
+    """Pomiary jednego przebiegu scenariusza"""
+
+    def __init__(self, name: str, scenario: Dict, mode: str, measure_memory: bool = True):
+        self.name = name
+        self.scenario = scenario
+        self.mode = mode
+        self.measure_memory = measure_memory
+        self.model = MODELS["sonnet-4"]
+        self.timings: List[Dict] = []
+        self.output_tokens = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.frame_intervals: List[float] = []
+        self.ui: Dict = {}
+        self.started = 0.0
+        self.finished = 0.0
+
+    @property
+    def thinking(self) -> bool:
+        return bool(self.scenario.get("thinking"))
+
+    def begin(self):
+        tracer.clear()
+        tracer.enable()
+        if self.measure_memory:
+            tracemalloc.start()
+        self.started = time.perf_counter()
+
+    def end(self):
+        self.finished = time.perf_counter()
+        tracer.disable()
+
+    def record(self, result):
+        """Wywoływane z wątku roboczego po każdej odpowiedzi"""
+        self.completed += 1
+        self.output_tokens += result.output_tokens
+        if result.timing:
+            self.timings.append(result.timing)
+
+    def metrics(self) -> Dict:
+        elapsed = max(self.finished - self.started, 1e-9)
+        db_writes = [e["dur"] / 1_000_000 for e in tracer.events
+                     if e.get("ph") == "X" and e["name"] == "DatabaseManager.add_message"]
+        ttft = [t["ttft"] for t in self.timings if t.get("ttft") is not None]
+
+        metrics = {
+            "requests": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "elapsed_s": elapsed,
+            "requests_per_sec": self.completed / elapsed,
+            "output_tokens_per_sec": self.output_tokens / elapsed,
+            "ttft_ms": ms_percentiles(ttft),
+            "db_write_ms": ms_percentiles(db_writes),
+            "db_writes": len(db_writes),
+            "max_rss_mb": max_rss_mb()
+        }
+        if self.frame_intervals:
+            frames = ms_percentiles(self.frame_intervals)
+            frames["max"] = max(self.frame_intervals) * 1000
+            metrics["frame_ms"] = frames
+            metrics["slow_frames"] = sum(1 for i in self.frame_intervals if i * 1000 > SLOW_FRAME_MS)
+            metrics["frames"] = len(self.frame_intervals)
+        if self.measure_memory and tracemalloc.is_tracing():
+            metrics["tracemalloc_peak_mb"] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+        metrics.update(self.ui)
+        return metrics
+
+
+def run_headless(run: BenchmarkRun, base_url: str, db_url: str):
+    """Silnik zapytań + zapis do bazy bez okna (tam, gdzie nie ma ekranu)"""
+    from claude_engine import RequestEngine, RequestSettings, create_client
+    from claude_ratelimit import RateLimitScheduler
+    from claude_db_extension import DatabaseManager
+
+    db = DatabaseManager(db_url=db_url)
+    scheduler = RateLimitScheduler(base_delay=0.05)
+    client = create_client("sk-ant-benchmark", base_url=base_url, max_retries=0)
+    # Jak w GUI: połączenie otwarte przed pierwszym zapytaniem
+    client.models.list(limit=1)
+    engine = RequestEngine(client, scheduler=scheduler)
+    settings = RequestSettings(model=run.model, thinking_enabled=run.thinking,
+                               thinking_budget=run.model.default_thinking_budget)
+    conversation_id = db.create_conversation(title=f"benchmark {run.name}", model_id=run.model.id,
+                                             model_name=run.model.name)
+    history = []
+
+    run.begin()
+    for prompt in benchmark_prompts(run.scenario["prompts"]):
+        history.append({"role": "user", "content": prompt})
+        db.add_message(conversation_id, "user", prompt, input_tokens=len(prompt) // 4)
+        chunks = []
+        try:
+            result = engine.stream(settings, history, on_text=chunks.append)
+        except Exception as e:
+            print(f"[BENCHMARK] ❌ {e}")
+            run.failed += 1
+            history.pop()
+            continue
+        "".join(chunks)  # odpowiednik sklejania tekstu w oknie czatu
+        history.append({"role": "assistant", "content": result.text})
+        run.record(result)
+        db.add_message(conversation_id, "assistant", result.text, output_tokens=result.output_tokens,
+                       timing=result.timing)
+    run.end()
+    run.retries = scheduler.retries
+
+
+def run_gui(run: BenchmarkRun, base_url: str, db_url: str):
+    """Pełna ścieżka GUI: send_message -> send_api_request -> stream w czacie -> baza"""
+    # Aplikacja czyta klucz, adres API i bazę ze zmiennych środowiskowych
+    os.environ["ANTHROPIC_API_KEY"] = "sk-ant-benchmark"
+    os.environ["ANTHROPIC_BASE_URL"] = base_url
+    os.environ["DB_URL"] = db_url
+
+    from claude_gui import create_app
+    app = create_app()
+    root = app.root
+    prompts = iter(benchmark_prompts(run.scenario["prompts"]))
+    sampler = FrameSampler(root)
+    waited = time.perf_counter()
+
+    original_save = app.save_response
+    original_finalize = app.finalize_streaming_response
+    original_error = app.handle_error
+
+    def save_response(session, request, result, cost):
+        run.record(result)
+        original_save(session, request, result, cost)
+
+    def finalize(session, full_response, cost, thinking_content=""):
+        original_finalize(session, full_response, cost, thinking_content)
+        root.after_idle(send_next)
+
+    def handle_error(error_msg, modal=True, session=None, attempts=1):
+        run.failed += 1
+        original_error(error_msg, False, session, attempts)  # bez okna modalnego - blokowałoby benchmark
+        root.after_idle(send_next)
+
+    app.save_response = save_response
+    app.finalize_streaming_response = finalize
+    app.handle_error = handle_error
+
+    def wait_ready():
+        if app.engine is not None and getattr(app, 'db', None) is not None:
+            start()
+        elif time.perf_counter() - waited > READY_TIMEOUT:
+            print("[BENCHMARK] ❌ Aplikacja nie połączyła się z serwerem testowym lub bazą")
+            root.quit()
+        else:
+            root.after(50, wait_ready)
+
+    def start():
+        app.thinking_enabled_var.set(run.thinking)
+        run.begin()
+        sampler.start()
+        send_next()
+
+    def send_next():
+        prompt = next(prompts, None)
+        if prompt is None:
+            finish()
+            return
+        app.input_text.delete("1.0", "end")
+        app.input_text.insert("1.0", prompt)
+        app.send_message()
+
+    def finish():
+        run.end()
+        sampler.stop()
+        root.quit()
+
+    root.after_idle(wait_ready)
+    root.mainloop()
+
+    run.frame_intervals = sampler.intervals
+    run.retries = app.rate_scheduler.retries
+    watchdog = app.ui_watchdog.stats()
+    run.ui = {"ui_stalls": watchdog["stalls"], "max_event_loop_lag_ms": watchdog["max_lag"] * 1000}
+    app.ui_watchdog.stop()
+    root.destroy()
+
+
+def flatten(metrics: Dict, prefix: str = "") -> Dict[str, float]:
+    """{"frame_ms": {"p95": 1}} -> {"frame_ms.p95": 1}"""
+    flat = {}
+    for key, value in metrics.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def load_results(filepath: str) -> List[Dict]:
+    if not os.path.exists(filepath):
+        return []
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous_result(results: List[Dict], record: Dict) -> Optional[Dict]:
+    """Ostatni wcześniejszy wynik tego samego scenariusza w tym samym trybie"""
+    for candidate in reversed(results):
+        if candidate["scenario"] == record["scenario"] and candidate["mode"] == record["mode"]:
+            return candidate
+    return None
+
+
+def compare(record: Dict, previous: Dict) -> List[str]:
+    """Zmiany metryk względem poprzedniego przebiegu; regresje oznaczone ⚠️"""
+    current, before = flatten(record["metrics"]), flatten(previous["metrics"])
+    lines = []
+    for name in COMPARED_METRICS:
+        if name not in current or not before.get(name):
+            continue
+        change = (current[name] - before[name]) / before[name]
+        worse = -change if name.split(".")[0] in HIGHER_IS_BETTER else change
+        marker = "⚠️ " if worse > REGRESSION_THRESHOLD else "   "
+        lines.append(f"{marker}{name:<24} {before[name]:>10.2f} -> {current[name]:>10.2f} ({change:+.1%})")
+    return lines
+
+
+def describe(record: Dict) -> str:
+    m = record["metrics"]
+    text = (f"{m['requests']} zapytań ({m['failed']} błędów, {m['retries']} ponowień) w {m['elapsed_s']:.1f}s | "
+            f"{m['output_tokens_per_sec']:.0f} tok/s")
+    if m.get("ttft_ms"):
+        text += f" | TTFT p50 {m['ttft_ms']['p50']:.0f} ms"
+    if m.get("frame_ms"):
+        text += f" | klatki p95 {m['frame_ms']['p95']:.0f} ms, wolnych {m['slow_frames']}"
+    if m.get("db_write_ms"):
+        text += f" | zapis p95 {m['db_write_ms']['p95']:.1f} ms"
+    if m.get("tracemalloc_peak_mb") is not None:
+        text += f" | pamięć {m['tracemalloc_peak_mb']:.1f} MB"
+    return text
+
+
+def run_scenario(name: str, scenario: Dict, headless: bool, db_url: Optional[str],
+                 measure_memory: bool) -> Dict:
+    server_options = {key: scenario[key] for key in ("token_rate", "ttft", "response_tokens",
+                                                     "thinking_tokens", "message_error_rate")
+                      if key in scenario}
+    server, base_url = start_in_thread(seed=SERVER_SEED, retry_after=0.1, verbose=False, **server_options)
+    workdir = tempfile.mkdtemp(prefix="claude_benchmark_")
+    db_url = db_url or f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+    # Indeks znaczeniowy bazy testowej w katalogu tymczasowym - nie nadpisuje indeksu użytkownika
+    os.environ["SEMANTIC_INDEX_DIR"] = os.path.join(workdir, "semantic_index")
+
+    mode = "headless" if headless else "gui"
+    run = BenchmarkRun(name, scenario, mode, measure_memory)
+    try:
+        if headless:
+            run_headless(run, base_url, db_url)
+        else:
+            run_gui(run, base_url, db_url)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "version": git_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "mode": mode,
+        "scenario": name,
+        "config": scenario,
+        "metrics": run.metrics()
+    }
+
+
+def main(argv=None):
+    """Punkt wejścia CLI"""
+    parser = argparse.ArgumentParser(description="Benchmark Claude GUI Assistant na lokalnym serwerze testowym")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="Scenariusz (można powtórzyć; domyślnie wszystkie)")
+    parser.add_argument("--headless", action="store_true", help="Bez okna: silnik zapytań i baza")
+    parser.add_argument("--prompts", type=int, help="Nadpisz liczbę zapytań w scenariuszu")
+    parser.add_argument("--db-url", help="Baza do testu (domyślnie tymczasowy plik SQLite)")
+    parser.add_argument("--no-memory", action="store_true", help="Bez tracemalloc (mniejszy narzut)")
+    parser.add_argument("-o", "--output", default=RESULTS_FILE, help="Plik JSONL z wynikami")
+    parser.add_argument("--compare", action="store_true", help="Porównaj z poprzednim wynikiem")
+    args = parser.parse_args(argv)
+
+    headless = args.headless
+    if not headless:
+        try:
+            import tkinter
+            tkinter.Tk().destroy()
+        except Exception as e:
+            print(f"[BENCHMARK] ⚠️ Brak ekranu ({e}) - przełączam na --headless")
+            headless = True
+
+    history = load_results(args.output)
+    regressions = 0
+    for name in args.scenario or list(SCENARIOS):
+        scenario = dict(SCENARIOS[name])
+        if args.prompts:
+            scenario["prompts"] = args.prompts
+
+        print(f"[BENCHMARK] Scenariusz '{name}' ({'headless' if headless else 'gui'})...")
+        record = run_scenario(name, scenario, headless, args.db_url, not args.no_memory)
+        print(f"[BENCHMARK] {name}: {describe(record)}")
+
+        if args.compare:
+            previous = previous_result(history, record)
+            if previous is None:
+                print(f"[BENCHMARK]   brak wcześniejszego wyniku '{name}' do porównania")
+            else:
+                print(f"[BENCHMARK]   względem {previous['version'] or '?'} z {previous['timestamp']}:")
+                for line in compare(record, previous):
+                    print(f"[BENCHMARK]   {line}")
+                    regressions += line.startswith("⚠️")
+
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        history.append(record)
+
+    print(f"[BENCHMARK] Wyniki dopisane do {args.output}")
+    return 3 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
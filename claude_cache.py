@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Cache odpowiedzi dla Claude GUI Assistant
+Identyczne zapytania (model, system prompt, wiadomości, temperature, thinking)
+obsługiwane są z dysku zamiast z API. Domyślnie cache'owane są tylko
+ustawienia deterministyczne (temperature 0, bez Extended Thinking).
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from typing import Dict, List, Optional
+
+from claude_engine import RequestSettings, ResponseResult
+
+CACHE_FILE = "response_cache.sqlite3"
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+
+def _normalize_text(text) -> str:
+    """Ujednolica zapis tekstu: NFC, końce linii, białe znaki na końcach"""
+    if not isinstance(text, str):
+        return json.dumps(text, ensure_ascii=False, sort_keys=True)
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.strip().split("\n"))
+
+
+def attachment_digests(message: Dict) -> List[str]:
+    """Załączniki wiadomości (adresy treści) - ta sama treść z innym plikiem to inne zapytanie"""
+    return [attachment.digest for attachment in message.get("attachments") or ()]
+
+
+def cache_key(settings: RequestSettings, messages: List[Dict]) -> str:
+    """Hash znormalizowanych parametrów zapytania"""
+    payload = {
+        "model": settings.model.id,
+        "system": _normalize_text(settings.system_prompt or ""),
+        "temperature": round(float(settings.temperature), 3),
+        "thinking": settings.thinking_budget if settings.uses_thinking else None,
+        "messages": [[m["role"], _normalize_text(m["content"])] + attachment_digests(m) for m in messages]
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Cache odpowiedzi w SQLite z limitem rozmiaru (LRU) i czasem życia"""
+
+    def __init__(self, filepath: str = CACHE_FILE, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl_seconds: float = DEFAULT_TTL_SECONDS, allow_nondeterministic: bool = False):
+        self.filepath = filepath
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.allow_nondeterministic = allow_nondeterministic
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(filepath, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                text TEXT NOT NULL,
+                thinking TEXT NOT NULL DEFAULT '',
+                input_tokens INTEGER NOT NULL DEFAULT 0,
+                output_tokens INTEGER NOT NULL DEFAULT 0,
+                stop_reason TEXT,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+        self._conn.commit()
+
+    def is_cacheable(self, settings: RequestSettings) -> bool:
+        """Czy odpowiedź dla tych ustawień może być powtórzona z cache"""
+        if self.allow_nondeterministic:
+            return True
+        return float(settings.temperature) == 0.0 and not settings.uses_thinking
+
+    def get(self, settings: RequestSettings, messages: List[Dict]) -> Optional[ResponseResult]:
+        """Zwraca zapisaną odpowiedź lub None"""
+        key = cache_key(settings, messages)
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, thinking, input_tokens, output_tokens, stop_reason, created "
+                "FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[5] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+
+        return ResponseResult(
+            text=row[0],
+            thinking=row[1],
+            input_tokens=row[2],
+            output_tokens=row[3],
+            stop_reason=row[4],
+            cached=True
+        )
+
+    def put(self, settings: RequestSettings, messages: List[Dict], result: ResponseResult):
+        """Zapisuje odpowiedź i usuwa najstarsze wpisy ponad limit"""
+        # Przerwana lub ucięta odpowiedź nie nadaje się do powtarzania
+        if result.stop_reason not in (None, "end_turn", "stop_sequence"):
+            return
+
+        key = cache_key(settings, messages)
+        now = time.time()
+        size = len(result.text.encode("utf-8")) + len(result.thinking.encode("utf-8"))
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, model, text, thinking, input_tokens, output_tokens, stop_reason, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, settings.model.id, result.text, result.thinking, result.input_tokens,
+                 result.output_tokens, result.stop_reason, size, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Usuń najdawniej używane, aż zmieścimy się w limicie
+        to_free = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            victims.append((key,))
+            freed += size
+            if freed >= to_free:
+                break
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Rozgrzewanie połączenia z API i pomiar czasu do pierwszego tokenu
+Klient HTTP trzyma połączenie w puli dłużej niż domyślne 5 s, połączenie
+otwierane jest zaraz po sprawdzeniu klucza i odnawiane, gdy użytkownik
+zaczyna pisać po przerwie. Zdarzenia httpcore (rozszerzenie "trace") dzielą
+czas do pierwszego tokenu na: połączenie, kolejkę serwera i pierwszy bajt.
+"""
+
+import time
+import threading
+from typing import Callable, Dict, Optional
+
+from claude_engine import create_client
+
+# Jak długo bezczynne połączenie zostaje w puli (serwer i tak może je zamknąć)
+KEEPALIVE_SECONDS = 60.0
+# Po takiej przerwie zakładamy, że połączenie wygasło i trzeba je odnowić
+REWARM_AFTER_IDLE = KEEPALIVE_SECONDS * 0.8
+
+
+class RequestTrace:
+    """Znaczniki czasu zdarzeń jednego zapytania HTTP (perf_counter)"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.events: Dict[str, float] = {}
+
+    def record(self, event_name: str):
+        # http11.send_request_headers.started -> send_request_headers.started
+        name = event_name.split(".", 1)[1] if event_name.startswith(("http11.", "http2.")) else event_name
+        self.events.setdefault(name, time.perf_counter())
+
+    def _duration(self, start: str, end: str) -> float:
+        if start in self.events and end in self.events:
+            return self.events[end] - self.events[start]
+        return 0.0
+
+    def breakdown(self, first_token: Optional[float], origin: Optional[float] = None) -> Dict[str, float]:
+        """Rozbicie czasu do pierwszego tokenu (sekundy); origin - moment zlecenia zapytania"""
+        connect = (self._duration("connection.connect_tcp.started", "connection.connect_tcp.complete") +
+                   self._duration("connection.start_tls.started", "connection.start_tls.complete"))
+        sent = self.events.get("send_request_body.complete", self.events.get("send_request_headers.complete"))
+        headers = self.events.get("receive_response_headers.complete")
+
+        timing = {
+            "connect": connect,
+            "reused_connection": "connection.connect_tcp.started" not in self.events
+        }
+        if sent is not None and headers is not None:
+            timing["server_queue"] = headers - sent
+        if headers is not None and first_token is not None:
+            timing["first_byte"] = first_token - headers
+        if first_token is not None:
+            timing["ttft"] = first_token - (origin if origin is not None else self.started)
+        return timing
+
+
+class ConnectionTracer:
+    """Podpina się pod klienta httpx i zbiera zdarzenia bieżącego zapytania w wątku"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self.last_activity = 0.0
+
+    def begin(self) -> RequestTrace:
+        """Rozpoczyna pomiar zapytania w bieżącym wątku"""
+        trace = RequestTrace()
+        self._local.trace = trace
+        return trace
+
+    def end(self):
+        self._local.trace = None
+
+    def on_request(self, request):
+        """Hook httpx "request" - dokłada rozszerzenie trace do zapytania"""
+        self.last_activity = time.monotonic()
+        trace = getattr(self._local, "trace", None)
+        if trace is not None:
+            request.extensions["trace"] = lambda event_name, info: trace.record(event_name)
+
+    def on_response(self, response):
+        self.last_activity = time.monotonic()
+
+
+def create_warm_client(api_key: str, tracer: ConnectionTracer, base_url: Optional[str] = None,
+                       max_retries: Optional[int] = None):
+    """Klient API z dłużej żyjącą pulą połączeń i instrumentacją"""
+    from anthropic import DEFAULT_CONNECTION_LIMITS, DefaultHttpxClient
+
+    # Klasa Limits z tej samej biblioteki HTTP, której używa SDK
+    limits_class = type(DEFAULT_CONNECTION_LIMITS)
+    http_client = DefaultHttpxClient(
+        limits=limits_class(max_connections=DEFAULT_CONNECTION_LIMITS.max_connections,
+                            max_keepalive_connections=DEFAULT_CONNECTION_LIMITS.max_keepalive_connections,
+                            keepalive_expiry=KEEPALIVE_SECONDS),
+        event_hooks={"request": [tracer.on_request], "response": [tracer.on_response]}
+    )
+    return create_client(api_key, base_url=base_url, max_retries=max_retries, http_client=http_client)
+
+
+class ConnectionWarmer:
+    """Otwiera połączenie z wyprzedzeniem, żeby pierwsza wiadomość nie płaciła za DNS/TCP/TLS"""
+
+    def __init__(self, client, tracer: ConnectionTracer):
+        self.client = client
+        self.tracer = tracer
+        self._lock = threading.Lock()
+        self._warming = False
+
+    def warm(self) -> float:
+        """Lekki GET /v1/models - sprawdza klucz i zostawia połączenie w puli"""
+        started = time.perf_counter()
+        self.client.models.list(limit=1)
+        return time.perf_counter() - started
+
+    def needs_rewarm(self) -> bool:
+        return time.monotonic() - self.tracer.last_activity > REWARM_AFTER_IDLE
+
+    def warm_async(self, on_done: Optional[Callable[[float], None]] = None,
+                   on_error: Optional[Callable[[Exception], None]] = None):
+        """Rozgrzewa w tle; kolejne wywołania w trakcie są ignorowane"""
+        with self._lock:
+            if self._warming:
+                return
+            self._warming = True
+
+        def worker():
+            try:
+                elapsed = self.warm()
+            except Exception as e:
+                if on_error:
+                    on_error(e)
+                return
+            finally:
+                with self._lock:
+                    self._warming = False
+            if on_done:
+                on_done(elapsed)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+
+def format_ttft(timing: Optional[Dict]) -> str:
+    """Krótki opis rozbicia czasu do pierwszego tokenu (pasek statusu)"""
+    if not timing or "ttft" not in timing:
+        return ""
+    connect = "ponowne" if timing.get("reused_connection") else f"{timing['connect']:.2f}s"
+    parts = [f"poł. {connect}"]
+    if "server_queue" in timing:
+        parts.append(f"serwer {timing['server_queue']:.2f}s")
+    if "first_byte" in timing:
+        parts.append(f"1. token {timing['first_byte']:.2f}s")
+    return f"TTFT {timing['ttft']:.2f}s ({' / '.join(parts)})"
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Strumieniowy zapis i odczyt rozmów dla Claude GUI Assistant
+Format JSON Lines: pierwszy rekord to nagłówek, każdy kolejny to jedna wiadomość
+"""
+
+import os
+import json
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+FORMAT_NAME = "claude-gui-conversation"
+FORMAT_VERSION = 1
+
+# Co ile wiadomości raportować postęp
+PROGRESS_EVERY = 500
+# Wiadomości na jedną stronę przekazywaną do okna przy wczytywaniu
+PAGE_MESSAGES = 500
+# Ile stron może czekać na okno - odczyt nie wyprzedza renderowania
+LOAD_PAGES_AHEAD = 2
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def is_jsonl_file(filepath: str) -> bool:
+    """Sprawdza czy plik powinien być obsługiwany jako JSON Lines"""
+    return filepath.lower().endswith((".jsonl", ".ndjson"))
+
+
+def build_header(model_id: str, system_prompt: str, message_count: int,
+                 statistics: Optional[Dict] = None) -> Dict:
+    """Buduje rekord nagłówka pliku rozmowy"""
+    return {
+        "type": "header",
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "timestamp": datetime.now().isoformat(),
+        "model": model_id,
+        "system_prompt": system_prompt,
+        "message_count": message_count,
+        "statistics": statistics or {}
+    }
+
+
+def write_conversation_jsonl(filepath: str, header: Dict, messages: Iterable[Dict],
+                             progress_callback: Optional[ProgressCallback] = None) -> int:
+    """
+    Zapisuje rozmowę przyrostowo - wiadomość po wiadomości.
+    Zapis idzie do pliku tymczasowego podmienianego na końcu, więc przerwany
+    eksport nie niszczy poprzedniej wersji pliku. Zwraca liczbę zapisanych wiadomości.
+    """
+    total = header.get("message_count", 0)
+    tmp_path = f"{filepath}.part"
+    written = 0
+
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+
+            for msg in messages:
+                record = {"type": "message", "role": msg["role"], "content": msg["content"]}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                written += 1
+
+                if progress_callback and written % PROGRESS_EVERY == 0:
+                    progress_callback(written, total)
+
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        # Nieudany zapis nie zostawia po sobie pliku tymczasowego
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    if progress_callback:
+        progress_callback(written, total)
+
+    return written
+
+
+class ConversationReader:
+    """Przyrostowy czytnik pliku rozmowy w formacie JSON Lines"""
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.file_size = os.path.getsize(filepath)
+        # Tryb binarny - tell() działa w trakcie iteracji, więc postęp jest dokładny
+        self._file = open(filepath, 'rb')
+
+        first_line = self._file.readline()
+        try:
+            header = json.loads(first_line) if first_line.strip() else {}
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            header = {}
+
+        if header.get("type") != "header" or header.get("format") != FORMAT_NAME:
+            self._file.close()
+            raise ValueError(f"Plik {os.path.basename(filepath)} nie jest eksportem rozmowy (brak nagłówka)")
+
+        self.header = header
+
+    def iter_messages(self, progress_callback: Optional[ProgressCallback] = None) -> Iterator[Dict]:
+        """Zwraca kolejne wiadomości; postęp raportowany w bajtach"""
+        count = 0
+        try:
+            for line in self._file:
+                if not line.strip():
+                    continue
+
+                record = json.loads(line)
+                if record.get("type") != "message":
+                    continue
+
+                count += 1
+                if progress_callback and count % PROGRESS_EVERY == 0:
+                    progress_callback(self._file.tell(), self.file_size)
+
+                yield {"role": record["role"], "content": record["content"]}
+        finally:
+            self.close()
+
+        if progress_callback:
+            progress_callback(self.file_size, self.file_size)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_conversation_file(filepath: str,
+                           progress_callback: Optional[ProgressCallback] = None) -> Tuple[Dict, Iterator[Dict]]:
+    """
+    Otwiera rozmowę z pliku .jsonl (strumieniowo) lub starego .json.
+    Zwraca (nagłówek, iterator wiadomości) - plik .jsonl czytany jest dopiero przy iteracji,
+    stary .json (jeden dokument) wczytywany jest od razu w całości.
+    Iterator trzeba wyczerpać albo zamknąć (close) - zamyka plik.
+    """
+    if is_jsonl_file(filepath):
+        reader = ConversationReader(filepath)
+        return reader.header, reader.iter_messages(progress_callback)
+
+    # Stary format - cały dokument JSON
+    with open(filepath, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    messages = data.pop("messages", [])
+    if progress_callback:
+        size = os.path.getsize(filepath)
+        progress_callback(size, size)
+
+    return data, (msg for msg in messages)
+
+
+def iter_pages(messages: Iterable[Dict], size: int = PAGE_MESSAGES) -> Iterator[List[Dict]]:
+    """Dzieli wiadomości na strony po size"""
+    page = []
+    for msg in messages:
+        page.append(msg)
+        if len(page) >= size:
+            yield page
+            page = []
+    if page:
+        yield page
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Masowy eksport/import całej bazy rozmów dla Claude GUI Assistant
+Archiwum: gzip z rekordami JSON Lines ({"table": ..., "row": {...}}),
+zapisywane porcjami (osobny człon gzip na porcję), więc eksport i import
+można wznowić po przerwaniu, a pamięć nie rośnie z rozmiarem bazy.
+
+PostgreSQL: strumieniowo przez COPY. Inne backendy (SQLite): paczki przez SQLAlchemy Core.
+
+Użycie:
+    python claude_db_bulk.py export backup.jsonl.gz [--resume]
+    python claude_db_bulk.py import backup.jsonl.gz [--resume]
+"""
+
+import os
+import io
+import sys
+import json
+import gzip
+import time
+import argparse
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import select, func, insert, DateTime, LargeBinary
+
+from claude_db_extension import DatabaseManager, Base
+
+ARCHIVE_FORMAT = "claude-gui-db-archive"
+ARCHIVE_VERSION = 1
+
+# Kolejność ma znaczenie - najpierw rodzice (klucze obce)
+TABLES = ["blobs", "conversations", "messages", "archived_conversations", "archive_terms"]
+
+# Rozmiar okna kluczy przy eksporcie i paczki przy imporcie
+EXPORT_ID_WINDOW = 50_000
+IMPORT_BATCH_SIZE = 5_000
+
+# Separatory nie występujące w JSON - COPY w trybie CSV nie escapuje wtedy niczego
+_COPY_RAW_OPTIONS = "WITH (FORMAT csv, QUOTE e'\\x01', DELIMITER e'\\x02')"
+
+ProgressCallback = Callable[[Dict], None]
+
+
+def _print_progress(progress: Dict):
+    """Domyślny raport postępu na konsolę"""
+    print(f"[DB BULK] {progress['phase']} {progress['table']}: "
+          f"{progress['rows']:,} wierszy | {progress['rows_per_sec']:,.0f} wierszy/s")
+
+
+class _Checkpoint:
+    """Plik punktu kontrolnego obok archiwum"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Optional[Dict]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def save(self, state: Dict):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class BulkTransfer:
+    """Eksport/import wszystkich rozmów i wiadomości"""
+
+    def __init__(self, db: DatabaseManager, progress_callback: Optional[ProgressCallback] = _print_progress):
+        self.db = db
+        self.progress_callback = progress_callback
+
+    # ---------- EKSPORT ----------
+
+    def export_all(self, filepath: str, resume: bool = False) -> Dict:
+        """
+        Eksportuje całą bazę do archiwum. Przy resume=True kontynuuje od
+        ostatniego punktu kontrolnego (plik jest przycinany do ostatniej pełnej porcji).
+        Zwraca podsumowanie z liczbą wierszy i przepustowością.
+        """
+        checkpoint = _Checkpoint(f"{filepath}.export-checkpoint")
+        state = checkpoint.load() if resume else None
+
+        if state:
+            with open(filepath, 'r+b') as raw:
+                raw.truncate(state['offset'])
+            print(f"[DB BULK] Wznawiam eksport: {state['table']} od ID > {state['last_id']}")
+        else:
+            state = {'table_index': 0, 'table': TABLES[0], 'last_id': 0, 'offset': 0, 'rows': {}}
+            with open(filepath, 'wb') as raw:
+                self._write_member(raw, [json.dumps({
+                    "table": "__meta__",
+                    "format": ARCHIVE_FORMAT,
+                    "version": ARCHIVE_VERSION,
+                    "created_at": datetime.now().isoformat(),
+                    "backend": self.db.engine.dialect.name
+                })])
+                state['offset'] = raw.tell()
+            checkpoint.save(state)
+
+        started = time.perf_counter()
+        total_rows = sum(state['rows'].values())
+
+        with open(filepath, 'ab') as raw:
+            for table_index in range(state['table_index'], len(TABLES)):
+                table_name = TABLES[table_index]
+                table = Base.metadata.tables[table_name]
+
+                if table_index != state['table_index']:
+                    state.update(table_index=table_index, table=table_name, last_id=0)
+
+                with self.db.engine.connect() as conn:
+                    max_id = conn.execute(select(func.max(table.c.id))).scalar() or 0
+
+                table_started = time.perf_counter()
+                table_rows = 0
+                last_id = state['last_id']
+
+                while last_id < max_id:
+                    upper = min(last_id + EXPORT_ID_WINDOW, max_id)
+
+                    if self.db.is_postgres:
+                        count = self._export_window_copy(raw, table_name, last_id, upper)
+                    else:
+                        count = self._export_window_core(raw, table, last_id, upper)
+
+                    last_id = upper
+                    table_rows += count
+                    total_rows += count
+                    state['rows'][table_name] = state['rows'].get(table_name, 0) + count
+                    state.update(last_id=last_id, offset=raw.tell())
+                    checkpoint.save(state)
+
+                    self._report("eksport", table_name, table_rows, table_started)
+
+        checkpoint.clear()
+        return self._summary(filepath, state['rows'], total_rows, started)
+
+    def _write_member(self, raw, lines: List[str]):
+        """Zapisuje porcję jako osobny, zamknięty człon gzip"""
+        with gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+            for line in lines:
+                gz.write(line.encode('utf-8') + b"\n")
+        raw.flush()
+        os.fsync(raw.fileno())
+
+    def _export_window_copy(self, raw, table_name: str, low: int, high: int) -> int:
+        """Eksport okna ID przez COPY ... TO STDOUT (PostgreSQL)"""
+        sql = (
+            f"COPY (SELECT json_build_object('table', '{table_name}', 'row', row_to_json(t)) "
+            f"FROM {table_name} t WHERE t.id > {int(low)} AND t.id <= {int(high)} ORDER BY t.id) "
+            f"TO STDOUT {_COPY_RAW_OPTIONS}"
+        )
+        connection = self.db.engine.raw_connection()
+        try:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+                cursor = connection.cursor()
+                cursor.copy_expert(sql, gz)
+                count = cursor.rowcount
+                cursor.close()
+            connection.commit()
+        finally:
+            connection.close()
+
+        raw.flush()
+        os.fsync(raw.fileno())
+        return max(count, 0)
+
+    def _export_window_core(self, raw, table, low: int, high: int) -> int:
+        """Eksport okna ID przez SQLAlchemy Core (backendy bez COPY)"""
+        count = 0
+        with self.db.engine.connect() as conn, gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+            result = conn.execution_options(stream_results=True).execute(
+                select(table).where(table.c.id > low, table.c.id <= high).order_by(table.c.id)
+            )
+            for row in result.mappings():
+                line = json.dumps({"table": table.name, "row": dict(row)}, ensure_ascii=False, default=_json_default)
+                gz.write(line.encode('utf-8') + b"\n")
+                count += 1
+
+        raw.flush()
+        os.fsync(raw.fileno())
+        return count
+
+    # ---------- IMPORT ----------
+
+    def import_all(self, filepath: str, resume: bool = False) -> Dict:
+        """
+        Importuje archiwum do bazy. Wiersze o istniejących ID są pomijane,
+        więc ponowny import po przerwaniu nie duplikuje danych; resume=True
+        dodatkowo pomija linie zatwierdzone przed przerwaniem.
+        """
+        checkpoint = _Checkpoint(f"{filepath}.import-checkpoint")
+        state = (checkpoint.load() if resume else None) or {'line': 0, 'rows': {}}
+        skip_lines = state['line']
+        if skip_lines:
+            print(f"[DB BULK] Wznawiam import od linii {skip_lines:,}")
+
+        started = time.perf_counter()
+        total_rows = sum(state['rows'].values())
+        table_started = {}
+
+        batch_table = None
+        batch: List = []
+        batch_last_line = skip_lines
+        line_no = 0
+
+        def flush():
+            nonlocal total_rows
+            if not batch:
+                return
+            if self.db.is_postgres:
+                self._import_batch_copy(batch_table, batch)
+            else:
+                self._import_batch_core(batch_table, batch)
+
+            state['rows'][batch_table] = state['rows'].get(batch_table, 0) + len(batch)
+            total_rows += len(batch)
+            state['line'] = batch_last_line
+            checkpoint.save(state)
+
+            self._report("import", batch_table, state['rows'][batch_table], table_started[batch_table])
+            batch.clear()
+
+        with gzip.open(filepath, 'rb') as gz:
+            for raw_line in gz:
+                line_no += 1
+                if line_no <= skip_lines or not raw_line.strip():
+                    continue
+
+                table_name = _peek_table(raw_line)
+                if table_name not in TABLES:
+                    if table_name == "__meta__":
+                        meta = json.loads(raw_line)
+                        if meta.get("format") != ARCHIVE_FORMAT:
+                            raise ValueError(f"Nieznany format archiwum: {meta.get('format')}")
+                    continue
+
+                if self.db.is_postgres:
+                    # Do COPY idzie surowa linia - bez parsowania w Pythonie
+                    item = raw_line.rstrip(b"\n").decode('utf-8')
+                else:
+                    item = json.loads(raw_line)['row']
+
+                if table_name != batch_table:
+                    flush()
+                    batch_table = table_name
+                    table_started.setdefault(table_name, time.perf_counter())
+
+                batch.append(item)
+                batch_last_line = line_no
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    flush()
+
+            flush()
+
+        if self.db.is_postgres:
+            self._reset_sequences()
+        # Indeks pełnotekstowy treści nie jest częścią archiwum - budowany od nowa
+        self.db.rebuild_search_index()
+
+        checkpoint.clear()
+        return self._summary(filepath, state['rows'], total_rows, started)
+
+    def _import_batch_copy(self, table_name: str, lines: List[str]):
+        """Import paczki przez COPY do tabeli tymczasowej i INSERT ... SELECT (PostgreSQL)"""
+        table = Base.metadata.tables[table_name]
+        columns = ", ".join(c.name for c in table.columns)
+        buffer = io.StringIO("\n".join(lines) + "\n")
+
+        connection = self.db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS bulk_import_stage (doc json) ON COMMIT DELETE ROWS")
+            cursor.copy_expert(f"COPY bulk_import_stage (doc) FROM STDIN {_COPY_RAW_OPTIONS}", buffer)
+            cursor.execute(
+                f"INSERT INTO {table_name} ({columns}) "
+                f"SELECT {columns} FROM bulk_import_stage s, "
+                f"json_populate_record(NULL::{table_name}, s.doc->'row') "
+                f"ON CONFLICT (id) DO NOTHING"
+            )
+            cursor.close()
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def _import_batch_core(self, table_name: str, rows: List[Dict]):
+        """Import paczki przez SQLAlchemy Core (backendy bez COPY)"""
+        table = Base.metadata.tables[table_name]
+        datetime_columns = [c.name for c in table.columns if isinstance(c.type, DateTime)]
+        binary_columns = [c.name for c in table.columns if isinstance(c.type, LargeBinary)]
+        for row in rows:
+            for name in datetime_columns:
+                if row.get(name):
+                    row[name] = datetime.fromisoformat(row[name])
+            for name in binary_columns:
+                if isinstance(row.get(name), str):
+                    row[name] = bytes.fromhex(row[name][2:])
+
+        statement = insert(table)
+        if self.db.engine.dialect.name == 'sqlite':
+            statement = statement.prefix_with("OR IGNORE")
+
+        with self.db.engine.begin() as conn:
+            conn.execute(statement, rows)
+
+    def _reset_sequences(self):
+        """Ustawia sekwencje ID za zaimportowanymi wierszami (PostgreSQL)"""
+        connection = self.db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for table_name in TABLES:
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table_name}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {table_name}), 1))"
+                )
+            cursor.close()
+            connection.commit()
+        finally:
+            connection.close()
+
+    # ---------- RAPORTY ----------
+
+    def _report(self, phase: str, table_name: str, rows: int, since: float):
+        if not self.progress_callback:
+            return
+        elapsed = max(time.perf_counter() - since, 1e-9)
+        self.progress_callback({
+            'phase': phase,
+            'table': table_name,
+            'rows': rows,
+            'elapsed': elapsed,
+            'rows_per_sec': rows / elapsed
+        })
+
+    def _summary(self, filepath: str, rows: Dict, total_rows: int, started: float) -> Dict:
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        summary = {
+            'file': filepath,
+            'rows': dict(rows),
+            'total_rows': total_rows,
+            'elapsed': elapsed,
+            'rows_per_sec': total_rows / elapsed,
+            'archive_bytes': os.path.getsize(filepath)
+        }
+        print(f"[DB BULK] Gotowe: {total_rows:,} wierszy w {elapsed:.1f}s "
+              f"({summary['rows_per_sec']:,.0f} wierszy/s), archiwum {summary['archive_bytes']:,} B")
+        return summary
+
+
+def _peek_table(raw_line: bytes) -> str:
+    """Odczytuje nazwę tabeli z rekordu bez parsowania całego wiersza"""
+    if b'"__meta__"' in raw_line[:64]:
+        return "__meta__"
+    for table_name in TABLES:
+        if f'"{table_name}"'.encode() in raw_line[:64]:
+            return table_name
+    return json.loads(raw_line)['table']
+
+
+def _json_default(value):
+    """Serializacja typów spoza JSON (daty, dane binarne jak bytea w JSON PostgreSQL)"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return "\\x" + value.hex()
+    raise TypeError(f"Nie można zserializować {type(value).__name__}")
+
+
+def main(argv=None):
+    """Punkt wejścia CLI - kopie nocne i zasilanie baz testowych"""
+    parser = argparse.ArgumentParser(description="Masowy eksport/import bazy rozmów")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("archive", help="Plik archiwum (.jsonl.gz)")
+    parser.add_argument("--resume", action="store_true", help="Wznów od ostatniego punktu kontrolnego")
+    parser.add_argument("--db-url", help="URL bazy (domyślnie konfiguracja z .env)")
+    args = parser.parse_args(argv)
+
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    db = DatabaseManager(db_url=args.db_url)
+    transfer = BulkTransfer(db)
+
+    if args.command == "export":
+        transfer.export_all(args.archive, resume=args.resume)
+    else:
+        transfer.import_all(args.archive, resume=args.resume)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
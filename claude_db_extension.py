@@ -5,19 +5,104 @@ Obsługuje PostgreSQL do przechowywania historii rozmów
 """
 
 import os
-from datetime import datetime
-from typing import List, Optional, Dict
+import re
+import zlib
+import hashlib
+import threading
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Dict, Tuple
 import json
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, Boolean, JSON, ForeignKey, func
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, Boolean, JSON, LargeBinary, ForeignKey, func, inspect, or_, text
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, Session
-from sqlalchemy.exc import SQLAlchemyError
-import psycopg2
-from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy.orm import sessionmaker, relationship, deferred, undefer, Session
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from claude_tracing import instrument_class
 
 Base = declarative_base()
 
+# Treści od tego rozmiaru (bajty UTF-8) trafiają do tabeli blobs - jedna kopia na treść.
+# Krótsze zostają w wierszu: zysk z deduplikacji nie pokryłby kosztu wiersza bloba
+BLOB_MIN_BYTES = 1024
+# Od tego rozmiaru blob jest kompresowany (o ile kompresja coś daje)
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_LEVEL = 6
+
+# Zimne archiwum: rozmowy nieaktualizowane od tylu dni przenoszone są z tabel roboczych
+# (0 - tylko rozmowy oznaczone do archiwizacji)
+ARCHIVE_AFTER_DAYS = int(os.getenv('DB_ARCHIVE_AFTER_DAYS', '90'))
+ARCHIVE_INTERVAL = 3600  # sekundy między przebiegami przenoszenia w tle
+ARCHIVE_BATCH = 200      # rozmów na jeden przebieg
+# Indeks archiwum: słowa od 3 znaków, skracane do TERM_LENGTH
+TERM_LENGTH = 32
+_TERM_RE = re.compile(r"\w{3,}")
+# Wyszukiwanie z dopasowaniami: limit znaków pasujących treści zwracanych wraz z wynikami.
+# Powyżej limitu (bardzo krótkie, częste zapytania) wyniki nie nadają się do zawężania
+MATCH_TEXT_BUDGET = 4_000_000
+# Indeks trigramów treści w blobach (FTS5 'trigram' w SQLite, pg_trgm w PostgreSQL) - zawęża
+# wyszukiwanie podciągów od SEARCH_MIN_CHARS znaków bez zmiany wyników.
+# Dłuższe treści (rzadkie) nie trafiają do indeksu - wyszukiwanie je rozpakowuje
+SEARCH_INDEX_MAX_BYTES = 256 * 1024
+SEARCH_MIN_CHARS = 3
+
+
+def content_hash(body: str) -> str:
+    """Adres treści w tabeli blobs (sha256 z UTF-8)"""
+    return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+
+def pack_body(body: str) -> Tuple[bytes, Optional[str]]:
+    """Dane bloba i rodzaj kompresji (None - bez kompresji)"""
+    raw = body.encode('utf-8')
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(raw, COMPRESS_LEVEL)
+        if len(packed) < len(raw):
+            return packed, 'zlib'
+    return raw, None
+
+
+def unpack_body(data: bytes, compression: Optional[str], max_chars: Optional[int] = None) -> str:
+    """Treść bloba; max_chars - rozpakuj tylko początek (podgląd)"""
+    if max_chars is None:
+        raw = zlib.decompress(data) if compression == 'zlib' else data
+        return raw.decode('utf-8')
+    
+    # Znak UTF-8 to maks. 4 bajty - tyle wystarczy na max_chars znaków
+    limit = max_chars * 4
+    raw = zlib.decompressobj().decompress(data, limit) if compression == 'zlib' else data[:limit]
+    return raw.decode('utf-8', errors='ignore')[:max_chars]
+
+
+def archive_terms(*texts: str) -> set:
+    """Słowa (małe litery) indeksowane dla rozmowy w archiwum - każde raz"""
+    terms = set()
+    for body in texts:
+        if body:
+            terms.update(word[:TERM_LENGTH] for word in _TERM_RE.findall(body.lower()))
+    return terms
+
+
+def _chunks(items: List, size: int = 500):
+    """Paczki dla IN (...) - limity parametrów zapytania"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
 # Modele bazy danych
+class Blob(Base):
+    """Treść adresowana zawartością (wiadomości i system prompty), skompresowana powyżej progu"""
+    __tablename__ = 'blobs'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    hash = Column(String(64), nullable=False, unique=True)
+    size = Column(Integer, nullable=False)  # Bajty przed kompresją
+    compression = Column(String(16))  # 'zlib' albo NULL
+    # Dane wczytywane dopiero, gdy treść jest potrzebna
+    data = deferred(Column(LargeBinary, nullable=False))
+    # Treść jest w indeksie pełnotekstowym blob_search (NULL - nie jest: wyszukiwanie ją rozpakowuje)
+    search_indexed = Column(Boolean)
+
 class Conversation(Base):
     """Model rozmowy"""
     __tablename__ = 'conversations'
@@ -32,9 +117,14 @@ class Conversation(Base):
     total_cost = Column(Float, default=0.0)
     message_count = Column(Integer, default=0)
     system_prompt = Column(Text)
+    # Długi system prompt trafia do blobs (wspólny dla wszystkich rozmów), system_prompt jest wtedy NULL
+    system_prompt_blob_id = Column(Integer, ForeignKey('blobs.id'))
     temperature = Column(Float, default=0.7)
     is_archived = Column(Boolean, default=False)
     tags = Column(JSON)  # Lista tagów
+    # Gałąź: ID wiadomości (innej rozmowy), za którą dopisywane są wiadomości tej rozmowy.
+    # Bez klucza obcego - messages już wskazuje na conversations (cykl tabel)
+    branch_point_id = Column(Integer)
     
     # Relacja z wiadomościami
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
@@ -47,7 +137,8 @@ class Conversation(Base):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'message_count': self.message_count,
-            'total_cost': self.total_cost
+            'total_cost': self.total_cost,
+            'branch_point_id': self.branch_point_id
         }
 
 class Message(Base):
@@ -55,32 +146,94 @@ class Message(Base):
     __tablename__ = 'messages'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    conversation_id = Column(Integer, ForeignKey('conversations.id'), nullable=False)
+    conversation_id = Column(Integer, ForeignKey('conversations.id'), nullable=False, index=True)
+    # Poprzednia wiadomość w gałęzi - wiadomości tworzą drzewo, gałęzie współdzielą prefiks.
+    # NULL w starszych danych: poprzednikiem jest wcześniejsza wiadomość tej samej rozmowy
+    parent_id = Column(Integer, ForeignKey('messages.id'), index=True)
     role = Column(String(50), nullable=False)  # 'user' lub 'assistant'
+    # Krótkie treści w wierszu; dłuższe w blobs (content pusty, blob_id ustawione)
     content = Column(Text, nullable=False)
+    blob_id = Column(Integer, ForeignKey('blobs.id'), index=True)
     timestamp = Column(DateTime, default=datetime.now)
     input_tokens = Column(Integer, default=0)
     output_tokens = Column(Integer, default=0)
     cost = Column(Float, default=0.0)
+    timing = Column(JSON)  # Czasy zapytania: queue_wait, ttft, inter_token, total, tokens_per_sec
+    # Myślenie (Extended Thinking) zawsze w blobs - czytane dopiero przy rozwinięciu w czacie.
+    # thinking_tokens to część output_tokens
+    thinking_blob_id = Column(Integer, ForeignKey('blobs.id'), index=True)
+    thinking_tokens = Column(Integer, default=0)
     
     # Relacja z rozmową
     conversation = relationship("Conversation", back_populates="messages")
     
-    def to_dict(self):
+    def to_dict(self, content: Optional[str] = None):
         return {
             'id': self.id,
+            'parent_id': self.parent_id,
             'role': self.role,
-            'content': self.content,
+            'content': self.content if content is None else content,
             'timestamp': self.timestamp.isoformat() if self.timestamp else None,
             'tokens': self.input_tokens + self.output_tokens,
-            'cost': self.cost
+            'cost': self.cost,
+            'timing': self.timing,
+            'thinking_tokens': self.thinking_tokens or 0,
+            'has_thinking': self.thinking_blob_id is not None
         }
 
+class ArchivedConversation(Base):
+    """
+    Rozmowa w zimnym archiwum - metadane do listy i jeden skompresowany dokument
+    (rozmowa z pełną ścieżką wiadomości). Tabele robocze jej już nie zawierają.
+    """
+    __tablename__ = 'archived_conversations'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    conversation_id = Column(Integer, nullable=False)  # ID rozmowy przed archiwizacją
+    title = Column(String(255), nullable=False)
+    model_id = Column(String(100), nullable=False)
+    model_name = Column(String(100))
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.now)
+    message_count = Column(Integer, default=0)
+    total_tokens = Column(Integer, default=0)
+    total_cost = Column(Float, default=0.0)
+    size = Column(Integer, nullable=False)  # Bajty dokumentu przed kompresją
+    payload = deferred(Column(LargeBinary, nullable=False))  # JSON skompresowany zlib
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'model_name': self.model_name,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'archived_at': self.archived_at.isoformat() if self.archived_at else None,
+            'message_count': self.message_count,
+            'total_cost': self.total_cost,
+            'archived': True
+        }
+
+class ArchiveTerm(Base):
+    """Indeks słów archiwum: jedno słowo raz na rozmowę"""
+    __tablename__ = 'archive_terms'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    term = Column(String(TERM_LENGTH), nullable=False, index=True)
+    archive_id = Column(Integer, ForeignKey('archived_conversations.id'), nullable=False, index=True)
+
 class DatabaseManager:
     """Menedżer bazy danych"""
     
-    def __init__(self, db_config: Optional[Dict] = None):
-        """Inicjalizacja menedżera bazy danych"""
+    def __init__(self, db_config: Optional[Dict] = None, db_url: Optional[str] = None):
+        """
+        Inicjalizacja menedżera bazy danych.
+        db_url (lub zmienna DB_URL) pozwala użyć innego backendu, np. wbudowanego
+        SQLite: "sqlite:///claude_assistant.db" - bez zewnętrznego serwera.
+        """
+        self.db_url = db_url or os.getenv('DB_URL')
+        
         if db_config is None:
             # Domyślna konfiguracja
             db_config = {
@@ -93,6 +246,7 @@ class DatabaseManager:
         
         self.db_config = db_config
         self.engine = None
+        self.search_index = None
         self.Session = None
         
         # Inicjalizuj połączenie
@@ -100,6 +254,10 @@ class DatabaseManager:
     
     def create_database_if_not_exists(self):
         """Tworzy bazę danych jeśli nie istnieje"""
+        # Sterownik PostgreSQL potrzebny tylko tutaj - nie ładuj go przy imporcie modułu
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+        
         try:
             # Połącz się z PostgreSQL (nie z konkretną bazą)
             conn = psycopg2.connect(
@@ -132,89 +290,447 @@ class DatabaseManager:
             print(f"[DB ERROR] Nie można utworzyć bazy danych: {e}")
             raise
     
+    @property
+    def is_postgres(self) -> bool:
+        """Czy backend to PostgreSQL (COPY, pule połączeń itd.)"""
+        return self.engine is not None and self.engine.dialect.name == 'postgresql'
+    
     def initialize_database(self):
         """Inicjalizuje połączenie z bazą danych i tworzy tabele"""
         try:
-            # Najpierw upewnij się, że baza istnieje
-            self.create_database_if_not_exists()
-            
-            # Utwórz connection string
-            db_url = f"postgresql://{self.db_config['user']}:{self.db_config['password']}@{self.db_config['host']}:{self.db_config['port']}/{self.db_config['database']}"
-            
-            # Utwórz silnik
-            self.engine = create_engine(db_url, echo=False, pool_size=5, max_overflow=10)
+            if self.db_url and not self.db_url.startswith('postgresql'):
+                # Wbudowany backend (SQLite) - bez tworzenia bazy i puli połączeń
+                self.engine = create_engine(self.db_url, echo=False)
+            else:
+                # Najpierw upewnij się, że baza istnieje
+                if not self.db_url:
+                    self.create_database_if_not_exists()
+                
+                # Utwórz connection string
+                db_url = self.db_url or f"postgresql://{self.db_config['user']}:{self.db_config['password']}@{self.db_config['host']}:{self.db_config['port']}/{self.db_config['database']}"
+                
+                # Utwórz silnik
+                self.engine = create_engine(db_url, echo=False, pool_size=5, max_overflow=10)
             
             # Utwórz tabele
             Base.metadata.create_all(self.engine)
+            self._migrate_schema()
+            self.search_index = self._create_search_index()
             
             # Utwórz sesję
             self.Session = sessionmaker(bind=self.engine)
             
-            print("[DB] Połączono z bazą danych PostgreSQL")
+            print(f"[DB] Połączono z bazą danych ({self.engine.dialect.name})")
             
         except Exception as e:
             print(f"[DB ERROR] Błąd inicjalizacji bazy danych: {e}")
             raise
     
+    def _migrate_schema(self):
+        """Dodaje do istniejących tabel kolumny (tylko nullable) i indeksy, które pojawiły się w modelach"""
+        inspector = inspect(self.engine)
+        with self.engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                existing = {column['name'] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing or not column.nullable or column.primary_key:
+                        continue
+                    column_type = column.type.compile(dialect=self.engine.dialect)
+                    connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                    print(f"[DB] Migracja: dodano kolumnę {table.name}.{column.name}")
+                
+                # create_all nie dodaje indeksów do istniejących tabel
+                existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name not in existing_indexes:
+                        index.create(connection)
+                        print(f"[DB] Migracja: dodano indeks {index.name}")
+    
+    def _write(self, operation):
+        """
+        Wykonuje operację zapisu w nowej sesji i zatwierdza ją. Konflikt unikalnego
+        hasha bloba (ta sama treść zapisywana równolegle) jest ponawiany raz -
+        druga próba znajdzie już istniejący blob.
+        """
+        for attempt in (1, 2):
+            session = self.Session()
+            try:
+                result = operation(session)
+                session.commit()
+                return result
+            except IntegrityError:
+                session.rollback()
+                if attempt == 2:
+                    raise
+            except SQLAlchemyError:
+                session.rollback()
+                raise
+            finally:
+                session.close()
+    
+    def _store_body(self, session: Session, body: Optional[str]) -> Tuple[Optional[str], Optional[int]]:
+        """(treść w wierszu, blob_id) - długie treści zapisywane raz, pod swoim hashem"""
+        if not body:
+            return body, None
+        size = len(body.encode('utf-8'))
+        if size < BLOB_MIN_BYTES:
+            return body, None
+        
+        return "", self._store_blob(session, body, searchable=True)
+    
+    def _store_blob(self, session: Session, body: str, searchable: bool = False) -> int:
+        """ID bloba z treścią - istniejącego (ten sam hash) albo nowego; searchable - do indeksu wyszukiwania"""
+        digest = content_hash(body)
+        blob_id = session.query(Blob.id).filter(Blob.hash == digest).scalar()
+        if blob_id is None:
+            data, compression = pack_body(body)
+            size = len(body.encode('utf-8'))
+            indexed = searchable and self.search_index is not None and size <= SEARCH_INDEX_MAX_BYTES
+            blob = Blob(hash=digest, size=size, compression=compression, data=data,
+                        search_indexed=True if indexed else None)
+            session.add(blob)
+            session.flush()
+            blob_id = blob.id
+            if indexed:
+                self._index_body(session, blob_id, body)
+        return blob_id
+    
+    # ---------- indeks pełnotekstowy treści ----------
+    
+    def _create_search_index(self) -> Optional[str]:
+        """Tabela blob_search: FTS5 z trigramami bez kopii treści (SQLite) albo treść z indeksem pg_trgm (PostgreSQL)"""
+        dialect = self.engine.dialect.name
+        try:
+            with self.engine.begin() as connection:
+                if dialect == 'sqlite':
+                    existing = connection.execute(text(
+                        "SELECT sql FROM sqlite_master WHERE name = 'blob_search'")).scalar()
+                    if existing is not None and 'trigram' not in existing:
+                        # Wcześniejszy indeks słów - szukał tylko początków słów, budowany od nowa
+                        connection.execute(text("DROP TABLE blob_search"))
+                        connection.execute(text("UPDATE blobs SET search_indexed = NULL"))
+                    connection.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS blob_search "
+                                            "USING fts5(body, content='', tokenize='trigram')"))
+                elif dialect == 'postgresql':
+                    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                    inspector = inspect(connection)
+                    if inspector.has_table('blob_search') and \
+                            'body' not in {column['name'] for column in inspector.get_columns('blob_search')}:
+                        connection.execute(text("DROP TABLE blob_search"))
+                        connection.execute(text("UPDATE blobs SET search_indexed = NULL"))
+                    connection.execute(text("CREATE TABLE IF NOT EXISTS blob_search "
+                                            "(blob_id INTEGER PRIMARY KEY REFERENCES blobs(id), body TEXT NOT NULL)"))
+                    connection.execute(text("CREATE INDEX IF NOT EXISTS ix_blob_search_body "
+                                            "ON blob_search USING GIN (body gin_trgm_ops)"))
+                else:
+                    return None
+            return dialect
+        except SQLAlchemyError as e:
+            print(f"[DB] ⚠️ Indeks pełnotekstowy niedostępny - wyszukiwanie rozpakowuje treści: {e}")
+            return None
+    
+    def _index_body(self, session: Session, blob_id: int, body: str):
+        if self.search_index == 'sqlite':
+            session.execute(text("INSERT INTO blob_search (rowid, body) VALUES (:id, :body)"),
+                            {'id': blob_id, 'body': body})
+        else:
+            session.execute(text("INSERT INTO blob_search (blob_id, body) VALUES (:id, :body) ON CONFLICT DO NOTHING"),
+                            {'id': blob_id, 'body': body})
+    
+    def _unindex_blobs(self, session: Session, blob_ids: List[int]):
+        """Usuwa bloby z indeksu (przed usunięciem blobów)"""
+        if self.search_index == 'postgresql':
+            session.execute(text("DELETE FROM blob_search WHERE blob_id = ANY(:ids)"), {'ids': blob_ids})
+        elif self.search_index == 'sqlite':
+            # FTS5 bez kopii treści usuwa wpis tylko z oryginalną treścią
+            indexed = [blob_id for (blob_id,) in session.query(Blob.id).filter(
+                Blob.id.in_(blob_ids), Blob.search_indexed.is_(True))]
+            for blob_id, body in self._load_bodies(session, indexed).items():
+                session.execute(text("INSERT INTO blob_search (blob_search, rowid, body) VALUES ('delete', :id, :body)"),
+                                {'id': blob_id, 'body': body})
+    
+    def _load_bodies(self, session: Session, blob_ids: Iterable[Optional[int]],
+                     preview_chars: Optional[int] = None) -> Dict[int, str]:
+        """Treści blobów jednym zapytaniem na paczkę; preview_chars - tylko początek"""
+        bodies = {}
+        for chunk in _chunks(sorted({blob_id for blob_id in blob_ids if blob_id})):
+            blobs = session.query(Blob).options(undefer(Blob.data)).filter(Blob.id.in_(chunk))
+            for blob in blobs:
+                bodies[blob.id] = unpack_body(blob.data, blob.compression, preview_chars)
+        return bodies
+    
+    def _message_dicts(self, session: Session, messages: List["Message"],
+                       preview_chars: Optional[int] = None) -> List[Dict]:
+        bodies = self._load_bodies(session, (msg.blob_id for msg in messages), preview_chars)
+        return [msg.to_dict(bodies.get(msg.blob_id)) for msg in messages]
+    
+    def _system_prompt(self, session: Session, conversation: "Conversation") -> Optional[str]:
+        if conversation.system_prompt_blob_id:
+            return self._load_bodies(session, [conversation.system_prompt_blob_id])[conversation.system_prompt_blob_id]
+        return conversation.system_prompt
+    
     def create_conversation(self, title: str, model_id: str, model_name: str, 
                           system_prompt: str = "", temperature: float = 0.7) -> Optional[int]:
         """Tworzy nową rozmowę w bazie"""
-        session = self.Session()
-        try:
+        def insert(session):
+            inline_prompt, prompt_blob_id = self._store_body(session, system_prompt)
             conversation = Conversation(
                 title=title,
                 model_id=model_id,
                 model_name=model_name,
-                system_prompt=system_prompt,
+                system_prompt=inline_prompt if prompt_blob_id is None else None,
+                system_prompt_blob_id=prompt_blob_id,
                 temperature=temperature
             )
             session.add(conversation)
-            session.commit()
-            
-            print(f"[DB] Utworzono rozmowę: {title} (ID: {conversation.id})")
+            session.flush()
             return conversation.id
+        
+        try:
+            conversation_id = self._write(insert)
+            print(f"[DB] Utworzono rozmowę: {title} (ID: {conversation_id})")
+            return conversation_id
             
         except SQLAlchemyError as e:
-            session.rollback()
             print(f"[DB ERROR] Błąd tworzenia rozmowy: {e}")
             return None
-        finally:
-            session.close()
     
     def add_message(self, conversation_id: int, role: str, content: str,
-                   input_tokens: int = 0, output_tokens: int = 0, cost: float = 0.0) -> bool:
-        """Dodaje wiadomość do rozmowy"""
-        session = self.Session()
-        try:
-            # Dodaj wiadomość
+                   input_tokens: int = 0, output_tokens: int = 0, cost: float = 0.0,
+                   timing: Optional[Dict] = None, thinking: Optional[str] = None,
+                   thinking_tokens: int = 0) -> Optional[int]:
+        """
+        Dodaje wiadomość na koniec gałęzi rozmowy; zwraca ID wiadomości.
+        Rozmowy nie ma (np. przeniesiona do archiwum) - None, bez zapisu: osierocony wiersz
+        zostałby doklejony do rozmowy po przywróceniu, a na PostgreSQL odrzuci go klucz obcy
+        """
+        def insert(session):
+            conversation = session.query(Conversation).filter_by(id=conversation_id).first()
+            if conversation is None:
+                return None
+            inline_content, blob_id = self._store_body(session, content)
+            
+            # Dodaj wiadomość za ostatnią wiadomością gałęzi
             message = Message(
                 conversation_id=conversation_id,
+                parent_id=self._branch_head(session, conversation),
                 role=role,
-                content=content,
+                content=inline_content,
+                blob_id=blob_id,
                 input_tokens=input_tokens,
                 output_tokens=output_tokens,
-                cost=cost
+                cost=cost,
+                timing=timing,
+                thinking_blob_id=self._store_blob(session, thinking) if thinking else None,
+                thinking_tokens=thinking_tokens
             )
             session.add(message)
             
             # Zaktualizuj statystyki rozmowy
+            conversation.message_count += 1
+            conversation.total_tokens += input_tokens + output_tokens
+            conversation.total_cost += cost
+            conversation.updated_at = datetime.now()
+            
+            session.flush()
+            return message.id
+        
+        try:
+            message_id = self._write(insert)
+            if message_id is None:
+                print(f"[DB ERROR] Rozmowa {conversation_id} nie istnieje (archiwum?) - wiadomość niezapisana")
+            return message_id
+            
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd dodawania wiadomości: {e}")
+            return None
+    
+    def _branch_head(self, session: Session, conversation: Optional[Conversation]) -> Optional[int]:
+        """ID ostatniej wiadomości gałęzi (własnej albo punktu odgałęzienia)"""
+        if conversation is None:
+            return None
+        last_id = session.query(func.max(Message.id)).filter(Message.conversation_id == conversation.id).scalar()
+        return last_id if last_id is not None else conversation.branch_point_id
+    
+    def _message_path(self, session: Session, leaf_id: Optional[int]) -> List[Message]:
+        """Wiadomości od korzenia do leaf_id (rekurencyjne CTE po parent_id)"""
+        if leaf_id is None:
+            return []
+        path = (session.query(Message.id, Message.parent_id)
+                .filter(Message.id == leaf_id)
+                .cte(name="path", recursive=True))
+        path = path.union_all(
+            session.query(Message.id, Message.parent_id).join(path, Message.id == path.c.parent_id)
+        )
+        messages = session.query(Message).join(path, Message.id == path.c.id).order_by(Message.id).all()
+        
+        # Starsze dane bez wskaźników: reszta prefiksu to wcześniejsze wiadomości tej rozmowy
+        if messages and messages[0].parent_id is None:
+            head = messages[0]
+            earlier = (session.query(Message)
+                       .filter(Message.conversation_id == head.conversation_id, Message.id < head.id)
+                       .order_by(Message.id).all())
+            messages = earlier + messages
+        return messages
+    
+    def get_message_path(self, conversation_id: int) -> List[Dict]:
+        """Pełna ścieżka rozmowy (z prefiksem współdzielonym z rozmową nadrzędną)"""
+        session = self.Session()
+        try:
             conversation = session.query(Conversation).filter_by(id=conversation_id).first()
-            if conversation:
-                conversation.message_count += 1
-                conversation.total_tokens += input_tokens + output_tokens
-                conversation.total_cost += cost
-                conversation.updated_at = datetime.now()
+            path = self._message_path(session, self._branch_head(session, conversation))
+            return self._message_dicts(session, path)
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd pobierania ścieżki rozmowy: {e}")
+            return []
+        finally:
+            session.close()
+    
+    def fork_conversation(self, conversation_id: int, keep_messages: int,
+                          title: Optional[str] = None) -> Optional[int]:
+        """
+        Tworzy gałąź rozmowy po pierwszych keep_messages wiadomościach jej ścieżki.
+        Prefiks nie jest kopiowany - nowe wiadomości wskazują na wiadomość rozgałęzienia.
+        """
+        session = self.Session()
+        try:
+            source = session.query(Conversation).filter_by(id=conversation_id).first()
+            if not source:
+                return None
+            
+            path = self._message_path(session, self._branch_head(session, source))
+            branch_point = path[keep_messages - 1].id if 0 < keep_messages <= len(path) else None
             
+            branch = Conversation(
+                title=title or (source.title if source.title.startswith("⑂") else f"⑂ {source.title}"[:255]),
+                model_id=source.model_id,
+                model_name=source.model_name,
+                system_prompt=source.system_prompt,
+                system_prompt_blob_id=source.system_prompt_blob_id,
+                temperature=source.temperature,
+                tags=source.tags,
+                branch_point_id=branch_point
+            )
+            session.add(branch)
             session.commit()
-            return True
+            
+            print(f"[DB] Odgałęziono rozmowę {conversation_id} po {keep_messages} wiadomościach (ID: {branch.id})")
+            return branch.id
             
         except SQLAlchemyError as e:
             session.rollback()
-            print(f"[DB ERROR] Błąd dodawania wiadomości: {e}")
-            return False
+            print(f"[DB ERROR] Błąd tworzenia gałęzi: {e}")
+            return None
+        finally:
+            session.close()
+    
+    def _rehome_shared_messages(self, session: Session, conversation_id: int):
+        """Przed usunięciem rozmowy przenosi prefiks współdzielony z gałęziami do gałęzi"""
+        own_ids = session.query(Message.id).filter(Message.conversation_id == conversation_id)
+        branches = (session.query(Conversation)
+                    .filter(Conversation.branch_point_id.in_(own_ids))
+                    .order_by(Conversation.id).all())
+        for branch in branches:
+            shared = [msg for msg in self._message_path(session, branch.branch_point_id)
+                      if msg.conversation_id == conversation_id]
+            for msg in shared:
+                msg.conversation_id = branch.id
+            branch.message_count += len(shared)
+            if shared:
+                print(f"[DB] Przeniesiono {len(shared)} wspólnych wiadomości do gałęzi {branch.id}")
+        session.flush()
+    
+    def save_exchange(self, messages: List[Dict], reply: str, model_id: str, model_name: str,
+                      system_prompt: str = "", temperature: float = 0.7,
+                      input_tokens: int = 0, output_tokens: int = 0, cost: float = 0.0,
+                      conversation_id: Optional[int] = None, title: Optional[str] = None,
+                      timing: Optional[Dict] = None, thinking: Optional[str] = None,
+                      thinking_tokens: int = 0) -> Optional[int]:
+        """Zapisuje wiadomości zapytania i odpowiedź (tryby wsadowe); tworzy rozmowę gdy jej brak"""
+        if conversation_id is None:
+            first_user = next((m["content"] for m in messages if m["role"] == "user"), reply)
+            conversation_id = self.create_conversation(
+                title=title or self.generate_title_from_first_message(str(first_user)),
+                model_id=model_id,
+                model_name=model_name,
+                system_prompt=system_prompt,
+                temperature=temperature
+            )
+            if not conversation_id:
+                return None
+        
+        for msg in messages:
+            if self.add_message(conversation_id, msg["role"], msg["content"]) is None:
+                return None
+        if self.add_message(conversation_id, "assistant", reply,
+                            input_tokens=input_tokens, output_tokens=output_tokens, cost=cost, timing=timing,
+                            thinking=thinking, thinking_tokens=thinking_tokens) is None:
+            return None
+        return conversation_id
+    
+    def get_message_thinking(self, message_id: int) -> Optional[str]:
+        """Myślenie zapisane przy odpowiedzi (rozpakowywane na żądanie); None gdy brak"""
+        session = self.Session()
+        try:
+            blob_id = session.query(Message.thinking_blob_id).filter(Message.id == message_id).scalar()
+            if blob_id is None:
+                return None
+            return self._load_bodies(session, [blob_id]).get(blob_id)
+            
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd pobierania myślenia: {e}")
+            return None
+        finally:
+            session.close()
+    
+    def get_conversations_by_ids(self, conversation_ids: List[int]) -> List[Dict]:
+        """Rozmowy w kolejności podanych ID (brakujące - usunięte, w archiwum - pomijane)"""
+        session = self.Session()
+        try:
+            found = {}
+            for chunk in _chunks(list(conversation_ids)):
+                for conv in session.query(Conversation).filter(Conversation.id.in_(chunk)):
+                    found[conv.id] = conv.to_dict()
+            return [found[conversation_id] for conversation_id in conversation_ids if conversation_id in found]
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd pobierania rozmów: {e}")
+            return []
+        finally:
+            session.close()
+    
+    def get_max_message_id(self) -> int:
+        session = self.Session()
+        try:
+            return session.query(func.max(Message.id)).scalar() or 0
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd pobierania ID wiadomości: {e}")
+            return 0
         finally:
             session.close()
     
+    def iter_messages(self, batch_size: int = 5000, after_id: int = 0,
+                      upper_id: Optional[int] = None) -> Iterable[List[Tuple[int, int, str]]]:
+        """Paczki (id, conversation_id, treść) w kolejności ID - treści z blobów rozpakowane"""
+        while True:
+            session = self.Session()
+            try:
+                query = session.query(Message.id, Message.conversation_id, Message.content, Message.blob_id).filter(
+                    Message.id > after_id)
+                if upper_id is not None:
+                    query = query.filter(Message.id <= upper_id)
+                rows = query.order_by(Message.id).limit(batch_size).all()
+                bodies = self._load_bodies(session, (row.blob_id for row in rows))
+            except SQLAlchemyError as e:
+                print(f"[DB ERROR] Błąd odczytu wiadomości: {e}")
+                return
+            finally:
+                session.close()
+            
+            if not rows:
+                return
+            yield [(row.id, row.conversation_id, bodies.get(row.blob_id, row.content)) for row in rows]
+            after_id = rows[-1].id
+    
     def get_all_conversations(self, include_archived: bool = False) -> List[Dict]:
         """Pobiera wszystkie rozmowy"""
         session = self.Session()
@@ -234,8 +750,12 @@ class DatabaseManager:
         finally:
             session.close()
     
-    def get_conversation_with_messages(self, conversation_id: int) -> Optional[Dict]:
-        """Pobiera rozmowę wraz z wszystkimi wiadomościami"""
+    def get_conversation_with_messages(self, conversation_id: int,
+                                       preview_chars: Optional[int] = None) -> Optional[Dict]:
+        """
+        Pobiera rozmowę wraz z wszystkimi wiadomościami.
+        preview_chars - treści z blobów rozpakowane tylko do tej długości (podgląd).
+        """
         session = self.Session()
         try:
             conversation = session.query(Conversation).filter_by(id=conversation_id).first()
@@ -244,9 +764,12 @@ class DatabaseManager:
                 return None
             
             result = conversation.to_dict()
-            result['messages'] = [msg.to_dict() for msg in conversation.messages]
-            result['system_prompt'] = conversation.system_prompt
+            # Ścieżka gałęzi - razem z prefiksem współdzielonym z rozmową nadrzędną
+            head = self._branch_head(session, conversation)
+            result['messages'] = self._message_dicts(session, self._message_path(session, head), preview_chars)
+            result['system_prompt'] = self._system_prompt(session, conversation)
             result['temperature'] = conversation.temperature
+            result['model_id'] = conversation.model_id
             
             return result
             
@@ -277,27 +800,387 @@ class DatabaseManager:
         finally:
             session.close()
     
+    def _delete_conversation_rows(self, session: Session, conversation: Conversation):
+        """Usuwa rozmowę z tabel roboczych (wraz z blobami, których nic innego nie używa)"""
+        self._rehome_shared_messages(session, conversation.id)
+        # Bloby tej rozmowy - usuwane, jeśli nic innego ich nie używa
+        blob_ids = {blob_id for row in session.query(Message.blob_id, Message.thinking_blob_id).filter(
+            Message.conversation_id == conversation.id) for blob_id in row if blob_id is not None}
+        if conversation.system_prompt_blob_id:
+            blob_ids.add(conversation.system_prompt_blob_id)
+        # Wskaźniki między usuwanymi wiadomościami - kolejność DELETE bez znaczenia
+        session.query(Message).filter(Message.conversation_id == conversation.id).update(
+            {Message.parent_id: None}, synchronize_session=False
+        )
+        session.expire(conversation, ['messages'])
+        session.delete(conversation)
+        session.flush()
+        self._delete_unreferenced_blobs(session, blob_ids)
+    
+    def _archive(self, session: Session, conversation_id: int) -> Optional[int]:
+        """Przenosi rozmowę do archiwum w bieżącej transakcji; zwraca ID w archiwum"""
+        conversation = session.query(Conversation).filter_by(id=conversation_id).first()
+        if not conversation:
+            return None
+        
+        # Gałęzie tej rozmowy dostają wspólny prefiks, zanim jej wiadomości znikną
+        self._rehome_shared_messages(session, conversation_id)
+        path = self._message_path(session, self._branch_head(session, conversation))
+        bodies = self._load_bodies(session, [msg.blob_id for msg in path] + [msg.thinking_blob_id for msg in path])
+        system_prompt = self._system_prompt(session, conversation)
+        
+        # Gałąź trafia do archiwum z pełną ścieżką - po przywróceniu jest samodzielną rozmową
+        messages = [{
+            'role': msg.role,
+            'content': bodies.get(msg.blob_id, msg.content),
+            'timestamp': msg.timestamp.isoformat() if msg.timestamp else None,
+            'input_tokens': msg.input_tokens,
+            'output_tokens': msg.output_tokens,
+            'cost': msg.cost,
+            'timing': msg.timing,
+            'thinking': bodies.get(msg.thinking_blob_id),
+            'thinking_tokens': msg.thinking_tokens or 0
+        } for msg in path]
+        document = {
+            'conversation': {
+                'title': conversation.title,
+                'model_id': conversation.model_id,
+                'model_name': conversation.model_name,
+                'system_prompt': system_prompt,
+                'temperature': conversation.temperature,
+                'tags': conversation.tags,
+                'created_at': conversation.created_at.isoformat() if conversation.created_at else None
+            },
+            'messages': messages
+        }
+        raw = json.dumps(document, ensure_ascii=False).encode('utf-8')
+        
+        archived = ArchivedConversation(
+            conversation_id=conversation.id,
+            title=conversation.title,
+            model_id=conversation.model_id,
+            model_name=conversation.model_name,
+            created_at=conversation.created_at,
+            updated_at=conversation.updated_at,
+            message_count=len(messages),
+            total_tokens=conversation.total_tokens,
+            total_cost=conversation.total_cost,
+            size=len(raw),
+            payload=zlib.compress(raw, COMPRESS_LEVEL)
+        )
+        self._delete_conversation_rows(session, conversation)
+        session.add(archived)
+        session.flush()
+        
+        terms = archive_terms(conversation.title, system_prompt, *(msg['content'] for msg in messages))
+        session.bulk_insert_mappings(ArchiveTerm, [{'term': term, 'archive_id': archived.id} for term in terms])
+        return archived.id
+    
     def archive_conversation(self, conversation_id: int) -> bool:
-        """Archiwizuje rozmowę"""
+        """
+        Archiwizuje rozmowę: przenosi ją z tabel roboczych do zimnego archiwum
+        (jeden skompresowany dokument + indeks słów). Przywracana na żądanie.
+        """
+        try:
+            archive_id = self._write(lambda session: self._archive(session, conversation_id))
+            if archive_id is None:
+                return False
+            print(f"[DB] Zarchiwizowano rozmowę ID: {conversation_id} (archiwum ID: {archive_id})")
+            return True
+            
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd archiwizacji: {e}")
+            return False
+    
+    def archive_idle_conversations(self, older_than_days: int = ARCHIVE_AFTER_DAYS,
+                                   limit: int = ARCHIVE_BATCH, exclude: Iterable[int] = ()) -> int:
+        """
+        Polityka archiwum: przenosi rozmowy oznaczone is_archived oraz nieaktualizowane
+        od older_than_days dni (0 - tylko oznaczone), poza exclude (np. otwarte w kartach GUI).
+        Zwraca liczbę przeniesionych.
+        """
         session = self.Session()
         try:
-            conversation = session.query(Conversation).filter_by(id=conversation_id).first()
+            idle = Conversation.is_archived.is_(True)
+            if older_than_days > 0:
+                cutoff = datetime.now() - timedelta(days=older_than_days)
+                idle = idle | (Conversation.updated_at < cutoff)
+            query = session.query(Conversation.id).filter(idle)
+            exclude = [conversation_id for conversation_id in exclude if conversation_id is not None]
+            if exclude:
+                query = query.filter(~Conversation.id.in_(exclude))
+            candidates = [conversation_id for (conversation_id,) in
+                          query.order_by(Conversation.updated_at).limit(limit)]
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd wyboru rozmów do archiwum: {e}")
+            return 0
+        finally:
+            session.close()
+        
+        moved = 0
+        for conversation_id in candidates:
+            # Każda rozmowa we własnej transakcji - zapis z GUI nie czeka na całą paczkę.
+            # Przez archive_conversation, żeby hooki (indeks znaczeniowy) widziały przeniesienie
+            if self.archive_conversation(conversation_id):
+                moved += 1
+        if moved:
+            print(f"[DB] Przeniesiono do archiwum {moved} rozmów")
+        return moved
+    
+    def restore_conversation(self, archive_id: int) -> Optional[int]:
+        """Przywraca rozmowę z archiwum do tabel roboczych; zwraca jej ID"""
+        def restore(session):
+            archived = (session.query(ArchivedConversation).options(undefer(ArchivedConversation.payload))
+                        .filter_by(id=archive_id).first())
+            if not archived:
+                return None
+            document = json.loads(zlib.decompress(archived.payload))
+            info = document['conversation']
             
-            if conversation:
-                conversation.is_archived = True
-                conversation.updated_at = datetime.now()
-                session.commit()
-                return True
+            # Pierwotne ID, o ile nie zajęła go w międzyczasie inna rozmowa
+            taken = session.query(Conversation.id).filter_by(id=archived.conversation_id).first() is not None
+            inline_prompt, prompt_blob_id = self._store_body(session, info['system_prompt'])
+            conversation = Conversation(
+                id=None if taken else archived.conversation_id,
+                title=archived.title,
+                model_id=archived.model_id,
+                model_name=archived.model_name,
+                system_prompt=inline_prompt if prompt_blob_id is None else None,
+                system_prompt_blob_id=prompt_blob_id,
+                temperature=info['temperature'],
+                tags=info['tags'],
+                created_at=datetime.fromisoformat(info['created_at']) if info['created_at'] else None,
+                # Przywrócenie to aktywność - polityka wieku nie przeniesie jej od razu z powrotem
+                updated_at=datetime.now(),
+                message_count=archived.message_count,
+                total_tokens=archived.total_tokens,
+                total_cost=archived.total_cost
+            )
+            session.add(conversation)
+            session.flush()
             
-            return False
+            parent_id = None
+            for item in document['messages']:
+                inline_content, blob_id = self._store_body(session, item['content'])
+                message = Message(
+                    conversation_id=conversation.id,
+                    parent_id=parent_id,
+                    role=item['role'],
+                    content=inline_content,
+                    blob_id=blob_id,
+                    timestamp=datetime.fromisoformat(item['timestamp']) if item['timestamp'] else None,
+                    input_tokens=item['input_tokens'],
+                    output_tokens=item['output_tokens'],
+                    cost=item['cost'],
+                    timing=item['timing'],
+                    # Archiwa sprzed zapisu myślenia nie mają tych pól
+                    thinking_blob_id=self._store_blob(session, item['thinking']) if item.get('thinking') else None,
+                    thinking_tokens=item.get('thinking_tokens', 0)
+                )
+                session.add(message)
+                session.flush()
+                parent_id = message.id
+            
+            session.query(ArchiveTerm).filter_by(archive_id=archive_id).delete(synchronize_session=False)
+            session.delete(archived)
+            return conversation.id
+        
+        try:
+            conversation_id = self._write(restore)
+            if conversation_id is not None:
+                print(f"[DB] Przywrócono rozmowę z archiwum (ID: {conversation_id})")
+            return conversation_id
             
         except SQLAlchemyError as e:
-            session.rollback()
-            print(f"[DB ERROR] Błąd archiwizacji: {e}")
-            return False
+            print(f"[DB ERROR] Błąd przywracania rozmowy: {e}")
+            return None
+    
+    def find_archived_conversation(self, conversation_id: int) -> Optional[int]:
+        """ID w archiwum rozmowy, która miała podane ID w tabelach roboczych (najnowsze przeniesienie)"""
+        session = self.Session()
+        try:
+            row = (session.query(ArchivedConversation.id)
+                   .filter_by(conversation_id=conversation_id)
+                   .order_by(ArchivedConversation.archived_at.desc()).first())
+            return row[0] if row else None
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd wyszukiwania w archiwum: {e}")
+            return None
+        finally:
+            session.close()
+    
+    def get_archived_conversations(self) -> List[Dict]:
+        """Lista rozmów w archiwum (bez rozpakowywania treści)"""
+        session = self.Session()
+        try:
+            archived = session.query(ArchivedConversation).order_by(ArchivedConversation.updated_at.desc()).all()
+            return [conv.to_dict() for conv in archived]
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd pobierania archiwum: {e}")
+            return []
+        finally:
+            session.close()
+    
+    def get_archived_conversation(self, archive_id: int, preview_chars: Optional[int] = None) -> Optional[Dict]:
+        """Rozmowa z archiwum do podglądu (bez przywracania) - w kształcie get_conversation_with_messages"""
+        session = self.Session()
+        try:
+            archived = (session.query(ArchivedConversation).options(undefer(ArchivedConversation.payload))
+                        .filter_by(id=archive_id).first())
+            if not archived:
+                return None
+            
+            document = json.loads(zlib.decompress(archived.payload))
+            result = archived.to_dict()
+            result['messages'] = [{
+                'role': item['role'],
+                'content': item['content'] if preview_chars is None else item['content'][:preview_chars],
+                'timestamp': item['timestamp'],
+                'tokens': item['input_tokens'] + item['output_tokens'],
+                'cost': item['cost'],
+                'timing': item['timing']
+            } for item in document['messages']]
+            result['system_prompt'] = document['conversation']['system_prompt']
+            result['temperature'] = document['conversation']['temperature']
+            result['model_id'] = archived.model_id
+            return result
+            
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd pobierania rozmowy z archiwum: {e}")
+            return None
         finally:
             session.close()
     
+    def delete_archived_conversation(self, archive_id: int) -> bool:
+        """Trwale usuwa rozmowę z archiwum"""
+        def delete(session):
+            session.query(ArchiveTerm).filter_by(archive_id=archive_id).delete(synchronize_session=False)
+            return session.query(ArchivedConversation).filter_by(id=archive_id).delete(synchronize_session=False)
+        
+        try:
+            if self._write(delete):
+                print(f"[DB] Usunięto rozmowę z archiwum ID: {archive_id}")
+                return True
+            return False
+            
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd usuwania z archiwum: {e}")
+            return False
+    
+    def _search_archive(self, session: Session, query: str) -> List[ArchivedConversation]:
+        """
+        Wyszukiwanie w archiwum przez indeks słów (początki słów, wszystkie słowa zapytania).
+        Zapytanie z kilku słów sprawdzane jest dodatkowo jako fraza w rozpakowanej treści.
+        """
+        words = sorted(archive_terms(query), key=len, reverse=True)
+        if not words:
+            return session.query(ArchivedConversation).filter(ArchivedConversation.title.ilike(f'%{query}%')).all()
+        
+        archive_ids = None
+        for word in words:
+            matched = {archive_id for (archive_id,) in session.query(ArchiveTerm.archive_id)
+                       .filter(ArchiveTerm.term.startswith(word, autoescape=True)).distinct()}
+            archive_ids = matched if archive_ids is None else archive_ids & matched
+            if not archive_ids:
+                return []
+        
+        archived = []
+        phrase = len(words) > 1
+        for chunk in _chunks(sorted(archive_ids)):
+            rows = session.query(ArchivedConversation).filter(ArchivedConversation.id.in_(chunk))
+            if phrase:
+                rows = rows.options(undefer(ArchivedConversation.payload))
+            archived.extend(rows)
+        
+        if phrase:
+            needle = query.lower()
+            archived = [conv for conv in archived if needle in self._archive_text(conv)]
+        return archived
+    
+    def _candidate_blobs(self, session: Session, query: str) -> set:
+        """
+        Bloby treści wiadomości, które mogą zawierać zapytanie jako podciąg (bez względu na
+        wielkość liter): według indeksu trigramów zawierają cały tekst zapytania albo nie są
+        jeszcze zaindeksowane. Bez indeksu albo dla zapytań krótszych niż SEARCH_MIN_CHARS -
+        wszystkie bloby treści
+        """
+        content_blobs = session.query(Message.blob_id).filter(Message.blob_id.isnot(None))
+        if len(query) < SEARCH_MIN_CHARS or self.search_index is None:
+            return {blob_id for (blob_id,) in content_blobs.distinct()}
+        
+        if self.search_index == 'sqlite':
+            # Fraza trigramów = ciągły podciąg
+            rows = session.execute(text("SELECT rowid FROM blob_search WHERE blob_search MATCH :match"),
+                                   {'match': '"' + query.replace('"', '""') + '"'})
+        else:
+            pattern = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            rows = session.execute(text("SELECT blob_id FROM blob_search WHERE body ILIKE :pattern"),
+                                   {'pattern': f'%{pattern}%'})
+        candidates = {blob_id for (blob_id,) in rows}
+        unindexed = {blob_id for (blob_id,) in content_blobs.join(Blob, Blob.id == Message.blob_id)
+                     .filter(Blob.search_indexed.is_(None)).distinct()}
+        return candidates | unindexed
+    
+    def index_blob_search(self, batch_size: int = 200) -> int:
+        """Dodaje do indeksu pełnotekstowego treści zapisane przed nim (w tle); zwraca liczbę blobów"""
+        if self.search_index is None:
+            return 0
+        indexed = 0
+        last_id = 0
+        try:
+            while True:
+                def index_batch(session):
+                    blob_ids = [blob_id for (blob_id,) in session.query(Blob.id)
+                                .join(Message, Message.blob_id == Blob.id)
+                                .filter(Blob.id > last_id, Blob.search_indexed.is_(None),
+                                        Blob.size <= SEARCH_INDEX_MAX_BYTES)
+                                .distinct().order_by(Blob.id).limit(batch_size)]
+                    for blob_id, body in self._load_bodies(session, blob_ids).items():
+                        self._index_body(session, blob_id, body)
+                    if blob_ids:
+                        session.query(Blob).filter(Blob.id.in_(blob_ids)).update(
+                            {Blob.search_indexed: True}, synchronize_session=False
+                        )
+                    return (blob_ids[-1] if blob_ids else last_id), len(blob_ids)
+                
+                last_id, count = self._write(index_batch)
+                indexed += count
+                if count < batch_size:
+                    break
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd indeksowania treści: {e}")
+        if indexed:
+            print(f"[DB] Zaindeksowano {indexed} treści do wyszukiwania")
+        return indexed
+    
+    def rebuild_search_index(self) -> int:
+        """Indeks pełnotekstowy od zera (np. po imporcie - bloby przychodzą bez wpisów indeksu)"""
+        if self.search_index is None:
+            return 0
+        def clear(session):
+            if self.search_index == 'sqlite':
+                session.execute(text("INSERT INTO blob_search (blob_search) VALUES ('delete-all')"))
+            else:
+                session.execute(text("DELETE FROM blob_search"))
+            session.query(Blob).update({Blob.search_indexed: None}, synchronize_session=False)
+        
+        try:
+            self._write(clear)
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd czyszczenia indeksu treści: {e}")
+            return 0
+        return self.index_blob_search()
+    
+    def _archive_texts(self, archived: ArchivedConversation) -> List[str]:
+        """Tytuł, prompt systemowy i treści wiadomości rozmowy z archiwum"""
+        document = json.loads(zlib.decompress(archived.payload))
+        texts = [archived.title, document['conversation']['system_prompt'] or '']
+        texts.extend(item['content'] for item in document['messages'])
+        return texts
+    
+    def _archive_text(self, archived: ArchivedConversation) -> str:
+        return "\n".join(self._archive_texts(archived)).lower()
+    
     def delete_conversation(self, conversation_id: int) -> bool:
         """Usuwa rozmowę i wszystkie jej wiadomości"""
         session = self.Session()
@@ -305,7 +1188,7 @@ class DatabaseManager:
             conversation = session.query(Conversation).filter_by(id=conversation_id).first()
             
             if conversation:
-                session.delete(conversation)
+                self._delete_conversation_rows(session, conversation)
                 session.commit()
                 print(f"[DB] Usunięto rozmowę ID: {conversation_id}")
                 return True
@@ -319,24 +1202,81 @@ class DatabaseManager:
         finally:
             session.close()
     
-    def search_conversations(self, query: str) -> List[Dict]:
-        """Wyszukuje rozmowy po tytule lub treści"""
+    def search_conversations(self, query: str, include_archive: bool = True,
+                             with_matches: bool = False) -> List[Dict]:
+        """
+        Wyszukuje rozmowy po tytule lub treści (także w archiwum - wyniki z 'archived': True).
+        with_matches - każdy wynik dostaje 'matches': pasujące treści wiadomości, żeby dłuższe
+        zapytanie dało się zawęzić bez bazy (brak klucza - przekroczony MATCH_TEXT_BUDGET).
+        """
         session = self.Session()
         try:
+            needle = query.lower()
+            matches = {} if with_matches else None
+            budget = MATCH_TEXT_BUDGET
+            
+            def collect(conversation_id, body):
+                nonlocal matches, budget
+                if matches is None:
+                    return
+                budget -= len(body)
+                if budget < 0:
+                    matches = None
+                else:
+                    matches.setdefault(conversation_id, []).append(body)
+            
             # Wyszukaj w tytułach
             conversations = session.query(Conversation).filter(
                 Conversation.title.ilike(f'%{query}%')
             ).all()
             
             # Wyszukaj również w treści wiadomości
-            message_convs = session.query(Conversation).join(Message).filter(
-                Message.content.ilike(f'%{query}%')
-            ).distinct().all()
+            hit_ids = set()
+            if with_matches:
+                rows = session.query(Message.conversation_id, Message.content).filter(
+                    Message.content.ilike(f'%{query}%')
+                ).yield_per(1000)
+                for conversation_id, content in rows:
+                    hit_ids.add(conversation_id)
+                    collect(conversation_id, content)
+            else:
+                hit_ids.update(conversation_id for (conversation_id,) in session.query(Message.conversation_id)
+                               .filter(Message.content.ilike(f'%{query}%')).distinct())
+            
+            # Długie treści są w blobach (skompresowane) - rozpakowywane tylko kandydaci z indeksu trigramów
+            # (tylko treści wiadomości - bez promptów systemowych i myślenia)
+            matching_blobs = {}
+            for chunk in _chunks(sorted(self._candidate_blobs(session, query))):
+                bodies = self._load_bodies(session, chunk)
+                matching_blobs.update((blob_id, body) for blob_id, body in bodies.items() if needle in body.lower())
+            for chunk in _chunks(sorted(matching_blobs)):
+                for conversation_id, blob_id in session.query(Message.conversation_id, Message.blob_id).filter(
+                    Message.blob_id.in_(chunk)
+                ):
+                    hit_ids.add(conversation_id)
+                    collect(conversation_id, matching_blobs[blob_id])
             
-            # Połącz wyniki
-            all_convs = list(set(conversations + message_convs))
+            # Połącz wyniki - najpierw ostatnio aktualizowane
+            hit_ids -= {conv.id for conv in conversations}
+            for chunk in _chunks(sorted(hit_ids)):
+                conversations += session.query(Conversation).filter(Conversation.id.in_(chunk)).all()
+            conversations.sort(key=lambda conv: conv.updated_at or conv.created_at, reverse=True)
+            found = [(conv.id, conv.to_dict()) for conv in conversations]
             
-            return [conv.to_dict() for conv in all_convs]
+            if include_archive:
+                for archived in self._search_archive(session, query):
+                    if matches is not None:
+                        for body in self._archive_texts(archived)[1:]:
+                            if needle in body.lower():
+                                collect(('archive', archived.id), body)
+                    found.append((('archive', archived.id), archived.to_dict()))
+            
+            results = []
+            for key, result in found:
+                if matches is not None:
+                    result['matches'] = matches.get(key, [])
+                results.append(result)
+            return results
             
         except SQLAlchemyError as e:
             print(f"[DB ERROR] Błąd wyszukiwania: {e}")
@@ -344,6 +1284,105 @@ class DatabaseManager:
         finally:
             session.close()
     
+    def _delete_unreferenced_blobs(self, session: Session, blob_ids: Iterable[int]) -> int:
+        """Usuwa bloby z listy, do których nie odwołuje się już żadna wiadomość ani rozmowa"""
+        removed = 0
+        for chunk in _chunks(sorted(blob_ids)):
+            used = {blob_id for (blob_id,) in session.query(Message.blob_id).filter(Message.blob_id.in_(chunk))}
+            used |= {blob_id for (blob_id,) in session.query(Message.thinking_blob_id).filter(
+                Message.thinking_blob_id.in_(chunk))}
+            used |= {blob_id for (blob_id,) in session.query(Conversation.system_prompt_blob_id).filter(
+                Conversation.system_prompt_blob_id.in_(chunk))}
+            orphans = [blob_id for blob_id in chunk if blob_id not in used]
+            if orphans:
+                self._unindex_blobs(session, orphans)
+                removed += session.query(Blob).filter(Blob.id.in_(orphans)).delete(synchronize_session=False)
+        return removed
+    
+    def compact_storage(self, batch_size: int = 500) -> Dict:
+        """
+        Przenosi długie treści zapisane w wierszach (starsze dane) do blobów:
+        każda treść raz, pod swoim hashem, skompresowana powyżej progu.
+        """
+        moved = {'messages': 0, 'system_prompts': 0}
+        last_id = 0
+        try:
+            while True:
+                def move_messages(session):
+                    # Wstępny filtr w znakach (znak UTF-8 ma 1-4 bajty), dokładny próg w _store_body
+                    rows = (session.query(Message)
+                            .filter(Message.id > last_id, Message.blob_id.is_(None),
+                                    func.length(Message.content) >= BLOB_MIN_BYTES // 4)
+                            .order_by(Message.id).limit(batch_size).all())
+                    changed = 0
+                    for msg in rows:
+                        inline_content, blob_id = self._store_body(session, msg.content)
+                        if blob_id is not None:
+                            msg.content, msg.blob_id = inline_content, blob_id
+                            changed += 1
+                    return (rows[-1].id if rows else last_id), len(rows), changed
+                
+                last_id, scanned, changed = self._write(move_messages)
+                moved['messages'] += changed
+                if scanned < batch_size:
+                    break
+            
+            def move_prompts(session):
+                rows = (session.query(Conversation)
+                        .filter(Conversation.system_prompt_blob_id.is_(None),
+                                func.length(Conversation.system_prompt) >= BLOB_MIN_BYTES // 4)
+                        .all())
+                changed = 0
+                for conversation in rows:
+                    _, blob_id = self._store_body(session, conversation.system_prompt)
+                    if blob_id is not None:
+                        conversation.system_prompt, conversation.system_prompt_blob_id = None, blob_id
+                        changed += 1
+                return changed
+            
+            moved['system_prompts'] = self._write(move_prompts)
+            print(f"[DB] Przeniesiono do blobów: {moved['messages']} wiadomości, "
+                  f"{moved['system_prompts']} promptów systemowych")
+            return moved
+            
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd kompaktowania treści: {e}")
+            return moved
+    
+    def storage_stats(self) -> Dict:
+        """Rozmiar treści: w wierszach, logiczny w blobach i faktycznie zapisany (po kompresji)"""
+        session = self.Session()
+        try:
+            # length() - znaki (przybliżenie bajtów dla tekstu w większości ASCII)
+            inline_bytes = ((session.query(func.sum(func.length(Message.content))).scalar() or 0) +
+                            (session.query(func.sum(func.length(Conversation.system_prompt))).scalar() or 0))
+            blob_count, blob_bytes, stored_bytes = session.query(
+                func.count(Blob.id), func.sum(Blob.size), func.sum(func.length(Blob.data))
+            ).one()
+            
+            # Ile treści odwołuje się do blobów (bez deduplikacji zajęłyby references x size)
+            referenced = (session.query(func.sum(Blob.size)).join(Message, Message.blob_id == Blob.id).scalar() or 0)
+            referenced += (session.query(func.sum(Blob.size))
+                           .join(Message, Message.thinking_blob_id == Blob.id).scalar() or 0)
+            referenced += (session.query(func.sum(Blob.size))
+                           .join(Conversation, Conversation.system_prompt_blob_id == Blob.id).scalar() or 0)
+            
+            return {
+                'inline_bytes': inline_bytes,
+                'blob_count': blob_count or 0,
+                'blob_bytes': blob_bytes or 0,
+                'stored_bytes': stored_bytes or 0,
+                'referenced_bytes': referenced,
+                'logical_bytes': inline_bytes + referenced,
+                'physical_bytes': inline_bytes + (stored_bytes or 0)
+            }
+            
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd pobierania rozmiaru treści: {e}")
+            return {}
+        finally:
+            session.close()
+    
     def get_statistics(self) -> Dict:
         """Pobiera statystyki użytkowania"""
         session = self.Session()
@@ -352,6 +1391,8 @@ class DatabaseManager:
             total_messages = session.query(func.count(Message.id)).scalar()
             total_tokens = session.query(func.sum(Conversation.total_tokens)).scalar() or 0
             total_cost = session.query(func.sum(Conversation.total_cost)).scalar() or 0.0
+            archived_conversations = session.query(func.count(ArchivedConversation.id)).scalar()
+            total_thinking_tokens = session.query(func.sum(Message.thinking_tokens)).scalar() or 0
             
             # Najczęściej używane modele
             model_usage = session.query(
@@ -364,6 +1405,8 @@ class DatabaseManager:
                 'total_messages': total_messages,
                 'total_tokens': total_tokens,
                 'total_cost': total_cost,
+                'archived_conversations': archived_conversations,
+                'total_thinking_tokens': total_thinking_tokens,
                 'model_usage': {model: count for model, count in model_usage}
             }
             
@@ -373,6 +1416,98 @@ class DatabaseManager:
         finally:
             session.close()
     
+    def get_recent_timings(self, limit_per_model: int = 500) -> Dict[str, List[Dict]]:
+        """Ostatnie pomiary czasu odpowiedzi pogrupowane po modelu (od najstarszych)"""
+        session = self.Session()
+        try:
+            rows = (
+                session.query(Message.timing, Conversation.model_id)
+                .join(Conversation, Message.conversation_id == Conversation.id)
+                .filter(Message.role == 'assistant', Message.timing.isnot(None))
+                .order_by(Message.id.desc())
+                .limit(limit_per_model * 20)
+                .all()
+            )
+            
+            samples: Dict[str, List[Dict]] = {}
+            for timing, conversation_model in rows:
+                if not timing:
+                    continue
+                model_id = timing.get('model') or conversation_model
+                bucket = samples.setdefault(model_id, [])
+                if len(bucket) < limit_per_model:
+                    bucket.append(timing)
+            return {model_id: list(reversed(bucket)) for model_id, bucket in samples.items()}
+            
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd pobierania pomiarów: {e}")
+            return {}
+        finally:
+            session.close()
+
+    def get_thinking_history(self, limit: int = 5000) -> List[Dict]:
+        """
+        Ostatnie odpowiedzi z myśleniem (od najstarszych) z promptem, który je wywołał,
+        numerem tury, zużyciem i pomiarami - historia dla adaptacyjnego budżetu myślenia
+        """
+        session = self.Session()
+        try:
+            rows = (
+                session.query(Message, Conversation.model_id)
+                .join(Conversation, Message.conversation_id == Conversation.id)
+                .filter(Message.role == 'assistant',
+                        or_(Message.thinking_tokens > 0, Message.thinking_blob_id.isnot(None)))
+                .order_by(Message.id.desc())
+                .limit(limit)
+                .all()
+            )
+
+            # ID wiadomości rozmów (rosnąco) - numer tury i poprzednik bez zapytania na wiersz
+            conversation_ids = sorted({msg.conversation_id for msg, _ in rows})
+            ids_by_conversation: Dict[int, List[int]] = {}
+            for chunk in _chunks(conversation_ids):
+                for conversation_id, message_id in (
+                    session.query(Message.conversation_id, Message.id)
+                    .filter(Message.conversation_id.in_(chunk))
+                    .order_by(Message.id)
+                ):
+                    ids_by_conversation.setdefault(conversation_id, []).append(message_id)
+
+            # Prompt: poprzednik w gałęzi albo (starsze dane) wcześniejsza wiadomość rozmowy
+            turns, prompt_ids = {}, {}
+            for msg, _ in rows:
+                turn = bisect_left(ids_by_conversation[msg.conversation_id], msg.id)
+                turns[msg.id] = turn
+                prompt_ids[msg.id] = msg.parent_id or (
+                    ids_by_conversation[msg.conversation_id][turn - 1] if turn else None
+                )
+            prompts = {}
+            for chunk in _chunks(sorted({pid for pid in prompt_ids.values() if pid})):
+                prompts.update({prompt.id: prompt for prompt in session.query(Message).filter(Message.id.in_(chunk))})
+            bodies = self._load_bodies(session, (prompt.blob_id for prompt in prompts.values()))
+
+            history = []
+            for msg, conversation_model in reversed(rows):
+                prompt = prompts.get(prompt_ids[msg.id])
+                history.append({
+                    'message_id': msg.id,
+                    'conversation_id': msg.conversation_id,
+                    'model_id': (msg.timing or {}).get('model') or conversation_model,
+                    'prompt': (bodies.get(prompt.blob_id) or prompt.content) if prompt else "",
+                    'turn': turns[msg.id],
+                    'thinking_tokens': msg.thinking_tokens or 0,
+                    'output_tokens': msg.output_tokens or 0,
+                    'cost': msg.cost or 0.0,
+                    'timing': msg.timing
+                })
+            return history
+
+        except SQLAlchemyError as e:
+            print(f"[DB ERROR] Błąd pobierania historii myślenia: {e}")
+            return []
+        finally:
+            session.close()
+
     def generate_title_from_first_message(self, first_message: str, max_length: int = 50) -> str:
         """Generuje tytuł rozmowy na podstawie pierwszej wiadomości"""
         # Usuń zbędne białe znaki
@@ -410,6 +1545,64 @@ class DatabaseManager:
             print(f"[DB ERROR] Błąd eksportu: {e}")
             return False
 
+# Każda metoda menedżera jako span "db" (gdy profilowanie włączone)
+instrument_class(DatabaseManager, category="db")
+
+
+class ArchiveMover:
+    """Wątek w tle przenoszący nieaktywne rozmowy do archiwum według polityki wieku"""
+    
+    def __init__(self, db: DatabaseManager, after_days: Optional[int] = None,
+                 interval: float = ARCHIVE_INTERVAL, start_delay: float = 60.0, on_moved=None,
+                 open_conversations: Optional[Callable[[], Iterable[int]]] = None):
+        self.db = db
+        # ID rozmów otwartych w kartach - ich nie przenosimy (dalsze wiadomości nie miałyby dokąd trafić)
+        self.open_conversations = open_conversations
+        self.after_days = int(os.getenv('DB_ARCHIVE_AFTER_DAYS', ARCHIVE_AFTER_DAYS)) if after_days is None else after_days
+        self.interval = interval
+        self.start_delay = start_delay  # Pierwszy przebieg po starcie aplikacji, nie w trakcie
+        self.on_moved = on_moved
+        self.moved = 0
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="archive-mover", daemon=True)
+        self._thread.start()
+        policy = f"nieaktywne od {self.after_days} dni" if self.after_days > 0 else "tylko oznaczone"
+        print(f"[DB] Archiwizacja w tle aktywna ({policy}, co {self.interval / 60:.0f} min)")
+    
+    def stop(self):
+        self._stop.set()
+    
+    def run_once(self) -> int:
+        """Jeden przebieg: paczki rozmów aż do wyczerpania kandydatów"""
+        total = 0
+        while not self._stop.is_set():
+            exclude = set(self.open_conversations()) if self.open_conversations else ()
+            moved = self.db.archive_idle_conversations(self.after_days, exclude=exclude)
+            total += moved
+            if moved < ARCHIVE_BATCH:
+                break
+        self.moved += total
+        return total
+    
+    def _run(self):
+        if self._stop.wait(self.start_delay):
+            return
+        while True:
+            try:
+                moved = self.run_once()
+                if moved and self.on_moved:
+                    self.on_moved(moved)
+            except Exception as e:
+                print(f"[DB ERROR] Archiwizacja w tle: {e}")
+            if self._stop.wait(self.interval):
+                return
+
 # Przykład użycia z GUI
 def integrate_with_gui(gui_instance):
     """Integruje bazę danych z istniejącą aplikacją GUI"""
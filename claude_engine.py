@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Silnik zapytań do API Claude - wspólny dla GUI i trybu wsadowego
+Buduje parametry zapytania z konfiguracji modelu, streamuje odpowiedź
+i zwraca tekst, myślenie oraz zużycie tokenów. Bez zależności od Tk.
+"""
+
+import time
+import random
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from claude_models import ModelConfig
+from claude_telemetry import percentiles
+from claude_tracing import tracer
+
+# Odpowiedź z cache odtwarzana jest w kawałkach przez ten sam renderer co stream
+REPLAY_CHUNK_CHARS = 2048
+
+# Kody HTTP, po których warto ponowić zapytanie (limit, przeciążenie, błąd serwera)
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Szacunek tokenów obrazu (~1,15 Mpx / 750 px na token) do limitów zapytań
+IMAGE_TOKENS = 1600
+
+
+def create_client(api_key: str, base_url: Optional[str] = None, max_retries: Optional[int] = None,
+                  http_client=None):
+    """Tworzy klienta API - import SDK odłożony do pierwszego użycia"""
+    from anthropic import Anthropic
+
+    kwargs = {"api_key": api_key}
+    if base_url:
+        kwargs["base_url"] = base_url
+    if max_retries is not None:
+        kwargs["max_retries"] = max_retries
+    if http_client is not None:
+        kwargs["http_client"] = http_client
+    return Anthropic(**kwargs)
+
+
+@dataclass
+class RequestSettings:
+    """Ustawienia pojedynczego zapytania (odpowiednik kontrolek GUI)"""
+    model: ModelConfig
+    system_prompt: str = ""
+    temperature: float = 0.7
+    thinking_enabled: bool = False
+    thinking_budget: int = 10000
+    # Cache promptu po stronie API; cache_prefix - liczba wiadomości wspólnych z innymi gałęziami
+    prompt_caching: bool = False
+    cache_prefix: int = 0
+
+    @property
+    def uses_thinking(self) -> bool:
+        return self.model.extended_thinking and self.thinking_enabled
+
+
+@dataclass
+class ResponseResult:
+    """Wynik zapytania"""
+    text: str
+    thinking: str
+    input_tokens: int
+    output_tokens: int
+    usage_estimated: bool = False
+    stop_reason: Optional[str] = None
+    attempts: int = 1
+    cached: bool = False
+    # Tokeny wejściowe zapisane do / odczytane z cache promptu (poza input_tokens)
+    cache_write_tokens: int = 0
+    cache_read_tokens: int = 0
+    # Część output_tokens przypadająca na myślenie (Extended Thinking)
+    thinking_tokens: int = 0
+    # Rozbicie czasu odpowiedzi (sekundy): connect, server_queue, first_byte, ttft...
+    timing: Optional[Dict] = None
+
+
+def build_request_params(settings: RequestSettings, messages: List[Dict]) -> Dict:
+    """Buduje parametry messages.stream() dla danych ustawień"""
+    params = {
+        "model": settings.model.id,
+        "max_tokens": settings.model.max_output_tokens,
+        "temperature": settings.temperature,
+        "system": settings.system_prompt,
+        "messages": [api_message(message) for message in messages]
+    }
+
+    # Punkty cache: system prompt, koniec wspólnego prefiksu gałęzi i bieżąca tura
+    if settings.prompt_caching:
+        if settings.system_prompt:
+            params["system"] = [with_cache_control({"type": "text", "text": settings.system_prompt})]
+        for index in {settings.cache_prefix - 1, len(messages) - 1}:
+            if 0 <= index < len(messages) and messages[index].get("content"):
+                params["messages"][index] = cache_message(params["messages"][index])
+
+    # Dodaj Extended Thinking jeśli włączone
+    if settings.uses_thinking:
+        params["thinking"] = {
+            "type": "enabled",
+            "budget_tokens": settings.thinking_budget
+        }
+
+    return params
+
+
+def api_message(message: Dict) -> Dict:
+    """Wiadomość w formacie API - załączniki (claude_attachments) jako bloki przed tekstem"""
+    attachments = message.get("attachments")
+    if not attachments:
+        return {"role": message["role"], "content": message["content"]}
+    blocks = [attachment.block for attachment in attachments]
+    if message["content"]:
+        blocks.append({"type": "text", "text": message["content"]})
+    return {"role": message["role"], "content": blocks}
+
+
+def with_cache_control(block: Dict) -> Dict:
+    """Kopia bloku treści z punktem cache promptu (ephemeral)"""
+    return {**block, "cache_control": {"type": "ephemeral"}}
+
+
+def cache_message(message: Dict) -> Dict:
+    """Kopia wiadomości z punktem cache na ostatnim bloku - API cache'uje prefiks do tego miejsca"""
+    content = message["content"]
+    blocks = [{"type": "text", "text": content}] if isinstance(content, str) else list(content)
+    return {**message, "content": blocks[:-1] + [with_cache_control(blocks[-1])]}
+
+
+def split_thinking_tokens(output_tokens: int, text: str, thinking: str) -> int:
+    """
+    Tokeny myślenia w output_tokens. API podaje tylko sumę (myślenie jest płatne jak
+    wyjście), więc dzielimy ją proporcjonalnie do długości myślenia i odpowiedzi.
+    """
+    if not thinking or not output_tokens:
+        return 0
+    return round(output_tokens * len(thinking) / (len(thinking) + len(text)))
+
+
+def estimate_input_tokens(params: Dict) -> int:
+    """Przybliżona liczba tokenów wejściowych (4 znaki na token)"""
+    size = len(str(params.get("system", "")))
+    tokens = 0
+    for message in params.get("messages", []):
+        content = message.get("content", "")
+        if isinstance(content, str):
+            size += len(content)
+            continue
+        for block in content:
+            # Obraz to ~1600 tokenów niezależnie od długości base64
+            if block.get("type") == "image":
+                tokens += IMAGE_TOKENS
+            else:
+                size += len(str(block.get("text") or block.get("source", {}).get("data", "")))
+    return tokens + size // 4
+
+
+class RequestEngine:
+    """Potok zapytania ze streamowaniem"""
+
+    def __init__(self, client, scheduler=None, cache=None, tracer=None):
+        self.client = client
+        # ConnectionTracer - zdarzenia połączenia HTTP do rozbicia TTFT
+        self.tracer = tracer
+        # RateLimitScheduler - limity modelu i ponawianie błędów przejściowych
+        self.scheduler = scheduler
+        # ResponseCache - opcjonalny, tylko dla powtarzalnych ustawień
+        self.cache = cache
+
+    def stream(self, settings: RequestSettings, messages: List[Dict],
+               on_start: Optional[Callable[[], None]] = None,
+               on_text: Optional[Callable[[str], None]] = None,
+               on_thinking: Optional[Callable[[str], None]] = None) -> ResponseResult:
+        """
+        Wysyła zapytanie i streamuje odpowiedź. Callbacki wywoływane są w wątku
+        wywołującego - GUI przekazuje je dalej przez root.after.
+        """
+        cache = self.cache if self.cache is not None and self.cache.is_cacheable(settings) else None
+        if cache is not None:
+            with tracer.span("cache.get", "api"):
+                cached = cache.get(settings, messages)
+            if cached is not None:
+                tracer.count("cache.hits", category="api")
+                return self._replay(cached, on_start, on_text, on_thinking)
+
+        result = self._send(settings, messages, on_start, on_text, on_thinking)
+
+        if cache is not None:
+            with tracer.span("cache.put", "api"):
+                cache.put(settings, messages, result)
+        return result
+
+    def _replay(self, result: ResponseResult,
+                on_start: Optional[Callable[[], None]],
+                on_text: Optional[Callable[[str], None]],
+                on_thinking: Optional[Callable[[str], None]]) -> ResponseResult:
+        """Odtwarza odpowiedź z cache przez te same callbacki co streaming"""
+        if on_start:
+            on_start()
+        if on_thinking and result.thinking:
+            on_thinking(result.thinking)
+        if on_text:
+            for start in range(0, len(result.text), REPLAY_CHUNK_CHARS):
+                on_text(result.text[start:start + REPLAY_CHUNK_CHARS])
+        return result
+
+    def _send(self, settings: RequestSettings, messages: List[Dict],
+              on_start: Optional[Callable[[], None]],
+              on_text: Optional[Callable[[str], None]],
+              on_thinking: Optional[Callable[[str], None]]) -> ResponseResult:
+        params = build_request_params(settings, messages)
+        # Od tego momentu liczymy czas widziany przez użytkownika (z kolejką i ponowieniami)
+        requested = time.perf_counter()
+        if self.scheduler is None:
+            return self._stream_once(params, messages, on_start, on_text, on_thinking, requested)
+
+        attempts = [0]
+        started = [False]
+
+        def mark_started():
+            started[0] = True
+            if on_start:
+                on_start()
+
+        def attempt():
+            attempts[0] += 1
+            return self._stream_once(params, messages, mark_started, on_text, on_thinking, requested)
+
+        # Ponawiamy tylko zanim cokolwiek pojawiło się w oknie czatu
+        result = self.scheduler.call(settings.model.id, estimate_input_tokens(params), attempt,
+                                     is_idempotent=lambda: not started[0])
+        result.attempts = attempts[0]
+        return result
+
+    def _stream_once(self, params: Dict, messages: List[Dict],
+                     on_start: Optional[Callable[[], None]],
+                     on_text: Optional[Callable[[str], None]],
+                     on_thinking: Optional[Callable[[str], None]],
+                     requested: float) -> ResponseResult:
+        trace = self.tracer.begin() if self.tracer else None
+        started = time.perf_counter()
+
+        try:
+            with self.client.messages.stream(**params) as stream:
+                full_response, thinking_content, delta_times, final_message = self._consume(
+                    stream, params, on_start, on_text, on_thinking
+                )
+        finally:
+            if trace is not None:
+                self.tracer.end()
+        finished = time.perf_counter()
+        self._trace_phases(params["model"], requested, started, finished, delta_times)
+
+        # Zużycie z API, a gdy go brak - przybliżenie (4 znaki na token)
+        usage = getattr(final_message, 'usage', None)
+        last_prompt = messages[-1]["content"] if messages else ""
+        if not isinstance(last_prompt, str):
+            last_prompt = str(last_prompt)
+        output_tokens = usage.output_tokens if usage else len(full_response) // 4
+        cache_write_tokens = getattr(usage, 'cache_creation_input_tokens', None) or 0
+        cache_read_tokens = getattr(usage, 'cache_read_input_tokens', None) or 0
+        timing = build_timing(params["model"], requested, started, finished, delta_times, output_tokens, trace)
+        if "thinking" in params:
+            # Budżet zapisany z pomiarami - historia dla adaptacyjnego budżetu myślenia
+            timing["thinking_budget"] = params["thinking"]["budget_tokens"]
+
+        return ResponseResult(
+            text=full_response,
+            thinking=thinking_content,
+            input_tokens=usage.input_tokens if usage else len(last_prompt) // 4,
+            output_tokens=output_tokens,
+            usage_estimated=usage is None,
+            stop_reason=getattr(final_message, 'stop_reason', None),
+            cache_write_tokens=cache_write_tokens,
+            cache_read_tokens=cache_read_tokens,
+            thinking_tokens=split_thinking_tokens(output_tokens, full_response, thinking_content),
+            timing=timing
+        )
+
+    def _trace_phases(self, model_id: str, requested: float, started: float, finished: float,
+                      delta_times: List[float]):
+        """Fazy zapytania jako spany: kolejka, do pierwszego tokenu, generowanie"""
+        if not tracer.enabled:
+            return
+        first_token = delta_times[0] if delta_times else finished
+        tracer.complete("api.queue_wait", requested, started, "api", model=model_id)
+        tracer.complete("api.first_token", started, first_token, "api", model=model_id)
+        tracer.complete("api.generation", first_token, finished, "api", model=model_id,
+                        deltas=len(delta_times))
+        tracer.count("api.requests", category="api")
+
+    def _consume(self, stream, params: Dict,
+                 on_start: Optional[Callable[[], None]],
+                 on_text: Optional[Callable[[str], None]],
+                 on_thinking: Optional[Callable[[str], None]]):
+        """Czyta zdarzenia streamu; zwraca tekst, myślenie, czasy kolejnych delt i wiadomość końcową"""
+        full_response = ""
+        thinking_content = ""
+        delta_times = []
+
+        if self.scheduler is not None:
+            response = getattr(stream, 'response', None)
+            self.scheduler.observe_headers(params["model"], getattr(response, 'headers', None))
+
+        if on_start:
+            on_start()
+
+        for event in stream:
+            if event.type != 'content_block_delta':
+                continue
+
+            if event.delta.type == 'thinking_delta':
+                delta_times.append(time.perf_counter())
+                thinking_content += event.delta.thinking
+                if on_thinking:
+                    on_thinking(event.delta.thinking)
+            elif event.delta.type == 'text_delta':
+                delta_times.append(time.perf_counter())
+                text = event.delta.text
+                full_response += text
+                if on_text:
+                    on_text(text)
+
+        return full_response, thinking_content, delta_times, stream.get_final_message()
+
+
+def build_timing(model_id: str, requested: float, started: float, finished: float,
+                 delta_times: List[float], output_tokens: int, trace=None) -> Dict:
+    """
+    Pomiary zapytania (sekundy): queue_wait (limity, ponowienia), ttft, inter_token
+    (p50/p95/p99 odstępów między deltami), total i tokens_per_sec generowania.
+    Z trace dochodzi rozbicie TTFT: connect, server_queue, first_byte.
+    """
+    first_token = delta_times[0] if delta_times else None
+    timing = trace.breakdown(first_token, origin=requested) if trace is not None else {}
+    timing["model"] = model_id
+    timing["queue_wait"] = started - requested
+    timing["total"] = finished - requested
+    if first_token is not None:
+        timing["ttft"] = first_token - requested
+        generation = finished - first_token
+        if generation > 0 and output_tokens:
+            timing["tokens_per_sec"] = output_tokens / generation
+
+    gaps = [later - earlier for earlier, later in zip(delta_times, delta_times[1:])]
+    if gaps:
+        timing["inter_token"] = percentiles(gaps)
+    return timing
+
+
+def error_status_code(error: Exception) -> Optional[int]:
+    """Kod HTTP błędu API (None dla błędów sieci)"""
+    return getattr(error, 'status_code', None)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Czy błąd jest przejściowy (limit, przeciążenie, sieć)"""
+    status = error_status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+
+    # Błędy połączenia / timeouty SDK nie mają kodu HTTP
+    return type(error).__name__ in ('APIConnectionError', 'APITimeoutError')
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Odczytuje nagłówek retry-after z odpowiedzi błędu"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+
+    value = headers.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Wykładnicze opóźnienie z pełnym jitterem"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""
+Lokalny serwer udający API Claude - do testów bez kluczy i kosztów
+Obsługuje Messages API ze streamowaniem SSE (tempo tokenów, delty thinking,
+wstrzykiwane błędy 429/529, cache promptu dla bloków z cache_control), endpointy Message Batches API (tworzenie, status,
+wyniki JSONL, anulowanie) oraz listę modeli. Odpowiedzi są deterministyczne,
+zużycie tokenów szacowane.
+
+Użycie:
+    python claude_fake_api.py --port 8765 --batch-delay 5 --error-rate 0.1
+    python claude_message_batches.py --base-url http://127.0.0.1:8765 submit prompts.jsonl --wait
+    python claude_fake_api.py --token-rate 80 --ttft 0.4 --message-error-rate 0.05
+"""
+
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+BATCH_PATH = re.compile(r"^/v1/messages/batches/([A-Za-z0-9_]+)(/results|/cancel)?$")
+
+# Słowa, z których składana jest streamowana odpowiedź (jedno słowo = jeden token)
+FILLER_WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+                "incididunt ut labore et dolore magna aliqua Ut enim ad minim veniam quis nostrud "
+                "exercitation ullamco laboris nisi aliquip ex ea commodo consequat").split()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat().replace("+00:00", "Z") if value else None
+
+
+def estimate_tokens(value) -> int:
+    """Przybliżenie liczby tokenów (4 znaki na token)"""
+    return max(1, len(json.dumps(value, ensure_ascii=False)) // 4)
+
+
+def _message_id() -> str:
+    return f"msg_{uuid.uuid4().hex[:24]}"
+
+
+def _strip_cache_control(block):
+    if isinstance(block, dict):
+        return {key: value for key, value in block.items() if key != "cache_control"}
+    return block
+
+
+def prompt_blocks(params: Dict) -> List[Tuple[object, bool]]:
+    """Bloki promptu w kolejności cache'owania (system, wiadomości) z flagą punktu cache"""
+    blocks = []
+    system = params.get("system") or []
+    for block in ([{"type": "text", "text": system}] if isinstance(system, str) else system):
+        blocks.append((block, isinstance(block, dict) and "cache_control" in block))
+    for message in params.get("messages") or []:
+        content = message.get("content")
+        for block in ([{"type": "text", "text": content}] if isinstance(content, str) else content or []):
+            blocks.append(({"role": message.get("role"), **_strip_cache_control(block)},
+                           isinstance(block, dict) and "cache_control" in block))
+    return blocks
+
+
+def fake_tokens(prompt: str, count: int, seed: str = "") -> List[str]:
+    """Deterministyczna sekwencja tokenów (słów) zależna od treści zapytania"""
+    rng = random.Random(f"{seed}{prompt}")
+    tokens = [f"Odpowiedź testowa na: {prompt[:60]}"]
+    for i in range(1, count):
+        word = rng.choice(FILLER_WORDS)
+        tokens.append(f".\n\n{word.capitalize()}" if i % 40 == 0 else f" {word}")
+    return tokens
+
+
+def fake_message(params: Dict) -> Dict:
+    """Deterministyczna odpowiedź dla parametrów zapytania"""
+    messages = params.get("messages") or []
+    last = messages[-1]["content"] if messages else ""
+    if not isinstance(last, str):
+        last = json.dumps(last, ensure_ascii=False)
+
+    text = f"Odpowiedź testowa na: {last[:200]}"
+    content = []
+    if params.get("thinking"):
+        content.append({"type": "thinking", "thinking": f"Rozważam pytanie: {last[:100]}", "signature": "fake"})
+    content.append({"type": "text", "text": text})
+
+    return {
+        "id": _message_id(),
+        "type": "message",
+        "role": "assistant",
+        "model": params.get("model", "claude-fake"),
+        "content": content,
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {
+            "input_tokens": estimate_tokens(messages) + estimate_tokens(params.get("system", "")),
+            "output_tokens": estimate_tokens(text)
+        }
+    }
+
+
+class FakeAPIState:
+    """Stan serwera - batche i ich wyniki"""
+
+    def __init__(self, batch_delay: float = 2.0, error_rate: float = 0.0, seed: Optional[int] = None,
+                 token_rate: float = 0.0, ttft: float = 0.0, response_tokens: int = 200,
+                 thinking_tokens: int = 50, message_error_rate: float = 0.0, retry_after: float = 1.0,
+                 verbose: bool = True):
+        self.batch_delay = batch_delay
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.batches: Dict[str, Dict] = {}
+        self.verbose = verbose
+
+        # Streaming: tempo (tokeny/s, 0 = bez opóźnień), czas do pierwszego tokenu, długość
+        self.token_rate = token_rate
+        self.ttft = ttft
+        self.response_tokens = response_tokens
+        self.thinking_tokens = thinking_tokens
+        self.message_error_rate = message_error_rate
+        self.retry_after = retry_after
+        self.messages_served = 0
+        self.errors_injected = 0
+        # Cache promptu: klucz prefiksu -> liczba tokenów
+        self.prompt_cache: Dict[str, int] = {}
+
+    def draw_message_error(self) -> Optional[Tuple[int, str]]:
+        """Losuje błąd przejściowy dla /v1/messages (status, typ) albo None"""
+        with self.lock:
+            if not self.message_error_rate or self.random.random() >= self.message_error_rate:
+                self.messages_served += 1
+                return None
+            self.errors_injected += 1
+            return (429, "rate_limit_error") if self.random.random() < 0.5 else (529, "overloaded_error")
+
+    def prompt_cache_usage(self, params: Dict) -> Tuple[int, int]:
+        """(zapisane, odczytane) tokeny cache promptu - najdłuższy znany prefiks do punktu cache"""
+        blocks = prompt_blocks(params)
+        last_breakpoint = max((i for i, (_, marked) in enumerate(blocks) if marked), default=-1)
+        if last_breakpoint < 0:
+            return 0, 0
+
+        prefix, tokens, read, keys = [], 0, 0, []
+        for i, (block, marked) in enumerate(blocks[:last_breakpoint + 1]):
+            prefix.append(_strip_cache_control(block))
+            tokens += estimate_tokens(block)
+            key = json.dumps(prefix, ensure_ascii=False, sort_keys=True)
+            with self.lock:
+                if key in self.prompt_cache:
+                    read = tokens
+            if marked:
+                keys.append((key, tokens))
+
+        with self.lock:
+            for key, key_tokens in keys:
+                self.prompt_cache[key] = key_tokens
+        return max(0, tokens - read), read
+
+    def create_batch(self, requests) -> Dict:
+        batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+        created = _now()
+        results = []
+        for request in requests:
+            if self.error_rate and self.random.random() < self.error_rate:
+                result = {"type": "errored", "error": {"type": "error", "error": {
+                    "type": "api_error", "message": "Błąd wstrzyknięty przez serwer testowy"}}}
+            else:
+                result = {"type": "succeeded", "message": fake_message(request["params"])}
+            results.append({"custom_id": request["custom_id"], "result": result})
+
+        with self.lock:
+            self.batches[batch_id] = {
+                "id": batch_id,
+                "created": created,
+                "ready_at": time.monotonic() + self.batch_delay,
+                "canceled": False,
+                "results": results
+            }
+        return self.batches[batch_id]
+
+    def batch_object(self, batch: Dict, base_url: str) -> Dict:
+        ended = batch["canceled"] or time.monotonic() >= batch["ready_at"]
+        results = batch["results"]
+        counts = {"processing": 0, "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0}
+        if not ended:
+            counts["processing"] = len(results)
+        elif batch["canceled"]:
+            counts["canceled"] = len(results)
+        else:
+            for entry in results:
+                counts[entry["result"]["type"]] += 1
+
+        return {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": counts,
+            "created_at": _iso(batch["created"]),
+            "expires_at": _iso(batch["created"] + timedelta(days=1)),
+            "ended_at": _iso(_now()) if ended else None,
+            "cancel_initiated_at": _iso(_now()) if batch["canceled"] else None,
+            "archived_at": None,
+            "results_url": f"{base_url}/v1/messages/batches/{batch['id']}/results" if ended else None
+        }
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    """Obsługa zapytań HTTP"""
+
+    state: FakeAPIState = None
+    # Keep-alive jak w prawdziwym API - pozwala testować ponowne użycie połączenia
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if not self.state.verbose:
+            return
+        print(f"[FAKE API] {self.command} {self.path} -> {args[1] if len(args) > 1 else ''}")
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.headers.get('Host') or '%s:%d' % self.server.server_address[:2]}"
+
+    def send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status: int, error_type: str, message: str):
+        self.send_json(status, {"type": "error", "error": {"type": error_type, "message": message}})
+
+    def read_json(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def send_sse(self, event: str, payload: Dict):
+        """Jedno zdarzenie SSE jako fragment odpowiedzi chunked"""
+        data = f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def stream_message(self, params: Dict):
+        """Odpowiedź /v1/messages w protokole SSE Messages API"""
+        state = self.state
+        messages = params.get("messages") or []
+        prompt = messages[-1]["content"] if messages else ""
+        if not isinstance(prompt, str):
+            prompt = json.dumps(prompt, ensure_ascii=False)
+        output_limit = max(1, min(state.response_tokens, int(params.get("max_tokens") or state.response_tokens)))
+        text_tokens = fake_tokens(prompt, output_limit)
+        thinking = fake_tokens(prompt, state.thinking_tokens, seed="thinking") if params.get("thinking") else []
+        delay = 1.0 / state.token_rate if state.token_rate else 0.0
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        input_tokens = estimate_tokens(messages) + estimate_tokens(params.get("system", ""))
+        cache_write, cache_read = state.prompt_cache_usage(params)
+        self.send_sse("message_start", {"type": "message_start", "message": {
+            "id": _message_id(), "type": "message", "role": "assistant",
+            "model": params.get("model", "claude-fake"), "content": [],
+            "stop_reason": None, "stop_sequence": None,
+            "usage": {"input_tokens": max(1, input_tokens - cache_write - cache_read), "output_tokens": 1,
+                      "cache_creation_input_tokens": cache_write, "cache_read_input_tokens": cache_read}
+        }})
+        if state.ttft:
+            time.sleep(state.ttft)
+
+        index = 0
+        if thinking:
+            self.send_sse("content_block_start", {"type": "content_block_start", "index": index,
+                                                  "content_block": {"type": "thinking", "thinking": "",
+                                                                    "signature": ""}})
+            for token in thinking:
+                self.send_sse("content_block_delta", {"type": "content_block_delta", "index": index,
+                                                      "delta": {"type": "thinking_delta", "thinking": token}})
+                if delay:
+                    time.sleep(delay)
+            self.send_sse("content_block_delta", {"type": "content_block_delta", "index": index,
+                                                  "delta": {"type": "signature_delta", "signature": "fake"}})
+            self.send_sse("content_block_stop", {"type": "content_block_stop", "index": index})
+            index += 1
+
+        self.send_sse("content_block_start", {"type": "content_block_start", "index": index,
+                                              "content_block": {"type": "text", "text": ""}})
+        for token in text_tokens:
+            self.send_sse("content_block_delta", {"type": "content_block_delta", "index": index,
+                                                  "delta": {"type": "text_delta", "text": token}})
+            if delay:
+                time.sleep(delay)
+        self.send_sse("content_block_stop", {"type": "content_block_stop", "index": index})
+
+        stop_reason = "max_tokens" if len(text_tokens) >= int(params.get("max_tokens") or 10**9) else "end_turn"
+        self.send_sse("message_delta", {"type": "message_delta",
+                                        "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                                        "usage": {"output_tokens": len(text_tokens) + len(thinking)}})
+        self.send_sse("message_stop", {"type": "message_stop"})
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def find_batch(self) -> Tuple[Optional[Dict], Optional[str]]:
+        match = BATCH_PATH.match(self.path.split("?")[0])
+        if not match:
+            return None, None
+        return self.state.batches.get(match.group(1)), match.group(2)
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        if path == "/v1/messages":
+            params = self.read_json()
+            error = self.state.draw_message_error()
+            if error is not None:
+                status, error_type = error
+                body = json.dumps({"type": "error", "error": {
+                    "type": error_type, "message": "Błąd wstrzyknięty przez serwer testowy"}}).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("retry-after", f"{self.state.retry_after:g}")
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            if params.get("stream"):
+                self.stream_message(params)
+            else:
+                self.send_json(200, fake_message(params))
+            return
+
+        if path == "/v1/messages/batches":
+            body = self.read_json()
+            requests = body.get("requests") or []
+            if not requests:
+                self.send_error_json(400, "invalid_request_error", "requests: lista nie może być pusta")
+                return
+            batch = self.state.create_batch(requests)
+            self.send_json(200, self.state.batch_object(batch, self.base_url))
+            return
+
+        batch, action = self.find_batch()
+        if batch is not None and action == "/cancel":
+            batch["canceled"] = True
+            self.send_json(200, self.state.batch_object(batch, self.base_url))
+            return
+
+        self.send_error_json(404, "not_found_error", f"Nieznany endpoint: {path}")
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/v1/models":
+            # Używane do rozgrzewania połączenia i sprawdzania klucza
+            model = {"type": "model", "id": "claude-fake", "display_name": "Claude Fake",
+                     "created_at": _iso(_now())}
+            self.send_json(200, {"data": [model], "has_more": False,
+                                 "first_id": model["id"], "last_id": model["id"]})
+            return
+
+        if path == "/v1/messages/batches":
+            data = [self.state.batch_object(b, self.base_url) for b in self.state.batches.values()]
+            self.send_json(200, {"data": data, "has_more": False, "first_id": None, "last_id": None})
+            return
+
+        batch, action = self.find_batch()
+        if batch is None:
+            self.send_error_json(404, "not_found_error", f"Nieznany batch lub endpoint: {path}")
+            return
+
+        if action is None:
+            self.send_json(200, self.state.batch_object(batch, self.base_url))
+            return
+
+        if action == "/results":
+            if self.state.batch_object(batch, self.base_url)["processing_status"] != "ended":
+                self.send_error_json(400, "invalid_request_error", "Batch jeszcze się przetwarza")
+                return
+            lines = []
+            for entry in batch["results"]:
+                if batch["canceled"]:
+                    entry = {"custom_id": entry["custom_id"], "result": {"type": "canceled"}}
+                lines.append(json.dumps(entry, ensure_ascii=False))
+            body = ("\n".join(lines) + "\n").encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/binary")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_error_json(404, "not_found_error", f"Nieznany endpoint: {path}")
+
+
+def create_server(host: str = "127.0.0.1", port: int = 8765, **state_options) -> ThreadingHTTPServer:
+    """Tworzy serwer (port 0 = wolny port, adres w server.server_address)"""
+    handler = type("BoundFakeAPIHandler", (FakeAPIHandler,), {"state": FakeAPIState(**state_options)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def start_in_thread(host: str = "127.0.0.1", port: int = 0, **state_options) -> Tuple[ThreadingHTTPServer, str]:
+    """Uruchamia serwer w wątku tle - zwraca serwer i base_url"""
+    server = create_server(host, port, **state_options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lokalny serwer udający API Claude")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-delay", type=float, default=2.0, help="Czas przetwarzania batcha (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Odsetek zapytań kończonych błędem")
+    parser.add_argument("--seed", type=int, help="Ziarno losowania błędów")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="Tokeny/s streamingu (0 = bez opóźnień)")
+    parser.add_argument("--ttft", type=float, default=0.0, help="Opóźnienie pierwszego tokenu (s)")
+    parser.add_argument("--response-tokens", type=int, default=200, help="Długość odpowiedzi w tokenach")
+    parser.add_argument("--thinking-tokens", type=int, default=50, help="Długość myślenia (gdy włączone)")
+    parser.add_argument("--message-error-rate", type=float, default=0.0,
+                        help="Odsetek zapytań /v1/messages kończonych 429/529")
+    args = parser.parse_args(argv)
+
+    server = create_server(args.host, args.port, batch_delay=args.batch_delay,
+                           error_rate=args.error_rate, seed=args.seed, token_rate=args.token_rate,
+                           ttft=args.ttft, response_tokens=args.response_tokens,
+                           thinking_tokens=args.thinking_tokens,
+                           message_error_rate=args.message_error_rate)
+    print(f"[FAKE API] Nasłuchuję na http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,15 +8,37 @@ import os
 import sys
 import json
 import threading
+import time
+import importlib.util
+from dataclasses import replace
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass, field
+
+# Profiler startu musi powstać przed ciężkimi importami (--profile-startup)
+from claude_startup import startup_profiler
+
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog, font
 import customtkinter as ctk
-from anthropic import Anthropic
 from dotenv import load_dotenv
 
+from claude_models import MODELS
+from claude_engine import RequestEngine, RequestSettings, is_retryable_error
+from claude_ratelimit import RateLimitScheduler
+from claude_cache import ResponseCache
+from claude_connection import ConnectionTracer, ConnectionWarmer, create_warm_client, format_ttft
+from claude_telemetry import LatencyTracker, describe_latency
+from claude_thinking_budget import ThinkingBudgetController, parse_target
+from claude_attachments import AttachmentPipeline, FILE_TYPES, attachment_kind, attachment_name, drop_failed, resolve_messages, user_message
+from claude_watchdog import UIWatchdog, describe_stall
+from claude_tracing import TRACE_FILE, traced, tracer
+from claude_session import ChatSession, DEFAULT_TITLE, title_from_message
+from claude_transcript import TranscriptRenderer
+from claude_widget_registry import WidgetRegistry
+from claude_conversation_io import (
+    LOAD_PAGES_AHEAD, build_header, is_jsonl_file, iter_pages, open_conversation_file, write_conversation_jsonl
+)
+
 # Ustaw tryb wyglądu customtkinter
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
@@ -24,200 +46,238 @@ ctk.set_default_color_theme("blue")
 # Ładowanie zmiennych środowiskowych
 load_dotenv()
 
+# SDK Anthropic i ORM (sqlalchemy/psycopg2) importowane są dopiero przy pierwszym
+# użyciu, w tle - tu sprawdzamy tylko czy są zainstalowane
 try:
     from claude_gui_db_panel import DatabaseHistoryPanel
-    from claude_db_extension import DatabaseManager
+    if importlib.util.find_spec("sqlalchemy") is None:
+        raise ImportError("No module named 'sqlalchemy'")
     DB_AVAILABLE = True
-    print("[DB] ✅ Moduły bazy danych załadowane!")
+    print("[DB] ✅ Moduły bazy danych dostępne!")
 except ImportError as e:
     DB_AVAILABLE = False
     print(f"[DB] ❌ Brak modułów bazy: {e}")
 
 
-@dataclass
-class ModelConfig:
-    """Pełna konfiguracja modelu Claude"""
-    id: str
-    name: str
-    description: str
-    strengths: str
-    max_output_tokens: int
-    context_window: str
-    latency: str
-    vision: bool = True
-    multilingual: bool = True
-    extended_thinking: bool = False
-    priority_tier: bool = False
-    training_cutoff: str = ""
-    # Koszty (w $ za milion tokenów)
-    input_cost: float = 0.0
-    output_cost: float = 0.0
-    # Extended Thinking settings
-    default_thinking_enabled: bool = False
-    default_thinking_budget: int = 10000
-    max_thinking_budget: int = 32000
-
-# Pełna konfiguracja wszystkich modeli
-MODELS = {
-    "opus-4.1": ModelConfig(
-        id="claude-opus-4-1-20250805",
-        name="Claude Opus 4.1",
-        description="Nasz najbardziej zaawansowany model",
-        strengths="Najwyższy poziom inteligencji i możliwości",
-        max_output_tokens=32000,
-        context_window="200K",
-        latency="Umiarkowanie szybki",
-        extended_thinking=True,
-        priority_tier=True,
-        training_cutoff="Mar 2025",
-        input_cost=15.0,
-        output_cost=75.0,
-        default_thinking_enabled=True,  # Domyślnie włączone dla Opus 4.1
-        default_thinking_budget=16000,
-        max_thinking_budget=32000
-    ),
-    "opus-4": ModelConfig(
-        id="claude-opus-4-20240229",
-        name="Claude Opus 4",
-        description="Poprzedni flagowy model",
-        strengths="Bardzo wysoka inteligencja i możliwości",
-        max_output_tokens=32000,
-        context_window="200K",
-        latency="Umiarkowanie szybki",
-        extended_thinking=True,
-        priority_tier=True,
-        training_cutoff="Mar 2025",
-        input_cost=12.0,
-        output_cost=60.0
-    ),
-    "sonnet-4": ModelConfig(
-        id="claude-sonnet-4-20250514",
-        name="Claude Sonnet 4",
-        description="Model o wysokiej wydajności",
-        strengths="Wysoka inteligencja i zbalansowana wydajność",
-        max_output_tokens=64000,
-        context_window="200K / 1M (beta)",
-        latency="Szybki",
-        extended_thinking=True,
-        priority_tier=True,
-        training_cutoff="Mar 2025",
-        input_cost=3.0,
-        output_cost=15.0
-    ),
-    "sonnet-3.7": ModelConfig(
-        id="claude-sonnet-3.7-20241029",
-        name="Claude Sonnet 3.7",
-        description="Model z rozszerzonym myśleniem",
-        strengths="Wysoka inteligencja z przełączalnym rozszerzonym myśleniem",
-        max_output_tokens=64000,
-        context_window="200K",
-        latency="Szybki",
-        extended_thinking=True,
-        priority_tier=True,
-        training_cutoff="Nov 2024",
-        input_cost=3.0,
-        output_cost=15.0
-    ),
-    "haiku-3.5": ModelConfig(
-        id="claude-3-5-haiku-20241022",
-        name="Claude Haiku 3.5",
-        description="Nasz najszybszy model",
-        strengths="Inteligencja w błyskawicznej prędkości",
-        max_output_tokens=8192,
-        context_window="200K",
-        latency="Najszybszy",
-        extended_thinking=False,
-        priority_tier=True,
-        training_cutoff="July 2024",
-        input_cost=1.0,
-        output_cost=5.0
-    ),
-    "haiku-3": ModelConfig(
-        id="claude-3-haiku-20240307",
-        name="Claude Haiku 3",
-        description="Szybki i kompaktowy model",
-        strengths="Szybka i dokładna wydajność",
-        max_output_tokens=4096,
-        context_window="200K",
-        latency="Szybki",
-        extended_thinking=False,
-        priority_tier=False,
-        training_cutoff="Aug 2023",
-        input_cost=0.25,
-        output_cost=1.25
-    )
-}
-
-class TokenStats:
-    """Klasa do śledzenia statystyk tokenów"""
-    def __init__(self):
-        self.total_input_tokens = 0
-        self.total_output_tokens = 0
-        self.session_cost = 0.0
-        self.messages_count = 0
-        
-    def add_usage(self, input_tokens: int, output_tokens: int, model: ModelConfig):
-        self.total_input_tokens += input_tokens
-        self.total_output_tokens += output_tokens
-        self.messages_count += 1
-        
-        # Oblicz koszt (ceny są za milion tokenów)
-        input_cost = (input_tokens / 1_000_000) * model.input_cost
-        output_cost = (output_tokens / 1_000_000) * model.output_cost
-        self.session_cost += input_cost + output_cost
-        
-        return input_cost + output_cost
-
 class ClaudeGUIAssistant:
     """Główna klasa aplikacji GUI"""
     
+    # Delty myślenia rysowane paczkami co tyle ms (zamiast wstawiania każdej osobno)
+    THINKING_FLUSH_MS = 100
+    
+    # Stan rozmowy należy do aktywnej sesji - dotychczasowe atrybuty delegują do niej
+    @property
+    def conversation_history(self):
+        return self.active_session.conversation_history
+    
+    @conversation_history.setter
+    def conversation_history(self, messages):
+        self.active_session.conversation_history = messages
+    
+    @property
+    def current_conversation_id(self):
+        return self.active_session.conversation_id
+    
+    @current_conversation_id.setter
+    def current_conversation_id(self, conversation_id):
+        self.active_session.conversation_id = conversation_id
+    
+    @property
+    def token_stats(self):
+        return self.active_session.token_stats
+    
+    @token_stats.setter
+    def token_stats(self, stats):
+        self.active_session.token_stats = stats
+    
+    @property
+    def chat_display(self):
+        return self.active_session.chat_display
+    
     def __init__(self):
-        self.root = ctk.CTk()
-        self.root.title("Claude GUI Assistant - Zaawansowany interfejs")
-        self.root.geometry("1400x900")
+        # Pomiar czasu uruchomienia (fazy i zakładki) - wspólny profiler startu
+        self.startup_finished = False
         
-        # Lista wszystkich widgetów do aktualizacji czcionki (musi być przed apply_global_font)
-        self.all_widgets = []
+        with self.measure_startup("okno główne"):
+            self.root = ctk.CTk()
+            self.root.title("Claude GUI Assistant - Zaawansowany interfejs")
+            self.root.geometry("1400x900")
+            
+            # Szkielet okna widoczny od razu, zanim powstanie właściwy interfejs
+            self.show_splash()
         
         # Konfiguracja czcionek
         self.load_font_preferences()
-        # apply_global_font będzie wywołane po zbudowaniu UI
+        
+        # Rejestr widgetów (słabe referencje) i współdzielone nazwane czcionki
+        self.widget_registry = WidgetRegistry(
+            self.current_font_family, self.current_font_size,
+            self.chat_font_family, self.chat_font_size
+        )
         
         # API i konfiguracja
         self.api_key = os.getenv("ANTHROPIC_API_KEY")
         self.client = None
+        self.engine = None
+        self.response_cache = None  # Tworzony przy włączeniu w ustawieniach
+        # Pula połączeń z instrumentacją - rozbicie czasu do pierwszego tokenu
+        self.connection_tracer = ConnectionTracer()
+        self.connection_warmer = None
+        # Limity API i ponawianie 429/529 - stan kolejki trafia na pasek statusu
+        self.rate_scheduler = RateLimitScheduler(
+            on_state=lambda state: self.root.after(0, self.show_scheduler_state, state),
+            on_retry=lambda retry: self.root.after(0, self.show_scheduler_retry, retry)
+        )
         self.current_model = MODELS["sonnet-4"]
-        self.conversation_history = []
-        self.token_stats = TokenStats()
+        # Otwarte rozmowy (zakładki czatu) - każda z własną historią i statystykami
+        self.sessions: Dict[str, ChatSession] = {}
+        self.active_session = ChatSession()
+        # Zaobserwowane opóźnienia per model (sesja + historia z bazy)
+        self.latency_tracker = LatencyTracker()
+        # Wczytywane rozmowy renderowane hurtem (od najnowszych wiadomości)
+        self.transcript_renderer = TranscriptRenderer(self)
+        # Adaptacyjny budżet myślenia (historia zużycia, opóźnień i kosztu per model)
+        self.budget_controller = ThinkingBudgetController()
+        # Załączniki do następnej wiadomości (Future[Attachment]) - przygotowywane w tle
+        self.attachment_pipeline = AttachmentPipeline()
+        self.pending_attachments = []
         self.system_prompt = "Jesteś pomocnym asystentem AI."
         
+        # Monitor zawieszeń pętli zdarzeń (startuje po zimnym starcie)
+        self.ui_watchdog = UIWatchdog(self.root, on_stall=self.on_ui_stall)
+        
+        # Zapis/odczyt plików w tle
+        self.io_busy = False
+        
         # Ustawienie ikon i stylów
         self.setup_styles()
         
+        # Stan ustawień niezależny od widgetów (zakładki budowane są leniwie)
+        self.init_settings_state()
+        
+        # Zakładki czekające na pierwsze otwarcie: nazwa -> funkcja budująca
+        self.lazy_tab_builders = {}
+        
         # Budowanie interfejsu
-        self.build_ui()
+        with self.measure_startup("build_ui"):
+            self.build_ui()
+            self.hide_splash()
         
-        # Zastosuj czcionki po zbudowaniu UI
-        self.apply_global_font()
+        # Widoczna zakładka i połączenie z API dopiero gdy okno jest już na ekranie
+        self.root.after_idle(self.finish_startup)
+    
+    def measure_startup(self, phase):
+        """Mierzy czas fazy uruchomienia"""
+        return startup_profiler.phase(phase)
+    
+    def show_splash(self):
+        """Pokazuje ekran ładowania na czas budowy interfejsu"""
+        self.splash = ctk.CTkLabel(
+            self.root,
+            text="Claude GUI Assistant\n⏳ Ładowanie interfejsu...",
+            font=("Arial", 20, "bold")
+        )
+        self.splash.pack(expand=True)
+        self.root.update()
+    
+    def hide_splash(self):
+        """Usuwa ekran ładowania"""
+        if getattr(self, 'splash', None) is not None:
+            self.splash.destroy()
+            self.splash = None
+    
+    def finish_startup(self):
+        """Kończy zimny start: buduje widoczną zakładkę i wypisuje raport czasów"""
+        self.ensure_tab_built(self.tabview.get())
+        startup_profiler.record("razem do pierwszego widoku", startup_profiler.since_start())
+        self.startup_finished = True
+        self.report_startup_timings()
         
-        # Sprawdź API key
+        # Zimny start sam w sobie blokuje pętlę - mierzymy dopiero od teraz
+        self.ui_watchdog.start()
+        
+        # Sprawdź API key (SDK ładowany w tle)
         self.check_api_key()
     
+    def report_startup_timings(self):
+        """Wypisuje rozbicie czasu uruchomienia"""
+        startup_profiler.report()
+        if self.lazy_tab_builders:
+            print(f"[STARTUP]   Odłożone zakładki: {', '.join(self.lazy_tab_builders)}")
+        if startup_profiler.import_profiling:
+            startup_profiler.save()
+    
+    def init_settings_state(self):
+        """Tworzy zmienne ustawień używane również poza zakładką ustawień"""
+        self.thinking_enabled_var = tk.BooleanVar(
+            value=self.current_model.default_thinking_enabled
+        )
+        self.thinking_budget_var = tk.IntVar(
+            value=self.current_model.default_thinking_budget if self.current_model.extended_thinking else 10000
+        )
+        # Budżet dobierany per zapytanie; cele puste - bez limitu
+        self.thinking_adaptive_var = tk.BooleanVar(value=False)
+        self.thinking_target_latency_var = tk.StringVar(value="")
+        self.thinking_target_cost_var = tk.StringVar(value="")
+        self.temperature_var = tk.DoubleVar(value=0.7)
+        self.font_family_var = tk.StringVar(value=self.current_font_family)
+        self.font_size_var = tk.IntVar(value=self.current_font_size)
+        self.chat_font_family_var = tk.StringVar(value=self.chat_font_family)
+        self.chat_font_size_var = tk.IntVar(value=self.chat_font_size)
+        self.response_cache_var = tk.BooleanVar(value=False)
+        self.prompt_caching_var = tk.BooleanVar(value=True)
+        self.tracing_var = tk.BooleanVar(value=tracer.enabled)
+    
+    def add_lazy_tab(self, name, builder):
+        """Dodaje zakładkę, której zawartość powstaje przy pierwszym otwarciu"""
+        self.tabview.add(name)
+        self.lazy_tab_builders[name] = builder
+    
+    def on_tab_changed(self):
+        """Callback zmiany zakładki - buduje ją jeśli jeszcze nie istnieje"""
+        self.ensure_tab_built(self.tabview.get())
+    
+    def ensure_tab_built(self, name):
+        """Buduje zawartość zakładki przy pierwszym użyciu"""
+        builder = self.lazy_tab_builders.pop(name, None)
+        if builder is None:
+            return
+        
+        start = time.perf_counter()
+        builder(self.tabview.tab(name))
+        elapsed = time.perf_counter() - start
+        
+        if self.startup_finished:
+            print(f"[STARTUP] Zakładka '{name}' zbudowana przy pierwszym otwarciu: {elapsed * 1000:.1f} ms")
+        else:
+            startup_profiler.record(f"zakładka: {name}", elapsed)
+    
+    def show_tab(self, name):
+        """Przełącza na zakładkę (budując ją w razie potrzeby)"""
+        self.tabview.set(name)
+        self.ensure_tab_built(name)
+    
+    def set_system_prompt(self, text):
+        """Ustawia system prompt i odświeża pole edycji, jeśli zakładka istnieje"""
+        self.system_prompt = text
+        if hasattr(self, 'system_prompt_text'):
+            self.system_prompt_text.delete("1.0", "end")
+            self.system_prompt_text.insert("1.0", text)
+    
     def start_new_conversation(self):
-        """Rozpoczyna nową rozmowę"""
-        if self.conversation_history:
+        """Rozpoczyna nową rozmowę w bieżącej zakładce"""
+        session = self.active_session
+        if session.busy:
+            self.update_status("⏳ Poczekaj na zakończenie odpowiedzi w tej zakładce", "warning")
+            return
+        if session.conversation_history:
             if messagebox.askyesno("Nowa rozmowa", "Czy chcesz rozpocząć nową rozmowę?\n(Obecna zostanie zachowana w bazie)"):
-                # Wyczyść wszystko
-                self.conversation_history.clear()
-                self.chat_display.delete("1.0", "end")
-                self.history_listbox.delete(0, tk.END)
-                self.token_stats = TokenStats()
+                # Wyczyść wszystko (razem z ID rozmowy w bazie)
+                session.reset()
+                self.rename_session(session, DEFAULT_TITLE)
+                self.update_history_list()
                 self.update_statistics(0)
                 
-                # Resetuj ID rozmowy
-                if hasattr(self, 'current_conversation_id'):
-                    self.current_conversation_id = None
-                
                 # Odśwież listę w bazie jeśli jest
                 if hasattr(self, 'db_panel') and hasattr(self.db_panel, 'load_conversations'):
                     self.db_panel.load_conversations()
@@ -266,43 +326,19 @@ class ClaudeGUIAssistant:
         with open(self.font_config_file, 'w') as f:
             json.dump(config, f, indent=2)
     
+    @traced("gui")
     def apply_global_font(self):
         """Aplikuje globalną czcionkę do wszystkich widgetów"""
-        # Zaktualizuj czcionkę dla wszystkich zarejestrowanych widgetów
-        for widget_info in self.all_widgets:
-            widget, widget_type = widget_info
-            try:
-                if widget.winfo_exists():
-                    if widget_type == "chat":
-                        widget.configure(font=(self.chat_font_family, self.chat_font_size))
-                    elif widget_type == "title":
-                        widget.configure(font=(self.current_font_family, int(self.current_font_size * 1.5), "bold"))
-                    elif widget_type == "header":
-                        widget.configure(font=(self.current_font_family, int(self.current_font_size * 1.2), "bold"))
-                    elif widget_type == "button":
-                        widget.configure(font=(self.current_font_family, self.current_font_size, "bold"))
-                    else:
-                        widget.configure(font=(self.current_font_family, self.current_font_size))
-            except:
-                pass
+        # Widgety używają współdzielonych czcionek - wystarczy zmienić same czcionki
+        self.widget_registry.set_fonts(
+            self.current_font_family, self.current_font_size,
+            self.chat_font_family, self.chat_font_size
+        )
+        self.widget_registry.prune()
     
     def register_widget(self, widget, widget_type="normal"):
         """Rejestruje widget do globalnej aktualizacji czcionki"""
-        self.all_widgets.append((widget, widget_type))
-        # Zastosuj odpowiednią czcionkę od razu
-        try:
-            if widget_type == "chat":
-                widget.configure(font=(self.chat_font_family, self.chat_font_size))
-            elif widget_type == "title":
-                widget.configure(font=(self.current_font_family, int(self.current_font_size * 1.5), "bold"))
-            elif widget_type == "header":
-                widget.configure(font=(self.current_font_family, int(self.current_font_size * 1.2), "bold"))
-            elif widget_type == "button":
-                widget.configure(font=(self.current_font_family, self.current_font_size, "bold"))
-            else:
-                widget.configure(font=(self.current_font_family, self.current_font_size))
-        except:
-            pass
+        self.widget_registry.register(widget, widget_type)
         
     def setup_styles(self):
         """Konfiguracja stylów aplikacji"""
@@ -320,8 +356,96 @@ class ClaudeGUIAssistant:
         if not self.api_key:
             self.show_api_key_dialog()
         else:
-            self.client = Anthropic(api_key=self.api_key)
+            self.update_status("⏳ Łączenie z API...", "warning")
+            self.connect_client_async(self.api_key)
+    
+    def connect_client_async(self, api_key):
+        """Importuje SDK, tworzy klienta i otwiera połączenie w tle, żeby nie opóźniać pierwszego widoku"""
+        def worker():
+            try:
+                with startup_profiler.phase("SDK anthropic (w tle)"):
+                    client = create_warm_client(api_key, self.connection_tracer, max_retries=0)
+            except Exception as e:
+                self.root.after(0, self.update_status, f"❌ Błąd SDK: {e}", "error")
+                return
+            
+            # Pierwsze zapytanie sprawdza klucz i zostawia połączenie w puli (DNS/TCP/TLS z głowy)
+            warmer = ConnectionWarmer(client, self.connection_tracer)
+            try:
+                warm_time = warmer.warm()
+            except Exception as e:
+                print(f"[CONNECTION] Rozgrzewanie nieudane: {e}")
+                warm_time = None
+                if getattr(e, 'status_code', None) == 401:
+                    # Bez klienta wysyłanie czekałoby w nieskończoność - prosimy o nowy klucz
+                    self.root.after(0, self.update_status, "❌ Nieprawidłowy klucz API", "error")
+                    self.root.after(0, self.show_api_key_dialog)
+                    return
+            
+            self.root.after(0, self.on_client_ready, client, warmer, warm_time)
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def on_client_ready(self, client, warmer=None, warm_time=None):
+        """Klient API gotowy (wątek UI)"""
+        self.set_client(client)
+        self.connection_warmer = warmer
+        if warm_time is not None:
+            self.update_status(f"✅ API połączone ({warm_time * 1000:.0f} ms)", "success")
+        else:
             self.update_status("✅ API połączone", "success")
+    
+    def on_input_activity(self, event=None):
+        """Użytkownik zaczął pisać - odnów połączenie, jeśli wygasło po bezczynności"""
+        warmer = self.connection_warmer
+        if warmer is not None and warmer.needs_rewarm():
+            warmer.warm_async(
+                on_done=lambda elapsed: print(f"[CONNECTION] Połączenie odnowione ({elapsed * 1000:.0f} ms)"),
+                on_error=lambda e: print(f"[CONNECTION] Odnawianie nieudane: {e}")
+            )
+    
+    def set_client(self, client):
+        """Ustawia klienta API i silnik zapytań"""
+        self.client = client
+        # Ponawianiem zajmuje się harmonogram (max_retries=0 w kliencie)
+        self.engine = RequestEngine(client, scheduler=self.rate_scheduler,
+                                    cache=self.response_cache if self.response_cache_var.get() else None,
+                                    tracer=self.connection_tracer)
+    
+    def toggle_response_cache(self):
+        """Włącza/wyłącza cache odpowiedzi dla identycznych zapytań"""
+        if self.response_cache_var.get():
+            if self.response_cache is None:
+                self.response_cache = ResponseCache()
+            stats = self.response_cache.stats()
+            self.update_status(
+                f"💾 Cache odpowiedzi włączony ({stats['entries']} wpisów, tylko temperature 0)", "success"
+            )
+        else:
+            self.update_status("Cache odpowiedzi wyłączony", "normal")
+        
+        if self.engine:
+            self.engine.cache = self.response_cache if self.response_cache_var.get() else None
+            
+    def toggle_tracing(self):
+        """Włącza/wyłącza zbieranie spanów"""
+        if self.tracing_var.get():
+            tracer.enable()
+            self.update_status("🔬 Profilowanie włączone", "success")
+        else:
+            tracer.disable()
+            self.update_status(f"Profilowanie wyłączone ({len(tracer.events)} zdarzeń w buforze)", "normal")
+    
+    def export_trace(self):
+        """Zapisuje zebrane spany do pliku trace (w tle)"""
+        def worker():
+            try:
+                count = tracer.export(TRACE_FILE)
+                self.root.after(0, self.update_status, f"✅ Zapisano {count} zdarzeń do {TRACE_FILE}", "success")
+            except Exception as e:
+                self.root.after(0, self.update_status, f"❌ Błąd zapisu trace: {e}", "error")
+        
+        threading.Thread(target=worker, daemon=True).start()
             
     def show_api_key_dialog(self):
         """Dialog do wprowadzenia klucza API"""
@@ -355,7 +479,10 @@ class ClaudeGUIAssistant:
             key = api_entry.get()
             if key.startswith("sk-ant-"):
                 self.api_key = key
-                self.client = Anthropic(api_key=self.api_key)
+                client = create_warm_client(self.api_key, self.connection_tracer, max_retries=0)
+                self.set_client(client)
+                self.connection_warmer = ConnectionWarmer(client, self.connection_tracer)
+                self.connection_warmer.warm_async()
                 
                 # Zapisz do .env
                 with open('.env', 'w') as f:
@@ -432,17 +559,21 @@ class ClaudeGUIAssistant:
         self.update_model_info()
         
         # Tabbed view dla dodatkowych opcji - ZAPISZ JAKO ATRYBUT KLASY!
-        self.tabview = ctk.CTkTabview(control_frame)
+        # Zawartość zakładek powstaje przy pierwszym otwarciu (add_lazy_tab)
+        self.tabview = ctk.CTkTabview(control_frame, command=self.on_tab_changed)
         self.tabview.pack(fill="both", expand=True, padx=10, pady=10)
         
         # Tab: Porównanie modeli
-        self.build_comparison_tab(self.tabview.add("Porównanie"))
+        self.add_lazy_tab("Porównanie", self.build_comparison_tab)
         
         # Tab: Ustawienia
-        self.build_settings_tab(self.tabview.add("Ustawienia"))
+        self.add_lazy_tab("Ustawienia", self.build_settings_tab)
         
         # Tab: Historia
-        self.build_history_tab(self.tabview.add("Historia"))
+        self.add_lazy_tab("Historia", self.build_history_tab)
+        
+        # Tab: Diagnostyka (zawieszenia interfejsu)
+        self.add_lazy_tab("Diagnostyka", self.build_diagnostics_tab)
         
         # MIEJSCE NA DODATKOWĄ ZAKŁADKĘ BAZY DANYCH
         
@@ -539,9 +670,6 @@ class ClaudeGUIAssistant:
         thinking_frame.pack(fill="x", padx=10, pady=10)
         
         # Włącznik Extended Thinking
-        self.thinking_enabled_var = tk.BooleanVar(
-            value=self.current_model.default_thinking_enabled
-        )
         thinking_checkbox = ctk.CTkCheckBox(
             thinking_frame,
             text="Włącz Extended Thinking",
@@ -561,10 +689,6 @@ class ClaudeGUIAssistant:
         budget_label.pack(anchor="w", padx=10, pady=5)
         self.register_widget(budget_label)
         
-        self.thinking_budget_var = tk.IntVar(
-            value=self.current_model.default_thinking_budget if self.current_model.extended_thinking else 10000
-        )
-        
         budget_slider = ctk.CTkSlider(
             thinking_frame,
             from_=1024,
@@ -583,6 +707,38 @@ class ClaudeGUIAssistant:
         self.thinking_budget_label.pack()
         self.register_widget(self.thinking_budget_label)
         
+        # Budżet adaptacyjny - suwak ignorowany, budżet z cech promptu i historii
+        adaptive_checkbox = ctk.CTkCheckBox(
+            thinking_frame,
+            text="Budżet adaptacyjny (dobierany do każdego zapytania)",
+            variable=self.thinking_adaptive_var,
+            font=(self.current_font_family, self.current_font_size),
+            command=self.update_thinking_budget_label
+        )
+        adaptive_checkbox.pack(anchor="w", padx=10, pady=5)
+        self.register_widget(adaptive_checkbox)
+        
+        targets_frame = ctk.CTkFrame(thinking_frame, fg_color="transparent")
+        targets_frame.pack(anchor="w", padx=10, pady=5)
+        for text, variable in (("Cel czasu (s):", self.thinking_target_latency_var),
+                               ("Cel kosztu ($):", self.thinking_target_cost_var)):
+            target_label = ctk.CTkLabel(
+                targets_frame,
+                text=text,
+                font=(self.current_font_family, self.current_font_size)
+            )
+            target_label.pack(side="left", padx=(0, 5))
+            self.register_widget(target_label)
+            target_entry = ctk.CTkEntry(
+                targets_frame,
+                textvariable=variable,
+                width=80,
+                placeholder_text="brak",
+                font=(self.current_font_family, self.current_font_size)
+            )
+            target_entry.pack(side="left", padx=(0, 15))
+            self.register_widget(target_entry)
+        
         # Informacja o Extended Thinking
         info_text = ctk.CTkLabel(
             thinking_frame,
@@ -592,6 +748,87 @@ class ClaudeGUIAssistant:
         )
         info_text.pack(anchor="w", padx=10, pady=10)
         self.register_widget(info_text)
+        
+        # SEKCJA: Cache odpowiedzi
+        cache_section_label = ctk.CTkLabel(
+            settings_frame,
+            text="Cache odpowiedzi:",
+            font=(self.current_font_family, int(self.current_font_size * 1.3), "bold")
+        )
+        cache_section_label.pack(anchor="w", padx=10, pady=(20, 5))
+        self.register_widget(cache_section_label, "header")
+        
+        cache_frame = ctk.CTkFrame(settings_frame)
+        cache_frame.pack(fill="x", padx=10, pady=10)
+        
+        cache_checkbox = ctk.CTkCheckBox(
+            cache_frame,
+            text="Odpowiadaj z cache na identyczne zapytania",
+            variable=self.response_cache_var,
+            font=(self.current_font_family, self.current_font_size),
+            command=self.toggle_response_cache
+        )
+        cache_checkbox.pack(anchor="w", padx=10, pady=5)
+        self.register_widget(cache_checkbox)
+        
+        cache_info = ctk.CTkLabel(
+            cache_frame,
+            text="💡 Tylko dla temperature 0 i bez Extended Thinking - wtedy odpowiedź\njest powtarzalna. Trafienie w cache jest natychmiastowe i kosztuje $0.",
+            font=(self.current_font_family, int(self.current_font_size * 0.9)),
+            justify="left"
+        )
+        cache_info.pack(anchor="w", padx=10, pady=10)
+        self.register_widget(cache_info, "small")
+        
+        prompt_cache_checkbox = ctk.CTkCheckBox(
+            cache_frame,
+            text="Cache promptu w API (wspólny początek rozmowy i gałęzi)",
+            variable=self.prompt_caching_var,
+            font=(self.current_font_family, self.current_font_size)
+        )
+        prompt_cache_checkbox.pack(anchor="w", padx=10, pady=5)
+        self.register_widget(prompt_cache_checkbox)
+        
+        # SEKCJA: Profilowanie
+        tracing_section_label = ctk.CTkLabel(
+            settings_frame,
+            text="Profilowanie:",
+            font=(self.current_font_family, int(self.current_font_size * 1.3), "bold")
+        )
+        tracing_section_label.pack(anchor="w", padx=10, pady=(20, 5))
+        self.register_widget(tracing_section_label, "header")
+        
+        tracing_frame = ctk.CTkFrame(settings_frame)
+        tracing_frame.pack(fill="x", padx=10, pady=10)
+        
+        tracing_checkbox = ctk.CTkCheckBox(
+            tracing_frame,
+            text="Zbieraj spany (baza, API, czat, czcionki)",
+            variable=self.tracing_var,
+            font=(self.current_font_family, self.current_font_size),
+            command=self.toggle_tracing
+        )
+        tracing_checkbox.pack(anchor="w", padx=10, pady=5)
+        self.register_widget(tracing_checkbox)
+        
+        export_trace_button = ctk.CTkButton(
+            tracing_frame,
+            text="Zapisz trace",
+            command=self.export_trace,
+            width=120,
+            font=(self.current_font_family, self.current_font_size, "bold")
+        )
+        export_trace_button.pack(anchor="w", padx=10, pady=5)
+        self.register_widget(export_trace_button, "button")
+        
+        tracing_info = ctk.CTkLabel(
+            tracing_frame,
+            text=f"💡 Plik {TRACE_FILE} otworzysz w chrome://tracing lub ui.perfetto.dev.\nWyłączone profilowanie nie spowalnia aplikacji.",
+            font=(self.current_font_family, int(self.current_font_size * 0.9)),
+            justify="left"
+        )
+        tracing_info.pack(anchor="w", padx=10, pady=10)
+        self.register_widget(tracing_info, "small")
 
 
         # Wybór czcionki głównej
@@ -612,7 +849,6 @@ class ClaudeGUIAssistant:
         # Filtruj tylko popularne czcionki + te zainstalowane
         font_list = [f for f in common_fonts if f in available_fonts]
         
-        self.font_family_var = tk.StringVar(value=self.current_font_family)
         font_dropdown = ctk.CTkOptionMenu(
             font_frame,
             variable=self.font_family_var,
@@ -632,7 +868,6 @@ class ClaudeGUIAssistant:
         size_main_label.grid(row=0, column=2, padx=10, pady=5, sticky="w")
         self.register_widget(size_main_label)
         
-        self.font_size_var = tk.IntVar(value=self.current_font_size)
         size_spinbox = ctk.CTkEntry(
             font_frame,
             width=80,
@@ -656,7 +891,6 @@ class ClaudeGUIAssistant:
                           "Menlo", "Source Code Pro", "Fira Code", "Cascadia Code"]
         chat_font_list = [f for f in monospace_fonts if f in available_fonts]
         
-        self.chat_font_family_var = tk.StringVar(value=self.chat_font_family)
         chat_font_dropdown = ctk.CTkOptionMenu(
             font_frame,
             variable=self.chat_font_family_var,
@@ -676,7 +910,6 @@ class ClaudeGUIAssistant:
         chat_size_label.grid(row=1, column=2, padx=10, pady=5, sticky="w")
         self.register_widget(chat_size_label)
         
-        self.chat_font_size_var = tk.IntVar(value=self.chat_font_size)
         chat_size_spinbox = ctk.CTkEntry(
             font_frame,
             width=80,
@@ -824,7 +1057,6 @@ class ClaudeGUIAssistant:
         temp_label.pack(anchor="w", padx=10, pady=5)
         self.register_widget(temp_label)
         
-        self.temperature_var = tk.DoubleVar(value=0.7)
         temperature_slider = ctk.CTkSlider(
             settings_frame,
             from_=0,
@@ -878,49 +1110,20 @@ class ClaudeGUIAssistant:
             print(f"[ERROR] Błąd zmiany czcionki: {e}")
             self.update_status(f"Błąd: {e}", "error")
     
+    @traced("gui")
     def force_refresh_all_fonts(self):
         """Wymusza odświeżenie wszystkich czcionek w aplikacji"""
-        print(f"[REFRESH] Wymuszam odświeżenie czcionek...")
-        
-        # Odśwież główne okno czatu (tk.Text)
-        if hasattr(self, 'chat_display'):
-            try:
-                new_font = (self.chat_font_family, self.chat_font_size)
-                self.chat_display.configure(font=new_font)
-                print(f"[SUCCESS] chat_display: {self.chat_font_family} {self.chat_font_size}px")
-            except Exception as e:
-                print(f"[ERROR] chat_display: {e}")
-        
-        if hasattr(self, 'input_text'):
-            try:
-                new_font = (self.chat_font_family, self.chat_font_size)
-                self.input_text.configure(font=new_font)
-                print(f"[SUCCESS] input_text: {self.chat_font_family} {self.chat_font_size}px")
-            except Exception as e:
-                print(f"[ERROR] input_text: {e}")
-        
-        # Odśwież system prompt (jeśli to też tk.Text)
-        if hasattr(self, 'system_prompt_text'):
-            try:
-                # Sprawdź czy to tk.Text czy CTkTextbox
-                if isinstance(self.system_prompt_text, tk.Text):
-                    self.system_prompt_text.configure(font=(self.chat_font_family, self.chat_font_size))
-                else:
-                    # CTkTextbox - może nie działać
-                    self.system_prompt_text.configure(font=(self.chat_font_family, self.chat_font_size))
-            except Exception as e:
-                print(f"[WARNING] system_prompt_text: {e}")
-        
-        if hasattr(self, 'history_listbox'):
-            try:
-                self.history_listbox.configure(font=(self.current_font_family, int(self.current_font_size * 0.9)))
-            except:
-                pass
-        
-        # Odśwież wszystkie zarejestrowane widgety
+        # Przywróć współdzielone czcionki widgetom zmienionym doraźnie (podgląd, test czatu)
+        for session in self.sessions.values():
+            self.widget_registry.restore(session.chat_display)
+        for widget_name in ('input_text', 'preview_text'):
+            if hasattr(self, widget_name):
+                self.widget_registry.restore(getattr(self, widget_name))
+        
+        # Zmień nazwane czcionki - wszystkie widgety odświeżą się same
         self.apply_global_font()
         
-        print(f"[REFRESH] Odświeżanie zakończone")
+        print(f"[REFRESH] Czcionki odświeżone: {self.widget_registry.counts()}")
     
     def apply_font_changes(self):
         """Aplikuje zmiany czcionek do całej aplikacji"""
@@ -1003,6 +1206,16 @@ class ClaudeGUIAssistant:
         clear_button.pack(side="left", padx=5)
         self.register_widget(clear_button, "button")
         
+        branch_button = ctk.CTkButton(
+            button_frame,
+            text="✏️ Edytuj i wyślij ponownie",
+            command=self.edit_and_resend,
+            width=100,
+            font=(self.current_font_family, self.current_font_size, "bold")
+        )
+        branch_button.pack(side="left", padx=5)
+        self.register_widget(branch_button, "button")
+        
         # Lista wiadomości
         self.history_listbox = tk.Listbox(
             history_frame,
@@ -1013,6 +1226,70 @@ class ClaudeGUIAssistant:
             font=(self.current_font_family, int(self.current_font_size * 0.9))
         )
         self.history_listbox.pack(fill="both", expand=True, padx=10, pady=10)
+        self.register_widget(self.history_listbox, "small")
+        
+        # Wypełnij bieżącą historią (zakładka mogła powstać w trakcie rozmowy)
+        self.update_history_list()
+        
+    def build_diagnostics_tab(self, parent):
+        """Buduje zakładkę z zawieszeniami interfejsu wykrytymi przez watchdog"""
+        diagnostics_frame = ctk.CTkFrame(parent)
+        diagnostics_frame.pack(fill="both", expand=True)
+        
+        diagnostics_label = ctk.CTkLabel(
+            diagnostics_frame,
+            text="Zawieszenia interfejsu:",
+            font=(self.current_font_family, int(self.current_font_size * 1.2), "bold")
+        )
+        diagnostics_label.pack(anchor="w", padx=10, pady=10)
+        self.register_widget(diagnostics_label, "header")
+        
+        self.watchdog_stats_label = ctk.CTkLabel(
+            diagnostics_frame,
+            text="",
+            font=(self.current_font_family, self.current_font_size),
+            justify="left"
+        )
+        self.watchdog_stats_label.pack(anchor="w", padx=10)
+        self.register_widget(self.watchdog_stats_label)
+        
+        self.stalls_text = tk.Text(
+            diagnostics_frame,
+            height=15,
+            wrap="none",
+            bg='#2b2b2b',
+            fg='white',
+            font=(self.current_font_family, int(self.current_font_size * 0.9))
+        )
+        self.stalls_text.pack(fill="both", expand=True, padx=10, pady=10)
+        self.stalls_text.tag_config("app_frame", foreground="#ffa500")
+        self.register_widget(self.stalls_text, "small")
+        
+        for event in self.ui_watchdog.events:
+            self.show_ui_stall(event)
+        self.update_watchdog_stats()
+        
+    def on_ui_stall(self, event):
+        """Callback watchdoga (wątek Tk) - nowe zawieszenie interfejsu"""
+        print(f"[WATCHDOG] {describe_stall(event)}")
+        if hasattr(self, 'stalls_text'):
+            self.show_ui_stall(event)
+            self.update_watchdog_stats()
+        
+    def show_ui_stall(self, event):
+        """Dopisuje zawieszenie z fragmentem stosu aplikacji do zakładki diagnostyki"""
+        self.stalls_text.insert("1.0", describe_stall(event) + "\n")
+        app_frames = [entry for entry in event["stack"] if entry["app"]][:5]
+        for offset, entry in enumerate(app_frames, start=2):
+            self.stalls_text.insert(f"{offset}.0", f"    {entry['file']}:{entry['line']} {entry['function']}\n",
+                                    "app_frame")
+        
+    def update_watchdog_stats(self):
+        stats = self.ui_watchdog.stats()
+        self.watchdog_stats_label.configure(
+            text=f"Zawieszeń: {stats['stalls']} | łącznie {stats['total_stall_time']:.2f}s | "
+                 f"najdłuższe opóźnienie: {stats['max_lag'] * 1000:.0f} ms | log: {self.ui_watchdog.log_path}"
+        )
         
     def build_chat_panel(self, parent):
         """Buduje główny panel czatu"""
@@ -1039,38 +1316,35 @@ class ClaudeGUIAssistant:
         self.status_label.pack(side="right", padx=10)
         self.register_widget(self.status_label)
         
-        # UŻYWAMY STANDARDOWEGO tk.Text ZAMIAST CTkTextbox
-        # Frame dla obszaru czatu z scrollbarem
-        chat_container = ctk.CTkFrame(chat_frame)
-        chat_container.pack(fill="both", expand=True, padx=10, pady=5)
-        
-        # Scrollbar
-        chat_scrollbar = tk.Scrollbar(chat_container)
-        chat_scrollbar.pack(side="right", fill="y")
-        
-        # Obszar czatu - używamy tk.Text dla pełnej kontroli nad czcionkami
-        self.chat_display = tk.Text(
-            chat_container,
-            wrap="word",
-            font=(self.chat_font_family, self.chat_font_size),
-            bg='#2b2b2b',
-            fg='white',
-            insertbackground='white',
-            selectbackground='#0084ff',
-            relief="flat",
-            borderwidth=0,
-            padx=10,
-            pady=10
-        )
-        self.chat_display.pack(side="left", fill="both", expand=True)
-        
-        # Połącz scrollbar
-        self.chat_display.config(yscrollcommand=chat_scrollbar.set)
-        chat_scrollbar.config(command=self.chat_display.yview)
+        # Zakładki rozmów - każda z własnym oknem czatu, streamują niezależnie
+        self.session_tabview = ctk.CTkTabview(chat_frame, command=self.on_session_changed)
+        self.session_tabview.pack(fill="both", expand=True, padx=10, pady=5)
+        self.create_session_tab(self.active_session)
         
         # Panel wprowadzania
         input_frame = ctk.CTkFrame(chat_frame)
         input_frame.pack(fill="x", padx=10, pady=(5, 10))
+        self.input_frame = input_frame
+        
+        # Pasek załączników nad polem wprowadzania (widoczny, gdy są załączniki)
+        self.attachments_bar = ctk.CTkFrame(chat_frame)
+        self.attachments_label = ctk.CTkLabel(
+            self.attachments_bar,
+            text="",
+            font=(self.current_font_family, int(self.current_font_size * 0.9)),
+            justify="left"
+        )
+        self.attachments_label.pack(side="left", padx=10, pady=2)
+        self.register_widget(self.attachments_label)
+        clear_attachments_button = ctk.CTkButton(
+            self.attachments_bar,
+            text="✖",
+            command=self.clear_attachments,
+            width=30,
+            height=24,
+            fg_color="#555555"
+        )
+        clear_attachments_button.pack(side="right", padx=5, pady=2)
         
         # UŻYWAMY tk.Text DLA POLA WPROWADZANIA
         # Frame dla pola tekstowego
@@ -1092,6 +1366,29 @@ class ClaudeGUIAssistant:
         )
         new_conv_button.pack(side="left", padx=10)
         self.register_widget(new_conv_button, "button")
+        
+        new_tab_button = ctk.CTkButton(
+            header,
+            text="🗂️ Nowa karta",
+            command=self.open_session,
+            width=110,
+            height=30,
+            font=(self.current_font_family, self.current_font_size)
+        )
+        new_tab_button.pack(side="left", padx=(0, 5))
+        self.register_widget(new_tab_button, "button")
+        
+        close_tab_button = ctk.CTkButton(
+            header,
+            text="✖ Zamknij kartę",
+            command=self.close_session,
+            width=110,
+            height=30,
+            fg_color="#555555",
+            font=(self.current_font_family, self.current_font_size)
+        )
+        close_tab_button.pack(side="left")
+        self.register_widget(close_tab_button, "button")
 
 
         # Pole tekstowe - używamy tk.Text
@@ -1110,6 +1407,8 @@ class ClaudeGUIAssistant:
             pady=10
         )
         self.input_text.pack(side="left", fill="both", expand=True)
+        self.register_widget(self.input_text, "chat")
+        self.input_text.bind("<KeyPress>", self.on_input_activity, add="+")
         
         # Połącz scrollbar
         self.input_text.config(yscrollcommand=input_scrollbar.set)
@@ -1130,6 +1429,18 @@ class ClaudeGUIAssistant:
         self.send_button.pack(pady=(0, 5))
         self.register_widget(self.send_button, "button")
         
+        attach_button = ctk.CTkButton(
+            button_panel,
+            text="📎 Załącz",
+            command=self.attach_files,
+            width=100,
+            height=35,
+            fg_color="#555555",
+            font=(self.current_font_family, self.current_font_size)
+        )
+        attach_button.pack(pady=(0, 5))
+        self.register_widget(attach_button, "button")
+        
         self.stop_button = ctk.CTkButton(
             button_panel,
             text="Stop",
@@ -1146,8 +1457,107 @@ class ClaudeGUIAssistant:
         # Skróty klawiszowe
         self.root.bind('<Control-Return>', lambda e: self.send_message())
         self.root.bind('<Control-n>', lambda e: self.start_new_conversation())  # CTRL+N dla nowej rozmowy
+        self.root.bind('<Control-t>', lambda e: self.open_session())
+        self.root.bind('<Control-w>', lambda e: self.close_session())
 
         print(f"[INIT] Chat używa tk.Text z czcionką: {self.chat_font_family} {self.chat_font_size}px")
+    
+    def create_session_tab(self, session):
+        """Dodaje zakładkę z oknem czatu (tk.Text) dla sesji"""
+        session.tab_name = f"{session.session_id}. {session.title}"
+        tab = self.session_tabview.add(session.tab_name)
+        
+        # Scrollbar
+        chat_scrollbar = tk.Scrollbar(tab)
+        chat_scrollbar.pack(side="right", fill="y")
+        
+        # Obszar czatu - używamy tk.Text dla pełnej kontroli nad czcionkami
+        chat_display = tk.Text(
+            tab,
+            wrap="word",
+            font=(self.chat_font_family, self.chat_font_size),
+            bg='#2b2b2b',
+            fg='white',
+            insertbackground='white',
+            selectbackground='#0084ff',
+            relief="flat",
+            borderwidth=0,
+            padx=10,
+            pady=10
+        )
+        chat_display.pack(side="left", fill="both", expand=True)
+        self.register_widget(chat_display, "chat")
+        
+        # Połącz scrollbar
+        chat_display.config(yscrollcommand=chat_scrollbar.set)
+        chat_scrollbar.config(command=chat_display.yview)
+        self.configure_chat_tags(session, chat_display)
+        
+        session.chat_display = chat_display
+        self.sessions[session.tab_name] = session
+        return session
+    
+    def configure_chat_tags(self, session, chat_display):
+        """Tagi okna czatu - raz na okno, nie przy każdej wiadomości (czcionki są nazwane)"""
+        chat_display.tag_config("timestamp", foreground="#888888")
+        chat_display.tag_config("user_sender", foreground="#0084ff", font=self.widget_registry.tk_fonts["chat_bold"])
+        chat_display.tag_config("ai_sender", foreground="#00d26a", font=self.widget_registry.tk_fonts["chat_bold"])
+        chat_display.tag_config("message", font=self.widget_registry.tk_fonts["chat"])
+        chat_display.tag_config("separator", foreground="#444444")
+        
+        # Bloki myślenia: wspólne wiązania nagłówków, zwinięta treść ukryta przez elide
+        chat_display.tag_config("thinking_header", foreground="#b48ead")
+        chat_display.tag_config("thinking", foreground="#999999", lmargin1=20, lmargin2=20)
+        chat_display.tag_config("thinking_collapsed", elide=True)
+        chat_display.tag_bind("thinking_header", "<Button-1>", lambda e: self.on_thinking_header_click(session, e))
+        chat_display.tag_bind("thinking_header", "<Enter>", lambda e: chat_display.configure(cursor="hand2"))
+        chat_display.tag_bind("thinking_header", "<Leave>", lambda e: chat_display.configure(cursor="xterm"))
+    
+    def open_session(self):
+        """Otwiera nową rozmowę w osobnej zakładce"""
+        session = self.create_session_tab(ChatSession())
+        self.session_tabview.set(session.tab_name)
+        self.on_session_changed()
+        self.update_status(f"🗂️ Otwarto kartę ({len(self.sessions)} rozmów)", "success")
+        return session
+    
+    def close_session(self):
+        """Zamyka aktywną zakładkę (rozmowa zostaje w bazie)"""
+        session = self.active_session
+        if session.busy:
+            self.update_status("⏳ Poczekaj na zakończenie odpowiedzi w tej zakładce", "warning")
+            return
+        if len(self.sessions) == 1:
+            self.start_new_conversation()
+            return
+        
+        self.session_tabview.delete(session.tab_name)
+        del self.sessions[session.tab_name]
+        self.on_session_changed()
+    
+    def rename_session(self, session, title):
+        """Zmienia tytuł zakładki sesji"""
+        tab_name = f"{session.session_id}. {title}"
+        session.title = title
+        if tab_name == session.tab_name:
+            return
+        self.session_tabview.rename(session.tab_name, tab_name)
+        del self.sessions[session.tab_name]
+        session.tab_name = tab_name
+        self.sessions[tab_name] = session
+    
+    def on_session_changed(self):
+        """Przełączenie zakładki rozmowy - przyciski, statystyki i historia aktywnej sesji"""
+        self.active_session = self.sessions[self.session_tabview.get()]
+        self.update_send_state()
+        self.update_statistics(self.active_session.last_cost)
+        self.update_history_list()
+    
+    def update_send_state(self):
+        """Wysyłanie zablokowane tylko, gdy aktywna sesja czeka na odpowiedź"""
+        busy = self.active_session.busy
+        self.send_button.configure(state="disabled" if busy else "normal")
+        self.stop_button.configure(state="normal" if busy else "disabled")
         
     def build_stats_panel(self):
         """Buduje dolny panel ze statystykami"""
@@ -1160,6 +1570,7 @@ class ClaudeGUIAssistant:
             ("messages", "Wiadomości: 0"),
             ("input_tokens", "Tokeny wejściowe: 0"),
             ("output_tokens", "Tokeny wyjściowe: 0"),
+            ("thinking_tokens", "w tym myślenie: 0"),
             ("total_tokens", "Suma tokenów: 0"),
             ("session_cost", "Koszt sesji: $0.00"),
             ("last_cost", "Ostatni koszt: $0.00")
@@ -1175,6 +1586,15 @@ class ClaudeGUIAssistant:
             self.stats_labels[key] = label
             self.register_widget(label)
         
+        # Percentyle opóźnień bieżącego modelu
+        self.latency_label = ctk.CTkLabel(
+            stats_frame,
+            text="Opóźnienia: brak pomiarów",
+            font=(self.current_font_family, self.current_font_size)
+        )
+        self.latency_label.pack(side="right", padx=15, pady=10)
+        self.register_widget(self.latency_label)
+        
     def update_model_info(self):
         """Aktualizuje informacje o wybranym modelu"""
         # Usuń poprzednie informacje
@@ -1182,10 +1602,12 @@ class ClaudeGUIAssistant:
             widget.destroy()
         
         model = self.current_model
+        # Zmierzone opóźnienia mają pierwszeństwo przed opisem z katalogu
+        latency = describe_latency(self.latency_tracker.summary(model.id)) or model.latency
         
         info_text = f"""📊 Max output: {model.max_output_tokens:,} tokenów
 🧠 Context window: {model.context_window}
-⚡ Latencja: {model.latency}
+⚡ Latencja: {latency}
 💰 Koszt: ${model.input_cost}/1M in, ${model.output_cost}/1M out
 📅 Training cutoff: {model.training_cutoff}"""
         
@@ -1202,214 +1624,366 @@ class ClaudeGUIAssistant:
         """Zmienia aktywny model"""
         self.current_model = MODELS[model_key]
         self.update_model_info()
+        self.update_latency_display()
         self.chat_title.configure(text=f"Czat z {self.current_model.name}")
         
         # Zaktualizuj ustawienia Extended Thinking
-        if hasattr(self, 'thinking_enabled_var'):
-            self.thinking_enabled_var.set(self.current_model.default_thinking_enabled)
-            if self.current_model.extended_thinking:
-                self.thinking_budget_var.set(self.current_model.default_thinking_budget)
-                self.thinking_budget_label.configure(
-                    text=f"Budżet: {self.current_model.default_thinking_budget} tokenów"
-                )
+        self.thinking_enabled_var.set(self.current_model.default_thinking_enabled)
+        if self.current_model.extended_thinking:
+            self.thinking_budget_var.set(self.current_model.default_thinking_budget)
+            self.update_thinking_budget_label()
         
         self.update_status(f"Przełączono na {self.current_model.name}", "success")
         
     def send_message(self):
-        """Wysyła wiadomość do API"""
+        """Wysyła wiadomość do API z aktywnej zakładki"""
+        session = self.active_session
+        if session.busy:
+            return
         message = self.input_text.get("1.0", "end-1c").strip()
-        if not message or not self.client:
+        if not message and not self.pending_attachments:
+            return
+        if not self.client:
+            self.update_status("⏳ API jeszcze się łączy...", "warning")
+            return
+        if not self.current_model.vision and any(
+                attachment_kind(attachment_name(item)) == "image" for item in self.pending_attachments):
+            self.update_status(f"{self.current_model.name} nie obsługuje obrazów", "warning")
             return
         
         # Wyczyść pole wejściowe
         self.input_text.delete("1.0", "end")
         
+        # Załączniki zostają w historii - kolejne tury wysyłają gotowe bloki
+        entry = {"role": "user", "content": message}
+        if self.pending_attachments:
+            entry = user_message(message, self.pending_attachments)
+            message = entry["content"]
+            self.pending_attachments = []
+            self.update_attachments_bar()
+        
         # Dodaj wiadomość użytkownika do wyświetlacza
         self.append_to_chat("Ty", message, "#0084ff")
         
-        # Dodaj do historii
-        self.conversation_history.append({"role": "user", "content": message})
+        # Dodaj do historii (wątek Tk) - wątek roboczy dostaje migawkę
+        session.conversation_history.append(entry)
+        if session.title == DEFAULT_TITLE:
+            self.rename_session(session, title_from_message(message))
         self.update_history_list()
         
-        # Wyłącz przyciski i pokaż status
-        self.send_button.configure(state="disabled")
-        self.stop_button.configure(state="normal")
-        self.update_status("🤔 Claude myśli...", "warning")
+        # Zablokuj wysyłanie tylko w tej zakładce i pokaż status
+        session.busy = True
+        self.update_send_state()
+        self.update_status(self.describe_busy_sessions(), "warning")
+        
+        # Kontrolki i historia odczytane tutaj (wątek Tk) - wątek roboczy dostaje gotowe zapytanie
+        # Gałąź: wspólny prefiks z rozmową źródłową jako osobny punkt cache promptu
+        settings = replace(self.current_request_settings(), cache_prefix=session.cache_prefix)
+        thinking_targets = None
+        if self.thinking_adaptive_var.get():
+            thinking_targets = (parse_target(self.thinking_target_latency_var.get()),
+                                parse_target(self.thinking_target_cost_var.get()))
+        request = session.request(settings, thinking_targets)
         
         # Wyślij w osobnym wątku
-        thread = threading.Thread(target=self.send_api_request, args=(message,))
+        thread = threading.Thread(target=self.send_api_request, args=(session, message, request))
         thread.daemon = True
         thread.start()
-        
-    def send_api_request(self, message):
-        """Wysyła request do API ze streamowaniem i Extended Thinking"""
+    
+    def attach_files(self):
+        """Wybór plików do następnej wiadomości - przygotowanie startuje od razu w tle"""
+        paths = filedialog.askopenfilenames(title="Załącz pliki", filetypes=FILE_TYPES)
+        for path in paths:
+            future = self.attachment_pipeline.submit(path)
+            future.add_done_callback(lambda f: self.root.after(0, self.on_attachment_ready, f))
+            self.pending_attachments.append(future)
+        self.update_attachments_bar()
+    
+    def on_attachment_ready(self, future):
+        """Załącznik przygotowany (wątek Tk) - statystyki albo błąd na pasku"""
+        if future not in self.pending_attachments:
+            return
+        error = future.exception()
+        if error is not None:
+            self.pending_attachments.remove(future)
+            self.update_status(f"❌ {future.attachment_name}: {error}", "error")
+        else:
+            self.update_status(f"📎 {self.attachment_pipeline.summary()}", "success")
+        self.update_attachments_bar()
+    
+    def update_attachments_bar(self):
+        """Pasek z listą załączników: rozmiar przed/po i czas przygotowania"""
+        if not self.pending_attachments:
+            self.attachments_bar.pack_forget()
+            return
+        lines = []
+        for future in self.pending_attachments:
+            if future.done() and future.exception() is None:
+                lines.append(f"📎 {future.result().describe()}")
+            elif future.done():
+                lines.append(f"❌ {future.attachment_name}: {future.exception()}")
+            else:
+                lines.append(f"📎 {future.attachment_name} (przygotowywanie...)")
+        self.attachments_label.configure(text="\n".join(lines))
+        self.attachments_bar.pack(fill="x", padx=10, pady=(5, 0), before=self.input_frame)
+    
+    def clear_attachments(self):
+        """Usuwa załączniki z następnej wiadomości"""
+        self.pending_attachments = []
+        self.update_attachments_bar()
+    
+    def drop_failed_attachments(self, session):
+        """Usuwa z historii sesji załączniki z błędem przygotowania (wątek Tk)"""
+        dropped = drop_failed(session.conversation_history)
+        if dropped:
+            print(f"[ATTACH] Usunięto z rozmowy: {', '.join(dropped)}")
+            self.append_to_chat("System", f"Pominięto załączniki z błędem: {', '.join(dropped)} - "
+                                "kolejne wiadomości zostaną wysłane bez nich", "#ffa500", session)
+    
+    def describe_busy_sessions(self):
+        """Status z liczbą rozmów czekających na odpowiedź"""
+        busy = sum(1 for session in self.sessions.values() if session.busy)
+        return "🤔 Claude myśli..." if busy <= 1 else f"🤔 Claude myśli... ({busy} rozmów w toku)"
+        
+    @traced("api")
+    def send_api_request(self, session, message, request):
+        """Wysyła request do API ze streamowaniem i Extended Thinking (wątek roboczy)"""
+        decision = None
         try:
-            # Przygotuj parametry
-            params = {
-                "model": self.current_model.id,
-                "max_tokens": self.current_model.max_output_tokens,
-                "temperature": self.temperature_var.get(),
-                "system": self.system_prompt,
-                "messages": self.conversation_history
-            }
+            # Czeka na załączniki jeszcze przygotowywane w tle
+            messages = resolve_messages(request.messages)
+            settings = request.settings
+            if request.thinking_targets is not None and settings.uses_thinking:
+                decision = self.choose_thinking_budget(settings, messages, request.thinking_targets)
+                settings = decision.apply(settings)
+                print(f"[THINKING] {decision.describe()}")
+                self.root.after(0, self.update_thinking_budget_label)
+            with tracer.span("engine.stream", "api", session=session.session_id):
+                result = self.engine.stream(
+                    settings,
+                    messages,
+                    on_start=lambda: self.root.after(0, self.init_claude_response, session),
+                    on_text=lambda text: self.root.after(0, self.append_streaming_text, session, text),
+                    on_thinking=lambda text: self.queue_thinking(session, text)
+                )
             
-            # Dodaj Extended Thinking jeśli włączone
-            if (self.current_model.extended_thinking and 
-                hasattr(self, 'thinking_enabled_var') and 
-                self.thinking_enabled_var.get()):
-                params["thinking"] = {
-                    "type": "enabled",
-                    "budget_tokens": self.thinking_budget_var.get()
-                }
-                
-                # Dla Extended Thinking użyj bardziej szczegółowej obsługi
-                with self.client.messages.stream(**params) as stream:
-                    full_response = ""
-                    thinking_content = ""
-                    
-                    # Zainicjalizuj odpowiedź
-                    self.root.after(0, self.init_claude_response)
-                    
-                    for event in stream:
-                        # Obsługa różnych typów eventów
-                        if event.type == 'content_block_start':
-                            if event.content_block.type == 'thinking':
-                                # Rozpoczyna się blok myślenia
-                                pass
-                        elif event.type == 'content_block_delta':
-                            if event.delta.type == 'thinking_delta':
-                                # Dodaj do myślenia
-                                thinking_content += event.delta.thinking
-                            elif event.delta.type == 'text_delta':
-                                # Dodaj do odpowiedzi
-                                text = event.delta.text
-                                full_response += text
-                                self.root.after(0, self.append_streaming_text, text)
-                    
-                    # Pobierz finalne metryki
-                    final_message = stream.get_final_message()
-                    
-                    # Zapisz pełną odpowiedź
-                    self.conversation_history.append({
-                        "role": "assistant", 
-                        "content": full_response
-                    })
-                    
-                    # Oblicz koszt
-                    usage = final_message.usage if hasattr(final_message, 'usage') else None
-                    input_tokens = usage.input_tokens if usage else len(message) // 4
-                    output_tokens = usage.output_tokens if usage else len(full_response) // 4
-                    
-                    message_cost = self.token_stats.add_usage(
-                        input_tokens,
-                        output_tokens,
-                        self.current_model
-                    )
-                    
-                    self.root.after(0, self.finalize_streaming_response, 
-                                full_response, message_cost, thinking_content)
-            else:
-                # Bez Extended Thinking - użyj prostszego streamowania
-                with self.client.messages.stream(**params) as stream:
-                    full_response = ""
-                    
-                    self.root.after(0, self.init_claude_response)
-                    
-                    # Użyj wbudowanego text_stream
-                    for text in stream.text_stream:
-                        full_response += text
-                        self.root.after(0, self.append_streaming_text, text)
-                    
-                    # Finalizuj
-                    final_message = stream.get_final_message()
-                    self.conversation_history.append({
-                        "role": "assistant",
-                        "content": full_response
-                    })
-                    
-                    usage = final_message.usage if hasattr(final_message, 'usage') else None
-                    input_tokens = usage.input_tokens if usage else len(message) // 4
-                    output_tokens = usage.output_tokens if usage else len(full_response) // 4
-                    
-                    message_cost = self.token_stats.add_usage(
-                        input_tokens, output_tokens, self.current_model
-                    )
-                    
-                    self.root.after(0, self.finalize_streaming_response,
-                                full_response, message_cost, "")
+            # Oblicz koszt (statystyki tej sesji - jedno zapytanie w toku na sesję)
+            message_cost = session.token_stats.add_usage(
+                result.input_tokens,
+                result.output_tokens,
+                settings.model,
+                cached=result.cached,
+                cache_read_tokens=result.cache_read_tokens,
+                cache_write_tokens=result.cache_write_tokens,
+                thinking_tokens=result.thinking_tokens
+            )
+            
+            if not result.cached:
+                self.latency_tracker.add(settings.model.id, result.timing)
+            if decision is not None:
+                self.budget_controller.record(decision, result, message_cost)
+            with tracer.span("save_response", "db"):
+                self.save_response(session, request, result, message_cost)
+            tracer.count("tokens.output", result.output_tokens, "api")
+            
+            # Odpowiedź trafia do historii sesji w wątku Tk
+            self.root.after(0, self.finalize_streaming_response,
+                            session, result.text, message_cost, result.thinking, result.thinking_tokens)
+            if result.cached:
+                self.root.after(0, self.update_status, "✅ Gotowy (odpowiedź z cache - $0)", "success")
+            elif result.timing and "ttft" in result.timing:
+                ttft_text = format_ttft(result.timing)
+                if result.cache_read_tokens:
+                    ttft_text += f" | cache promptu: {result.cache_read_tokens:,} tok."
+                print(f"[TIMING] {ttft_text}")
+                self.root.after(0, self.update_status, f"✅ Gotowy | {ttft_text}", "success")
+                self.root.after(0, self.update_latency_display)
                     
         except Exception as e:
-            self.root.after(0, self.handle_error, str(e))
+            if decision is not None:
+                self.budget_controller.record(decision, error=str(e))
+            # Błędy przejściowe były już ponawiane - bez okna modalnego
+            self.root.after(0, self.handle_error, str(e), not is_retryable_error(e), session,
+                            getattr(e, 'attempts', 1))
+            self.root.after(0, self.drop_failed_attachments, session)
+    
+    def choose_thinking_budget(self, settings, messages, targets):
+        """Decyzja adaptacyjnego budżetu dla ostatniej wiadomości (wątek roboczy); targets - (czas, koszt)"""
+        prompt = messages[-1]["content"] if messages else ""
+        context_chars = len(settings.system_prompt) + sum(len(str(m["content"])) for m in messages)
+        target_latency, target_cost = targets
+        return self.budget_controller.choose(
+            settings.model,
+            str(prompt),
+            turn=len(messages),
+            input_tokens=context_chars // 4,
+            target_latency=target_latency,
+            target_cost=target_cost
+        )
+    
+    def save_response(self, session, request, result, cost):
+        """Zapis odpowiedzi (wątek roboczy) - nadpisywane przez integrację z bazą"""
+        pass
+    
+    def bind_conversation(self, session, request, conversation_id):
+        """ID rozmowy założonej/przywróconej w bazie przez wątek roboczy (wątek Tk)"""
+        # Zakładka wyczyszczona albo wczytana od nowa w trakcie zapytania - to już inna rozmowa
+        if session.transcript_generation == request.generation:
+            session.conversation_id = conversation_id
+    
+    def update_latency_display(self):
+        """Odświeża percentyle opóźnień bieżącego modelu"""
+        summary = self.latency_tracker.summary(self.current_model.id)
+        description = describe_latency(summary)
+        if hasattr(self, 'latency_label'):
+            self.latency_label.configure(
+                text=f"Opóźnienia: {description}" if description else "Opóźnienia: brak pomiarów"
+            )
+        if hasattr(self, 'model_info_frame'):
+            self.update_model_info()
+    
+    def current_request_settings(self):
+        """Ustawienia zapytania odczytane z kontrolek GUI"""
+        return RequestSettings(
+            model=self.current_model,
+            system_prompt=self.system_prompt,
+            temperature=self.temperature_var.get(),
+            thinking_enabled=self.thinking_enabled_var.get(),
+            thinking_budget=self.thinking_budget_var.get(),
+            prompt_caching=self.prompt_caching_var.get()
+        )
    
 
-    def init_claude_response(self):
-        """Inicjalizuje nową odpowiedź Claude'a w czacie"""
+    def init_claude_response(self, session):
+        """Inicjalizuje nową odpowiedź Claude'a w czacie sesji"""
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.chat_display.insert("end", f"\n[{timestamp}] ", "timestamp")
-        self.chat_display.insert("end", "Claude:\n", "ai_sender")
+        session.chat_display.insert("end", f"\n[{timestamp}] ", "timestamp")
+        session.chat_display.insert("end", "Claude:\n", "ai_sender")
         # Zapisz pozycję gdzie zaczynamy dodawać tekst
-        self.streaming_start_pos = self.chat_display.index("end-1c")
+        session.streaming_start_pos = session.chat_display.index("end-1c")
+        # Znacznik początku odpowiedzi (lewa grawitacja - zostaje przed dopisywanym tekstem);
+        # tu wstawiany jest blok myślenia, nawet gdy tekst zdążył się już pojawić
+        session.chat_display.mark_set("response_start", "end-1c")
+        session.chat_display.mark_gravity("response_start", "left")
+        session.thinking_block = None
 
-    def append_streaming_text(self, text_chunk):
+    def append_streaming_text(self, session, text_chunk):
         """Dodaje fragment tekstu podczas streamowania"""
-        # Dodaj tekst bezpośrednio
-        self.chat_display.insert("end", text_chunk, "message")
-        self.chat_display.see("end")
+        session.chat_display.insert("end", text_chunk, "message")
+        session.chat_display.see("end")
 
-    def finalize_streaming_response(self, full_response, cost, thinking_content=""):
-        """Finalizuje odpowiedź po zakończeniu streamowania"""
-        # Dodaj separator
-        self.chat_display.insert("end", "\n" + "-" * 80 + "\n", "separator")
-        
-        # Jeśli było Extended Thinking, pokaż info
-        if thinking_content:
-            print(f"[THINKING] Użyto Extended Thinking ({len(thinking_content)} znaków)")
-            self.update_status("✅ Gotowy (użyto Extended Thinking)", "success")
-        else:
-            self.update_status("✅ Gotowy", "success")
-        
-        # Aktualizuj statystyki
-        self.update_history_list()
-        self.update_statistics(cost)
-        
-        # Włącz przyciski
-        self.send_button.configure(state="normal")
-        self.stop_button.configure(state="disabled")
+    def queue_thinking(self, session, thinking_text):
+        """Delta myślenia z wątku roboczego - rysowana w paczce co THINKING_FLUSH_MS"""
+        session.thinking_buffer.append(thinking_text)
+        if not session.thinking_flush_scheduled:
+            session.thinking_flush_scheduled = True
+            self.root.after(self.THINKING_FLUSH_MS, self.flush_thinking, session)
 
+    def flush_thinking(self, session):
+        """Rysuje zebrane delty myślenia jednym wstawieniem (wątek Tk)"""
+        # Najpierw flaga - delta dopisana w trakcie zaplanuje kolejną paczkę
+        session.thinking_flush_scheduled = False
+        count = len(session.thinking_buffer)
+        if count:
+            thinking_text = "".join(session.thinking_buffer[:count])
+            del session.thinking_buffer[:count]
+            self.update_thinking_display(session, thinking_text)
 
-    def append_streaming_text(self, text_chunk):
-        """Dodaje fragment tekstu podczas streamowania"""
-        # Znajdź ostatnią pozycję Claude'a
-        last_pos = self.chat_display.search("Claude:", "1.0", tk.END)
-        if last_pos:
-            # Dodaj tekst na końcu
-            self.chat_display.insert("end", text_chunk)
-            self.chat_display.see("end")
+    def update_thinking_display(self, session, thinking_text):
+        """Dopisuje myślenie do bloku bieżącej odpowiedzi (rozwiniętego podczas streamowania)"""
+        chat_display = session.chat_display
+        if session.thinking_block is None:
+            session.thinking_block = self.insert_thinking_block(session, "response_start", expanded=True)
+        body = f"thinking_{session.thinking_block}"
+        # Blok kończy się znakiem nowej linii - treść dopisywana przed nim
+        chat_display.insert(f"{body}.last-1c", thinking_text, ("thinking", body))
+        chat_display.see("end")
+
+    def insert_thinking_block(self, session, index, thinking_text="", expanded=False, details="", loader=None):
+        """
+        Wstawia zwijany blok myślenia: klikalny nagłówek i treść (ukryta tagiem
+        thinking_collapsed, gdy zwinięty). loader - treść pobierana przy pierwszym rozwinięciu.
+        """
+        block = session.new_thinking_block(expanded, details, loader)
+        header, body = f"thinking_header_{block}", f"thinking_{block}"
+        body_tags = ("thinking", body) if expanded else ("thinking", body, "thinking_collapsed")
+        session.chat_display.insert(index, self.thinking_header_text(session, block), ("thinking_header", header),
+                                    f"{thinking_text}\n", body_tags)
+        return block
+    
+    def on_thinking_header_click(self, session, event):
+        """Klik w nagłówek bloku myślenia - numer bloku z tagu thinking_header_<n>"""
+        for tag in session.chat_display.tag_names(f"@{event.x},{event.y}"):
+            if tag.startswith("thinking_header_"):
+                return self.toggle_thinking_block(session, int(tag.rsplit("_", 1)[1]))
+
+    def thinking_header_text(self, session, block):
+        info = session.thinking_blocks[block]
+        return f"{'▾' if info['expanded'] else '▸'} 🧠 Myślenie{info['details']}\n"
+
+    def render_thinking_header(self, session, block):
+        """Przepisuje nagłówek bloku (strzałka, opis)"""
+        chat_display = session.chat_display
+        header = f"thinking_header_{block}"
+        position = chat_display.index(f"{header}.first")
+        chat_display.delete(position, f"{header}.last")
+        chat_display.insert(position, self.thinking_header_text(session, block), ("thinking_header", header))
+
+    def toggle_thinking_block(self, session, block):
+        """Zwija/rozwija blok myślenia; przy pierwszym rozwinięciu doczytuje treść z bazy"""
+        info = session.thinking_blocks[block]
+        body = f"thinking_{block}"
+        loader = info['loader']
+        if loader is not None:
+            info['loader'] = None
+            thinking_text = loader() or "(brak zapisanego myślenia)"
+            session.chat_display.insert(f"{body}.last-1c", thinking_text, ("thinking", body))
+        
+        info['expanded'] = not info['expanded']
+        if info['expanded']:
+            session.chat_display.tag_remove("thinking_collapsed", f"{body}.first", f"{body}.last")
         else:
-            # Rozpocznij nową wiadomość Claude'a
-            self.append_to_chat("Claude", text_chunk, "#00d26a")
+            session.chat_display.tag_add("thinking_collapsed", f"{body}.first", f"{body}.last")
+        self.render_thinking_header(session, block)
+        return "break"
 
-    def update_thinking_display(self, thinking_text):
-        """Opcjonalnie: wyświetla proces myślenia Claude'a"""
-        # Możesz utworzyć osobne okno lub sekcję dla wyświetlania myślenia
-        if hasattr(self, 'thinking_display'):
-            self.thinking_display.insert("end", thinking_text)
-            self.thinking_display.see("end")
+    def finish_thinking_block(self, session, thinking_content, thinking_tokens):
+        """Koniec streamu: dorysowuje resztę myślenia, zwija blok i opisuje go w nagłówku"""
+        self.flush_thinking(session)
+        block = session.thinking_block
+        session.thinking_block = None
+        if block is None:
+            return
+        info = session.thinking_blocks[block]
+        info['details'] = f" ({len(thinking_content):,} znaków, ~{thinking_tokens:,} tok.)"
+        info['expanded'] = False
+        session.chat_display.tag_add("thinking_collapsed", f"thinking_{block}.first", f"thinking_{block}.last")
+        self.render_thinking_header(session, block)
 
-    def finalize_streaming_response(self, full_response, cost, thinking_content=""):
-        """Finalizuje odpowiedź po zakończeniu streamowania"""
-        # Jeśli Extended Thinking był używany, możesz zapisać lub wyświetlić myślenie
+    def finalize_streaming_response(self, session, full_response, cost, thinking_content="", thinking_tokens=0):
+        """Finalizuje odpowiedź po zakończeniu streamowania (wątek Tk)"""
+        session.conversation_history.append({"role": "assistant", "content": full_response})
+        session.last_cost = cost
+        session.busy = False
+        
+        # Dodaj separator
+        session.chat_display.insert("end", "\n" + "-" * 80 + "\n", "separator")
+        
+        self.finish_thinking_block(session, thinking_content, thinking_tokens)
         if thinking_content:
-            print(f"[THINKING] Claude pomyślał:\n{thinking_content[:500]}...")  # Pierwsze 500 znaków
+            print(f"[THINKING] Użyto Extended Thinking ({len(thinking_content)} znaków, ~{thinking_tokens} tokenów)")
         
-        # Aktualizuj historię i statystyki
+        if session is not self.active_session:
+            # Odpowiedź w tle - statystyki odświeżą się po przełączeniu zakładki
+            self.update_status(f"✅ Odpowiedź gotowa w karcie: {session.title}", "success")
+            return
+        
+        self.update_status("✅ Gotowy (użyto Extended Thinking)" if thinking_content else "✅ Gotowy", "success")
+        
+        # Aktualizuj statystyki i przyciski
         self.update_history_list()
         self.update_statistics(cost)
-        
-        # Włącz przyciski
-        self.send_button.configure(state="normal")
-        self.stop_button.configure(state="disabled")
-        self.update_status("✅ Gotowy", "success")
+        self.update_send_state()
 
     def toggle_thinking(self):
         """Przełącza Extended Thinking"""
@@ -1427,6 +2001,14 @@ class ClaudeGUIAssistant:
 
     def update_thinking_budget_label(self):
         """Aktualizuje etykietę budżetu myślenia"""
+        if not hasattr(self, 'thinking_budget_label'):
+            return
+        if self.thinking_adaptive_var.get():
+            decision = self.budget_controller.last_decision
+            self.thinking_budget_label.configure(
+                text=decision.describe() if decision else "Auto: budżet dobierany przy wysłaniu"
+            )
+            return
         budget = self.thinking_budget_var.get()
         self.thinking_budget_label.configure(text=f"Budżet: {budget} tokenów")
         if budget > 21333:
@@ -1443,34 +2025,41 @@ class ClaudeGUIAssistant:
         self.update_statistics(cost)
         
         # Włącz przyciski
-        self.send_button.configure(state="normal")
-        self.stop_button.configure(state="disabled")
+        self.update_send_state()
         self.update_status("✅ Gotowy", "success")
         
-    def append_to_chat(self, sender, message, color):
-        """Dodaje wiadomość do okna czatu (tk.Text)"""
+    @traced("gui")
+    def append_to_chat(self, sender, message, color, session=None, thinking=None, thinking_tokens=0):
+        """
+        Dodaje wiadomość do okna czatu (tk.Text) sesji - domyślnie aktywnej.
+        thinking - myślenie odpowiedzi (tekst albo funkcja doczytująca je przy rozwinięciu)
+        """
         timestamp = datetime.now().strftime("%H:%M:%S")
-        
-        # Konfiguruj tagi dla różnych elementów
-        self.chat_display.tag_config("timestamp", foreground="#888888")
-        self.chat_display.tag_config("user_sender", foreground="#0084ff", font=(self.chat_font_family, self.chat_font_size, "bold"))
-        self.chat_display.tag_config("ai_sender", foreground="#00d26a", font=(self.chat_font_family, self.chat_font_size, "bold"))
-        self.chat_display.tag_config("message", font=(self.chat_font_family, self.chat_font_size))
-        self.chat_display.tag_config("separator", foreground="#444444")
+        session = session or self.active_session
+        chat_display = session.chat_display
         
         # Dodaj elementy z odpowiednimi tagami
-        self.chat_display.insert("end", f"\n[{timestamp}] ", "timestamp")
+        chat_display.insert("end", f"\n[{timestamp}] ", "timestamp")
         
         if sender == "Ty":
-            self.chat_display.insert("end", f"{sender}:\n", "user_sender")
+            chat_display.insert("end", f"{sender}:\n", "user_sender")
         else:
-            self.chat_display.insert("end", f"{sender}:\n", "ai_sender")
+            chat_display.insert("end", f"{sender}:\n", "ai_sender")
+        
+        if thinking:
+            loaded = isinstance(thinking, str)
+            self.insert_thinking_block(
+                session, "end",
+                thinking_text=thinking if loaded else "",
+                details=f" (~{thinking_tokens:,} tok.)" if thinking_tokens else "",
+                loader=None if loaded else thinking
+            )
         
-        self.chat_display.insert("end", f"{message}\n", "message")
-        self.chat_display.insert("end", "-" * 80 + "\n", "separator")
+        chat_display.insert("end", f"{message}\n", "message")
+        chat_display.insert("end", "-" * 80 + "\n", "separator")
         
         # Przewiń do końca
-        self.chat_display.see("end")
+        chat_display.see("end")
         
     def update_statistics(self, last_cost):
         """Aktualizuje panel statystyk"""
@@ -1485,6 +2074,9 @@ class ClaudeGUIAssistant:
         self.stats_labels["output_tokens"].configure(
             text=f"Tokeny wyjściowe: {stats.total_output_tokens:,}"
         )
+        self.stats_labels["thinking_tokens"].configure(
+            text=f"w tym myślenie: {stats.total_thinking_tokens:,}"
+        )
         self.stats_labels["total_tokens"].configure(
             text=f"Suma tokenów: {stats.total_input_tokens + stats.total_output_tokens:,}"
         )
@@ -1495,89 +2087,241 @@ class ClaudeGUIAssistant:
             text=f"Ostatni koszt: ${last_cost:.4f}"
         )
         
+    @traced("gui")
     def update_history_list(self):
         """Aktualizuje listę historii"""
+        if not hasattr(self, 'history_listbox'):
+            # Zakładka Historia jeszcze nie zbudowana - wypełni się przy otwarciu
+            return
         self.history_listbox.delete(0, tk.END)
         for i, msg in enumerate(self.conversation_history):
             role = "👤" if msg["role"] == "user" else "🤖"
             preview = msg["content"][:50] + "..." if len(msg["content"]) > 50 else msg["content"]
             self.history_listbox.insert(tk.END, f"{role} {preview}")
             
+    def edit_and_resend(self):
+        """Odgałęzia rozmowę od zaznaczonej wiadomości użytkownika - edycja w nowej karcie"""
+        selection = self.history_listbox.curselection() if hasattr(self, 'history_listbox') else ()
+        if not selection:
+            self.update_status("Zaznacz na liście wiadomość do edycji", "warning")
+            return
+        
+        index = selection[0]
+        message = self.conversation_history[index]
+        if message["role"] != "user":
+            self.update_status("Edytować można tylko wiadomości użytkownika", "warning")
+            return
+        
+        # Gałąź dostaje wiadomości sprzed edytowanej - oryginał zostaje w swojej karcie
+        branch = self.create_session_tab(self.active_session.branch(index))
+        self.session_tabview.set(branch.tab_name)
+        self.on_session_changed()
+        self.render_transcript(branch.conversation_history, branch)
+        
+        self.input_text.delete("1.0", "end")
+        self.input_text.insert("1.0", message["content"])
+        self.input_text.focus_set()
+        self.update_status(f"✏️ Gałąź od wiadomości {index + 1} - popraw treść i wyślij", "success")
+            
     def save_conversation(self):
-        """Zapisuje rozmowę do pliku"""
+        """Zapisuje rozmowę do pliku (JSON Lines - strumieniowo w tle)"""
         filename = filedialog.asksaveasfilename(
-            defaultextension=".json",
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")],
-            initialfile=f"claude_chat_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        )
-        
-        if filename:
-            data = {
-                "timestamp": datetime.now().isoformat(),
-                "model": self.current_model.id,
-                "system_prompt": self.system_prompt,
-                "messages": self.conversation_history,
-                "statistics": {
-                    "total_input_tokens": self.token_stats.total_input_tokens,
-                    "total_output_tokens": self.token_stats.total_output_tokens,
-                    "total_cost": self.token_stats.session_cost,
-                    "messages_count": self.token_stats.messages_count
-                }
-            }
-            
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
-            self.update_status(f"Zapisano: {os.path.basename(filename)}", "success")
+            defaultextension=".jsonl",
+            filetypes=[("JSON Lines", "*.jsonl"), ("JSON files", "*.json"), ("All files", "*.*")],
+            initialfile=f"claude_chat_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+        )
+        
+        if not filename:
+            return
+        
+        if self.io_busy:
+            self.update_status("⏳ Trwa inna operacja na pliku", "warning")
+            return
+        
+        # Migawka stanu - wątek roboczy nie może czytać żywej listy
+        messages = list(self.conversation_history)
+        statistics = {
+            "total_input_tokens": self.token_stats.total_input_tokens,
+            "total_output_tokens": self.token_stats.total_output_tokens,
+            "total_cost": self.token_stats.session_cost,
+            "messages_count": self.token_stats.messages_count
+        }
+        model_id = self.current_model.id
+        system_prompt = self.system_prompt
+        
+        def worker():
+            try:
+                if is_jsonl_file(filename):
+                    header = build_header(model_id, system_prompt, len(messages), statistics)
+                    write_conversation_jsonl(
+                        filename, header, messages,
+                        progress_callback=lambda done, total: self.root.after(
+                            0, self.update_status, f"💾 Zapisywanie... {done}/{total} wiadomości", "warning"
+                        )
+                    )
+                else:
+                    data = {
+                        "timestamp": datetime.now().isoformat(),
+                        "model": model_id,
+                        "system_prompt": system_prompt,
+                        "messages": messages,
+                        "statistics": statistics
+                    }
+                    with open(filename, 'w', encoding='utf-8') as f:
+                        json.dump(data, f, ensure_ascii=False, indent=2)
+                
+                self.root.after(0, self.finish_file_operation, f"Zapisano: {os.path.basename(filename)}", "success")
+            except Exception as e:
+                self.root.after(0, self.finish_file_operation, f"Błąd zapisu: {e}", "error")
+        
+        self.io_busy = True
+        self.update_status("💾 Zapisywanie...", "warning")
+        threading.Thread(target=worker, daemon=True).start()
             
     def load_conversation(self):
-        """Wczytuje rozmowę z pliku"""
+        """Wczytuje rozmowę z pliku (odczyt w tle, do okna stronami)"""
         filename = filedialog.askopenfilename(
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("Rozmowy", "*.jsonl *.json"), ("JSON Lines", "*.jsonl"),
+                       ("JSON files", "*.json"), ("All files", "*.*")]
         )
         
-        if filename:
-            with open(filename, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            self.conversation_history = data["messages"]
-            self.system_prompt = data.get("system_prompt", "")
-            self.system_prompt_text.delete("1.0", "end")
-            self.system_prompt_text.insert("1.0", self.system_prompt)
-            
-            # Odtwórz rozmowę w czacie
-            self.chat_display.delete("1.0", "end")
-            for msg in self.conversation_history:
-                sender = "Ty" if msg["role"] == "user" else "Claude"
-                color = "#0084ff" if msg["role"] == "user" else "#00d26a"
-                self.append_to_chat(sender, msg["content"], color)
-            
+        if not filename:
+            return
+        
+        if self.io_busy:
+            self.update_status("⏳ Trwa inna operacja na pliku", "warning")
+            return
+        
+        def report_progress(done, total):
+            percent = int(done * 100 / total) if total else 100
+            self.root.after(0, self.update_status, f"📂 Wczytywanie... {percent}%", "warning")
+        
+        # Stan wczytywania w wątku Tk; wątek roboczy czeka, aż okno przyjmie poprzednie strony
+        load = {"session": None, "generation": None, "count": 0,
+                "cancelled": threading.Event(), "pages": threading.Semaphore(LOAD_PAGES_AHEAD)}
+        
+        def worker():
+            messages = None
+            try:
+                header, messages = open_conversation_file(filename, report_progress)
+                self.root.after(0, self.begin_loaded_conversation, load, header)
+                for page in iter_pages(messages):
+                    load["pages"].acquire()
+                    if load["cancelled"].is_set():
+                        break
+                    self.root.after(0, self.append_loaded_page, load, page)
+                self.root.after(0, self.finish_loaded_conversation, load, filename, None)
+            except Exception as e:
+                self.root.after(0, self.finish_loaded_conversation, load, filename, e)
+            finally:
+                if messages is not None:
+                    messages.close()
+        
+        self.io_busy = True
+        self.update_status("📂 Wczytywanie...", "warning")
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def begin_loaded_conversation(self, load, header):
+        """Czyści zakładkę pod rozmowę wczytywaną z pliku (wątek UI)"""
+        # Zakładka czekająca na odpowiedź zostaje nietknięta - wczytaj do nowej
+        if self.active_session.busy:
+            self.open_session()
+        session = self.active_session
+        session.conversation_history = []
+        self.set_system_prompt(header.get("system_prompt", ""))
+        self.render_transcript([], session)
+        load["session"] = session
+        load["generation"] = session.transcript_generation
+    
+    def append_loaded_page(self, load, page):
+        """Dokleja stronę wiadomości z pliku do historii i okna zakładki (wątek UI)"""
+        session = load["session"]
+        try:
+            # Zakładka wyczyszczona albo wczytana od nowa w trakcie - wczytywanie przerwane
+            if session is None or session.transcript_generation != load["generation"]:
+                load["cancelled"].set()
+            else:
+                session.conversation_history.extend(page)
+                self.transcript_renderer.append(session, page)
+                load["count"] += len(page)
+        finally:
+            load["pages"].release()
+    
+    def finish_loaded_conversation(self, load, filename, error):
+        """Kończy wczytywanie z pliku - liczba wiadomości albo błąd (wątek UI)"""
+        if load["session"] is not None:
             self.update_history_list()
-            self.update_status(f"Wczytano: {os.path.basename(filename)}", "success")
+        name = os.path.basename(filename)
+        if error is not None:
+            suffix = f" (wczytano {load['count']} wiadomości)" if load["count"] else ""
+            self.finish_file_operation(f"Błąd wczytywania: {error}{suffix}", "error")
+        elif load["cancelled"].is_set():
+            self.finish_file_operation(f"Przerwano wczytywanie: {name}", "warning")
+        else:
+            self.finish_file_operation(f"Wczytano: {name} ({load['count']} wiadomości)", "success")
+    
+    def finish_file_operation(self, text, status_type):
+        """Kończy operację zapisu/odczytu pliku"""
+        self.io_busy = False
+        self.update_status(text, status_type)
+    
+    def render_transcript(self, messages, session=None, thinking_loader=None):
+        """Wczytana rozmowa w oknie czatu sesji - hurtem, duże od najnowszych wiadomości"""
+        self.transcript_renderer.render(session or self.active_session, messages, thinking_loader)
             
     def clear_history(self):
-        """Czyści historię rozmowy"""
+        """Czyści historię rozmowy w aktywnej zakładce"""
+        session = self.active_session
+        if session.busy:
+            self.update_status("⏳ Poczekaj na zakończenie odpowiedzi w tej zakładce", "warning")
+            return
         if messagebox.askyesno("Potwierdzenie", "Czy na pewno chcesz wyczyścić całą historię?"):
-            self.conversation_history.clear()
-            self.chat_display.delete("1.0", "end")
-            self.history_listbox.delete(0, tk.END)
-            self.token_stats = TokenStats()
+            session.reset()
+            self.rename_session(session, DEFAULT_TITLE)
+            self.update_history_list()
             self.update_statistics(0)
             self.update_status("Historia wyczyszczona", "success")
             
     def stop_generation(self):
-        """Zatrzymuje generowanie (placeholder)"""
-        self.send_button.configure(state="normal")
-        self.stop_button.configure(state="disabled")
+        """Zatrzymuje generowanie (placeholder) - odblokowuje aktywną zakładkę"""
+        self.active_session.busy = False
+        self.update_send_state()
         self.update_status("⏹️ Zatrzymano", "warning")
         
-    def handle_error(self, error_msg):
-        """Obsługuje błędy"""
-        self.append_to_chat("System", f"Błąd: {error_msg}", "#ff4444")
-        self.send_button.configure(state="normal")
-        self.stop_button.configure(state="disabled")
-        self.update_status("❌ Błąd", "error")
-        messagebox.showerror("Błąd API", error_msg)
+    def handle_error(self, error_msg, modal=True, session=None, attempts=1):
+        """Obsługuje błędy zapytania sesji (domyślnie aktywnej)"""
+        session = session or self.active_session
+        session.busy = False
+        if session.thinking_block is not None:
+            self.finish_thinking_block(session, "", 0)
+        self.append_to_chat("System", f"Błąd: {error_msg}", "#ff4444", session)
+        self.update_send_state()
+        if modal:
+            self.update_status("❌ Błąd", "error")
+            messagebox.showerror("Błąd API", error_msg)
+        elif attempts > 1:
+            self.update_status(f"❌ API niedostępne po {attempts} próbach", "error")
+        else:
+            self.update_status("❌ Błąd API (przejściowy)", "error")
+    
+    def show_scheduler_state(self, state):
+        """Pokazuje kolejkę zapytań czekających na limit API"""
+        if state["queued"]:
+            self.update_status(
+                f"⏳ Limit API: w kolejce {state['queued']}, czekam ~{state['wait']:.1f}s", "warning"
+            )
+        elif state["in_flight"]:
+            self.update_status("🤔 Claude myśli...", "warning")
+    
+    def show_scheduler_retry(self, retry):
+        """Informuje o ponowieniu zapytania po błędzie przejściowym"""
+        reason = {429: "Limit zapytań (429)", 529: "API przeciążone (529)"}.get(
+            retry["status"], retry["error"]
+        )
+        self.update_status(
+            f"🔁 {reason} - ponawiam za {retry['delay']:.1f}s "
+            f"(próba {retry['attempt'] + 1}/{retry['max_attempts']})", "warning"
+        )
         
     def update_status(self, text, status_type="normal"):
         """Aktualizuje status"""
@@ -1594,14 +2338,8 @@ class ClaudeGUIAssistant:
         self.root.mainloop()
       
 
-def main():
-    """Punkt wejścia aplikacji"""
-    try:
-        import customtkinter
-    except ImportError:
-        print("Instaluję customtkinter...")
-        os.system("pip install customtkinter")
-        
+def create_app():
+    """Tworzy okno z integracją bazy danych - bez uruchamiania pętli zdarzeń (np. benchmark)"""
     app = ClaudeGUIAssistant()
     
     # ============= INTEGRACJA BAZY DANYCH =============
@@ -1609,74 +2347,131 @@ def main():
         try:
             print("\n[DB] 🔧 DODAJĘ ZAKŁADKĘ BAZY DANYCH...")
             
-            # Utwórz menedżer bazy
-            app.db = DatabaseManager()
+            # Menedżer bazy (sqlalchemy/psycopg2) powstaje w tle po pokazaniu okna
+            app.db = None
             app.db_panel = DatabaseHistoryPanel(app)
-            app.db_panel.db = app.db
             
             original_send_api = app.send_api_request
             
-            def enhanced_send_api_request(message):
-                # Utwórz nową rozmowę jeśli nie ma ID
-                if not hasattr(app, 'current_conversation_id') or app.current_conversation_id is None:
+            def use_conversation(session, request, conversation_id):
+                """Rozmowa zapytania (wątek roboczy) - do sesji trafia w wątku Tk"""
+                request.conversation_id = conversation_id
+                app.root.after(0, app.bind_conversation, session, request, conversation_id)
+            
+            def recover_conversation(session, request, history):
+                """
+                Rozmowy sesji nie ma w tabelach roboczych (przeniesiona do archiwum, usunięta) -
+                przywraca ją z archiwum albo zakłada nową z dotychczasową historią karty
+                """
+                archive_id = app.db.find_archived_conversation(request.conversation_id)
+                restored_id = app.db.restore_conversation(archive_id) if archive_id else None
+                if restored_id:
+                    use_conversation(session, request, restored_id)
+                    app.root.after(0, app.update_status, "♻️ Rozmowa przywrócona z archiwum", "warning")
+                    return True
+                
+                conversation_id = app.db.create_conversation(
+                    title=request.title,
+                    model_id=request.settings.model.id,
+                    model_name=request.settings.model.name,
+                    system_prompt=request.settings.system_prompt,
+                    temperature=request.settings.temperature
+                )
+                if not conversation_id:
+                    return False
+                for msg in history:
+                    app.db.add_message(conversation_id, msg['role'], msg['content'])
+                use_conversation(session, request, conversation_id)
+                app.root.after(0, app.update_status, "♻️ Rozmowy nie było w bazie - zapis w nowej", "warning")
+                return True
+            
+            def add_session_message(session, request, history, role, content, **kwargs):
+                """Zapis wiadomości do rozmowy zapytania; gdy rozmowa zniknęła - odzyskanie i ponowna próba"""
+                message_id = app.db.add_message(request.conversation_id, role, content, **kwargs)
+                if message_id is None and recover_conversation(session, request, history):
+                    message_id = app.db.add_message(request.conversation_id, role, content, **kwargs)
+                return message_id
+            
+            def enhanced_send_api_request(session, message, request):
+                # Baza jeszcze się łączy (albo połączenie się nie udało)
+                if app.db is None:
+                    original_send_api(session, message, request)
+                    return
+                
+                # Gałąź istniejącej rozmowy - wspólny prefiks zostaje w rozmowie źródłowej
+                if request.conversation_id is None and request.branch_source:
+                    forked_id = app.db.fork_conversation(*request.branch_source)
+                    if forked_id:
+                        use_conversation(session, request, forked_id)
+                
+                # Utwórz nową rozmowę jeśli sesja nie ma jeszcze ID
+                if request.conversation_id is None:
                     title = message[:50] + "..." if len(message) > 50 else message
-                    app.current_conversation_id = app.db.create_conversation(
+                    conversation_id = app.db.create_conversation(
                         title=title,
-                        model_id=app.current_model.id,
-                        model_name=app.current_model.name,
-                        system_prompt=app.system_prompt,
-                        temperature=app.temperature_var.get()
+                        model_id=request.settings.model.id,
+                        model_name=request.settings.model.name,
+                        system_prompt=request.settings.system_prompt,
+                        temperature=request.settings.temperature
                     )
+                    if conversation_id:
+                        use_conversation(session, request, conversation_id)
                 
-                # Zapisz wiadomość użytkownika
-                if app.current_conversation_id:
-                    app.db.add_message(
-                        app.current_conversation_id,
+                # Zapisz wiadomość użytkownika (migawka bez niej - historia do ewentualnego odzyskania)
+                if request.conversation_id:
+                    add_session_message(
+                        session,
+                        request,
+                        request.messages[:-1],
                         "user",
                         message,
                         input_tokens=len(message) // 4
                     )
                 
                 # Wywołaj oryginalną funkcję
-                original_send_api(message)
+                original_send_api(session, message, request)
             
             def load_conversation_from_db():
                 """Wczytuje wybraną rozmowę z bazy do czatu"""
+                # Rozmowa z archiwum - najpierw wraca do tabel roboczych
+                if app.db_panel.selected_archive_id:
+                    restored_id = app.db.restore_conversation(app.db_panel.selected_archive_id)
+                    if restored_id:
+                        app.db_panel.selected_conversation_id = restored_id
+                        app.db_panel.selected_archive_id = None
+                
                 if hasattr(app.db_panel, 'selected_conversation_id') and app.db_panel.selected_conversation_id:
                     try:
                         # Pobierz rozmowę
                         conv = app.db.get_conversation_with_messages(app.db_panel.selected_conversation_id)
                         if conv:
+                            # Zakładka czekająca na odpowiedź zostaje - wczytaj do nowej
+                            if app.active_session.busy:
+                                app.open_session()
+                            
                             # Wyczyść obecny czat
                             app.conversation_history.clear()
-                            app.chat_display.delete("1.0", "end")
                             
                             # Wczytaj system prompt
                             if conv['system_prompt']:
-                                app.system_prompt = conv['system_prompt']
-                                app.system_prompt_text.delete("1.0", "end")
-                                app.system_prompt_text.insert("1.0", conv['system_prompt'])
+                                app.set_system_prompt(conv['system_prompt'])
                             
-                            # Wczytaj wiadomości
-                            for msg in conv['messages']:
-                                app.conversation_history.append({
-                                    'role': msg['role'],
-                                    'content': msg['content']
-                                })
-                                
-                                sender = "Ty" if msg['role'] == 'user' else "Claude"
-                                color = "#0084ff" if msg['role'] == 'user' else "#00d26a"
-                                app.append_to_chat(sender, msg['content'], color)
+                            # Wczytaj wiadomości - okno czatu hurtem, od najnowszych
+                            app.conversation_history.extend(
+                                {'role': msg['role'], 'content': msg['content']} for msg in conv['messages']
+                            )
+                            app.render_transcript(conv['messages'], thinking_loader=app.db_panel.thinking_loader)
                             
-                            # Ustaw ID rozmowy
+                            # Ustaw ID rozmowy i tytuł zakładki
                             app.current_conversation_id = app.db_panel.selected_conversation_id
+                            app.rename_session(app.active_session, title_from_message(conv['title']))
                             
                             # Aktualizuj UI
                             app.update_history_list()
                             app.update_status(f"✅ Wczytano: {conv['title']}", "success")
                             
                             # Przełącz na zakładkę czatu (opcjonalne)
-                            app.tabview.set("Historia")  # Przełącz widok jeśli chcesz
+                            app.show_tab("Historia")  # Przełącz widok jeśli chcesz
                             
                     except Exception as e:
                         app.update_status(f"Błąd wczytywania: {e}", "error")
@@ -1688,39 +2483,95 @@ def main():
 
             app.send_api_request = enhanced_send_api_request
             
-            # Nadpisz też update_after_response
-            original_update = app.update_after_response
-            
-            def enhanced_update_after_response(message, cost):
-                original_update(message, cost)
-                
-                # Zapisz odpowiedź Claude'a
-                if hasattr(app, 'current_conversation_id') and app.current_conversation_id:
-                    app.db.add_message(
-                        app.current_conversation_id,
+            # Zapis odpowiedzi Claude'a do rozmowy sesji (z wątku roboczego, po zakończeniu streamu)
+            def save_response_to_db(session, request, result, cost):
+                if app.db is not None and request.conversation_id:
+                    add_session_message(
+                        session,
+                        request,
+                        request.messages,
                         "assistant",
-                        message,
-                        output_tokens=len(message) // 4,
-                        cost=cost
+                        result.text,
+                        output_tokens=result.output_tokens,
+                        cost=cost,
+                        timing=result.timing,
+                        thinking=result.thinking or None,
+                        thinking_tokens=result.thinking_tokens
                     )
-                    # Odśwież listę rozmów
-                    if hasattr(app.db_panel, 'load_conversations'):
-                        app.db_panel.load_conversations()
+                    # Odśwież listę rozmów (z aktywnym wyszukiwaniem - jego wyniki)
+                    if hasattr(app.db_panel, 'refresh_conversations'):
+                        app.root.after(0, app.db_panel.refresh_conversations)
             
-            app.update_after_response = enhanced_update_after_response
+            app.save_response = save_response_to_db
 
 
-            # DODAJ ZAKŁADKĘ DO TABVIEW!!!
-            db_tab = app.tabview.add("📚 BAZA DANYCH")
-            app.db_panel.build_database_tab(db_tab)
+            # DODAJ ZAKŁADKĘ DO TABVIEW!!! (budowana przy pierwszym otwarciu)
+            app.add_lazy_tab("📚 BAZA DANYCH", app.db_panel.build_database_tab)
             
             # Test zakładka
-            test_tab = app.tabview.add("🔴 TEST KURWA")
-            test_label = ctk.CTkLabel(test_tab, text="DZIAŁA KURWA!", font=("Arial", 30, "bold"))
-            test_label.pack(expand=True)
+            def build_test_tab(test_tab):
+                test_label = ctk.CTkLabel(test_tab, text="DZIAŁA KURWA!", font=("Arial", 30, "bold"))
+                test_label.pack(expand=True)
+            
+            app.add_lazy_tab("🔴 TEST KURWA", build_test_tab)
             
             app.current_conversation_id = None
             
+            def connect_database():
+                """Importuje ORM i łączy się z bazą w osobnym wątku"""
+                def worker():
+                    try:
+                        with startup_profiler.phase("baza danych: import + połączenie (w tle)"):
+                            from claude_db_extension import DatabaseManager
+                            db = DatabaseManager()
+                    except Exception as e:
+                        print(f"\n[DB] ❌ Nie można połączyć z bazą: {e}")
+                        app.root.after(0, app.update_status, "❌ Brak połączenia z bazą", "error")
+                        return
+                    
+                    # Indeks znaczeniowy (numpy) - dopisywany przy add_message, zaległe w tle
+                    try:
+                        from claude_semantic import SemanticIndex
+                        app.db_panel.semantic = SemanticIndex.attach(db)
+                    except Exception as e:
+                        print(f"[SEMANTIC] ⚠️ Wyszukiwanie znaczeniowe niedostępne: {e}")
+                    
+                    # Historia opóźnień z poprzednich sesji
+                    try:
+                        app.latency_tracker.extend(db.get_recent_timings())
+                        app.root.after(0, app.update_latency_display)
+                    except Exception as e:
+                        print(f"[DB] ⚠️ Nie można wczytać pomiarów opóźnień: {e}")
+                    
+                    # Zużycie myślenia z poprzednich sesji - historia budżetu adaptacyjnego
+                    try:
+                        app.budget_controller.load_history(db)
+                    except Exception as e:
+                        print(f"[DB] ⚠️ Nie można wczytać historii myślenia: {e}")
+                    app.root.after(0, on_database_ready, db)
+                    
+                    # Indeks pełnotekstowy treści zapisanych przed jego powstaniem (do tego czasu wyszukiwanie je rozpakowuje)
+                    db.index_blob_search()
+                
+                threading.Thread(target=worker, daemon=True).start()
+            
+            def on_database_ready(db):
+                app.db = db
+                app.db_panel.db = db
+                if app.db_panel.is_built:
+                    app.db_panel.load_initial_data()
+                app.update_status("✅ Baza danych połączona", "success")
+                
+                # Nieaktywne rozmowy przenoszone w tle do archiwum (DB_ARCHIVE_AFTER_DAYS)
+                from claude_db_extension import ArchiveMover
+                app.archive_mover = ArchiveMover(
+                    db, on_moved=lambda moved: app.root.after(0, app.db_panel.load_conversations),
+                    open_conversations=lambda: [session.conversation_id for session in list(app.sessions.values())]
+                )
+                app.archive_mover.start()
+            
+            app.root.after_idle(connect_database)
+            
             print("[DB] ✅✅✅ ZAKŁADKA BAZY DODANA! SZUKAJ '📚 BAZA DANYCH'")
             
         except Exception as e:
@@ -1732,6 +2583,18 @@ def main():
         print("     - claude_db_extension.py")
         print("     - claude_gui_db_panel.py")
     
+    return app
+
+
+def main():
+    """Punkt wejścia aplikacji"""
+    try:
+        import customtkinter
+    except ImportError:
+        print("Instaluję customtkinter...")
+        os.system("pip install customtkinter")
+        
+    app = create_app()
     app.run()
 
 if __name__ == "__main__":
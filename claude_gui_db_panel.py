@@ -3,11 +3,57 @@
 Panel historii rozmów - rozszerzenie GUI o obsługę bazy danych
 """
 
+import time
+import threading
+from collections import OrderedDict
 import tkinter as tk
 from tkinter import messagebox
 import customtkinter as ctk
 from datetime import datetime
 
+from claude_models import model_by_id
+from claude_session import title_from_message
+from claude_telemetry import describe_latency
+from claude_virtual_list import VirtualList
+
+# Długość treści wiadomości w podglądzie rozmowy (reszta nie jest rozpakowywana)
+PREVIEW_CHARS = 2000
+# Wyników "podobnych rozmów" (indeks znaczeniowy)
+SIMILAR_RESULTS = 20
+# Wyszukiwanie podczas pisania: pauza po ostatnim klawiszu, minimalna długość zapytania
+SEARCH_DEBOUNCE_MS = 250
+# Od 3 znaków - jak indeks słów archiwum; krótsze zapytanie nie obejmowałoby
+# wyników dłuższego i nie nadawałoby się do zawężania
+SEARCH_MIN_CHARS = 3
+SEARCH_CACHE_SIZE = 32  # zapamiętanych zapytań (wyniki z dopasowaniami)
+SNIPPET_CHARS = 40      # kontekst dopasowania w treści pokazywany w wierszu listy
+
+
+def refine_results(results, needle):
+    """
+    Zawęża wyniki zapytania do jego przedłużenia bez bazy: rozmowa pasująca do
+    needle pasuje też do każdego jego początku (także w archiwum, gdzie słowa
+    dopasowywane są od początku), więc wystarczy przefiltrować zapamiętane
+    dopasowania (tytuł i treści wiadomości).
+    """
+    refined = []
+    for conv in results:
+        matches = [body for body in conv['matches'] if needle in body.lower()]
+        if matches or needle in conv['title'].lower():
+            refined.append(dict(conv, matches=matches))
+    return refined
+
+
+def match_snippet(body, needle, width=SNIPPET_CHARS):
+    """Fragment treści wokół pierwszego dopasowania (jedna linia)"""
+    position = body.lower().find(needle)
+    if position < 0:
+        return ""
+    start = max(0, position - width // 2)
+    end = position + len(needle) + width // 2
+    snippet = " ".join(body[start:end].split())
+    return ("…" if start else "") + snippet + ("…" if end < len(body) else "")
+
 class DatabaseHistoryPanel:
     """Panel do zarządzania historią rozmów z bazy danych"""
     
@@ -16,6 +62,20 @@ class DatabaseHistoryPanel:
         self.gui = parent_gui
         self.db = None  # Będzie ustawione przez integrate_database
         self.selected_conversation_id = None
+        self.selected_archive_id = None  # Rozmowa z archiwum - przywracana przy wczytaniu
+        self.conversation_data = {}
+        self.is_built = False  # Zakładka budowana leniwie przy pierwszym otwarciu
+        self.batch_runner = None
+        self.batch_polling = None
+        self.semantic = None  # SemanticIndex - gdy numpy dostępne
+        
+        # Wyszukiwanie podczas pisania
+        self.search_after_id = None  # zaplanowane (debounce) wyszukiwanie
+        self.search_generation = 0   # wyniki starszych zapytań są odrzucane
+        self.search_cache = OrderedDict()  # zapytanie (małe litery) -> wyniki z dopasowaniami
+        self.search_lock = threading.Lock()
+        self.queued_search = None    # (generacja, zapytanie) czekające na wątek
+        self.search_running = False
         
     def build_database_tab(self, parent):
         """Buduje zakładkę z historią rozmów z bazy"""
@@ -43,6 +103,7 @@ class DatabaseHistoryPanel:
         )
         self.search_entry.pack(side="left", padx=5)
         self.search_entry.bind('<Return>', lambda e: self.search_conversations())
+        self.search_entry.bind('<KeyRelease>', self.on_search_key)
         
         search_button = ctk.CTkButton(
             top_frame,
@@ -62,6 +123,24 @@ class DatabaseHistoryPanel:
         )
         refresh_button.pack(side="left", padx=5)
         
+        archive_list_button = ctk.CTkButton(
+            top_frame,
+            text="🧊 Archiwum",
+            command=self.load_archived_conversations,
+            width=80,
+            font=(self.gui.current_font_family, self.gui.current_font_size)
+        )
+        archive_list_button.pack(side="left", padx=5)
+        
+        similar_button = ctk.CTkButton(
+            top_frame,
+            text="🧭 Podobne",
+            command=self.find_similar_conversations,
+            width=80,
+            font=(self.gui.current_font_family, self.gui.current_font_size)
+        )
+        similar_button.pack(side="left", padx=5)
+        
         # Środkowy panel - lista rozmów i podgląd
         middle_frame = ctk.CTkFrame(main_frame)
         middle_frame.pack(fill="both", expand=True, padx=5, pady=5)
@@ -78,27 +157,20 @@ class DatabaseHistoryPanel:
         )
         list_label.pack(pady=5)
         
-        # Listbox z rozmowami
+        # Lista rozmów - renderowane tylko widoczne wiersze, Ctrl/Shift - kilka naraz (batch)
         list_container = ctk.CTkFrame(left_frame)
         list_container.pack(fill="both", expand=True, padx=5, pady=5)
         
-        scrollbar = tk.Scrollbar(list_container)
-        scrollbar.pack(side="right", fill="y")
-        
-        self.conversations_listbox = tk.Listbox(
+        self.conversations_listbox = VirtualList(
             list_container,
-            yscrollcommand=scrollbar.set,
+            font=(self.gui.current_font_family, int(self.gui.current_font_size * 0.9)),
             bg='#2b2b2b',
             fg='white',
-            selectbackground='#0084ff',
-            font=(self.gui.current_font_family, int(self.gui.current_font_size * 0.9)),
-            height=20
+            select_bg='#0084ff',
+            on_select=lambda: self.on_conversation_select(None),
+            on_activate=self.load_selected_conversation
         )
         self.conversations_listbox.pack(side="left", fill="both", expand=True)
-        self.conversations_listbox.bind('<<ListboxSelect>>', self.on_conversation_select)
-        self.conversations_listbox.bind('<Double-Button-1>', lambda e: self.load_selected_conversation())
-
-        scrollbar.config(command=self.conversations_listbox.yview)
         
         # Przyciski akcji
         action_frame = ctk.CTkFrame(left_frame)
@@ -135,6 +207,16 @@ class DatabaseHistoryPanel:
         )
         delete_button.pack(side="left", padx=2)
         
+        batch_button = ctk.CTkButton(
+            action_frame,
+            text="📨 Batch",
+            command=self.submit_selected_as_batch,
+            width=70,
+            fg_color="#aa6600",
+            font=(self.gui.current_font_family, self.gui.current_font_size)
+        )
+        batch_button.pack(side="left", padx=2)
+        
         # Prawa strona - podgląd rozmowy
         right_frame = ctk.CTkFrame(middle_frame)
         right_frame.pack(side="right", fill="both", expand=True)
@@ -186,61 +268,220 @@ class DatabaseHistoryPanel:
         )
         self.stats_label.pack(pady=5)
         
-        # Załaduj rozmowy przy starcie
-        self.load_conversations()
-        self.load_statistics()
+        # Zaobserwowane opóźnienia per model (p50/p95/p99)
+        self.latency_label = ctk.CTkLabel(
+            stats_frame,
+            text="",
+            font=(self.gui.current_font_family, self.gui.current_font_size),
+            justify="left"
+        )
+        self.latency_label.pack(pady=(0, 5))
+        
+        self.is_built = True
+        
+        # Dane z bazy pobierane w tle - zakładka pokazuje się od razu
+        self.load_initial_data()
+    
+    def load_initial_data(self):
+        """Pobiera listę rozmów i statystyki w osobnym wątku"""
+        if not self.db:
+            return
+        
+        self.conversation_data = {}
+        self.conversations_listbox.set_rows(["⏳ Ładowanie rozmów..."])
+        
+        def worker():
+            try:
+                conversations = self.db.get_all_conversations()
+                stats = self.db.get_statistics()
+            except Exception as e:
+                print(f"[DB ERROR] {e}")
+                self.gui.root.after(0, self.gui.update_status, "Błąd ładowania rozmów", "error")
+                return
+            self.gui.root.after(0, self.apply_initial_data, conversations, stats)
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def apply_initial_data(self, conversations, stats):
+        """Wyświetla dane pobrane w tle (wątek UI)"""
+        self.render_conversations(conversations, "📅")
+        self.render_statistics(stats)
+        self.gui.update_status(f"Załadowano {len(conversations)} rozmów", "success")
+        
+    def render_conversations(self, conversations, icon, highlight=None):
+        """Wypełnia listę rozmów; highlight - podświetlany tekst zapytania"""
+        self.conversation_data = {}
+        rows = []
+        
+        for conv in conversations:
+            # Format: "📅 Data | 💬 Tytuł | 📊 Wiad: X" (+ fragment pasującej treści)
+            created = datetime.fromisoformat(conv['created_at']).strftime("%Y-%m-%d %H:%M")
+            display_text = (f"{'🧊' if conv.get('archived') else icon} {created} | 💬 {conv['title'][:30]}... | "
+                            f"📊 {conv['message_count']} wiad.")
+            if highlight and conv.get('matches'):
+                display_text += f" | {match_snippet(conv['matches'][0], highlight.lower())}"
+            
+            rows.append(display_text)
+            self.conversation_data[len(self.conversation_data)] = conv
+        
+        self.conversations_listbox.set_rows(rows, highlight)
         
     def load_conversations(self):
         """Ładuje listę rozmów z bazy"""
-        if not self.db:
+        if not self.db or not self.is_built:
             return
         
+        self.search_cache.clear()  # baza się zmieniła - zapamiętane wyniki nieaktualne
         try:
             conversations = self.db.get_all_conversations()
-            
-            self.conversations_listbox.delete(0, tk.END)
-            self.conversation_data = {}
-            
-            for conv in conversations:
-                # Format: "📅 Data | 💬 Tytuł | 📊 Wiad: X"
-                created = datetime.fromisoformat(conv['created_at']).strftime("%Y-%m-%d %H:%M")
-                display_text = f"📅 {created} | 💬 {conv['title'][:30]}... | 📊 {conv['message_count']} wiad."
-                
-                self.conversations_listbox.insert(tk.END, display_text)
-                self.conversation_data[len(self.conversation_data)] = conv
-            
+            self.render_conversations(conversations, "📅")
             self.gui.update_status(f"Załadowano {len(conversations)} rozmów", "success")
             
         except Exception as e:
             print(f"[DB ERROR] {e}")
             self.gui.update_status("Błąd ładowania rozmów", "error")
     
+    def load_archived_conversations(self):
+        """Lista rozmów przeniesionych do archiwum"""
+        if not self.db or not self.is_built:
+            return
+        
+        conversations = self.db.get_archived_conversations()
+        self.render_conversations(conversations, "🧊")
+        self.gui.update_status(f"W archiwum: {len(conversations)} rozmów (wczytanie przywraca rozmowę)", "success")
+    
+    def refresh_conversations(self):
+        """Odświeża listę po zmianie w bazie - z aktywnym wyszukiwaniem powtarza zapytanie"""
+        self.search_cache.clear()
+        if self.is_built and self.search_entry.get().strip():
+            self.search_conversations()
+        else:
+            self.load_conversations()
+    
+    def on_search_key(self, event):
+        """Wyszukiwanie podczas pisania - zapytanie dopiero po SEARCH_DEBOUNCE_MS ciszy"""
+        if event.keysym in ("Return", "KP_Enter"):
+            return
+        if self.search_after_id is not None:
+            self.gui.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.gui.root.after(SEARCH_DEBOUNCE_MS, self.search_conversations)
+    
     def search_conversations(self):
-        """Wyszukuje rozmowy"""
-        query = self.search_entry.get()
+        """Wyszukuje rozmowy (Enter, przycisk albo pauza w pisaniu)"""
+        if self.search_after_id is not None:
+            self.gui.root.after_cancel(self.search_after_id)
+            self.search_after_id = None
+        
+        query = self.search_entry.get().strip()
+        # Każde nowe zapytanie unieważnia wyniki poprzednich (także tych w toku)
+        self.search_generation += 1
         
         if not query or not self.db:
             self.load_conversations()
             return
+        if len(query) < SEARCH_MIN_CHARS:
+            return
         
-        try:
-            conversations = self.db.search_conversations(query)
-            
-            self.conversations_listbox.delete(0, tk.END)
-            self.conversation_data = {}
-            
-            for conv in conversations:
-                created = datetime.fromisoformat(conv['created_at']).strftime("%Y-%m-%d %H:%M")
-                display_text = f"🔍 {created} | 💬 {conv['title'][:30]}... | 📊 {conv['message_count']} wiad."
-                
-                self.conversations_listbox.insert(tk.END, display_text)
-                self.conversation_data[len(self.conversation_data)] = conv
-            
-            self.gui.update_status(f"Znaleziono {len(conversations)} rozmów", "success")
+        # Dłuższa wersja zapamiętanego zapytania - zawężenie bez bazy
+        started = time.perf_counter()
+        cached = self.cached_search(query)
+        if cached is not None:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.show_search_results(query, cached, f"{elapsed_ms:.1f} ms, bez bazy")
+            return
+        
+        self.gui.update_status(f"🔍 Szukanie \"{query}\"...", "warning")
+        with self.search_lock:
+            self.queued_search = (self.search_generation, query)
+            if self.search_running:
+                return  # wątek weźmie najnowsze zapytanie po zakończeniu bieżącego
+            self.search_running = True
+        threading.Thread(target=self.search_worker, daemon=True).start()
+    
+    def search_worker(self):
+        """Wątek wyszukiwania - jedno zapytanie naraz, zawsze najnowsze z kolejki"""
+        while True:
+            with self.search_lock:
+                job = self.queued_search
+                self.queued_search = None
+                if job is None:
+                    self.search_running = False
+                    return
             
-        except Exception as e:
-            print(f"[DB ERROR] {e}")
-            self.gui.update_status("Błąd wyszukiwania", "error")
+            generation, query = job
+            if generation != self.search_generation:
+                continue  # zastąpione, zanim zdążyło wystartować
+            started = time.perf_counter()
+            try:
+                results = self.db.search_conversations(query, with_matches=True)
+            except Exception as e:
+                print(f"[DB ERROR] {e}")
+                self.gui.root.after(0, self.gui.update_status, "Błąd wyszukiwania", "error")
+                continue
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.gui.root.after(0, self.apply_search_results, generation, query, results, elapsed_ms)
+    
+    def apply_search_results(self, generation, query, results, elapsed_ms):
+        """Wynik z bazy (wątek UI) - zapamiętany zawsze, wyświetlany tylko gdy aktualny"""
+        self.remember_search(query.lower(), results)
+        if generation == self.search_generation:
+            self.show_search_results(query, results, f"{elapsed_ms:.0f} ms")
+    
+    def show_search_results(self, query, conversations, timing):
+        self.render_conversations(conversations, "🔍", highlight=query)
+        self.gui.update_status(f"Znaleziono {len(conversations)} rozmów ({timing})", "success")
+    
+    def remember_search(self, key, results):
+        self.search_cache[key] = results
+        self.search_cache.move_to_end(key)
+        while len(self.search_cache) > SEARCH_CACHE_SIZE:
+            self.search_cache.popitem(last=False)
+    
+    def cached_search(self, query):
+        """Wyniki z pamięci: to samo zapytanie albo zawężenie najdłuższego, które przedłuża"""
+        key = query.lower()
+        if key in self.search_cache:
+            self.search_cache.move_to_end(key)
+            return self.search_cache[key]
+        
+        bases = [cached for cached, results in self.search_cache.items()
+                 if key.startswith(cached) and all('matches' in conv for conv in results)]
+        if not bases:
+            return None
+        results = refine_results(self.search_cache[max(bases, key=len)], key)
+        self.remember_search(key, results)
+        return results
+    
+    def find_similar_conversations(self):
+        """Rozmowy podobne znaczeniowo do zaznaczonej (albo do tekstu w polu wyszukiwania)"""
+        if not self.db:
+            return
+        if self.semantic is None:
+            self.gui.update_status("Wyszukiwanie znaczeniowe niedostępne (wymaga numpy)", "warning")
+            return
+        
+        query = self.search_entry.get().strip()
+        started = time.perf_counter()
+        if self.selected_conversation_id:
+            results = self.semantic.similar_conversations(self.selected_conversation_id, SIMILAR_RESULTS)
+            source = "zaznaczonej rozmowy"
+        elif query:
+            results = self.semantic.search(query, SIMILAR_RESULTS)
+            source = f"\"{query}\""
+        else:
+            self.gui.update_status("Zaznacz rozmowę albo wpisz tekst", "warning")
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        
+        conversations = self.db.get_conversations_by_ids([cid for cid, _ in results])
+        self.render_conversations(conversations, "🧭")
+        stats = self.semantic.stats()
+        backfill_note = " - indeksowanie w toku" if stats["backfilling"] else ""
+        self.gui.update_status(
+            f"🧭 {len(conversations)} rozmów podobnych do {source} ({elapsed_ms:.1f} ms, "
+            f"{stats['messages']:,} wiadomości w indeksie{backfill_note})",
+            "success"
+        )
     
     def on_conversation_select(self, event):
         """Obsługuje wybór rozmowy z listy"""
@@ -252,10 +493,19 @@ class DatabaseHistoryPanel:
         index = selection[0]
         if index in self.conversation_data:
             conv_data = self.conversation_data[index]
-            self.selected_conversation_id = conv_data['id']
             
             # Pobierz pełną rozmowę
-            full_conversation = self.db.get_conversation_with_messages(self.selected_conversation_id)
+            # Podgląd - długie treści rozpakowywane tylko do PREVIEW_CHARS znaków
+            if conv_data.get('archived'):
+                self.selected_conversation_id = None
+                self.selected_archive_id = conv_data['id']
+                full_conversation = self.db.get_archived_conversation(self.selected_archive_id,
+                                                                      preview_chars=PREVIEW_CHARS)
+            else:
+                self.selected_conversation_id = conv_data['id']
+                self.selected_archive_id = None
+                full_conversation = self.db.get_conversation_with_messages(self.selected_conversation_id,
+                                                                           preview_chars=PREVIEW_CHARS)
             
             if full_conversation:
                 # Aktualizuj info
@@ -267,6 +517,8 @@ class DatabaseHistoryPanel:
 💬 Wiadomości: {full_conversation['message_count']}
 💰 Koszt: ${full_conversation['total_cost']:.4f}
                 """
+                if full_conversation.get('archived'):
+                    info_text = info_text.strip() + f"\n🧊 W archiwum od: {full_conversation['archived_at'][:16]}"
                 self.conversation_info.configure(text=info_text.strip())
                 
                 # Wyświetl podgląd
@@ -278,45 +530,78 @@ class DatabaseHistoryPanel:
                     role = "👤 Użytkownik" if msg['role'] == 'user' else "🤖 Claude"
                     
                     self.preview_text.insert(tk.END, f"[{timestamp}] {role}:\n")
-                    self.preview_text.insert(tk.END, f"{msg['content']}\n")
+                    content = msg['content']
+                    if len(content) >= PREVIEW_CHARS:
+                        content = content[:PREVIEW_CHARS] + "…"
+                    self.preview_text.insert(tk.END, f"{content}\n")
                     self.preview_text.insert(tk.END, "-" * 60 + "\n")
                 
+                first_match = self.highlight_preview()
                 self.preview_text.configure(state="disabled")
-                self.preview_text.see("1.0")
+                self.preview_text.see(first_match or "1.0")
+    
+    def highlight_preview(self):
+        """Podświetla w podglądzie wyszukiwany tekst; zwraca pozycję pierwszego dopasowania"""
+        query = self.search_entry.get().strip()
+        self.preview_text.tag_remove("match", "1.0", tk.END)
+        if len(query) < SEARCH_MIN_CHARS:
+            return None
+        self.preview_text.tag_configure("match", background="#806600")
+        
+        first = None
+        count = tk.IntVar()
+        start = "1.0"
+        while True:
+            start = self.preview_text.search(query, start, stopindex=tk.END, nocase=True, count=count)
+            if not start or not count.get():
+                break
+            end = f"{start}+{count.get()}c"
+            self.preview_text.tag_add("match", start, end)
+            first = first or start
+            start = end
+        return first
     
     def load_selected_conversation(self):
         """Wczytuje wybraną rozmowę do głównego okna czatu"""
-        if not self.selected_conversation_id or not self.db:
+        if not self.db:
+            return
+        
+        # Rozmowa z archiwum wraca do tabel roboczych dopiero teraz
+        if self.selected_archive_id:
+            restored_id = self.db.restore_conversation(self.selected_archive_id)
+            if not restored_id:
+                self.gui.update_status("Błąd przywracania rozmowy z archiwum", "error")
+                return
+            self.selected_conversation_id = restored_id
+            self.selected_archive_id = None
+        
+        if not self.selected_conversation_id:
             return
         
         try:
             conversation = self.db.get_conversation_with_messages(self.selected_conversation_id)
             
             if conversation:
+                # Zakładka czekająca na odpowiedź zostaje - wczytaj do nowej
+                if self.gui.active_session.busy:
+                    self.gui.open_session()
+                
                 # Wyczyść obecny czat
                 self.gui.conversation_history.clear()
-                self.gui.chat_display.delete("1.0", tk.END)
                 
                 # Ustaw parametry rozmowy
                 if conversation['system_prompt']:
-                    self.gui.system_prompt = conversation['system_prompt']
-                    if hasattr(self.gui, 'system_prompt_text'):
-                        self.gui.system_prompt_text.delete("1.0", tk.END)
-                        self.gui.system_prompt_text.insert("1.0", conversation['system_prompt'])
+                    self.gui.set_system_prompt(conversation['system_prompt'])
                 
-                # Wczytaj wiadomości
-                for msg in conversation['messages']:
-                    self.gui.conversation_history.append({
-                        'role': msg['role'],
-                        'content': msg['content']
-                    })
-                    
-                    sender = "Ty" if msg['role'] == 'user' else "Claude"
-                    color = "#0084ff" if msg['role'] == 'user' else "#00d26a"
-                    self.gui.append_to_chat(sender, msg['content'], color)
+                # Wczytaj wiadomości - okno czatu hurtem, od najnowszych
+                self.gui.conversation_history.extend(
+                    {'role': msg['role'], 'content': msg['content']} for msg in conversation['messages']
+                )
+                self.gui.render_transcript(conversation['messages'], thinking_loader=self.thinking_loader)
                 
-                # Ustaw ID obecnej rozmowy
+                # Ustaw ID obecnej rozmowy i tytuł zakładki
                 self.gui.current_conversation_id = self.selected_conversation_id
+                self.gui.rename_session(self.gui.active_session, title_from_message(conversation['title']))
                 
                 # Aktualizuj UI
                 self.gui.update_history_list()
@@ -326,9 +611,18 @@ class DatabaseHistoryPanel:
             print(f"[DB ERROR] {e}")
             self.gui.update_status("Błąd wczytywania rozmowy", "error")
     
+    def thinking_loader(self, msg):
+        """Funkcja doczytująca myślenie wiadomości z bazy (None - wiadomość bez myślenia)"""
+        if not msg.get('has_thinking'):
+            return None
+        db = self.db
+        return lambda: db.get_message_thinking(msg['id'])
+    
     def archive_selected_conversation(self):
         """Archiwizuje wybraną rozmowę"""
         if not self.selected_conversation_id or not self.db:
+            if self.selected_archive_id:
+                self.gui.update_status("Rozmowa jest już w archiwum", "warning")
             return
         
         if messagebox.askyesno("Archiwizacja", "Czy na pewno chcesz zarchiwizować tę rozmowę?"):
@@ -340,37 +634,116 @@ class DatabaseHistoryPanel:
     
     def delete_selected_conversation(self):
         """Usuwa wybraną rozmowę"""
-        if not self.selected_conversation_id or not self.db:
+        if not (self.selected_conversation_id or self.selected_archive_id) or not self.db:
             return
         
         if messagebox.askyesno("Usuwanie", "Czy na pewno chcesz TRWALE usunąć tę rozmowę?"):
-            if self.db.delete_conversation(self.selected_conversation_id):
+            if self.selected_archive_id:
+                deleted = self.db.delete_archived_conversation(self.selected_archive_id)
+            else:
+                deleted = self.db.delete_conversation(self.selected_conversation_id)
+            if deleted:
                 self.gui.update_status("Rozmowa usunięta", "success")
                 self.load_conversations()
                 self.selected_conversation_id = None
+                self.selected_archive_id = None
                 self.preview_text.configure(state="normal")
                 self.preview_text.delete("1.0", tk.END)
                 self.preview_text.configure(state="disabled")
             else:
                 self.gui.update_status("Błąd usuwania", "error")
     
+    def submit_selected_as_batch(self):
+        """Wysyła zaznaczone rozmowy przez Message Batches API (taniej, wyniki później)"""
+        selection = self.conversations_listbox.curselection()
+        conversation_ids = [self.conversation_data[i]['id'] for i in selection if i in self.conversation_data]
+        
+        if not conversation_ids or not self.db:
+            self.gui.update_status("Zaznacz rozmowy do wysłania (Ctrl/Shift)", "warning")
+            return
+        if not self.gui.client:
+            self.gui.update_status("⏳ API jeszcze się łączy...", "warning")
+            return
+        
+        dialog = ctk.CTkInputDialog(
+            title="Message Batches API",
+            text=f"Pytanie dopisywane do {len(conversation_ids)} rozmów\n(puste = odpowiedź na ostatnią wiadomość):"
+        )
+        prompt = dialog.get_input()
+        if prompt is None:
+            return
+        
+        settings = self.gui.current_request_settings()
+        self.gui.update_status(f"📨 Wysyłanie batcha ({len(conversation_ids)} rozmów)...", "warning")
+        
+        def worker():
+            from claude_message_batches import BatchRunner, items_from_conversations
+            
+            try:
+                if self.batch_runner is None:
+                    # Własne statystyki runnera - odpytuje w wątku tła; statystyki GUI zmieniamy w wątku Tk
+                    self.batch_runner = BatchRunner(self.gui.client, db=self.db)
+                items = items_from_conversations(self.db, conversation_ids, settings, prompt.strip() or None)
+                if not items:
+                    self.gui.root.after(0, self.gui.update_status, "Brak pytań do wysłania", "warning")
+                    return
+                self.batch_runner.submit(items)
+            except Exception as e:
+                print(f"[BATCH ERROR] {e}")
+                self.gui.root.after(0, self.gui.update_status, f"Błąd batcha: {e}", "error")
+                return
+            
+            self.gui.root.after(0, self.gui.update_status, "📨 Batch wysłany - wyniki pojawią się w historii", "success")
+            if self.batch_polling is None or not self.batch_polling.is_alive():
+                self.batch_polling = self.batch_runner.start_background_polling(
+                    on_collected=lambda summary: self.gui.root.after(0, self.on_batch_collected, summary)
+                )
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def on_batch_collected(self, summary):
+        """Wyniki batcha zapisane w bazie - odśwież widok (wątek UI)"""
+        for usage in summary['usage']:
+            self.gui.token_stats.add_usage(usage['input_tokens'], usage['output_tokens'],
+                                           model_by_id(usage['model']), batch=True,
+                                           thinking_tokens=usage['thinking_tokens'])
+        self.gui.update_statistics(summary['cost'])
+        self.load_conversations()
+        self.load_statistics()
+        self.gui.update_status(
+            f"📨 Batch gotowy: {summary['succeeded']} odpowiedzi, {summary['failed']} błędów "
+            f"(oszczędność ${self.gui.token_stats.batch_savings:.4f})",
+            "success" if not summary['failed'] else "warning"
+        )
+    
     def load_statistics(self):
         """Ładuje statystyki z bazy"""
-        if not self.db:
+        if not self.db or not self.is_built:
             return
         
         try:
-            stats = self.db.get_statistics()
-            
-            stats_text = f"📊 Rozmów: {stats.get('total_conversations', 0)} | "
-            stats_text += f"💬 Wiadomości: {stats.get('total_messages', 0)} | "
-            stats_text += f"🔢 Tokenów: {stats.get('total_tokens', 0):,} | "
-            stats_text += f"💰 Koszt całkowity: ${stats.get('total_cost', 0):.2f}"
-            
-            self.stats_label.configure(text=stats_text)
+            self.render_statistics(self.db.get_statistics())
             
         except Exception as e:
             print(f"[DB ERROR] {e}")
+    
+    def render_statistics(self, stats):
+        """Wyświetla statystyki z bazy"""
+        stats_text = f"📊 Rozmów: {stats.get('total_conversations', 0)} | "
+        stats_text += f"💬 Wiadomości: {stats.get('total_messages', 0)} | "
+        stats_text += f"🔢 Tokenów: {stats.get('total_tokens', 0):,} "
+        stats_text += f"(🧠 myślenie: {stats.get('total_thinking_tokens', 0):,}) | "
+        stats_text += f"💰 Koszt całkowity: ${stats.get('total_cost', 0):.2f} | "
+        stats_text += f"🧊 W archiwum: {stats.get('archived_conversations', 0)}"
+        
+        self.stats_label.configure(text=stats_text)
+        
+        lines = []
+        for model_id, summary in self.gui.latency_tracker.summaries().items():
+            description = describe_latency(summary)
+            if description:
+                lines.append(f"⏱ {model_by_id(model_id).name}: {description}")
+        self.latency_label.configure(text="\n".join(lines) or "⏱ Brak pomiarów opóźnień")
 
 def integrate_database_with_gui(gui_instance):
     """Integruje bazę danych z istniejącą aplikacją GUI"""
@@ -385,6 +758,13 @@ def integrate_database_with_gui(gui_instance):
     gui_instance.db = DatabaseManager()
     history_panel.db = gui_instance.db
     
+    # Indeks znaczeniowy (numpy) - dopisywany przy add_message
+    try:
+        from claude_semantic import SemanticIndex
+        history_panel.semantic = SemanticIndex.attach(gui_instance.db)
+    except Exception as e:
+        print(f"[SEMANTIC] ⚠️ Wyszukiwanie znaczeniowe niedostępne: {e}")
+    
     # Inicjalizuj zmienne
     gui_instance.current_conversation_id = None
     
@@ -408,22 +788,33 @@ def integrate_database_with_gui(gui_instance):
     # Zmodyfikuj send_api_request żeby zapisywała do bazy
     original_send_api = gui_instance.send_api_request
     
-    def enhanced_send_api_request(message):
+    def enhanced_send_api_request(session, message, request):
+        # Nowe ID rozmowy trafia do sesji w wątku Tk
+        def use_conversation(conversation_id):
+            request.conversation_id = conversation_id
+            gui_instance.root.after(0, gui_instance.bind_conversation, session, request, conversation_id)
+        
+        # Gałąź istniejącej rozmowy - wspólny prefiks zostaje w rozmowie źródłowej
+        if request.conversation_id is None and request.branch_source:
+            forked_id = gui_instance.db.fork_conversation(*request.branch_source)
+            if forked_id:
+                use_conversation(forked_id)
+        
         # Jeśli to pierwsza wiadomość, utwórz nową rozmowę
-        if gui_instance.current_conversation_id is None:
+        if request.conversation_id is None:
             title = gui_instance.db.generate_title_from_first_message(message)
             
             conv_id = gui_instance.db.create_conversation(
                 title=title,
-                model_id=gui_instance.current_model.id,
-                model_name=gui_instance.current_model.name,
-                system_prompt=gui_instance.system_prompt,
-                temperature=gui_instance.temperature_var.get()
+                model_id=request.settings.model.id,
+                model_name=request.settings.model.name,
+                system_prompt=request.settings.system_prompt,
+                temperature=request.settings.temperature
             )
-            gui_instance.current_conversation_id = conv_id
             
             # Zapisz pierwszą wiadomość użytkownika
             if conv_id:
+                use_conversation(conv_id)
                 gui_instance.db.add_message(
                     conversation_id=conv_id,
                     role="user",
@@ -433,39 +824,36 @@ def integrate_database_with_gui(gui_instance):
         else:
             # Zapisz kolejną wiadomość użytkownika
             gui_instance.db.add_message(
-                conversation_id=gui_instance.current_conversation_id,
+                conversation_id=request.conversation_id,
                 role="user",
                 content=message,
                 input_tokens=len(message) // 4
             )
         
         # Wywołaj oryginalną metodę
-        original_send_api(message)
+        original_send_api(session, message, request)
     
     gui_instance.send_api_request = enhanced_send_api_request
     
-    # Zmodyfikuj update_after_response żeby zapisywała odpowiedź do bazy
-    original_update = gui_instance.update_after_response
-    
-    def enhanced_update_after_response(message, cost):
-        # Wywołaj oryginalną metodę
-        original_update(message, cost)
-        
-        # Zapisz odpowiedź asystenta do bazy
-        if gui_instance.current_conversation_id:
+    # Zapisuj odpowiedź asystenta do bazy (z wątku roboczego, po zakończeniu streamu)
+    def save_response_to_db(session, request, result, cost):
+        if request.conversation_id:
             gui_instance.db.add_message(
-                conversation_id=gui_instance.current_conversation_id,
+                conversation_id=request.conversation_id,
                 role="assistant",
-                content=message,
-                output_tokens=len(message) // 4,  # Przybliżone
-                cost=cost
+                content=result.text,
+                output_tokens=result.output_tokens,
+                cost=cost,
+                timing=result.timing,
+                thinking=result.thinking or None,
+                thinking_tokens=result.thinking_tokens
             )
             
             # Odśwież listę w panelu historii jeśli jest otwarty
-            if hasattr(history_panel, 'load_conversations'):
-                history_panel.load_conversations()
+            if hasattr(history_panel, 'refresh_conversations'):
+                gui_instance.root.after(0, history_panel.refresh_conversations)
     
-    gui_instance.update_after_response = enhanced_update_after_response
+    gui_instance.save_response = save_response_to_db
     
     # Dodaj przycisk "Nowa rozmowa" do głównego interfejsu
     def start_new_conversation():
@@ -476,7 +864,7 @@ def integrate_database_with_gui(gui_instance):
             # Wyczyść obecną rozmowę
             gui_instance.conversation_history.clear()
             gui_instance.chat_display.delete("1.0", tk.END)
-            gui_instance.history_listbox.delete(0, tk.END)
+            gui_instance.update_history_list()
             gui_instance.current_conversation_id = None
             gui_instance.update_status("Rozpoczęto nową rozmowę", "success")
     
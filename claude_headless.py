@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Tryb wsadowy (bez GUI) dla Claude GUI Assistant
+Przepuszcza plik JSONL z promptami przez ten sam silnik zapytań, konfigurację
+modeli (MODELS) i liczenie kosztów (TokenStats) co GUI, z ograniczoną pulą
+wątków i harmonogramem limitów API (claude_ratelimit). Wyniki trafiają do JSONL i opcjonalnie do bazy.
+
+Format wejścia (jedna linia = jedno zapytanie):
+    {"id": "q1", "prompt": "...", "system": "...", "model": "haiku-3.5",
+     "temperature": 0.0, "thinking_budget": 4000, "messages": [...]}
+Wymagane jest tylko "prompt" (lub "messages").
+
+Użycie:
+    python claude_headless.py prompts.jsonl -o results.jsonl --model sonnet-4 --concurrency 8 --db
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional
+
+from claude_models import MODELS, TokenStats
+from claude_engine import RequestEngine, RequestSettings, create_client
+from claude_ratelimit import RateLimitScheduler
+from claude_telemetry import LatencyTracker, describe_latency
+
+
+class HeadlessRunner:
+    """Przetwarza zapytania wsadowo z ograniczoną współbieżnością"""
+
+    def __init__(self, client, default_settings: RequestSettings, concurrency: int = 4,
+                 max_retries: int = 5, db=None, cache=None):
+        # Limity modelu i ponawianie 429/529 - wspólne dla wszystkich wątków
+        self.scheduler = RateLimitScheduler(max_attempts=max_retries + 1, on_retry=self.report_retry)
+        self.engine = RequestEngine(client, scheduler=self.scheduler, cache=cache)
+        self.default_settings = default_settings
+        self.concurrency = max(1, concurrency)
+        self.db = db
+
+        self.token_stats = TokenStats()
+        self.latency = LatencyTracker(max_samples=100_000)
+        self._stats_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+        self.completed = 0
+        self.failed = 0
+
+    def settings_for(self, item: Dict) -> RequestSettings:
+        """Ustawienia zapytania: domyślne z CLI nadpisane polami z linii wejścia"""
+        base = self.default_settings
+        model = MODELS[item["model"]] if item.get("model") else base.model
+        thinking_budget = item.get("thinking_budget")
+
+        return RequestSettings(
+            model=model,
+            system_prompt=item.get("system", base.system_prompt),
+            temperature=item.get("temperature", base.temperature),
+            thinking_enabled=bool(thinking_budget) if thinking_budget is not None else base.thinking_enabled,
+            thinking_budget=thinking_budget or base.thinking_budget
+        )
+
+    def process(self, item: Dict) -> Dict:
+        """Wykonuje jedno zapytanie z ponawianiem błędów przejściowych"""
+        started = time.perf_counter()
+        if "parse_error" in item:
+            print(f"[HEADLESS] ❌ {item['parse_error']}")
+            return self._fail(item, self.default_settings, item["parse_error"], started)
+        try:
+            settings = self.settings_for(item)
+        except KeyError as e:
+            return self._fail(item, self.default_settings, f"Nieznany model: {e.args[0]}", started,
+                              model_id=item.get("model"))
+
+        messages = list(item.get("messages") or [])
+        if item.get("prompt"):
+            messages.append({"role": "user", "content": item["prompt"]})
+
+        try:
+            result = self.engine.stream(settings, messages)
+        except Exception as e:
+            return self._fail(item, settings, str(e), started)
+
+        if not result.cached:
+            self.latency.add(settings.model.id, result.timing)
+
+        with self._stats_lock:
+            # Koszt liczony także gdy zapis do bazy się nie uda - odpowiedź została opłacona
+            cost = self.token_stats.add_usage(result.input_tokens, result.output_tokens, settings.model,
+                                              cached=result.cached, thinking_tokens=result.thinking_tokens)
+
+        try:
+            conversation_id = self._persist(item, settings, messages, result, cost)
+        except Exception as e:
+            conversation_id, error = None, str(e)
+        else:
+            error = "Zapis do bazy nieudany" if self.db is not None and not conversation_id else None
+        if error:
+            print(f"[HEADLESS] ❌ {item.get('id')}: {error}")
+            return self._fail(item, settings, error, started, result=result, cost=cost)
+
+        with self._stats_lock:
+            self.completed += 1
+        return self._record(item, settings, result=result, cost=cost, attempts=result.attempts,
+                            duration=time.perf_counter() - started, conversation_id=conversation_id)
+
+    def _fail(self, item: Dict, settings: RequestSettings, error: str, started: float,
+              result=None, cost: float = 0.0, model_id: Optional[str] = None) -> Dict:
+        """Rekord błędu (z odpowiedzią, jeśli ją otrzymano) i licznik nieudanych"""
+        with self._stats_lock:
+            self.failed += 1
+        record = self._record(item, settings, result=result, cost=cost, error=error,
+                              attempts=result.attempts if result is not None else None,
+                              duration=time.perf_counter() - started)
+        if model_id:
+            record["model"] = model_id
+        return record
+
+    def _persist(self, item: Dict, settings: RequestSettings, messages, result, cost) -> Optional[int]:
+        """Zapisuje zapytanie i odpowiedź w bazie (tak jak robi to GUI)"""
+        if self.db is None:
+            return None
+
+        return self.db.save_exchange(
+            messages, result.text,
+            model_id=settings.model.id,
+            model_name=settings.model.name,
+            system_prompt=settings.system_prompt,
+            temperature=settings.temperature,
+            input_tokens=result.input_tokens,
+            output_tokens=result.output_tokens,
+            cost=cost,
+            title=item.get("title"),
+            timing=result.timing,
+            thinking=result.thinking or None,
+            thinking_tokens=result.thinking_tokens
+        )
+
+    def _record(self, item: Dict, settings: RequestSettings, result=None, cost: float = 0.0,
+                error: Optional[str] = None, attempts: Optional[int] = None, duration: float = 0.0,
+                conversation_id: Optional[int] = None) -> Dict:
+        record = {
+            "id": item.get("id"),
+            "model": settings.model.id,
+            "duration_s": round(duration, 3)
+        }
+        if attempts is not None:
+            record["attempts"] = attempts
+        if result is not None:
+            record.update({
+                "response": result.text,
+                "input_tokens": result.input_tokens,
+                "output_tokens": result.output_tokens,
+                "cost": cost,
+                "stop_reason": result.stop_reason
+            })
+            if result.thinking:
+                record["thinking"] = result.thinking
+                record["thinking_tokens"] = result.thinking_tokens
+            if result.cached:
+                record["cached"] = True
+            if result.timing:
+                record["timing"] = result.timing
+        if conversation_id:
+            record["conversation_id"] = conversation_id
+        if error:
+            record["error"] = error
+        return record
+
+    def run(self, items: Iterator[Dict], output_file, total: Optional[int] = None) -> Dict:
+        """Przetwarza wszystkie zapytania; wyniki zapisywane na bieżąco"""
+        started = time.perf_counter()
+        last_report = started
+        # Ograniczona liczba zadań w kolejce - wejście czytane leniwie
+        slots = threading.BoundedSemaphore(self.concurrency * 2)
+
+        errors = []
+
+        def handle(item):
+            try:
+                try:
+                    record = self.process(item)
+                except Exception as e:
+                    # Nieprzewidziany błąd - zapytanie i tak dostaje rekord w wynikach
+                    print(f"[HEADLESS] ❌ {item.get('id')}: {e}")
+                    record = self._fail(item, self.default_settings, str(e), time.perf_counter())
+                with self._write_lock:
+                    output_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    output_file.flush()
+            finally:
+                slots.release()
+
+        def check(future):
+            # Błąd zapisu wyników - nie może zniknąć w wątku puli
+            if future.exception() is not None:
+                print(f"[HEADLESS] ❌ Zapis wyniku nieudany: {future.exception()}")
+                errors.append(future.exception())
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for item in items:
+                slots.acquire()
+                pool.submit(handle, item).add_done_callback(check)
+
+                now = time.perf_counter()
+                if now - last_report >= 5:
+                    last_report = now
+                    self.report_progress(started, total)
+
+        self.report_progress(started, total)
+        if errors:
+            raise errors[0]
+        for model_id, summary in self.latency.summaries().items():
+            print(f"[HEADLESS] {model_id}: {describe_latency(summary)}")
+
+        elapsed = time.perf_counter() - started
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.scheduler.retries,
+            "rate_limit_wait_s": self.scheduler.total_wait,
+            "elapsed_s": elapsed,
+            "requests_per_minute": (self.completed + self.failed) / elapsed * 60 if elapsed else 0.0,
+            "input_tokens": self.token_stats.total_input_tokens,
+            "output_tokens": self.token_stats.total_output_tokens,
+            "thinking_tokens": self.token_stats.total_thinking_tokens,
+            "cost": self.token_stats.session_cost,
+            "cache_hits": self.token_stats.cache_hits,
+            "latency": self.latency.summaries()
+        }
+
+    def report_retry(self, retry: Dict):
+        print(f"[HEADLESS] {retry['error']} ({retry['status'] or 'sieć'}), ponawiam za {retry['delay']:.1f}s "
+              f"(próba {retry['attempt'] + 1}/{retry['max_attempts']})")
+
+    def report_progress(self, started: float, total: Optional[int]):
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        done = self.completed + self.failed
+        total_text = f"/{total}" if total else ""
+        print(f"[HEADLESS] {done}{total_text} (błędy: {self.failed}, ponowienia: {self.scheduler.retries}) | "
+              f"{done / elapsed * 60:.0f} zapytań/min | koszt ${self.token_stats.session_cost:.4f}")
+
+
+def iter_prompts(filepath: str, skip_ids=None) -> Iterator[Dict]:
+    """
+    Czyta zapytania z pliku JSONL linia po linii. Niepoprawna linia nie przerywa przebiegu -
+    daje zapytanie z 'parse_error' (ID = numer linii), które trafia do wyników jako błąd
+    """
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"id": line_no, "parse_error": f"Linia {line_no}: niepoprawny JSON ({e})"}
+                continue
+            if not isinstance(item, dict):
+                yield {"id": line_no, "parse_error": f"Linia {line_no}: oczekiwano obiektu JSON"}
+                continue
+            item.setdefault("id", line_no)
+            if skip_ids and item["id"] in skip_ids:
+                continue
+            yield item
+
+
+def completed_ids(filepath: str) -> set:
+    """ID zapytań już obecnych w pliku wyników (do wznowienia)"""
+    done = set()
+    if not os.path.exists(filepath):
+        return done
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" not in record:
+                done.add(record.get("id"))
+    return done
+
+
+def main(argv=None):
+    """Punkt wejścia CLI"""
+    parser = argparse.ArgumentParser(description="Wsadowe przetwarzanie promptów przez API Claude")
+    parser.add_argument("input", help="Plik JSONL z zapytaniami")
+    parser.add_argument("-o", "--output", default="results.jsonl", help="Plik JSONL z wynikami")
+    parser.add_argument("--model", default="sonnet-4", choices=list(MODELS.keys()))
+    parser.add_argument("--system", default="Jesteś pomocnym asystentem AI.", help="System prompt")
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--thinking-budget", type=int, default=0,
+                        help="Budżet Extended Thinking (0 = wyłączone)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Liczba równoległych zapytań")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--cache", action="store_true",
+                        help="Odpowiadaj z cache na identyczne zapytania (tylko temperature 0)")
+    parser.add_argument("--cache-any-temperature", action="store_true",
+                        help="Cache także dla temperature > 0 i Extended Thinking")
+    parser.add_argument("--resume", action="store_true", help="Pomiń zapytania obecne już w pliku wyników")
+    parser.add_argument("--db", action="store_true", help="Zapisuj rozmowy w bazie (DatabaseManager)")
+    parser.add_argument("--db-url", help="URL bazy (domyślnie konfiguracja z .env)")
+    parser.add_argument("--base-url", help="Adres API (np. lokalny serwer testowy)")
+    args = parser.parse_args(argv)
+
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    api_key = os.getenv("ANTHROPIC_API_KEY")
+    if not api_key:
+        print("[HEADLESS] ❌ Brak ANTHROPIC_API_KEY")
+        return 1
+
+    db = None
+    if args.db:
+        from claude_db_extension import DatabaseManager
+        db = DatabaseManager(db_url=args.db_url)
+
+    default_settings = RequestSettings(
+        model=MODELS[args.model],
+        system_prompt=args.system,
+        temperature=args.temperature,
+        thinking_enabled=args.thinking_budget > 0,
+        thinking_budget=args.thinking_budget or MODELS[args.model].default_thinking_budget
+    )
+
+    # Ponawianiem zajmuje się RateLimitScheduler (z pauzą wspólną dla wszystkich wątków)
+    client = create_client(api_key, base_url=args.base_url, max_retries=0)
+    cache = None
+    if args.cache or args.cache_any_temperature:
+        from claude_cache import ResponseCache
+        cache = ResponseCache(allow_nondeterministic=args.cache_any_temperature)
+
+    runner = HeadlessRunner(client, default_settings, concurrency=args.concurrency,
+                            max_retries=args.max_retries, db=db, cache=cache)
+
+    skip_ids = completed_ids(args.output) if args.resume else None
+    with open(args.input, 'r', encoding='utf-8') as f:
+        total = sum(1 for line in f if line.strip()) - (len(skip_ids) if skip_ids else 0)
+
+    with open(args.output, 'a' if args.resume else 'w', encoding='utf-8') as output_file:
+        summary = runner.run(iter_prompts(args.input, skip_ids), output_file, total=total)
+
+    print(f"[HEADLESS] Gotowe: {json.dumps(summary, ensure_ascii=False)}")
+    return 0 if summary["failed"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
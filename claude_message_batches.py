@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Tryb Message Batches API dla Claude GUI Assistant
+Pakuje wiele zapytań (z pliku JSONL lub z wybranych rozmów w bazie) w zadania
+wsadowe, odpytuje o wyniki w tle i zapisuje je przez DatabaseManager z ceną
+obniżoną dla batchy (TokenStats). Stan zadań trzymany jest w pliku, więc
+wyniki można odebrać także po ponownym uruchomieniu.
+
+Użycie:
+    python claude_message_batches.py submit prompts.jsonl --model haiku-3.5 --wait --db
+    python claude_message_batches.py submit --conversations 3,5,8 --prompt "Podsumuj rozmowę" --db
+    python claude_message_batches.py poll --db
+    python claude_message_batches.py status
+
+Do testów bez kosztów: python claude_fake_api.py, a potem --base-url http://127.0.0.1:8765
+"""
+
+import os
+import sys
+import json
+import argparse
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from claude_models import MODELS, TokenStats, model_by_id
+from claude_engine import RequestSettings, build_request_params, create_client, split_thinking_tokens
+
+# Limit API to 100 000 zapytań na batch - mniejsze paczki szybciej wracają
+BATCH_MAX_REQUESTS = 10_000
+POLL_INTERVAL = 30
+# Co ile odebranych wyników zapisywać postęp odbioru (wznowienie bez duplikatów)
+COLLECT_SAVE_EVERY = 100
+JOBS_FILE = "batch_jobs.json"
+DEFAULT_MODEL = "sonnet-4"
+
+
+def items_from_file(filepath: str, default_settings: RequestSettings) -> List[Dict]:
+    """Zapytania z pliku JSONL (ten sam format co claude_headless.py)"""
+    items = []
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            messages = list(data.get("messages") or [])
+            if data.get("prompt"):
+                messages.append({"role": "user", "content": data["prompt"]})
+
+            model = default_settings.model
+            if data.get("model"):
+                # Nieznany model odrzuca plik przed wysłaniem - bez cichej podmiany na inny
+                model = model_by_id(data["model"], default=None)
+                if model is None:
+                    raise ValueError(f"Linia {line_no}: nieznany model {data['model']!r}")
+
+            thinking_budget = data.get("thinking_budget")
+            settings = RequestSettings(
+                model=model,
+                system_prompt=data.get("system", default_settings.system_prompt),
+                temperature=data.get("temperature", default_settings.temperature),
+                thinking_enabled=bool(thinking_budget) if thinking_budget is not None else default_settings.thinking_enabled,
+                thinking_budget=thinking_budget or default_settings.thinking_budget
+            )
+            items.append({
+                "id": data.get("id", line_no),
+                "settings": settings,
+                "messages": messages,
+                "new_messages": messages,
+                "title": data.get("title")
+            })
+    return items
+
+
+def items_from_conversations(db, conversation_ids: Iterable[int], default_settings: RequestSettings,
+                             prompt: Optional[str] = None) -> List[Dict]:
+    """
+    Zapytania z rozmów zapisanych w bazie. Z promptem - dopisywany jako nowa
+    wiadomość użytkownika; bez niego - odpowiedź na ostatnią wiadomość rozmowy.
+    """
+    items = []
+    for conv_id in conversation_ids:
+        conversation = db.get_conversation_with_messages(conv_id)
+        if not conversation:
+            print(f"[BATCH] Pominięto rozmowę {conv_id} - nie znaleziono")
+            continue
+
+        history = [{"role": m["role"], "content": m["content"]} for m in conversation["messages"]]
+        new_messages = [{"role": "user", "content": prompt}] if prompt else []
+        messages = history + new_messages
+        if not messages or messages[-1]["role"] != "user":
+            print(f"[BATCH] Pominięto rozmowę {conv_id} - brak pytania do wysłania")
+            continue
+
+        settings = RequestSettings(
+            model=default_settings.model,
+            system_prompt=conversation.get("system_prompt") or default_settings.system_prompt,
+            temperature=conversation.get("temperature", default_settings.temperature),
+            thinking_enabled=default_settings.thinking_enabled,
+            thinking_budget=default_settings.thinking_budget
+        )
+        items.append({
+            "id": f"conversation-{conv_id}",
+            "settings": settings,
+            "messages": messages,
+            "new_messages": new_messages,
+            "conversation_id": conv_id
+        })
+    return items
+
+
+class BatchJobStore:
+    """Stan zadań wsadowych w pliku JSON (przeżywa restart aplikacji)"""
+
+    def __init__(self, filepath: str = JOBS_FILE):
+        self.filepath = filepath
+        self._lock = threading.Lock()
+        self.jobs: Dict[str, Dict] = {}
+        if os.path.exists(filepath):
+            with open(filepath, 'r', encoding='utf-8') as f:
+                self.jobs = json.load(f)
+
+    def save(self):
+        with self._lock:
+            tmp_path = self.filepath + ".part"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.jobs, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.filepath)
+
+    def add(self, job: Dict):
+        self.jobs[job["batch_id"]] = job
+        self.save()
+
+    def update(self, batch_id: str, **fields):
+        self.jobs[batch_id].update(fields)
+        self.save()
+
+    def pending(self) -> List[Dict]:
+        return [job for job in self.jobs.values() if not job.get("collected")]
+
+
+class BatchRunner:
+    """Wysyła zadania wsadowe, odpytuje o status i odbiera wyniki"""
+
+    def __init__(self, client, db=None, token_stats: Optional[TokenStats] = None,
+                 store: Optional[BatchJobStore] = None):
+        self.client = client
+        self.db = db
+        self.token_stats = token_stats or TokenStats()
+        self.store = store or BatchJobStore()
+        self._stop = threading.Event()
+
+    def submit(self, items: List[Dict], output_path: Optional[str] = None) -> List[str]:
+        """Wysyła zapytania paczkami po BATCH_MAX_REQUESTS; zwraca ID batchy"""
+        batch_ids = []
+        for start in range(0, len(items), BATCH_MAX_REQUESTS):
+            chunk = items[start:start + BATCH_MAX_REQUESTS]
+            requests = []
+            job_requests = {}
+
+            for index, item in enumerate(chunk):
+                # custom_id musi pasować do [a-zA-Z0-9_-]{1,64} - oryginalne ID trzymamy w stanie
+                custom_id = f"req-{start + index}"
+                requests.append({
+                    "custom_id": custom_id,
+                    "params": build_request_params(item["settings"], item["messages"])
+                })
+                settings = item["settings"]
+                job_requests[custom_id] = {
+                    "id": item["id"],
+                    "model": settings.model.id,
+                    "system_prompt": settings.system_prompt,
+                    "temperature": settings.temperature,
+                    "new_messages": item["new_messages"],
+                    "conversation_id": item.get("conversation_id"),
+                    "title": item.get("title")
+                }
+
+            batch = self.client.messages.batches.create(requests=requests)
+            self.store.add({
+                "batch_id": batch.id,
+                "created_at": datetime.now().isoformat(),
+                "status": batch.processing_status,
+                "output": output_path,
+                "requests": job_requests,
+                "collected": False
+            })
+            batch_ids.append(batch.id)
+            print(f"[BATCH] Wysłano batch {batch.id} ({len(requests)} zapytań)")
+
+        return batch_ids
+
+    def poll_once(self) -> List[Dict]:
+        """Sprawdza status niezakończonych batchy; odbiera gotowe wyniki"""
+        summaries = []
+        for job in self.store.pending():
+            batch = self.client.messages.batches.retrieve(job["batch_id"])
+            if batch.processing_status != job.get("status"):
+                self.store.update(job["batch_id"], status=batch.processing_status)
+
+            if batch.processing_status == "ended":
+                summaries.append(self.collect(job["batch_id"]))
+            else:
+                counts = batch.request_counts
+                print(f"[BATCH] {job['batch_id']}: {batch.processing_status} "
+                      f"(w toku: {counts.processing}, gotowe: {counts.succeeded}, błędy: {counts.errored})")
+        return summaries
+
+    def collect(self, batch_id: str) -> Dict:
+        """
+        Odbiera wyniki zakończonego batcha, liczy koszt i zapisuje w bazie.
+        Odebrane custom_id zapisywane są w stanie zadania, więc ponowienie po błędzie
+        w połowie pomija wyniki już dopisane do pliku i bazy.
+        """
+        job = self.store.jobs[batch_id]
+        collected = set(job.get("collected_ids") or [])
+        succeeded = failed = 0
+        batch_cost = 0.0
+        usage = []
+        output_file = open(job["output"], 'a', encoding='utf-8') if job.get("output") else None
+
+        try:
+            for entry in self.client.messages.batches.results(batch_id):
+                request = job["requests"].get(entry.custom_id)
+                if request is None or entry.custom_id in collected:
+                    continue
+                record = {"id": request["id"], "model": request["model"], "batch_id": batch_id}
+
+                if entry.result.type == "succeeded":
+                    record.update(self._handle_success(request, entry.result.message))
+                    batch_cost += record["cost"]
+                    succeeded += 1
+                    usage.append({key: record.get(key, 0) for key in
+                                  ("model", "input_tokens", "output_tokens", "thinking_tokens")})
+                else:
+                    error = getattr(entry.result, "error", None)
+                    record["error"] = f"{entry.result.type}: {error}" if error else entry.result.type
+                    failed += 1
+
+                if output_file:
+                    output_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    output_file.flush()
+                collected.add(entry.custom_id)
+                if len(collected) % COLLECT_SAVE_EVERY == 0:
+                    self.store.update(batch_id, collected_ids=sorted(collected))
+        finally:
+            if output_file:
+                output_file.close()
+            self.store.update(batch_id, collected_ids=sorted(collected))
+
+        self.store.update(batch_id, collected=True, collected_at=datetime.now().isoformat())
+        print(f"[BATCH] Odebrano {batch_id}: {succeeded} OK, {failed} błędów, koszt ${batch_cost:.4f}")
+        return {"batch_id": batch_id, "succeeded": succeeded, "failed": failed, "cost": batch_cost,
+                "usage": usage}
+
+    def _handle_success(self, request: Dict, message) -> Dict:
+        text = "".join(block.text for block in message.content if block.type == "text")
+        thinking = "".join(block.thinking for block in message.content if block.type == "thinking")
+        usage = message.usage
+        model = model_by_id(request["model"])
+        thinking_tokens = split_thinking_tokens(usage.output_tokens, text, thinking)
+        # Sama cena - statystyki dopiero po udanym zapisie, żeby ponowienie nie liczyło kosztu dwa razy
+        cost = TokenStats().add_usage(usage.input_tokens, usage.output_tokens, model, batch=True,
+                                      thinking_tokens=thinking_tokens)
+
+        record = {
+            "response": text,
+            "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cost": cost,
+            "stop_reason": message.stop_reason
+        }
+        if thinking:
+            record["thinking"] = thinking
+            record["thinking_tokens"] = thinking_tokens
+
+        if self.db is not None:
+            conversation_id = self.db.save_exchange(
+                request["new_messages"], text,
+                model_id=model.id,
+                model_name=model.name,
+                system_prompt=request["system_prompt"],
+                temperature=request["temperature"],
+                input_tokens=usage.input_tokens,
+                output_tokens=usage.output_tokens,
+                cost=cost,
+                conversation_id=request.get("conversation_id"),
+                title=request.get("title"),
+                thinking=thinking or None,
+                thinking_tokens=thinking_tokens
+            )
+            if not conversation_id:
+                # Wynik zostaje nieodebrany - kolejne odpytanie spróbuje ponownie
+                raise RuntimeError(f"Zapis wyniku {request['id']} do bazy nieudany")
+            record["conversation_id"] = conversation_id
+
+        self.token_stats.add_usage(usage.input_tokens, usage.output_tokens, model, batch=True,
+                                   thinking_tokens=thinking_tokens)
+        return record
+
+    def wait(self, poll_interval: float = POLL_INTERVAL,
+             on_collected: Optional[Callable[[Dict], None]] = None):
+        """Odpytuje aż do odebrania wszystkich batchy (lub stop())"""
+        while self.store.pending() and not self._stop.is_set():
+            try:
+                for summary in self.poll_once():
+                    if on_collected:
+                        on_collected(summary)
+            except Exception as e:
+                # Błąd sieci nie przerywa odpytywania - spróbuj ponownie później
+                print(f"[BATCH ERROR] {e}")
+
+            if self.store.pending():
+                self._stop.wait(poll_interval)
+
+    def start_background_polling(self, poll_interval: float = POLL_INTERVAL,
+                                 on_collected: Optional[Callable[[Dict], None]] = None) -> threading.Thread:
+        """Odpytuje w wątku tle - callback wywoływany w tym wątku"""
+        self._stop.clear()
+        thread = threading.Thread(target=self.wait, args=(poll_interval, on_collected), daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+
+def main(argv=None):
+    """Punkt wejścia CLI"""
+    parser = argparse.ArgumentParser(description="Zapytania wsadowe przez Message Batches API")
+    parser.add_argument("--base-url", help="Adres API (np. lokalny claude_fake_api.py)")
+    parser.add_argument("--jobs-file", default=JOBS_FILE, help="Plik ze stanem zadań")
+    parser.add_argument("--db", action="store_true", help="Zapisuj wyniki w bazie (DatabaseManager)")
+    parser.add_argument("--db-url", help="URL bazy (domyślnie konfiguracja z .env)")
+    parser.add_argument("--poll-interval", type=float, default=POLL_INTERVAL)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    submit = sub.add_parser("submit", help="Wyślij zapytania jako batch")
+    submit.add_argument("input", nargs="?", help="Plik JSONL z zapytaniami")
+    submit.add_argument("--conversations", help="ID rozmów z bazy, rozdzielone przecinkami")
+    submit.add_argument("--prompt", help="Pytanie dopisywane do każdej rozmowy")
+    submit.add_argument("-o", "--output", default="batch_results.jsonl", help="Plik JSONL z wynikami")
+    submit.add_argument("--model", default=DEFAULT_MODEL, choices=list(MODELS.keys()))
+    submit.add_argument("--system", default="Jesteś pomocnym asystentem AI.")
+    submit.add_argument("--temperature", type=float, default=0.7)
+    submit.add_argument("--thinking-budget", type=int, default=0)
+    submit.add_argument("--wait", action="store_true", help="Czekaj na wyniki")
+
+    poll = sub.add_parser("poll", help="Odbierz wyniki niezakończonych batchy")
+    poll.add_argument("--once", action="store_true", help="Sprawdź raz zamiast czekać")
+
+    sub.add_parser("status", help="Pokaż zapisane zadania")
+    args = parser.parse_args(argv)
+
+    store = BatchJobStore(args.jobs_file)
+    if args.command == "status":
+        for job in store.jobs.values():
+            state = "odebrany" if job.get("collected") else job.get("status")
+            print(f"[BATCH] {job['batch_id']}: {state}, {len(job['requests'])} zapytań, wysłano {job['created_at']}")
+        return 0
+
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    api_key = os.getenv("ANTHROPIC_API_KEY")
+    if not api_key:
+        print("[BATCH] ❌ Brak ANTHROPIC_API_KEY")
+        return 1
+
+    db = None
+    if args.db or (args.command == "submit" and args.conversations):
+        from claude_db_extension import DatabaseManager
+        db = DatabaseManager(db_url=args.db_url)
+
+    runner = BatchRunner(create_client(api_key, base_url=args.base_url), db=db if args.db else None,
+                         store=store)
+
+    if args.command == "submit":
+        default_settings = RequestSettings(
+            model=MODELS[args.model],
+            system_prompt=args.system,
+            temperature=args.temperature,
+            thinking_enabled=args.thinking_budget > 0,
+            thinking_budget=args.thinking_budget or MODELS[args.model].default_thinking_budget
+        )
+        if args.conversations:
+            ids = [int(value) for value in args.conversations.split(",") if value.strip()]
+            items = items_from_conversations(db, ids, default_settings, args.prompt)
+        elif args.input:
+            try:
+                items = items_from_file(args.input, default_settings)
+            except ValueError as e:
+                print(f"[BATCH] ❌ {e}")
+                return 1
+        else:
+            parser.error("podaj plik z zapytaniami albo --conversations")
+
+        if not items:
+            print("[BATCH] Brak zapytań do wysłania")
+            return 1
+
+        runner.submit(items, output_path=args.output)
+        if not args.wait:
+            print("[BATCH] Wyniki odbierzesz poleceniem: python claude_message_batches.py poll")
+            return 0
+
+    if args.command == "poll" and args.once:
+        runner.poll_once()
+    else:
+        runner.wait(args.poll_interval)
+
+    stats = runner.token_stats
+    print(f"[BATCH] Koszt: ${stats.session_cost:.4f} (oszczędność batch: ${stats.batch_savings:.4f})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Konfiguracja modeli Claude i liczenie kosztów dla Claude GUI Assistant
+Moduł bez zależności od GUI - używany przez interfejs i tryb wsadowy
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class ModelConfig:
+    """Pełna konfiguracja modelu Claude"""
+    id: str
+    name: str
+    description: str
+    strengths: str
+    max_output_tokens: int
+    context_window: str
+    latency: str
+    vision: bool = True
+    multilingual: bool = True
+    extended_thinking: bool = False
+    priority_tier: bool = False
+    training_cutoff: str = ""
+    # Koszty (w $ za milion tokenów)
+    input_cost: float = 0.0
+    output_cost: float = 0.0
+    # Message Batches API - zniżka od ceny standardowej (0.5 = 50%)
+    batch_discount: float = 0.5
+    # Cache promptu - mnożniki ceny wejścia: zapis do cache i odczyt z cache
+    cache_write_multiplier: float = 1.25
+    cache_read_multiplier: float = 0.1
+    # Extended Thinking settings
+    default_thinking_enabled: bool = False
+    default_thinking_budget: int = 10000
+    max_thinking_budget: int = 32000
+
+# Pełna konfiguracja wszystkich modeli
+MODELS = {
+    "opus-4.1": ModelConfig(
+        id="claude-opus-4-1-20250805",
+        name="Claude Opus 4.1",
+        description="Nasz najbardziej zaawansowany model",
+        strengths="Najwyższy poziom inteligencji i możliwości",
+        max_output_tokens=32000,
+        context_window="200K",
+        latency="Umiarkowanie szybki",
+        extended_thinking=True,
+        priority_tier=True,
+        training_cutoff="Mar 2025",
+        input_cost=15.0,
+        output_cost=75.0,
+        default_thinking_enabled=True,  # Domyślnie włączone dla Opus 4.1
+        default_thinking_budget=16000,
+        max_thinking_budget=32000
+    ),
+    "opus-4": ModelConfig(
+        id="claude-opus-4-20240229",
+        name="Claude Opus 4",
+        description="Poprzedni flagowy model",
+        strengths="Bardzo wysoka inteligencja i możliwości",
+        max_output_tokens=32000,
+        context_window="200K",
+        latency="Umiarkowanie szybki",
+        extended_thinking=True,
+        priority_tier=True,
+        training_cutoff="Mar 2025",
+        input_cost=12.0,
+        output_cost=60.0
+    ),
+    "sonnet-4": ModelConfig(
+        id="claude-sonnet-4-20250514",
+        name="Claude Sonnet 4",
+        description="Model o wysokiej wydajności",
+        strengths="Wysoka inteligencja i zbalansowana wydajność",
+        max_output_tokens=64000,
+        context_window="200K / 1M (beta)",
+        latency="Szybki",
+        extended_thinking=True,
+        priority_tier=True,
+        training_cutoff="Mar 2025",
+        input_cost=3.0,
+        output_cost=15.0
+    ),
+    "sonnet-3.7": ModelConfig(
+        id="claude-sonnet-3.7-20241029",
+        name="Claude Sonnet 3.7",
+        description="Model z rozszerzonym myśleniem",
+        strengths="Wysoka inteligencja z przełączalnym rozszerzonym myśleniem",
+        max_output_tokens=64000,
+        context_window="200K",
+        latency="Szybki",
+        extended_thinking=True,
+        priority_tier=True,
+        training_cutoff="Nov 2024",
+        input_cost=3.0,
+        output_cost=15.0
+    ),
+    "haiku-3.5": ModelConfig(
+        id="claude-3-5-haiku-20241022",
+        name="Claude Haiku 3.5",
+        description="Nasz najszybszy model",
+        strengths="Inteligencja w błyskawicznej prędkości",
+        max_output_tokens=8192,
+        context_window="200K",
+        latency="Najszybszy",
+        extended_thinking=False,
+        priority_tier=True,
+        training_cutoff="July 2024",
+        input_cost=1.0,
+        output_cost=5.0
+    ),
+    "haiku-3": ModelConfig(
+        id="claude-3-haiku-20240307",
+        name="Claude Haiku 3",
+        description="Szybki i kompaktowy model",
+        strengths="Szybka i dokładna wydajność",
+        max_output_tokens=4096,
+        context_window="200K",
+        latency="Szybki",
+        extended_thinking=False,
+        priority_tier=False,
+        training_cutoff="Aug 2023",
+        input_cost=0.25,
+        output_cost=1.25
+    )
+}
+
+class TokenStats:
+    """Klasa do śledzenia statystyk tokenów"""
+    def __init__(self):
+        self.total_input_tokens = 0
+        self.total_output_tokens = 0
+        self.session_cost = 0.0
+        self.messages_count = 0
+        self.batch_messages = 0
+        self.batch_savings = 0.0
+        self.cache_hits = 0
+        self.cache_savings = 0.0
+        # Cache promptu po stronie API (wspólne prefiksy rozmów i gałęzi)
+        self.prompt_cache_read_tokens = 0
+        self.prompt_cache_write_tokens = 0
+        self.prompt_cache_savings = 0.0
+        # Extended Thinking - część tokenów wyjściowych (płatna jak wyjście)
+        self.total_thinking_tokens = 0
+        
+    def add_usage(self, input_tokens: int, output_tokens: int, model: ModelConfig,
+                  batch: bool = False, cached: bool = False,
+                  cache_read_tokens: int = 0, cache_write_tokens: int = 0,
+                  thinking_tokens: int = 0):
+        # Odpowiedź z cache nie kosztuje - liczymy tylko zaoszczędzoną kwotę
+        if cached:
+            self.messages_count += 1
+            self.cache_hits += 1
+            self.cache_savings += (input_tokens * model.input_cost + output_tokens * model.output_cost) / 1_000_000
+            return 0.0
+        
+        self.total_input_tokens += input_tokens
+        self.total_output_tokens += output_tokens
+        self.total_thinking_tokens += thinking_tokens
+        self.messages_count += 1
+        
+        # Oblicz koszt (ceny są za milion tokenów)
+        input_cost = (input_tokens / 1_000_000) * model.input_cost
+        
+        # Prefiks z cache promptu: zapis droższy, odczyt ułamkiem ceny wejścia
+        if cache_read_tokens or cache_write_tokens:
+            self.prompt_cache_read_tokens += cache_read_tokens
+            self.prompt_cache_write_tokens += cache_write_tokens
+            self.total_input_tokens += cache_read_tokens + cache_write_tokens
+            input_cost += (cache_write_tokens * model.cache_write_multiplier +
+                           cache_read_tokens * model.cache_read_multiplier) * model.input_cost / 1_000_000
+            self.prompt_cache_savings += (cache_read_tokens * (1 - model.cache_read_multiplier) -
+                                          cache_write_tokens * (model.cache_write_multiplier - 1)) * model.input_cost / 1_000_000
+        
+        output_cost = (output_tokens / 1_000_000) * model.output_cost
+        cost = input_cost + output_cost
+        
+        # Zapytania z Message Batches API są tańsze
+        if batch:
+            discounted = cost * (1 - model.batch_discount)
+            self.batch_messages += 1
+            self.batch_savings += cost - discounted
+            cost = discounted
+        
+        self.session_cost += cost
+        
+        return cost
+
+
+def model_by_id(model_id, default: Optional[str] = "sonnet-4") -> Optional[ModelConfig]:
+    """Konfiguracja modelu po identyfikatorze API (lub kluczu MODELS); default=None - brak zastępstwa"""
+    if model_id in MODELS:
+        return MODELS[model_id]
+    for model in MODELS.values():
+        if model.id == model_id:
+            return model
+    return MODELS[default] if default else None
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Harmonogram zapytań z limitami API dla Claude GUI Assistant
+Śledzi budżety zapytań i tokenów każdego modelu z nagłówków
+anthropic-ratelimit-*, wpuszcza zapytania przez kubełki tokenów, a po
+429/529 i błędach sieci ponawia je z wykładniczym opóźnieniem z jitterem.
+"""
+
+import time
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from claude_engine import backoff_delay, error_status_code, is_retryable_error, retry_after_seconds
+
+# Nagłówki limitów: nazwa kubełka -> prefiks nagłówka
+RATELIMIT_HEADERS = {
+    "requests": "anthropic-ratelimit-requests",
+    "input_tokens": "anthropic-ratelimit-input-tokens",
+    "output_tokens": "anthropic-ratelimit-output-tokens",
+}
+# Starsze konta zwracają wspólny limit tokenów
+COMBINED_TOKENS_HEADER = "anthropic-ratelimit-tokens"
+
+# Po tych kodach czeka cały model, nie tylko jedno zapytanie
+MODEL_COOLDOWN_STATUS_CODES = {429, 529}
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Czas resetu limitu (RFC 3339) jako znacznik time.time()"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """Kubełek tokenów; bez znanego limitu przepuszcza wszystko"""
+
+    def __init__(self, capacity: Optional[float] = None, per_minute: Optional[float] = None):
+        self.capacity = capacity
+        self.rate = (per_minute or capacity or 0) / 60.0
+        self.tokens = capacity or 0.0
+        self.updated = time.monotonic()
+
+    @property
+    def known(self) -> bool:
+        return self.capacity is not None
+
+    def _refill(self, now: float):
+        if self.known:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Ile sekund do momentu, gdy w kubełku będzie `amount` tokenów"""
+        if not self.known:
+            return 0.0
+        self._refill(now)
+        # Zapytanie większe niż cały kubełek - czekamy na pełny kubełek
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        if self.rate <= 0:
+            return 1.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        if self.known:
+            self.tokens -= min(amount, self.capacity)
+
+    def sync(self, limit: float, remaining: float, reset_at: Optional[float]):
+        """Ustawia stan kubełka na podstawie odpowiedzi serwera"""
+        now = time.monotonic()
+        self.capacity = limit
+        self.rate = limit / 60.0
+        self.tokens = min(limit, remaining)
+        self.updated = now
+
+        # Serwer podaje dokładny czas uzupełnienia - użyj go, jeśli jest wolniejszy
+        if reset_at is not None and remaining < limit:
+            seconds = reset_at - time.time()
+            if seconds > 0:
+                self.rate = min(self.rate, (limit - remaining) / seconds)
+
+
+class ModelBudget:
+    """Budżety jednego modelu: zapytania, tokeny wejściowe i wyjściowe"""
+
+    def __init__(self):
+        self.buckets: Dict[str, TokenBucket] = {name: TokenBucket() for name in RATELIMIT_HEADERS}
+        self.cooldown_until = 0.0
+
+    def wait_time(self, input_tokens: int, now: float) -> float:
+        return max(
+            self.cooldown_until - now,
+            self.buckets["requests"].wait_time(1, now),
+            self.buckets["input_tokens"].wait_time(input_tokens, now),
+            # Wyjścia nie da się przewidzieć - wymagamy tylko niepustego budżetu
+            self.buckets["output_tokens"].wait_time(1, now),
+            0.0
+        )
+
+    def consume(self, input_tokens: int):
+        self.buckets["requests"].consume(1)
+        self.buckets["input_tokens"].consume(input_tokens)
+
+    def sync_headers(self, headers):
+        for name, prefix in RATELIMIT_HEADERS.items():
+            limit = headers.get(f"{prefix}-limit")
+            remaining = headers.get(f"{prefix}-remaining")
+            reset = headers.get(f"{prefix}-reset")
+            if limit is None and name == "input_tokens":
+                limit = headers.get(f"{COMBINED_TOKENS_HEADER}-limit")
+                remaining = headers.get(f"{COMBINED_TOKENS_HEADER}-remaining")
+                reset = headers.get(f"{COMBINED_TOKENS_HEADER}-reset")
+            if limit is None or remaining is None:
+                continue
+            try:
+                self.buckets[name].sync(float(limit), float(remaining), parse_reset(reset))
+            except ValueError:
+                continue
+
+
+class RateLimitScheduler:
+    """
+    Wpuszcza zapytania zgodnie z limitami modelu i ponawia błędy przejściowe.
+    Wywołania blokują wątek wywołującego (wątki robocze GUI / trybu wsadowego).
+    """
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+                 on_state: Optional[Callable[[Dict], None]] = None,
+                 on_retry: Optional[Callable[[Dict], None]] = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_state = on_state
+        self.on_retry = on_retry
+
+        self._condition = threading.Condition()
+        self._budgets: Dict[str, ModelBudget] = {}
+        self._waiting: Dict[int, float] = {}  # id oczekującego -> przewidywany czas wpuszczenia
+        self._next_waiter = 0
+
+        self.in_flight = 0
+        self.retries = 0
+        self.total_wait = 0.0
+
+    def budget(self, model_id: str) -> ModelBudget:
+        with self._condition:
+            return self._budgets.setdefault(model_id, ModelBudget())
+
+    def state(self) -> Dict:
+        """Głębokość kolejki i przewidywany czas oczekiwania (dla paska statusu)"""
+        with self._condition:
+            now = time.monotonic()
+            wait = max((ready - now for ready in self._waiting.values()), default=0.0)
+            return {
+                "queued": len(self._waiting),
+                "in_flight": self.in_flight,
+                "wait": max(0.0, wait),
+                "retries": self.retries
+            }
+
+    def _notify_state(self):
+        if self.on_state:
+            self.on_state(self.state())
+
+    def acquire(self, model_id: str, input_tokens: int = 0) -> float:
+        """Czeka na miejsce w budżecie modelu; zwraca czas oczekiwania"""
+        started = time.monotonic()
+        budget = self.budget(model_id)
+
+        with self._condition:
+            waiter = self._next_waiter
+            self._next_waiter += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = budget.wait_time(input_tokens, now)
+                    if wait <= 0:
+                        budget.consume(input_tokens)
+                        self.in_flight += 1
+                        break
+
+                    first_wait = waiter not in self._waiting
+                    self._waiting[waiter] = now + wait
+                    if first_wait:
+                        self._condition.release()
+                        try:
+                            self._notify_state()
+                        finally:
+                            self._condition.acquire()
+                    # Budzimy się najpóźniej co sekundę - nagłówki mogą zmienić budżet
+                    self._condition.wait(min(wait, 1.0))
+            finally:
+                was_waiting = self._waiting.pop(waiter, None) is not None
+
+        waited = time.monotonic() - started
+        if was_waiting:
+            with self._condition:
+                self.total_wait += waited
+            self._notify_state()
+        return waited
+
+    def release(self):
+        with self._condition:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._condition.notify_all()
+
+    def observe_headers(self, model_id: str, headers):
+        """Aktualizuje budżet modelu z nagłówków odpowiedzi"""
+        if not headers:
+            return
+        with self._condition:
+            self._budgets.setdefault(model_id, ModelBudget()).sync_headers(headers)
+            self._condition.notify_all()
+
+    def cooldown(self, model_id: str, seconds: float):
+        """Wstrzymuje wszystkie zapytania do modelu"""
+        with self._condition:
+            budget = self._budgets.setdefault(model_id, ModelBudget())
+            budget.cooldown_until = max(budget.cooldown_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+
+    def call(self, model_id: str, input_tokens: int, request: Callable[[], object],
+             is_idempotent: Callable[[], bool] = lambda: True):
+        """
+        Wykonuje request() w ramach limitów. Błędy przejściowe są ponawiane,
+        dopóki is_idempotent() - czyli dopóki nic nie trafiło do użytkownika.
+        """
+        attempt = 0
+        while True:
+            self.acquire(model_id, input_tokens)
+            try:
+                return request()
+            except Exception as e:
+                response = getattr(e, 'response', None)
+                self.observe_headers(model_id, getattr(response, 'headers', None))
+
+                attempt += 1
+                if attempt >= self.max_attempts or not is_retryable_error(e) or not is_idempotent():
+                    # Faktyczna liczba prób - do komunikatu w GUI
+                    e.attempts = attempt
+                    raise
+
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = backoff_delay(attempt - 1, self.base_delay, self.max_delay)
+
+                status = error_status_code(e)
+                with self._condition:
+                    self.retries += 1
+                if status in MODEL_COOLDOWN_STATUS_CODES:
+                    # Limit lub przeciążenie dotyczy wszystkich zapytań do modelu
+                    self.cooldown(model_id, delay)
+
+                if self.on_retry:
+                    self.on_retry({
+                        "model": model_id,
+                        "status": status,
+                        "error": type(e).__name__,
+                        "delay": delay,
+                        "attempt": attempt,
+                        "max_attempts": self.max_attempts
+                    })
+
+                if status not in MODEL_COOLDOWN_STATUS_CODES:
+                    time.sleep(delay)
+            finally:
+                self.release()
@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+"""
+Wyszukiwanie znaczeniowe w historii rozmów (offline)
+Każda wiadomość to wektor haszowanego TF (unigramy i bigramy słów, znak z hasha).
+Wektory wiadomości sumowane są w wektor rozmowy - macierz float32 mapowana z dysku
+(semantic_index/), jeden wiersz na rozmowę. Zapytanie ważone jest IDF z liczników
+dokumentów, a podobieństwo (kosinus) liczone jednym mnożeniem macierzy na paczkę
+wierszy - bez sieci i bez modelu. Milion wiadomości to ~50 tys. wierszy do
+przejrzenia zamiast miliona. Indeks dopisywany jest przy każdym add_message,
+a wiadomości sprzed jego powstania indeksowane są w tle.
+
+Użycie:
+    index = SemanticIndex.attach(db)          # hook na add_message + doindeksowanie w tle
+    index.similar_conversations(42, k=10)     # [(conversation_id, podobieństwo), ...]
+    index.search("limit tokenów w streamingu")
+    python claude_semantic.py rebuild         # indeks od zera
+    python claude_semantic.py bench --messages 1M
+"""
+
+import os
+import re
+import sys
+import atexit
+import json
+import math
+import zlib
+import argparse
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+INDEX_DIR = "semantic_index"  # zmienna SEMANTIC_INDEX_DIR wskazuje inny katalog
+DIM = 256                 # wymiar wektora (kubełki hasha)
+INITIAL_CAPACITY = 4096   # wierszy przy tworzeniu plików; potem podwajanie
+SEARCH_CHUNK = 65_536     # wierszy na jedno mnożenie (stała pamięć pomocnicza)
+FLUSH_EVERY = 256         # zapis metadanych co tyle dopisanych wiadomości
+BACKFILL_BATCH = 5_000
+
+_WORD_RE = re.compile(r"\w{2,}")
+
+
+def tokens(text: str) -> List[str]:
+    """Słowa (małe litery) i pary sąsiednich słów"""
+    words = _WORD_RE.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def vectorize(texts: Iterable[str], dim: int = DIM) -> np.ndarray:
+    """
+    Wektory haszowanego TF (1 + log tf, znak z bitu hasha), znormalizowane do długości 1.
+    Cała paczka jednym np.add.at - pętla Pythona tylko po tokenach.
+    """
+    rows, buckets, weights = [], [], []
+    count = 0
+    for row, text in enumerate(texts):
+        count += 1
+        for token, tf in Counter(tokens(text)).items():
+            h = zlib.crc32(token.encode("utf-8"))
+            rows.append(row)
+            buckets.append(h % dim)
+            weights.append((1.0 + math.log(tf)) * (1.0 if h & 0x80000000 else -1.0))
+
+    vectors = np.zeros((count, dim), dtype=np.float32)
+    if rows:
+        np.add.at(vectors, (np.array(rows), np.array(buckets)), np.array(weights, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+class SemanticIndex:
+    """
+    Wektory rozmów (memmap float32, suma wektorów wiadomości) i dziennik
+    zaindeksowanych wiadomości (ID wiadomości, ID rozmowy)
+    """
+
+    def __init__(self, directory: str = INDEX_DIR, dim: int = DIM, source: str = ""):
+        self.directory = directory
+        self.dim = dim
+        self.source = source  # baza, z której pochodzi indeks (inna baza - indeks od zera)
+        self.db = None
+
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._dirty_rows = set()   # wiersze rozmów zmienione od ostatniego flush()
+        self._flushed_count = 0    # wiersze dziennika wiadomości zapisane na dysku
+        self._backfill = None
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # ---------- pliki ----------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        meta = {}
+        try:
+            with open(self._path("meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        if meta.get("dim") != self.dim or meta.get("source", self.source) != self.source:
+            if meta:
+                print("[SEMANTIC] Indeks z innej bazy lub o innym wymiarze - tworzę od nowa")
+            meta = {}
+
+        self.count = meta.get("count", 0)                # zaindeksowane wiadomości
+        self.conversations = meta.get("conversations", 0)  # zajęte wiersze rozmów
+        self.covered_id = meta.get("covered_id", 0)      # wszystkie wiadomości do tego ID są w indeksie
+        self.df = np.array(meta["df"], dtype=np.float64) if "df" in meta else np.zeros(self.dim)
+        self._open(max(meta.get("message_capacity", 0), INITIAL_CAPACITY),
+                   max(meta.get("conversation_capacity", 0), INITIAL_CAPACITY), create=not meta)
+
+        self._flushed_count = self.count
+
+        # Pliki z wersji zapisującej bez flush() mogą mieć wiersze spoza metadanych - zerujemy,
+        # inaczej doindeksowanie dodałoby te wiadomości drugi raz
+        stale = np.flatnonzero(self.vectors[self.conversations:].any(axis=1)) + self.conversations
+        if len(stale):
+            print(f"[SEMANTIC] {len(stale)} wierszy spoza metadanych (przerwany zapis) - zeruję")
+            self.vectors[stale] = 0
+            self.conversation_ids[stale] = 0
+            self._dirty_rows.update(stale.tolist())
+
+        # ID rozmowy -> wiersz; długości wektorów rozmów (mianownik kosinusa)
+        conversation_ids = self.conversation_ids[:self.conversations]
+        self._rows = {int(cid): row for row, cid in enumerate(conversation_ids.tolist()) if cid >= 0}
+        self.norms = np.zeros(self.conversation_capacity, dtype=np.float32)
+        self.norms[:self.conversations] = np.linalg.norm(self.vectors[:self.conversations], axis=1)
+
+    def _map(self, name: str, dtype, shape: Tuple, create: bool) -> np.memmap:
+        path = self._path(name)
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if create or not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.truncate(size)
+        elif os.path.getsize(path) < size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+        # Kopia przy zapisie: zmiany trafiają do pliku tylko w flush(), razem z metadanymi -
+        # po przerwaniu pliki zgadzają się z meta.json, a zaległe wiadomości doindeksuje catch_up
+        return np.memmap(path, dtype=dtype, mode="c", shape=shape)
+
+    def _open(self, message_capacity: int, conversation_capacity: int, create: bool = False):
+        """Mapuje pliki o podanej pojemności (powiększa je w razie potrzeby)"""
+        self.messages = self._map("messages.i64", np.int64, (message_capacity, 2), create)
+        self.vectors = self._map("conversations.f32", np.float32, (conversation_capacity, self.dim), create)
+        self.conversation_ids = self._map("conversation_ids.i64", np.int64, (conversation_capacity,), create)
+        self.message_capacity = message_capacity
+        self.conversation_capacity = conversation_capacity
+
+    def _grow(self, messages_needed: int, conversations_needed: int):
+        if messages_needed <= self.message_capacity and conversations_needed <= self.conversation_capacity:
+            return
+        # Zmiany w pamięci (kopia przy zapisie) zginęłyby przy ponownym mapowaniu
+        self._flush_locked()
+        message_capacity, conversation_capacity = self.message_capacity, self.conversation_capacity
+        while message_capacity < messages_needed:
+            message_capacity *= 2
+        while conversation_capacity < conversations_needed:
+            conversation_capacity *= 2
+        self._open(message_capacity, conversation_capacity)
+        norms = np.zeros(conversation_capacity, dtype=np.float32)
+        norms[:len(self.norms)] = self.norms
+        self.norms = norms
+
+    def flush(self):
+        """Zapisuje wektory i metadane (liczby wierszy, liczniki dokumentów)"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        rows = np.array(sorted(self._dirty_rows), dtype=np.int64)
+        self._write_rows("conversations.f32", self.vectors, rows)
+        self._write_rows("conversation_ids.i64", self.conversation_ids, rows)
+        self._write_rows("messages.i64", self.messages, np.arange(self._flushed_count, self.count))
+        self._dirty_rows.clear()
+        self._flushed_count = self.count
+        meta = {"dim": self.dim, "source": self.source, "count": self.count,
+                "conversations": self.conversations, "covered_id": self.covered_id,
+                "message_capacity": self.message_capacity, "conversation_capacity": self.conversation_capacity,
+                "df": self.df.tolist()}
+        tmp = self._path("meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._path("meta.json"))
+        self._pending = 0
+
+    def _write_rows(self, name: str, mapped: np.memmap, rows: np.ndarray):
+        """Zapisuje wskazane wiersze mapy (kopii przy zapisie) do pliku"""
+        if not len(rows):
+            return
+        target = np.memmap(self._path(name), dtype=mapped.dtype, mode="r+", shape=mapped.shape)
+        target[rows] = mapped[rows]
+        target.flush()
+        del target
+
+    def reset(self):
+        """Pusty indeks (np. przed przebudową)"""
+        with self._lock:
+            self.count = 0
+            self.conversations = 0
+            self.covered_id = 0
+            self.df = np.zeros(self.dim)
+            self._rows = {}
+            self.norms = np.zeros(INITIAL_CAPACITY, dtype=np.float32)
+            self._dirty_rows = set()
+            self._flushed_count = 0
+            self._open(INITIAL_CAPACITY, INITIAL_CAPACITY, create=True)
+            self._flush_locked()
+
+    # ---------- zapis ----------
+
+    def add(self, items: List[Tuple[int, int, str]]):
+        """Dopisuje wiadomości (message_id, conversation_id, treść)"""
+        if not items:
+            return
+        vectors = vectorize([content or "" for _, _, content in items], self.dim)
+        conversation_ids = [conversation_id for _, conversation_id, _ in items]
+        with self._lock:
+            new_conversations = {cid for cid in conversation_ids if cid not in self._rows}
+            self._grow(self.count + len(items), self.conversations + len(new_conversations))
+
+            for conversation_id in sorted(new_conversations):
+                self._rows[conversation_id] = self.conversations
+                self.conversation_ids[self.conversations] = conversation_id
+                self.conversations += 1
+
+            self.messages[self.count:self.count + len(items)] = [
+                (message_id, conversation_id) for message_id, conversation_id, _ in items
+            ]
+            self.count += len(items)
+            self.df += np.count_nonzero(vectors, axis=0)
+
+            rows = np.array([self._rows[cid] for cid in conversation_ids])
+            np.add.at(self.vectors, rows, vectors)
+            touched = np.unique(rows)
+            self.norms[touched] = np.linalg.norm(self.vectors[touched], axis=1)
+            self._dirty_rows.update(touched.tolist())
+
+            self._pending += len(items)
+            if self._pending >= FLUSH_EVERY:
+                self._flush_locked()
+
+    def remove_conversation(self, conversation_id: int) -> bool:
+        """Wyłącza rozmowę z wyników (usunięcie, archiwum)"""
+        with self._lock:
+            row = self._rows.pop(conversation_id, None)
+            if row is None:
+                return False
+            self.vectors[row] = 0
+            self.norms[row] = 0
+            self.conversation_ids[row] = -1
+            self._dirty_rows.add(row)
+            self._pending += 1
+        return True
+
+    # ---------- wyszukiwanie ----------
+
+    def _idf(self) -> np.ndarray:
+        return (np.log((self.count + 1) / (self.df + 1)) + 1.0).astype(np.float32)
+
+    def _query(self, vector: np.ndarray) -> Optional[np.ndarray]:
+        """Wektor zapytania ważony IDF (częste słowa mniej znaczą), długość 1"""
+        weighted = vector * self._idf()
+        norm = np.linalg.norm(weighted)
+        return weighted / norm if norm > 0 else None
+
+    def _top_conversations(self, query: np.ndarray, k: int, exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        with self._lock:
+            vectors, norms, conversation_ids, rows = self.vectors, self.norms, self.conversation_ids, self.conversations
+
+        # Kosinus dla paczek wierszy; z każdej paczki tylko k najlepszych (+1 na pominiętą rozmowę)
+        keep = k + 1
+        best_scores, best_rows = [], []
+        for start in range(0, rows, SEARCH_CHUNK):
+            end = min(start + SEARCH_CHUNK, rows)
+            scores = vectors[start:end] @ query
+            np.divide(scores, norms[start:end], out=scores, where=norms[start:end] > 0)
+            top = np.argpartition(scores, -keep)[-keep:] if len(scores) > keep else np.arange(len(scores))
+            best_scores.append(scores[top])
+            best_rows.append(top + start)
+        if not best_scores:
+            return []
+
+        scores = np.concatenate(best_scores)
+        candidates = np.concatenate(best_rows)
+        results = []
+        for position in np.argsort(-scores):
+            score = float(scores[position])
+            conversation_id = int(conversation_ids[candidates[position]])
+            if score <= 0 or len(results) >= k:
+                break
+            if conversation_id < 0 or conversation_id == exclude:
+                continue
+            results.append((conversation_id, score))
+        return results
+
+    def search(self, text: str, k: int = 10) -> List[Tuple[int, float]]:
+        """Rozmowy najbliższe znaczeniowo tekstowi: [(conversation_id, podobieństwo)]"""
+        query = self._query(vectorize([text], self.dim)[0])
+        return [] if query is None else self._top_conversations(query, k)
+
+    def similar_conversations(self, conversation_id: int, k: int = 10) -> List[Tuple[int, float]]:
+        """Rozmowy podobne do podanej (wektor jej wiadomości jako zapytanie)"""
+        with self._lock:
+            row = self._rows.get(conversation_id)
+            vector = np.array(self.vectors[row]) if row is not None else None
+        query = None if vector is None else self._query(vector)
+        return [] if query is None else self._top_conversations(query, k, exclude=conversation_id)
+
+    # ---------- integracja z DatabaseManager ----------
+
+    @classmethod
+    def attach(cls, db, directory: Optional[str] = None, backfill: bool = True) -> "SemanticIndex":
+        """
+        Indeks dla bazy: add_message dopisuje wiadomości na bieżąco, usunięcie
+        i archiwizacja wyłączają rozmowę, przywrócenie indeksuje ją ponownie.
+        Wiadomości spoza indeksu (sprzed jego powstania) doindeksowywane w tle.
+        """
+        index = cls(directory or os.getenv("SEMANTIC_INDEX_DIR", INDEX_DIR), source=str(db.engine.url))
+        index.db = db
+
+        original_add_message = db.add_message
+        original_delete = db.delete_conversation
+        original_archive = db.archive_conversation
+        original_restore = db.restore_conversation
+
+        def add_message(conversation_id, role, content, *args, **kwargs):
+            message_id = original_add_message(conversation_id, role, content, *args, **kwargs)
+            if message_id is not None:
+                try:
+                    index.add([(message_id, conversation_id, content)])
+                except Exception as e:
+                    print(f"[SEMANTIC] Błąd indeksowania wiadomości {message_id}: {e}")
+            return message_id
+
+        def delete_conversation(conversation_id):
+            deleted = original_delete(conversation_id)
+            if deleted:
+                index.remove_conversation(conversation_id)
+            return deleted
+
+        def archive_conversation(conversation_id):
+            archived = original_archive(conversation_id)
+            if archived:
+                index.remove_conversation(conversation_id)
+            return archived
+
+        def restore_conversation(archive_id):
+            conversation_id = original_restore(archive_id)
+            if conversation_id:
+                index.add([(msg["id"], conversation_id, msg["content"])
+                           for msg in db.get_message_path(conversation_id)])
+            return conversation_id
+
+        db.add_message = add_message
+        db.delete_conversation = delete_conversation
+        db.archive_conversation = archive_conversation
+        db.restore_conversation = restore_conversation
+
+        # Zmiany od ostatniego flush() zapisywane przy zamknięciu aplikacji
+        atexit.register(index.flush)
+
+        if backfill:
+            # Granica ustalona przed startem wątku - nowsze wiadomości dopisuje już hook
+            upper_id = db.get_max_message_id()
+            index._backfill = threading.Thread(target=index.catch_up, args=(upper_id,),
+                                               name="semantic-backfill", daemon=True)
+            index._backfill.start()
+        return index
+
+    def catch_up(self, upper_id: Optional[int] = None, progress_callback=None) -> int:
+        """Indeksuje wiadomości z bazy o ID z (covered_id, upper_id], których jeszcze nie ma"""
+        db = self.db
+        upper_id = db.get_max_message_id() if upper_id is None else upper_id
+        if upper_id <= self.covered_id:
+            return 0
+
+        started = time.perf_counter()
+        with self._lock:
+            known = self.messages[:self.count, 0]
+            present = set(known[known > self.covered_id].tolist())
+
+        added = 0
+        for batch in db.iter_messages(BACKFILL_BATCH, after_id=self.covered_id, upper_id=upper_id):
+            items = [item for item in batch if item[0] not in present]
+            self.add(items)
+            added += len(items)
+            if progress_callback:
+                progress_callback(added)
+
+        with self._lock:
+            self.covered_id = upper_id
+            self._flush_locked()
+        if added:
+            print(f"[SEMANTIC] Zaindeksowano {added:,} wiadomości w {time.perf_counter() - started:.1f}s "
+                  f"(razem {self.count:,})")
+        return added
+
+    def stats(self) -> Dict:
+        return {
+            "messages": self.count,
+            "conversations": len(self._rows),
+            "dim": self.dim,
+            "bytes": self.conversation_capacity * (self.dim * 4 + 8) + self.message_capacity * 16,
+            "covered_id": self.covered_id,
+            "backfilling": self._backfill is not None and self._backfill.is_alive()
+        }
+
+
+def benchmark(messages: int, queries: int = 50, k: int = 10) -> Dict:
+    """Budowa indeksu z syntetycznych wiadomości (katalog tymczasowy) i czasy zapytań top-k"""
+    import random
+    import shutil
+    import tempfile
+    from claude_db_benchmark import MESSAGES_PER_CONVERSATION, VOCABULARY
+    from claude_telemetry import percentiles
+
+    rng = random.Random(42)
+    conversations = max(1, messages // MESSAGES_PER_CONVERSATION)
+    directory = tempfile.mkdtemp(prefix="claude_semantic_")
+    try:
+        index = SemanticIndex(directory)
+        started = time.perf_counter()
+        for start in range(0, messages, BACKFILL_BATCH):
+            index.add([(message_id, rng.randint(1, conversations),
+                        " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(5, 60))))
+                       for message_id in range(start + 1, min(start + BACKFILL_BATCH, messages) + 1)])
+        index.flush()
+        build_s = time.perf_counter() - started
+
+        def timed(operation, args_list):
+            latencies = []
+            for args in args_list:
+                call_started = time.perf_counter()
+                operation(*args)
+                latencies.append((time.perf_counter() - call_started) * 1000)
+            return percentiles(latencies)
+
+        texts = [(" ".join(rng.choice(VOCABULARY) for _ in range(8)), k) for _ in range(queries)]
+        conversation_ids = [(rng.randint(1, conversations), k) for _ in range(queries)]
+        return {
+            "messages": messages,
+            "build_s": build_s,
+            "messages_per_sec": messages / build_s if build_s > 0 else 0.0,
+            "index_bytes": index.stats()["bytes"],
+            "search_ms": timed(index.search, texts),
+            "similar_ms": timed(index.similar_conversations, conversation_ids)
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main(argv=None):
+    """Punkt wejścia CLI - przebudowa indeksu i zapytania testowe"""
+    parser = argparse.ArgumentParser(description="Indeks znaczeniowy historii rozmów")
+    parser.add_argument("command", choices=["rebuild", "update", "search", "similar", "bench"])
+    parser.add_argument("query", nargs="?", help="Tekst (search) albo ID rozmowy (similar)")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--db-url", help="URL bazy (domyślnie konfiguracja z .env)")
+    parser.add_argument("--dir", help=f"Katalog indeksu (domyślnie SEMANTIC_INDEX_DIR albo {INDEX_DIR})")
+    parser.add_argument("--messages", default="1M", help="Rozmiar indeksu w bench, np. 100k, 1M")
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        from claude_db_benchmark import parse_size
+        result = benchmark(parse_size(args.messages), k=args.k)
+        print(f"[SEMANTIC] {result['messages']:,} wiadomości: budowa {result['build_s']:.1f}s "
+              f"({result['messages_per_sec']:,.0f}/s), indeks {result['index_bytes'] / 1e6:.0f} MB")
+        for name in ("search_ms", "similar_ms"):
+            ms = result[name]
+            print(f"[SEMANTIC]   {name[:-3]:<8} top-{args.k}: p50 {ms['p50']:.1f} ms  p95 {ms['p95']:.1f} ms  "
+                  f"p99 {ms['p99']:.1f} ms")
+        return 0
+
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    from claude_db_extension import DatabaseManager
+
+    db = DatabaseManager(db_url=args.db_url)
+    index = SemanticIndex.attach(db, args.dir, backfill=False)
+    if args.command == "rebuild":
+        index.reset()
+    if args.command in ("rebuild", "update"):
+        index.catch_up()
+        print(f"[SEMANTIC] {index.stats()}")
+        return 0
+
+    if args.query is None:
+        parser.error("podaj tekst zapytania albo ID rozmowy")
+    started = time.perf_counter()
+    if args.command == "search":
+        results = index.search(args.query, args.k)
+    else:
+        results = index.similar_conversations(int(args.query), args.k)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    conversations = {conv["id"]: conv for conv in db.get_conversations_by_ids([cid for cid, _ in results])}
+    for conversation_id, score in results:
+        title = conversations.get(conversation_id, {}).get("title", "?")
+        print(f"{score:6.3f}  #{conversation_id:<8} {title}")
+    print(f"[SEMANTIC] {len(results)} wyników w {elapsed_ms:.1f} ms ({index.count:,} wiadomości w indeksie)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Sesje czatu Claude GUI Assistant
+Każda otwarta rozmowa (zakładka czatu) ma własną historię, ID w bazie,
+statystyki tokenów i okno tekstowe. Wątki robocze dostają migawkę historii,
+a odpowiedź dopisywana jest do sesji dopiero w wątku Tk - kilka rozmów może
+streamować jednocześnie przez wspólny RequestEngine bez współdzielonych list.
+"""
+
+import itertools
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from claude_engine import RequestSettings
+from claude_models import TokenStats
+
+DEFAULT_TITLE = "Nowa rozmowa"
+TITLE_LENGTH = 24
+
+_session_ids = itertools.count(1)
+_thinking_block_ids = itertools.count(1)
+
+
+def title_from_message(message: str, length: int = TITLE_LENGTH) -> str:
+    """Krótki tytuł zakładki z pierwszej wiadomości"""
+    text = " ".join(message.split())
+    return text[:length] + "…" if len(text) > length else text or DEFAULT_TITLE
+
+
+@dataclass
+class ChatRequest:
+    """
+    Jedno zapytanie sesji - stan odczytany w wątku Tk (kontrolki, historia, ID rozmowy).
+    Wątek roboczy zmienia tylko to zapytanie; nowe ID rozmowy trafia do sesji przez root.after
+    """
+    settings: RequestSettings
+    messages: List[Dict]  # migawka historii z wysyłaną wiadomością na końcu
+    title: str
+    generation: int  # transcript_generation sesji - inna oznacza wyczyszczoną/wczytaną od nowa
+    conversation_id: Optional[int] = None
+    branch_source: Optional[Tuple[int, int]] = None
+    # Adaptacyjny budżet myślenia: (cel czasu, cel kosztu); None - budżet z kontrolek
+    thinking_targets: Optional[Tuple[Optional[float], Optional[float]]] = None
+
+
+class ChatSession:
+    """Stan jednej rozmowy - modyfikowany wyłącznie w wątku Tk"""
+
+    def __init__(self, title: str = DEFAULT_TITLE):
+        self.session_id = next(_session_ids)
+        self.title = title
+        self.conversation_history: List[Dict] = []
+        self.conversation_id: Optional[int] = None  # ID rozmowy w bazie
+        self.token_stats = TokenStats()
+        self.last_cost = 0.0
+
+        # Gałąź innej rozmowy: (ID rozmowy źródłowej, liczba wspólnych wiadomości).
+        # Rozmowa w bazie powstaje przy pierwszym wysłaniu; prefiks nie jest kopiowany
+        self.branch_source: Optional[Tuple[int, int]] = None
+        # Ile początkowych wiadomości dzieli z innymi gałęziami (punkt cache promptu)
+        self.cache_prefix = 0
+
+        # Widgety i stan renderowania - ustawiane przy budowie zakładki
+        self.tab_name: Optional[str] = None
+        self.chat_display = None
+        self.streaming_start_pos = None
+        # Starsze wiadomości wczytanej rozmowy czekające na renderowanie w tle (claude_transcript);
+        # zmiana numeru przerywa renderowanie poprzedniej zawartości
+        self.lazy_pending_messages: List[Dict] = []
+        self.transcript_generation = 0
+        
+        # Myślenie streamowanej odpowiedzi: delty zbierane z wątku roboczego, rysowane paczkami
+        self.thinking_buffer: List[str] = []
+        self.thinking_flush_scheduled = False
+        self.thinking_block: Optional[int] = None  # blok myślenia bieżącej odpowiedzi
+        # Bloki myślenia w oknie czatu: expanded, details (opis w nagłówku) i loader -
+        # dla bloków wczytanych z bazy treść pobierana jest przy pierwszym rozwinięciu
+        self.thinking_blocks: Dict[int, Dict] = {}
+
+        # Jedno zapytanie w toku na sesję (inne sesje działają niezależnie)
+        self.busy = False
+
+    def new_thinking_block(self, expanded: bool = False, details: str = "",
+                           loader: Optional[Callable[[], Optional[str]]] = None) -> int:
+        """Rejestruje blok myślenia w oknie czatu; zwraca jego numer (nazwy tagów)"""
+        block = next(_thinking_block_ids)
+        self.thinking_blocks[block] = {'expanded': expanded, 'details': details, 'loader': loader}
+        return block
+    
+    def snapshot(self) -> List[Dict]:
+        """Kopia historii dla wątku roboczego"""
+        return list(self.conversation_history)
+
+    def request(self, settings: RequestSettings,
+                thinking_targets: Optional[Tuple[Optional[float], Optional[float]]] = None) -> ChatRequest:
+        """Zapytanie dla wątku roboczego - wywoływane w wątku Tk po dopisaniu wiadomości"""
+        return ChatRequest(
+            settings=settings,
+            messages=self.snapshot(),
+            title=self.title,
+            generation=self.transcript_generation,
+            conversation_id=self.conversation_id,
+            branch_source=self.branch_source,
+            thinking_targets=thinking_targets
+        )
+
+    def branch(self, keep_messages: int) -> "ChatSession":
+        """Nowa sesja z pierwszymi keep_messages wiadomościami tej rozmowy (edycja od wiadomości)"""
+        title = self.title if self.title.startswith("⑂") else f"⑂ {self.title}"
+        branch = ChatSession(title=title)
+        branch.conversation_history = self.conversation_history[:keep_messages]
+        branch.cache_prefix = keep_messages
+        if self.conversation_id is not None:
+            branch.branch_source = (self.conversation_id, keep_messages)
+        return branch
+
+    def reset(self):
+        """Czyści rozmowę (nowa rozmowa w tej samej zakładce)"""
+        self.conversation_history = []
+        self.conversation_id = None
+        self.token_stats = TokenStats()
+        self.last_cost = 0.0
+        self.branch_source = None
+        self.cache_prefix = 0
+        self.lazy_pending_messages = []
+        self.transcript_generation += 1
+        self.thinking_block = None
+        self.thinking_blocks = {}
+        if self.chat_display is not None:
+            self.chat_display.delete("1.0", "end")
+
+    def __repr__(self):
+        return f"ChatSession({self.session_id}, {self.title!r}, {len(self.conversation_history)} wiadomości)"
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Profilowanie uruchomienia Claude GUI Assistant
+Fazy inicjalizacji mierzone są zawsze (koszt pomijalny), czasy importów tylko
+z przełącznikiem --profile-startup (podmiana builtins.__import__).
+"""
+
+import sys
+import json
+import time
+import builtins
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+PROFILE_FLAG = "--profile-startup"
+
+
+class StartupProfiler:
+    """Zbiera czasy faz uruchomienia i importów modułów"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self.imports: Dict[str, List[float]] = {}  # moduł -> [łącznie, własny czas]
+        self.top_level_imports: Dict[str, float] = {}
+        self._original_import = None
+        self._local = threading.local()
+
+    @property
+    def import_profiling(self) -> bool:
+        return self._original_import is not None
+
+    def enable_import_profiling(self):
+        """Włącza pomiar czasu każdego importu (tylko dla --profile-startup)"""
+        if self._original_import is not None:
+            return
+
+        original_import = builtins.__import__
+        self._original_import = original_import
+        profiler = self
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            # Moduły już załadowane nie kosztują - nie mierz ich
+            if level == 0 and name in sys.modules:
+                return original_import(name, globals, locals, fromlist, level)
+
+            stack = profiler._stack()
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return original_import(name, globals, locals, fromlist, level)
+            finally:
+                elapsed = time.perf_counter() - start
+                children = stack.pop()
+                key = name if level == 0 else "." * level + name
+                entry = profiler.imports.setdefault(key, [0.0, 0.0])
+                entry[0] += elapsed
+                entry[1] += elapsed - children
+                if stack:
+                    stack[-1] += elapsed
+                else:
+                    profiler.top_level_imports[key] = profiler.top_level_imports.get(key, 0.0) + elapsed
+
+        builtins.__import__ = timed_import
+
+    def disable_import_profiling(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _stack(self) -> List[float]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def phase(self, name: str):
+        """Mierzy czas fazy uruchomienia"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        self.phases.append((name, seconds))
+
+    def since_start(self) -> float:
+        return time.perf_counter() - self.started
+
+    def report(self, top_imports: int = 15):
+        """Wypisuje rozbicie czasu uruchomienia"""
+        print("[STARTUP] Czas uruchomienia:")
+        for name, seconds in self.phases:
+            print(f"[STARTUP]   {name:<40} {seconds * 1000:8.1f} ms")
+
+        if self.import_profiling and self.top_level_imports:
+            print("[STARTUP] Najwolniejsze importy (łącznie / własny czas):")
+            slowest = sorted(self.top_level_imports.items(), key=lambda item: item[1], reverse=True)
+            for name, total in slowest[:top_imports]:
+                own = self.imports.get(name, [total, total])[1]
+                print(f"[STARTUP]   {name:<40} {total * 1000:8.1f} ms / {own * 1000:7.1f} ms")
+
+    def save(self, filepath: str = "startup_profile.json"):
+        """Zapisuje profil do pliku - do porównywania między wersjami"""
+        data = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "phases_ms": [[name, round(seconds * 1000, 2)] for name, seconds in self.phases],
+            "imports_ms": {
+                name: round(total * 1000, 2)
+                for name, total in sorted(self.top_level_imports.items(), key=lambda item: item[1], reverse=True)
+            }
+        }
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"[STARTUP] Profil zapisany do: {filepath}")
+
+
+# Wspólna instancja dla całej aplikacji
+startup_profiler = StartupProfiler()
+
+if PROFILE_FLAG in sys.argv:
+    startup_profiler.enable_import_profiling()
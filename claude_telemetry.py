@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Telemetria opóźnień dla Claude GUI Assistant
+Agreguje czasy zapytań (oczekiwanie w kolejce, TTFT, odstępy między tokenami,
+czas całkowity, tokeny/s) per model do percentyli p50/p95/p99.
+"""
+
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+# Ile ostatnich pomiarów na model brać do percentyli
+RECENT_SAMPLES = 500
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Percentyl z interpolacją liniową (wartości nie muszą być posortowane)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {f"p{p}": percentile(values, p) for p in PERCENTILES}
+
+
+def summarize(timings: Iterable[Dict]) -> Dict:
+    """Percentyle dla listy pomiarów jednego modelu"""
+    timings = list(timings)
+    summary = {"count": len(timings)}
+    for key in ("queue_wait", "ttft", "total", "tokens_per_sec"):
+        values = [t[key] for t in timings if t.get(key) is not None]
+        if values:
+            summary[key] = percentiles(values)
+    inter = [t["inter_token"]["p50"] for t in timings if t.get("inter_token")]
+    if inter:
+        summary["inter_token"] = percentiles(inter)
+    return summary
+
+
+def describe_latency(summary: Optional[Dict]) -> str:
+    """Krótki opis zaobserwowanych opóźnień modelu"""
+    if not summary or "ttft" not in summary:
+        return ""
+    ttft = summary["ttft"]
+    text = f"TTFT {ttft['p50']:.2f}/{ttft['p95']:.2f}/{ttft['p99']:.2f}s (p50/p95/p99)"
+    if "tokens_per_sec" in summary:
+        text += f" · {summary['tokens_per_sec']['p50']:.0f} tok/s"
+    return text + f" · n={summary['count']}"
+
+
+class LatencyTracker:
+    """Ostatnie pomiary per model - zasilane z bazy i z bieżącej sesji"""
+
+    def __init__(self, max_samples: int = RECENT_SAMPLES):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+
+    def add(self, model_id: str, timing: Optional[Dict]):
+        if not timing or timing.get("ttft") is None:
+            return
+        with self._lock:
+            self._samples.setdefault(model_id, deque(maxlen=self.max_samples)).append(timing)
+
+    def extend(self, samples: Dict[str, List[Dict]]):
+        """Dokłada pomiary historyczne (starsze przed bieżącymi)"""
+        with self._lock:
+            for model_id, timings in samples.items():
+                current = list(self._samples.get(model_id, ()))
+                merged = deque(maxlen=self.max_samples)
+                merged.extend(timings)
+                merged.extend(current)
+                self._samples[model_id] = merged
+
+    def summary(self, model_id: str) -> Optional[Dict]:
+        with self._lock:
+            timings = list(self._samples.get(model_id, ()))
+        return summarize(timings) if timings else None
+
+    def summaries(self) -> Dict[str, Dict]:
+        with self._lock:
+            models = list(self._samples)
+        return {model_id: self.summary(model_id) for model_id in models}
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Adaptacyjny budżet Extended Thinking dla Claude GUI Assistant
+Zamiast stałego suwaka budget_tokens dobierany jest per zapytanie: cechy promptu
+(długość, kod, matematyka, słowa wymagające analizy, liczba pytań) dają złożoność
+0..1 i koszyk 0-3. Bez historii budżet rośnie geometrycznie ze złożonością od 1024
+do max_thinking_budget modelu; gdy koszyk (model, złożoność) ma dość pomiarów,
+budżet to p90 faktycznie zużytych tokenów myślenia z zapasem (podniesiony, gdy
+myślenie często dobija do budżetu). Cel czasu odpowiedzi i cel kosztu obcinają
+budżet: czas z TTFT i tokenów/s modelu, koszt z ceny wyjścia. Gdy cel jest
+nieosiągalny nawet z minimalnym budżetem, myślenie jest wyłączane.
+
+Każda decyzja z wynikiem trafia do thinking_budget_log.jsonl, a evaluate()
+odtwarza politykę na historii z bazy - bez wywołań API.
+
+Użycie:
+    controller = ThinkingBudgetController()
+    controller.load_history(db)
+    decision = controller.choose(model, prompt, turn=3, target_latency=20)
+    settings = decision.apply(settings)
+    controller.record(decision, result, cost)
+    python claude_thinking_budget.py evaluate --target-latency 20
+    python claude_thinking_budget.py log
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+from collections import deque
+from dataclasses import dataclass, field, replace, asdict
+from typing import Dict, List, Optional, Tuple
+
+from claude_models import MODELS, ModelConfig
+from claude_telemetry import percentile
+
+LOG_FILE = "thinking_budget_log.jsonl"  # zmienna THINKING_BUDGET_LOG wskazuje inny plik
+MIN_BUDGET = 1024          # minimum API dla budget_tokens
+BUCKETS = 4                # koszyki złożoności promptu
+MIN_SAMPLES = 5            # pomiarów w koszyku, zanim historia zastąpi budżet z cech
+HISTORY_SAMPLES = 200      # ostatnich pomiarów na (model, koszyk)
+HEADROOM = 1.25            # zapas nad p90 zużycia
+SATURATION = 0.9           # zużycie >= 90% budżetu - myślenie prawdopodobnie ucięte
+SATURATED_SHARE = 0.2      # ... w ponad 20% pomiarów - budżet w górę
+SATURATED_BOOST = 1.5
+DEFAULT_ANSWER_TOKENS = 1500  # oczekiwana długość odpowiedzi bez historii
+HISTORY_LIMIT = 5000       # odpowiedzi z bazy przy starcie i w evaluate
+LIMIT_REASONS = {"latency": "limit czasu", "cost": "limit kosztu", "max_tokens": "limit wyjścia"}
+
+CODE_PATTERN = re.compile(r"```|^\s*(def|class|import|function|const|SELECT|#include)\b|[{};]\s*$",
+                          re.MULTILINE | re.IGNORECASE)
+MATH_PATTERN = re.compile(r"\d\s*[-+*/^=<>]\s*\d|[∑∫√≤≥∞]|\\(frac|sum|int)\b|"
+                          r"równani|całk|pochodn|dowód|udowodnij|oblicz|prawdopodobie|"
+                          r"equation|integral|derivative|prove|proof|probability", re.IGNORECASE)
+REASONING_PATTERN = re.compile(r"dlaczego|porównaj|przeanalizuj|analiz|zaprojektuj|optymaliz|"
+                               r"krok po kroku|algorytm|architektur|debug|zaplanuj|uzasadnij|"
+                               r"\bwhy\b|compare|analy[sz]|design|optimi[sz]|step by step|"
+                               r"algorithm|architect|trade-?off|plan\b|explain", re.IGNORECASE)
+
+
+def prompt_features(prompt: str, turn: int = 0) -> Dict:
+    """Cechy promptu, z których liczona jest złożoność (tanie - regexy na tekście)"""
+    return {
+        "chars": len(prompt),
+        "code": len(CODE_PATTERN.findall(prompt)),
+        "math": len(MATH_PATTERN.findall(prompt)),
+        "reasoning": len(REASONING_PATTERN.findall(prompt)),
+        "questions": prompt.count("?"),
+        "turn": turn,
+    }
+
+
+def complexity(features: Dict) -> float:
+    """Złożoność 0..1 - ważona suma nasyconych cech"""
+    score = (
+        0.25 * min(1.0, math.log10(1 + features["chars"]) / 4)  # ~10 tys. znaków = pełna waga
+        + 0.25 * min(1.0, features["code"] / 3)
+        + 0.2 * min(1.0, features["math"] / 2)
+        + 0.2 * min(1.0, features["reasoning"] / 2)
+        + 0.1 * min(1.0, features["questions"] / 3)
+    )
+    return round(min(1.0, score), 3)
+
+
+def bucket_of(score: float) -> int:
+    return min(BUCKETS - 1, int(score * BUCKETS))
+
+
+def prior_budget(model: ModelConfig, score: float) -> int:
+    """Budżet bez historii: geometrycznie od MIN_BUDGET do max_thinking_budget"""
+    ceiling = max(MIN_BUDGET, model.max_thinking_budget)
+    return int(MIN_BUDGET * (ceiling / MIN_BUDGET) ** score)
+
+
+def parse_target(text: str) -> Optional[float]:
+    """Cel z pola tekstowego ("20", "0,05"); puste albo niepoprawne - brak celu"""
+    try:
+        value = float(text.strip().replace(",", "."))
+    except ValueError:
+        return None
+    return value if value > 0 else None
+
+
+def model_by_id(model_id: str) -> Optional[ModelConfig]:
+    return next((model for model in MODELS.values() if model.id == model_id), None)
+
+
+@dataclass
+class Decision:
+    """Wybrany budżet z uzasadnieniem (budget 0 - myślenie wyłączone)"""
+    model_id: str
+    budget: int
+    bucket: int
+    complexity: float
+    source: str                     # "cechy" albo "historia"
+    features: Dict
+    caps: Dict = field(default_factory=dict)      # limity z celów: latency / cost / max_tokens
+    expected: Dict = field(default_factory=dict)  # przewidywany czas (s) i koszt ($) przy pełnym budżecie
+    target_latency: Optional[float] = None
+    target_cost: Optional[float] = None
+    reason: str = ""
+    created: float = field(default_factory=time.time)
+
+    def apply(self, settings):
+        """RequestSettings z budżetem tej decyzji"""
+        if self.budget <= 0:
+            return replace(settings, thinking_enabled=False)
+        return replace(settings, thinking_enabled=True, thinking_budget=self.budget)
+
+    def describe(self) -> str:
+        if self.budget <= 0:
+            return f"Auto: myślenie wyłączone ({self.reason})"
+        text = f"Auto: {self.budget} tokenów ({self.source}, złożoność {self.bucket + 1}/{BUCKETS})"
+        return text + (f" - {self.reason}" if self.reason else "")
+
+
+@dataclass
+class Sample:
+    """Wynik jednego zapytania z myśleniem"""
+    budget: Optional[int]           # None - budżet nieznany (dane sprzed zapisu w timing)
+    thinking_tokens: int
+    answer_tokens: int
+    ttft: Optional[float]
+    tokens_per_sec: Optional[float]
+
+    @property
+    def saturated(self) -> bool:
+        return bool(self.budget) and self.thinking_tokens >= SATURATION * self.budget
+
+
+class ThinkingBudgetController:
+    """Wybór budżetu per zapytanie i uczenie się z wyników (bezpieczny dla wątków)"""
+
+    def __init__(self, log_path: Optional[str] = None):
+        # Pusty napis - bez dziennika (odtwarzanie w evaluate)
+        self.log_path = os.environ.get("THINKING_BUDGET_LOG", LOG_FILE) if log_path is None else log_path
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, int], deque] = {}
+        self._models: Dict[str, deque] = {}
+        self.last_decision: Optional[Decision] = None
+
+    # --- historia ---
+
+    def observe(self, model_id: str, bucket: int, sample: Sample):
+        with self._lock:
+            self._buckets.setdefault((model_id, bucket), deque(maxlen=HISTORY_SAMPLES)).append(sample)
+            self._models.setdefault(model_id, deque(maxlen=HISTORY_SAMPLES * BUCKETS)).append(sample)
+
+    def load_history(self, db, limit: int = HISTORY_LIMIT) -> int:
+        """Zasila historię odpowiedziami z myśleniem zapisanymi w bazie"""
+        rows = db.get_thinking_history(limit)
+        for row in rows:
+            self.observe(row["model_id"], bucket_of(complexity(prompt_features(row["prompt"], row["turn"]))),
+                         sample_from_row(row))
+        if rows:
+            print(f"[THINKING] Historia budżetu: {len(rows)} odpowiedzi z myśleniem")
+        return len(rows)
+
+    def _snapshot(self, model_id: str, bucket: int) -> Tuple[List[Sample], List[Sample]]:
+        with self._lock:
+            return list(self._buckets.get((model_id, bucket), ())), list(self._models.get(model_id, ()))
+
+    # --- decyzja ---
+
+    def choose(self, model: ModelConfig, prompt: str, turn: int = 0, input_tokens: int = 0,
+               target_latency: Optional[float] = None, target_cost: Optional[float] = None) -> Decision:
+        """Budżet dla zapytania; input_tokens (kontekst) potrzebne tylko do celu kosztu"""
+        features = prompt_features(prompt, turn)
+        score = complexity(features)
+        bucket = bucket_of(score)
+        bucket_samples, model_samples = self._snapshot(model.id, bucket)
+
+        budget, source = prior_budget(model, score), "cechy"
+        if len(bucket_samples) >= MIN_SAMPLES:
+            budget = int(percentile([s.thinking_tokens for s in bucket_samples], 90) * HEADROOM)
+            known = [s for s in bucket_samples if s.budget]
+            if known and sum(s.saturated for s in known) / len(known) > SATURATED_SHARE:
+                budget = max(budget, int(percentile([s.budget for s in known], 90) * SATURATED_BOOST))
+            source = "historia"
+
+        answer_tokens = DEFAULT_ANSWER_TOKENS
+        answers = [s.answer_tokens for s in model_samples if s.answer_tokens > 0]
+        if answers:
+            answer_tokens = int(percentile(answers, 90))
+        ttft = percentile([s.ttft for s in model_samples if s.ttft is not None], 50)
+        speed = percentile([s.tokens_per_sec for s in model_samples if s.tokens_per_sec], 50)
+
+        # budget_tokens < max_tokens; reszta na odpowiedź
+        caps = {"max_tokens": min(model.max_thinking_budget, model.max_output_tokens - answer_tokens)}
+        if target_latency is not None and ttft is not None and speed:
+            caps["latency"] = int((target_latency - ttft) * speed - answer_tokens)
+        if target_cost is not None and model.output_cost:
+            input_cost = input_tokens * model.input_cost / 1_000_000
+            caps["cost"] = int((target_cost - input_cost) * 1_000_000 / model.output_cost - answer_tokens)
+
+        cap_name = min(caps, key=caps.get)
+        reason = LIMIT_REASONS[cap_name] if caps[cap_name] < max(budget, MIN_BUDGET) else ""
+        budget = max(MIN_BUDGET, min(budget, caps[cap_name]))
+        if budget > caps[cap_name]:
+            # Nawet minimalny budżet nie mieści się w celu - odpowiedź bez myślenia
+            budget, reason = 0, f"{reason} poniżej {MIN_BUDGET} tokenów"
+
+        expected_tokens = budget + answer_tokens
+        expected = {"cost": round((input_tokens * model.input_cost + expected_tokens * model.output_cost)
+                                  / 1_000_000, 6)}
+        if ttft is not None and speed:
+            expected["latency"] = round(ttft + expected_tokens / speed, 2)
+
+        decision = Decision(
+            model_id=model.id, budget=budget, bucket=bucket, complexity=score, source=source,
+            features=features, caps=caps, expected=expected,
+            target_latency=target_latency, target_cost=target_cost, reason=reason
+        )
+        self.last_decision = decision
+        return decision
+
+    # --- wynik ---
+
+    def record(self, decision: Decision, result=None, cost: float = 0.0, error: Optional[str] = None):
+        """Wynik zapytania (ResponseResult) - do historii i do dziennika decyzji"""
+        outcome = {"error": error}
+        if result is not None and not result.cached:
+            timing = result.timing or {}
+            sample = Sample(
+                budget=decision.budget or None,
+                thinking_tokens=result.thinking_tokens,
+                answer_tokens=result.output_tokens - result.thinking_tokens,
+                ttft=timing.get("ttft"),
+                tokens_per_sec=timing.get("tokens_per_sec"),
+            )
+            if decision.budget:
+                self.observe(decision.model_id, decision.bucket, sample)
+            outcome.update(
+                thinking_tokens=result.thinking_tokens,
+                output_tokens=result.output_tokens,
+                latency=timing.get("total"),
+                cost=cost,
+                stop_reason=result.stop_reason,
+                saturated=sample.saturated,
+            )
+        elif result is not None:
+            outcome["cached"] = True
+        self._log({**asdict(decision), "outcome": outcome})
+
+    def _log(self, entry: Dict):
+        if not self.log_path:
+            return
+        try:
+            line = json.dumps(entry, ensure_ascii=False)
+            with self._lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"[THINKING] ⚠️ Nie można zapisać dziennika budżetu: {e}")
+
+
+def sample_from_row(row: Dict) -> Sample:
+    timing = row.get("timing") or {}
+    return Sample(
+        budget=timing.get("thinking_budget"),
+        thinking_tokens=row["thinking_tokens"],
+        answer_tokens=max(0, row["output_tokens"] - row["thinking_tokens"]),
+        ttft=timing.get("ttft"),
+        tokens_per_sec=timing.get("tokens_per_sec"),
+    )
+
+
+def evaluate(db, target_latency: Optional[float] = None, target_cost: Optional[float] = None,
+             limit: int = HISTORY_LIMIT) -> Dict:
+    """
+    Odtwarza politykę na historii z bazy (chronologicznie - kontroler zna tylko
+    wcześniejsze odpowiedzi). Zużycie przy mniejszym budżecie przybliżone jako
+    min(faktyczne, budżet): ucięcie liczone, gdy faktyczne myślenie przekraczało wybór.
+    """
+    controller = ThinkingBudgetController(log_path="")
+    totals = {"requests": 0, "actual_budget": 0, "known_budget": 0, "chosen_budget": 0,
+              "disabled": 0, "truncated": 0, "tokens_saved": 0, "cost_saved": 0.0,
+              "latency_saved": 0.0, "actual_violations": 0, "policy_violations": 0,
+              "actual_cost": 0.0, "latency_checked": 0}
+
+    for row in db.get_thinking_history(limit):
+        model = model_by_id(row["model_id"])
+        if model is None:
+            continue
+        sample = sample_from_row(row)
+        timing = row.get("timing") or {}
+        # Wejście odtworzone z kosztu (odpowiedzi z GUI nie zapisują input_tokens)
+        output_cost = row["output_tokens"] * model.output_cost / 1_000_000
+        input_tokens = int(max(0.0, (row["cost"] or 0.0) - output_cost) * 1_000_000 / model.input_cost) \
+            if model.input_cost else 0
+
+        decision = controller.choose(model, row["prompt"], row["turn"], input_tokens,
+                                     target_latency, target_cost)
+        used = sample.thinking_tokens
+        kept = min(used, decision.budget)
+        saved = used - kept
+        saved_seconds = saved / sample.tokens_per_sec if sample.tokens_per_sec else 0.0
+
+        totals["requests"] += 1
+        totals["chosen_budget"] += decision.budget
+        totals["disabled"] += decision.budget == 0
+        if sample.budget:
+            totals["known_budget"] += 1
+            totals["actual_budget"] += sample.budget
+        totals["truncated"] += used > decision.budget
+        totals["tokens_saved"] += saved
+        totals["cost_saved"] += saved * model.output_cost / 1_000_000
+        totals["latency_saved"] += saved_seconds
+        totals["actual_cost"] += row["cost"] or 0.0
+        if target_latency is not None and timing.get("total") is not None:
+            totals["latency_checked"] += 1
+            totals["actual_violations"] += timing["total"] > target_latency
+            totals["policy_violations"] += timing["total"] - saved_seconds > target_latency
+        if target_cost is not None:
+            totals["actual_violations"] += (row["cost"] or 0.0) > target_cost
+            totals["policy_violations"] += (row["cost"] or 0.0) - saved * model.output_cost / 1_000_000 > target_cost
+
+        controller.observe(model.id, decision.bucket, sample)
+
+    count = totals["requests"]
+    report = dict(totals)
+    if count:
+        report["mean_chosen_budget"] = totals["chosen_budget"] / count
+        report["truncation_rate"] = totals["truncated"] / count
+    if totals["known_budget"]:
+        report["mean_actual_budget"] = totals["actual_budget"] / totals["known_budget"]
+    return report
+
+
+def summarize_log(path: Optional[str] = None) -> Dict[str, Dict]:
+    """Podsumowanie dziennika decyzji per model: budżety, ucięcia, trafienie w cele"""
+    path = path or os.environ.get("THINKING_BUDGET_LOG", LOG_FILE)
+    summary: Dict[str, Dict] = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError) as e:
+        print(f"[THINKING] ⚠️ Nie można odczytać dziennika {path}: {e}")
+        return summary
+
+    for entry in entries:
+        stats = summary.setdefault(entry["model_id"], {"decisions": 0, "errors": 0, "disabled": 0,
+                                                       "budgets": [], "saturated": 0, "latencies": [],
+                                                       "on_target": 0, "with_target": 0, "cost": 0.0})
+        outcome = entry.get("outcome") or {}
+        stats["decisions"] += 1
+        stats["disabled"] += entry["budget"] == 0
+        stats["budgets"].append(entry["budget"])
+        if outcome.get("error"):
+            stats["errors"] += 1
+            continue
+        stats["saturated"] += bool(outcome.get("saturated"))
+        stats["cost"] += outcome.get("cost") or 0.0
+        latency = outcome.get("latency")
+        if latency is not None:
+            stats["latencies"].append(latency)
+        if entry.get("target_latency") is not None and latency is not None:
+            stats["with_target"] += 1
+            stats["on_target"] += latency <= entry["target_latency"]
+
+    for stats in summary.values():
+        budgets, latencies = stats.pop("budgets"), stats.pop("latencies")
+        stats["budget_p50"] = percentile(budgets, 50)
+        if latencies:
+            stats["latency_p50"] = percentile(latencies, 50)
+            stats["latency_p95"] = percentile(latencies, 95)
+    return summary
+
+
+def main(argv=None):
+    """Punkt wejścia CLI - ocena polityki na historii i podsumowanie dziennika"""
+    parser = argparse.ArgumentParser(description="Adaptacyjny budżet Extended Thinking")
+    parser.add_argument("command", choices=["evaluate", "log"])
+    parser.add_argument("--target-latency", type=float, help="Cel czasu odpowiedzi (s)")
+    parser.add_argument("--target-cost", type=float, help="Cel kosztu zapytania ($)")
+    parser.add_argument("--limit", type=int, default=HISTORY_LIMIT)
+    parser.add_argument("--db-url", help="URL bazy (domyślnie konfiguracja z .env)")
+    parser.add_argument("--log", help=f"Plik dziennika (domyślnie THINKING_BUDGET_LOG albo {LOG_FILE})")
+    args = parser.parse_args(argv)
+
+    if args.command == "log":
+        for model_id, stats in summarize_log(args.log).items():
+            print(f"[THINKING] {model_id}: {json.dumps(stats, ensure_ascii=False)}")
+        return 0
+
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    from claude_db_extension import DatabaseManager
+
+    report = evaluate(DatabaseManager(db_url=args.db_url), args.target_latency, args.target_cost, args.limit)
+    if not report["requests"]:
+        print("[THINKING] Brak odpowiedzi z myśleniem w bazie")
+        return 0
+    print(f"[THINKING] {report['requests']} odpowiedzi z myśleniem, "
+          f"budżet średnio {report.get('mean_actual_budget', 0):,.0f} → {report['mean_chosen_budget']:,.0f} tok.")
+    print(f"[THINKING]   ucięte myślenie: {report['truncation_rate']:.1%}, wyłączone: {report['disabled']}")
+    print(f"[THINKING]   oszczędność: {report['tokens_saved']:,} tok., ${report['cost_saved']:.4f} "
+          f"z ${report['actual_cost']:.4f}, {report['latency_saved']:.1f}s")
+    if args.target_latency is not None or args.target_cost is not None:
+        print(f"[THINKING]   przekroczenia celu: {report['actual_violations']} → {report['policy_violations']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Profilowanie gorących ścieżek Claude GUI Assistant
+Spany i liczniki zapisywane w formacie Chrome Trace Event (trace.json) -
+do otwarcia w chrome://tracing lub https://ui.perfetto.dev. Domyślnie
+wyłączone: wtedy span to jedno sprawdzenie flagi i współdzielony pusty kontekst.
+
+Użycie:
+    from claude_tracing import tracer, traced
+    with tracer.span("db.save", rows=10): ...
+    @traced("gui")
+    def append_to_chat(...): ...
+"""
+
+import os
+import json
+import time
+import inspect
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional
+
+TRACE_FILE = "trace.json"
+MAX_EVENTS = 200_000
+
+_NULL_SPAN = nullcontext()
+
+
+class Tracer:
+    """Bufor zdarzeń trace (spany "X", liczniki "C") włączany w locie"""
+
+    def __init__(self, max_events: int = MAX_EVENTS):
+        self.enabled = False
+        self.events = deque(maxlen=max_events)
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._thread_names: Dict[int, str] = {}
+
+    def enable(self):
+        self.enabled = True
+        print("[TRACE] Profilowanie włączone")
+
+    def disable(self):
+        self.enabled = False
+        print(f"[TRACE] Profilowanie wyłączone ({len(self.events)} zdarzeń w buforze)")
+
+    def clear(self):
+        with self._lock:
+            self.events.clear()
+            self.counters.clear()
+
+    def _us(self, perf_time: float) -> float:
+        return (perf_time - self._origin) * 1_000_000
+
+    def _tid(self) -> int:
+        thread = threading.current_thread()
+        if thread.ident not in self._thread_names:
+            self._thread_names[thread.ident] = thread.name
+        return thread.ident
+
+    def span(self, name: str, category: str = "app", **args):
+        """Kontekst mierzący czas bloku (pusty, gdy profilowanie wyłączone)"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(name, category, args)
+
+    @contextmanager
+    def _span(self, name: str, category: str, args: Dict):
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.complete(name, start, time.perf_counter(), category, **args)
+
+    def complete(self, name: str, start: float, end: float, category: str = "app", **args):
+        """Span o znanych granicach (perf_counter) - np. fazy zmierzone wcześniej"""
+        if not self.enabled or start is None or end is None:
+            return
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": self._us(start),
+            "dur": max(0.0, (end - start) * 1_000_000),
+            "pid": self._pid,
+            "tid": self._tid()
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self.events.append(event)
+
+    def count(self, name: str, value: float = 1, category: str = "app"):
+        """Licznik narastający (wykres w przeglądarce trace)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            total = self.counters.get(name, 0) + value
+            self.counters[name] = total
+            self.events.append({
+                "name": name,
+                "cat": category,
+                "ph": "C",
+                "ts": self._us(time.perf_counter()),
+                "pid": self._pid,
+                "args": {name: total}
+            })
+
+    def export(self, filepath: str = TRACE_FILE) -> int:
+        """Zapisuje bufor jako JSON Chrome Trace Event; zwraca liczbę zdarzeń"""
+        with self._lock:
+            events = list(self.events)
+            thread_names = dict(self._thread_names)
+
+        metadata = [{"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid,
+                     "args": {"name": name}} for tid, name in thread_names.items()]
+        with open(filepath, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+        print(f"[TRACE] Zapisano {len(events)} zdarzeń do {filepath}")
+        return len(events)
+
+
+tracer = Tracer()
+
+
+def traced(category: str = "app", name: Optional[str] = None):
+    """Dekorator: span wokół wywołania funkcji (nazwa domyślnie Klasa.metoda)"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer._span(span_name, category, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_class(cls, category: str, skip=()):
+    """Owija publiczne metody zdefiniowane w klasie w spany"""
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith("_") or attr in skip or not inspect.isfunction(value):
+            continue
+        setattr(cls, attr, traced(category)(value))
+    return cls
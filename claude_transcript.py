@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Hurtowe renderowanie transkryptu rozmowy dla Claude GUI Assistant
+Wczytana rozmowa budowana jest w jednym przebiegu jako lista par (tekst, tagi)
+i wstawiana do tk.Text jednym wywołaniem insert na paczkę - zamiast konfiguracji
+tagów, czterech wstawień i see("end") na każdą wiadomość. Duże rozmowy renderowane
+są od najnowszych: ostatnia strona od razu, starsze paczki doklejane na górze
+w kolejnych obrotach pętli zdarzeń, z zachowaniem widocznego fragmentu.
+"""
+
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+SEPARATOR = "-" * 80 + "\n"
+FIRST_PAGE = 100             # wiadomości renderowanych od razu (najnowsze)
+CHUNK_MESSAGES = 200         # starszych wiadomości na jeden krok w tle
+CHUNK_CHARS = 200_000        # ... albo mniej, gdy są długie
+CHUNK_DELAY_MS = 1           # przerwa między krokami - obsługa zdarzeń (przewijanie, pisanie)
+
+
+def message_time(msg: Dict) -> str:
+    """Godzina wiadomości z bazy (ISO), a bez niej bieżąca"""
+    stamp = msg.get("timestamp")
+    if stamp:
+        try:
+            return datetime.fromisoformat(stamp).strftime("%H:%M:%S")
+        except ValueError:
+            pass
+    return datetime.now().strftime("%H:%M:%S")
+
+
+class TranscriptRenderer:
+    """Renderowanie wielu wiadomości naraz do okna czatu sesji"""
+
+    def __init__(self, gui):
+        self.gui = gui
+
+    def render(self, session, messages: List[Dict],
+               thinking_loader: Optional[Callable[[Dict], Optional[Callable]]] = None):
+        """
+        Zastępuje zawartość okna czatu wiadomościami. thinking_loader(msg) zwraca funkcję
+        doczytującą myślenie odpowiedzi z bazy albo None
+        """
+        chat_display = session.chat_display
+        chat_display.delete("1.0", "end")
+        session.thinking_blocks = {}
+        session.transcript_generation += 1
+
+        split = max(0, len(messages) - FIRST_PAGE)
+        session.lazy_pending_messages = list(messages[:split])
+        segments = self.segments(session, messages[split:], thinking_loader)
+        if segments:
+            chat_display.insert("end", *segments)
+        chat_display.see("end")
+
+        if session.lazy_pending_messages:
+            generation = session.transcript_generation
+            self.gui.root.after(CHUNK_DELAY_MS, self._render_older, session, generation, thinking_loader)
+
+    def append(self, session, messages: List[Dict]):
+        """Dokleja wiadomości na końcu okna czatu (wczytywanie pliku stronami)"""
+        segments = self.segments(session, messages)
+        if segments:
+            session.chat_display.insert("end", *segments)
+        session.chat_display.see("end")
+
+    def segments(self, session, messages: List[Dict], thinking_loader=None) -> List:
+        """Naprzemiennie tekst i tagi dla Text.insert - jeden przebieg po wiadomościach"""
+        segments = []
+        for msg in messages:
+            user = msg["role"] == "user"
+            segments += [f"\n[{message_time(msg)}] ", "timestamp",
+                         "Ty:\n" if user else "Claude:\n", "user_sender" if user else "ai_sender"]
+
+            loader = thinking_loader(msg) if thinking_loader and not user else None
+            if loader is not None:
+                tokens = msg.get("thinking_tokens") or 0
+                block = session.new_thinking_block(False, f" (~{tokens:,} tok.)" if tokens else "", loader)
+                segments += [self.gui.thinking_header_text(session, block),
+                             ("thinking_header", f"thinking_header_{block}"),
+                             "\n", ("thinking", f"thinking_{block}", "thinking_collapsed")]
+
+            segments += [f"{msg['content']}\n", "message", SEPARATOR, "separator"]
+        return segments
+
+    def _render_older(self, session, generation: int, thinking_loader):
+        """Dokleja na górze kolejną paczkę starszych wiadomości (wątek Tk)"""
+        # Rozmowa wyczyszczona albo wczytana ponownie - ta kolejka jest nieaktualna
+        if generation != session.transcript_generation or not session.lazy_pending_messages:
+            return
+
+        pending = session.lazy_pending_messages
+        start, chars = len(pending), 0
+        while start > 0 and len(pending) - start < CHUNK_MESSAGES and chars < CHUNK_CHARS:
+            start -= 1
+            chars += len(pending[start]["content"])
+        chunk = pending[start:]
+        del pending[start:]
+
+        # Widoczny fragment zostaje na miejscu mimo tekstu dopisanego powyżej
+        chat_display = session.chat_display
+        chat_display.mark_set("transcript_view", "@0,0")
+        chat_display.insert("1.0", *self.segments(session, chunk, thinking_loader))
+        chat_display.yview("transcript_view")
+
+        if pending:
+            self.gui.root.after(CHUNK_DELAY_MS, self._render_older, session, generation, thinking_loader)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Wirtualna lista wierszy dla Claude GUI Assistant
+Trzyma wszystkie wiersze w pamięci, ale do widgetu Text wstawia tylko te widoczne
+(kilkadziesiąt zamiast tysięcy) - odświeżenie listy kosztuje tyle samo dla 50 i 50 000
+wyników. Pasujące fragmenty wierszy są podświetlane, zaznaczenie działa jak w Listbox
+(klik, Ctrl - przełącz, Shift - zakres, strzałki).
+"""
+
+import tkinter as tk
+from tkinter import font as tkfont
+from typing import Callable, List, Optional, Tuple
+
+
+class VirtualList(tk.Frame):
+    """Lista z renderowaniem tylko widocznych wierszy i podświetlaniem dopasowań"""
+
+    def __init__(self, parent, font, bg: str = '#2b2b2b', fg: str = 'white',
+                 select_bg: str = '#0084ff', match_bg: str = '#806600',
+                 on_select: Optional[Callable[[], None]] = None,
+                 on_activate: Optional[Callable[[], None]] = None):
+        super().__init__(parent, bg=bg)
+        self.rows: List[str] = []
+        self.highlight: Optional[str] = None
+        self.top = 0  # indeks pierwszego widocznego wiersza
+        self.selection = set()
+        self.anchor: Optional[int] = None
+        self.on_select = on_select
+        self.on_activate = on_activate
+
+        self.scrollbar = tk.Scrollbar(self, command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.text = tk.Text(
+            self, font=font, bg=bg, fg=fg, wrap="none", cursor="arrow",
+            width=30, height=20, borderwidth=0, highlightthickness=0, state="disabled"
+        )
+        self.text.pack(side="left", fill="both", expand=True)
+        self.text.tag_configure("selected", background=select_bg)
+        self.text.tag_configure("match", background=match_bg)
+        self.text.tag_raise("match")
+        self.line_height = max(1, tkfont.Font(font=self.text.cget("font")).metrics("linespace"))
+
+        self.text.bind("<Configure>", lambda e: self.render())
+        self.text.bind("<Button-1>", self._on_click)
+        self.text.bind("<Control-Button-1>", lambda e: self._on_click(e, toggle=True))
+        self.text.bind("<Shift-Button-1>", lambda e: self._on_click(e, extend=True))
+        self.text.bind("<Double-Button-1>", self._on_double_click)
+        self.text.bind("<Up>", lambda e: self._move(-1))
+        self.text.bind("<Down>", lambda e: self._move(1))
+        self.text.bind("<Prior>", lambda e: self._move(-self.visible_rows()))
+        self.text.bind("<Next>", lambda e: self._move(self.visible_rows()))
+        # Kółko myszy: Windows/macOS (delta) i X11 (przyciski 4/5)
+        self.text.bind("<MouseWheel>", lambda e: self._scroll(-1 if e.delta > 0 else 1, "units", 3))
+        self.text.bind("<Button-4>", lambda e: self._scroll(-1, "units", 3))
+        self.text.bind("<Button-5>", lambda e: self._scroll(1, "units", 3))
+
+    # --- dane ---
+
+    def set_rows(self, rows: List[str], highlight: Optional[str] = None):
+        """Nowa zawartość listy - czyści zaznaczenie i przewija na początek"""
+        self.rows = rows
+        self.highlight = highlight or None
+        self.top = 0
+        self.selection = set()
+        self.anchor = None
+        self.render()
+
+    def curselection(self) -> Tuple[int, ...]:
+        """Zaznaczone indeksy (rosnąco) - jak Listbox.curselection()"""
+        return tuple(sorted(self.selection))
+
+    # --- przewijanie ---
+
+    def visible_rows(self) -> int:
+        """Ile pełnych wierszy mieści się w widgecie"""
+        return max(1, self.text.winfo_height() // self.line_height)
+
+    def yview(self, *args):
+        """Obsługa paska przewijania (moveto / scroll)"""
+        if not args:
+            return
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.rows))
+            self.render()
+        elif args[0] == "scroll":
+            self._scroll(int(args[1]), args[2])
+
+    def _scroll(self, count: int, what: str, step: int = 1):
+        page = self.visible_rows()
+        self.top += count * (page if what == "pages" else step)
+        self.render()
+        return "break"
+
+    def see(self, index: int):
+        """Przewija tak, żeby wiersz index był widoczny"""
+        page = self.visible_rows()
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + page:
+            self.top = index - page + 1
+        self.render()
+
+    # --- rysowanie ---
+
+    def render(self):
+        """Wstawia do Text wyłącznie widoczny wycinek wierszy"""
+        total = len(self.rows)
+        page = self.visible_rows()
+        self.top = max(0, min(self.top, total - page))
+        # Wiersz więcej - ostatni może być widoczny częściowo
+        visible = self.rows[self.top:self.top + page + 1]
+
+        self.text.configure(state="normal")
+        self.text.delete("1.0", "end")
+        self.text.insert("1.0", "\n".join(visible))
+        for line, index in enumerate(range(self.top, self.top + len(visible)), start=1):
+            if index in self.selection:
+                self.text.tag_add("selected", f"{line}.0", f"{line}.0 lineend+1c")
+        if self.highlight:
+            self._highlight_matches()
+        self.text.configure(state="disabled")
+
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + page) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _highlight_matches(self):
+        # Wyszukiwanie Tk (a nie indeksy z Pythona) - poprawne także przy emoji spoza BMP
+        count = tk.IntVar()
+        start = "1.0"
+        while True:
+            start = self.text.search(self.highlight, start, stopindex="end", nocase=True, count=count)
+            if not start or not count.get():
+                break
+            end = f"{start}+{count.get()}c"
+            self.text.tag_add("match", start, end)
+            start = end
+
+    # --- zaznaczenie ---
+
+    def _index_at(self, event) -> Optional[int]:
+        line = int(self.text.index(f"@{event.x},{event.y}").split(".")[0])
+        index = self.top + line - 1
+        return index if 0 <= index < len(self.rows) else None
+
+    def _on_click(self, event, toggle: bool = False, extend: bool = False):
+        self.text.focus_set()
+        index = self._index_at(event)
+        if index is None:
+            return "break"
+        if extend and self.anchor is not None:
+            low, high = sorted((self.anchor, index))
+            self.selection = set(range(low, high + 1))
+        elif toggle:
+            self.selection ^= {index}
+            self.anchor = index
+        else:
+            self.selection = {index}
+            self.anchor = index
+        self.render()
+        if self.on_select:
+            self.on_select()
+        return "break"
+
+    def _on_double_click(self, event):
+        if self._index_at(event) is not None and self.on_activate:
+            self.on_activate()
+        return "break"
+
+    def _move(self, delta: int):
+        if not self.rows:
+            return "break"
+        current = self.anchor if self.anchor is not None else self.top - delta
+        index = max(0, min(len(self.rows) - 1, current + delta))
+        self.selection = {index}
+        self.anchor = index
+        self.see(index)
+        if self.on_select:
+            self.on_select()
+        return "break"
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Watchdog responsywności interfejsu Claude GUI Assistant
+Pętla Tk co chwilę odbija "heartbeat" (root.after), a wątek monitorujący
+sprawdza, czy przyszedł na czas. Gdy główny wątek się zawiesi (synchroniczne
+zapytanie do bazy, duże wstawienie do czatu, odświeżanie czcionek), watchdog
+próbkuje jego stos i zapisuje zdarzenie z winnym miejscem w kodzie do
+ui_stalls.log oraz do zakładki diagnostyki.
+"""
+
+import os
+import sys
+import time
+import threading
+from collections import Counter, deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+STALLS_LOG = "ui_stalls.log"
+HEARTBEAT_MS = 100
+STALL_THRESHOLD = 0.25  # sekundy opóźnienia pętli zdarzeń uznawane za zawieszenie
+MAX_SAMPLES = 20        # próbek stosu na jedno zawieszenie
+MAX_EVENTS = 200        # zdarzeń trzymanych w pamięci (zakładka diagnostyki)
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return getattr(code, "co_qualname", code.co_name)
+
+
+def _is_app_frame(frame) -> bool:
+    """Ramka z kodu aplikacji (nie biblioteki, nie sam watchdog)"""
+    filename = os.path.abspath(frame.f_code.co_filename)
+    return (os.path.dirname(filename) == APP_DIR and
+            os.path.basename(filename) != os.path.basename(__file__))
+
+
+def capture_stack(frame) -> List[Dict]:
+    """Stos od najgłębszej ramki (plik, linia, funkcja, czy kod aplikacji)"""
+    stack = []
+    while frame is not None:
+        stack.append({
+            "file": os.path.basename(frame.f_code.co_filename),
+            "line": frame.f_lineno,
+            "function": _frame_name(frame),
+            "app": _is_app_frame(frame)
+        })
+        frame = frame.f_back
+    return stack
+
+
+def culprit_of(samples: List[List[Dict]]) -> Optional[Dict]:
+    """Najczęstsza najgłębsza ramka aplikacji we wszystkich próbkach"""
+    counts = Counter()
+    by_key = {}
+    for stack in samples:
+        for entry in stack:
+            if entry["app"]:
+                key = (entry["file"], entry["function"])
+                counts[key] += 1
+                by_key.setdefault(key, entry)
+                break
+    if not counts:
+        return None
+    return by_key[counts.most_common(1)[0][0]]
+
+
+def describe_stall(event: Dict) -> str:
+    """Jedna linia opisu zawieszenia"""
+    culprit = event.get("culprit")
+    where = f"{culprit['function']} ({culprit['file']}:{culprit['line']})" if culprit else "nieznane miejsce"
+    return f"[{event['time']}] Zawieszenie UI {event['duration']:.2f}s - {where}"
+
+
+class UIWatchdog:
+    """Mierzy opóźnienie pętli zdarzeń Tk i łapie stos przy zawieszeniach"""
+
+    def __init__(self, root, interval_ms: int = HEARTBEAT_MS, threshold: float = STALL_THRESHOLD,
+                 log_path: Optional[str] = STALLS_LOG, on_stall: Optional[Callable[[Dict], None]] = None):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.threshold = threshold
+        self.log_path = log_path
+        self.on_stall = on_stall
+
+        self.events = deque(maxlen=MAX_EVENTS)
+        self.max_lag = 0.0
+        self.beats = 0
+
+        self._lock = threading.Lock()
+        self._main_ident = threading.main_thread().ident
+        self._expected = 0.0
+        self._samples: List[List[Dict]] = []
+        self._to_log: List[Dict] = []
+        self._running = False
+        self._stop = threading.Event()
+
+    def start(self):
+        """Uruchamia heartbeat (wywoływać z wątku Tk) i wątek monitorujący"""
+        if self._running:
+            return
+        self._running = True
+        self._stop.clear()
+        self._main_ident = threading.get_ident()
+        self._schedule()
+        threading.Thread(target=self._monitor, name="ui-watchdog", daemon=True).start()
+        print(f"[WATCHDOG] Monitor pętli zdarzeń aktywny (próg {self.threshold * 1000:.0f} ms)")
+
+    def stop(self):
+        self._running = False
+        self._stop.set()
+
+    def _schedule(self):
+        with self._lock:
+            self._expected = time.monotonic() + self.interval_ms / 1000.0
+        self.root.after(self.interval_ms, self._beat)
+
+    def _beat(self):
+        """Heartbeat w wątku Tk - zamyka ewentualne zawieszenie"""
+        if not self._running:
+            return
+        now = time.monotonic()
+        with self._lock:
+            lag = max(0.0, now - self._expected)
+            samples, self._samples = self._samples, []
+        self.beats += 1
+        self.max_lag = max(self.max_lag, lag)
+
+        if lag >= self.threshold:
+            event = {
+                "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "duration": lag,
+                "samples": len(samples),
+                "culprit": culprit_of(samples),
+                "stack": samples[0] if samples else []
+            }
+            self.events.append(event)
+            with self._lock:
+                self._to_log.append(event)
+            if self.on_stall:
+                self.on_stall(event)
+
+        self._schedule()
+
+    def _monitor(self):
+        """Wątek monitorujący - próbkuje stos głównego wątku, gdy heartbeat się spóźnia"""
+        poll = min(self.threshold / 2, self.interval_ms / 1000.0)
+        while not self._stop.wait(poll):
+            with self._lock:
+                overdue = time.monotonic() - self._expected
+                sampling = overdue >= self.threshold and len(self._samples) < MAX_SAMPLES
+                pending, self._to_log = self._to_log, []
+
+            if sampling:
+                frame = sys._current_frames().get(self._main_ident)
+                if frame is not None:
+                    stack = capture_stack(frame)
+                    with self._lock:
+                        # Heartbeat mógł w międzyczasie dotrzeć - wtedy próbka jest nieaktualna
+                        if time.monotonic() - self._expected >= self.threshold:
+                            self._samples.append(stack)
+                del frame
+
+            if pending:
+                self._write_log(pending)
+
+    def _write_log(self, events: List[Dict]):
+        if not self.log_path:
+            return
+        try:
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                for event in events:
+                    f.write(describe_stall(event) + "\n")
+                    for entry in event["stack"]:
+                        marker = "*" if entry["app"] else " "
+                        f.write(f"    {marker} {entry['file']}:{entry['line']} {entry['function']}\n")
+        except Exception as e:
+            print(f"[WATCHDOG] Nie można zapisać {self.log_path}: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "beats": self.beats,
+            "stalls": len(self.events),
+            "max_lag": self.max_lag,
+            "total_stall_time": sum(e["duration"] for e in self.events)
+        }
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Rejestr widgetów i współdzielone nazwane czcionki dla Claude GUI Assistant
+Widgety trzymane są przez słabe referencje i pogrupowane według typu,
+a zmiana czcionki to rekonfiguracja kilku obiektów Font zamiast tysięcy widgetów.
+"""
+
+import weakref
+from tkinter import font as tkfont
+from typing import Dict, Optional
+
+import customtkinter as ctk
+
+# Typy widgetów: (mnożnik rozmiaru, pogrubienie, czy czcionka czatu)
+FONT_ROLES = {
+    "title": (1.5, True, False),
+    "header": (1.2, True, False),
+    "button": (1.0, True, False),
+    "normal": (1.0, False, False),
+    "small": (0.9, False, False),
+    "chat": (1.0, False, True),
+    "chat_bold": (1.0, True, True),
+}
+
+
+class WidgetRegistry:
+    """Rejestr widgetów do globalnej zmiany czcionek"""
+
+    def __init__(self, family: str, size: int, chat_family: str, chat_size: int):
+        self.family = family
+        self.size = size
+        self.chat_family = chat_family
+        self.chat_size = chat_size
+
+        # CTk skaluje rozmiar w pikselach (CTkFont), zwykłe widgety tk używają punktów (Font)
+        self.ctk_fonts: Dict[str, ctk.CTkFont] = {}
+        self.tk_fonts: Dict[str, tkfont.Font] = {}
+        for role in FONT_ROLES:
+            family_, size_, weight = self._font_spec(role)
+            self.ctk_fonts[role] = ctk.CTkFont(family=family_, size=size_, weight=weight)
+            self.tk_fonts[role] = tkfont.Font(family=family_, size=size_, weight=weight)
+
+        # Słabe referencje - zniszczone widgety znikają same
+        self._roles = weakref.WeakKeyDictionary()
+        self._by_role: Dict[str, weakref.WeakSet] = {role: weakref.WeakSet() for role in FONT_ROLES}
+
+    def _font_spec(self, role: str):
+        scale, bold, is_chat = FONT_ROLES[role]
+        family = self.chat_family if is_chat else self.family
+        size = self.chat_size if is_chat else self.size
+        return family, max(1, int(size * scale)), "bold" if bold else "normal"
+
+    def font_for(self, widget, role: str = "normal"):
+        """Zwraca współdzieloną czcionkę odpowiednią dla rodzaju widgetu"""
+        if role not in FONT_ROLES:
+            role = "normal"
+        if isinstance(widget, ctk.CTkBaseClass):
+            return self.ctk_fonts[role]
+        return self.tk_fonts[role]
+
+    def register(self, widget, role: str = "normal"):
+        """Rejestruje widget i od razu przypisuje mu współdzieloną czcionkę"""
+        if role not in FONT_ROLES:
+            role = "normal"
+
+        previous = self._roles.get(widget)
+        if previous and previous != role:
+            self._by_role[previous].discard(widget)
+
+        self._roles[widget] = role
+        self._by_role[role].add(widget)
+
+        try:
+            widget.configure(font=self.font_for(widget, role))
+        except Exception:
+            pass
+
+    def restore(self, widget):
+        """Przywraca współdzieloną czcionkę widgetowi, któremu ustawiono czcionkę doraźnie"""
+        role = self._roles.get(widget)
+        if role:
+            try:
+                widget.configure(font=self.font_for(widget, role))
+            except Exception:
+                pass
+
+    def set_fonts(self, family: str, size: int, chat_family: str, chat_size: int):
+        """Zmienia czcionki - rekonfiguruje tylko nazwane obiekty Font"""
+        self.family = family
+        self.size = size
+        self.chat_family = chat_family
+        self.chat_size = chat_size
+
+        for role in FONT_ROLES:
+            family_, size_, weight = self._font_spec(role)
+            self.ctk_fonts[role].configure(family=family_, size=size_, weight=weight)
+            self.tk_fonts[role].configure(family=family_, size=size_, weight=weight)
+
+    def prune(self) -> int:
+        """Usuwa widgety zniszczone, ale wciąż trzymane gdzieś w atrybutach"""
+        removed = 0
+        for role, widgets in self._by_role.items():
+            for widget in list(widgets):
+                try:
+                    alive = widget.winfo_exists()
+                except Exception:
+                    alive = False
+                if not alive:
+                    widgets.discard(widget)
+                    self._roles.pop(widget, None)
+                    removed += 1
+        return removed
+
+    def widgets(self, role: Optional[str] = None):
+        """Zwraca żyjące widgety (wszystkie lub danego typu)"""
+        if role:
+            return list(self._by_role.get(role, ()))
+        return [w for widgets in self._by_role.values() for w in widgets]
+
+    def counts(self) -> Dict[str, int]:
+        """Liczba zarejestrowanych widgetów według typu"""
+        return {role: len(widgets) for role, widgets in self._by_role.items()}